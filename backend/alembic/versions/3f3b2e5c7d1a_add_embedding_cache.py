@@ -0,0 +1,54 @@
+"""Add Embedding Cache
+
+Revision ID: 3f3b2e5c7d1a
+Revises: b156fa702355
+Create Date: 2023-12-18 21:14:09.613312
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "3f3b2e5c7d1a"
+down_revision = "b156fa702355"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "embedding_cache",
+        sa.Column("model_name", sa.String(), nullable=False),
+        sa.Column("passage_prefix", sa.String(), nullable=False),
+        sa.Column("content_hash", sa.String(), nullable=False),
+        sa.Column("embedding", postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column(
+            "last_used_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("model_name", "passage_prefix", "content_hash"),
+    )
+    op.create_index(
+        op.f("ix_embedding_cache_last_used_at"),
+        "embedding_cache",
+        ["last_used_at"],
+        unique=False,
+    )
+    op.add_column(
+        "index_attempt",
+        sa.Column("embedding_cache_hits", sa.Integer(), nullable=True),
+    )
+    op.add_column(
+        "index_attempt",
+        sa.Column("embedding_cache_misses", sa.Integer(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("index_attempt", "embedding_cache_misses")
+    op.drop_column("index_attempt", "embedding_cache_hits")
+    op.drop_index(op.f("ix_embedding_cache_last_used_at"), table_name="embedding_cache")
+    op.drop_table("embedding_cache")
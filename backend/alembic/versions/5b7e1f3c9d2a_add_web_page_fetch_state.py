@@ -0,0 +1,40 @@
+"""Add Web Page Fetch State
+
+Revision ID: 5b7e1f3c9d2a
+Revises: 8a1c5d2e9f47
+Create Date: 2023-12-22 14:05:31.418226
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "5b7e1f3c9d2a"
+down_revision = "8a1c5d2e9f47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "web_page_fetch_state",
+        sa.Column("crawl_key", sa.String(), nullable=False),
+        sa.Column("url", sa.String(), nullable=False),
+        sa.Column("etag", sa.String(), nullable=True),
+        sa.Column("last_modified", sa.String(), nullable=True),
+        sa.Column("sitemap_lastmod", sa.String(), nullable=True),
+        sa.Column("content_hash", sa.String(), nullable=True),
+        sa.Column("links", postgresql.ARRAY(sa.String()), nullable=False),
+        sa.Column(
+            "time_updated",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("crawl_key", "url"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("web_page_fetch_state")
@@ -0,0 +1,44 @@
+"""Add Search Cache Invalidation
+
+Revision ID: 8a1c5d2e9f47
+Revises: 3f3b2e5c7d1a
+Create Date: 2023-12-21 10:42:17.281904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "8a1c5d2e9f47"
+down_revision = "3f3b2e5c7d1a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "search_cache_invalidation",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("document_id", sa.String(), nullable=False),
+        sa.Column(
+            "time_created",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_search_cache_invalidation_time_created"),
+        "search_cache_invalidation",
+        ["time_created"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_search_cache_invalidation_time_created"),
+        table_name="search_cache_invalidation",
+    )
+    op.drop_table("search_cache_invalidation")
@@ -0,0 +1,27 @@
+"""Add Index Attempt Checkpoint
+
+Revision ID: c4d8e2a6f1b3
+Revises: 5b7e1f3c9d2a
+Create Date: 2023-12-27 11:42:08.913457
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "c4d8e2a6f1b3"
+down_revision = "5b7e1f3c9d2a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "index_attempt",
+        sa.Column("checkpoint", postgresql.JSONB(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("index_attempt", "checkpoint")
@@ -0,0 +1,47 @@
+"""Add Query Embedding Cache
+
+Revision ID: d7a3f9b1e5c2
+Revises: c4d8e2a6f1b3
+Create Date: 2024-01-03 14:26:51.730518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "d7a3f9b1e5c2"
+down_revision = "c4d8e2a6f1b3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "query_embedding_cache",
+        sa.Column("model_name", sa.String(), nullable=False),
+        sa.Column("query_prefix", sa.String(), nullable=False),
+        sa.Column("query_hash", sa.String(), nullable=False),
+        sa.Column("embedding", postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column(
+            "time_created",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("model_name", "query_prefix", "query_hash"),
+    )
+    op.create_index(
+        op.f("ix_query_embedding_cache_time_created"),
+        "query_embedding_cache",
+        ["time_created"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_query_embedding_cache_time_created"),
+        table_name="query_embedding_cache",
+    )
+    op.drop_table("query_embedding_cache")
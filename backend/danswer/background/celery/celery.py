@@ -12,6 +12,9 @@ from danswer.background.task_utils import name_cc_cleanup_task
 from danswer.background.task_utils import name_document_set_sync_task
 from danswer.configs.app_configs import FILE_CONNECTOR_TMP_STORAGE_PATH
 from danswer.configs.app_configs import JOB_TIMEOUT
+from danswer.configs.chat_configs import ENABLE_SHARED_QUERY_EMBEDDING_CACHE
+from danswer.configs.chat_configs import QUERY_EMBEDDING_CACHE_TTL
+from danswer.configs.chat_configs import SEARCH_RESULT_CACHE_TTL
 from danswer.connectors.file.utils import file_age_in_hours
 from danswer.db.connector_credential_pair import get_connector_credential_pair
 from danswer.db.deletion_attempt import check_deletion_attempt_is_allowed
@@ -26,6 +29,8 @@ from danswer.db.engine import build_connection_string
 from danswer.db.engine import get_sqlalchemy_engine
 from danswer.db.engine import SYNC_DB_API
 from danswer.db.models import DocumentSet
+from danswer.db.query_embedding_cache import delete_expired_query_embeddings
+from danswer.db.search_cache import delete_old_search_cache_invalidations
 from danswer.db.tasks import check_live_task_not_timed_out
 from danswer.db.tasks import get_latest_task
 from danswer.document_index.factory import get_default_document_index
@@ -214,6 +219,32 @@ def clean_old_temp_files_task(
             os.remove(full_file_path)
 
 
+@celery_app.task(
+    name="clean_old_search_cache_invalidations_task", soft_time_limit=JOB_TIMEOUT
+)
+def clean_old_search_cache_invalidations_task() -> None:
+    """The API servers read the search cache invalidations within seconds, keep them
+    for twice the search result cache TTL for some slack"""
+    with Session(get_sqlalchemy_engine()) as db_session:
+        delete_old_search_cache_invalidations(
+            retention=timedelta(seconds=2 * SEARCH_RESULT_CACHE_TTL),
+            db_session=db_session,
+        )
+
+
+@celery_app.task(
+    name="clean_expired_query_embeddings_task", soft_time_limit=JOB_TIMEOUT
+)
+def clean_expired_query_embeddings_task() -> None:
+    if not ENABLE_SHARED_QUERY_EMBEDDING_CACHE:
+        return
+
+    with Session(get_sqlalchemy_engine()) as db_session:
+        delete_expired_query_embeddings(
+            ttl=timedelta(seconds=QUERY_EMBEDDING_CACHE_TTL), db_session=db_session
+        )
+
+
 #####
 # Celery Beat (Periodic Tasks) Settings
 #####
@@ -226,4 +257,12 @@ celery_app.conf.beat_schedule = {
         "task": "clean_old_temp_files_task",
         "schedule": timedelta(minutes=30),
     },
+    "clean-old-search-cache-invalidations": {
+        "task": "clean_old_search_cache_invalidations_task",
+        "schedule": timedelta(minutes=5),
+    },
+    "clean-expired-query-embeddings": {
+        "task": "clean_expired_query_embeddings_task",
+        "schedule": timedelta(hours=1),
+    },
 }
@@ -1,11 +1,28 @@
 """Experimental functionality related to splitting up indexing
 into a series of checkpoints to better handle intermittent failures
-/ jobs being killed by cloud providers."""
+/ jobs being killed by cloud providers.
+
+Connectors implementing `CheckpointConnector` are also resumed from the last
+batch that an earlier attempt for the same time window indexed."""
 import datetime
+import json
+import time
+from collections import deque
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import cast
 
 from danswer.configs.app_configs import EXPERIMENTAL_CHECKPOINTING_ENABLED
 from danswer.configs.constants import DocumentSource
 from danswer.connectors.cross_connector_utils.miscellaneous_utils import datetime_to_utc
+from danswer.connectors.interfaces import BaseConnector
+from danswer.connectors.interfaces import CheckpointConnector
+from danswer.connectors.interfaces import ConnectorCheckpoint
+from danswer.connectors.interfaces import GenerateDocumentsOutput
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
 
 
 def _2010_dt() -> datetime.datetime:
@@ -73,3 +90,92 @@ def get_time_windows_for_index_attempt(
         start_of_window = end_of_window
 
     return time_windows
+
+
+def build_checkpoint(
+    window_start: datetime.datetime,
+    window_end: datetime.datetime,
+    connector_checkpoint: ConnectorCheckpoint,
+) -> dict[str, Any]:
+    """What is saved with the index attempt, the connector state is only valid for the
+    time window it was taken in"""
+    return {
+        "window_start": window_start.timestamp(),
+        "window_end": window_end.timestamp(),
+        "connector_checkpoint": connector_checkpoint,
+    }
+
+
+def get_resumed_time_windows(
+    time_windows: list[tuple[datetime.datetime, datetime.datetime]],
+    checkpoint: dict[str, Any] | None,
+) -> tuple[
+    list[tuple[datetime.datetime, datetime.datetime]], ConnectorCheckpoint | None
+]:
+    """If the checkpoint was taken in the window this attempt starts with (i.e. the
+    previous attempt didn't finish it), that window is redone with the end it had
+    then and the connector resumes from the checkpoint. The rest of the time range
+    follows in the usual windows"""
+    if (
+        not checkpoint
+        or not time_windows
+        or time_windows[0][0].timestamp() != checkpoint["window_start"]
+    ):
+        return time_windows, None
+
+    resumed_window_end = datetime.datetime.fromtimestamp(
+        checkpoint["window_end"], tz=datetime.timezone.utc
+    )
+    resumed_windows = [(time_windows[0][0], resumed_window_end)]
+    for window_start, window_end in time_windows:
+        if window_end > resumed_window_end:
+            resumed_windows.append((max(window_start, resumed_window_end), window_end))
+
+    return resumed_windows, checkpoint["connector_checkpoint"]
+
+
+@dataclass
+class CheckpointTracker:
+    """Takes the connector's checkpoint as each batch comes out of the connector and
+    hands them back in the same order as the batches come out of indexing"""
+
+    connector: BaseConnector
+    # size of the checkpoint the connector was resumed from, if any
+    resumed_checkpoint_size: int | None = None
+    pending: deque[ConnectorCheckpoint | None] = field(default_factory=deque)
+    num_saved: int = 0
+    max_size: int = 0
+    time_to_first_batch: float | None = None
+
+    def track(self, doc_batches: GenerateDocumentsOutput) -> GenerateDocumentsOutput:
+        start = time.monotonic()
+        for doc_batch in doc_batches:
+            if self.time_to_first_batch is None:
+                self.time_to_first_batch = time.monotonic() - start
+                if self.resumed_checkpoint_size is not None:
+                    logger.info(
+                        f"Resumed from a checkpoint of {self.resumed_checkpoint_size} "
+                        f"bytes, first batch after {self.time_to_first_batch:.2f} seconds"
+                    )
+            # the connector is paused on the `yield` of this batch
+            self.pending.append(
+                self.connector.get_checkpoint()
+                if isinstance(self.connector, CheckpointConnector)
+                else None
+            )
+            yield doc_batch
+
+    def pop_indexed(self) -> ConnectorCheckpoint | None:
+        """The checkpoint to save after the next batch to be indexed"""
+        checkpoint = self.pending.popleft()
+        if checkpoint is None:
+            return None
+
+        connector = cast(CheckpointConnector, self.connector)
+        connector.checkpoint_indexed(checkpoint)
+        # saving it would only make the next attempt redo the time window
+        if not connector.resumable:
+            return None
+        self.num_saved += 1
+        self.max_size = max(self.max_size, len(json.dumps(checkpoint)))
+        return checkpoint
@@ -4,6 +4,7 @@ not follow the expected behavior, etc.
 
 NOTE: cannot use Celery directly due to
 https://github.com/celery/celery/issues/7007#issuecomment-1740139367"""
+import atexit
 from collections.abc import Callable
 from dataclasses import dataclass
 from typing import Any
@@ -11,7 +12,9 @@ from typing import Literal
 
 from torch import multiprocessing
 
+from danswer.configs.app_configs import INDEXING_CHUNKER_PROCESSES
 from danswer.utils.logger import setup_logger
+from danswer.utils.process_watchdog import exit_with_parent
 
 logger = setup_logger()
 
@@ -25,6 +28,12 @@ JobStatusType = (
 )
 
 
+def _run_job(func: Callable, *args: Any) -> None:
+    # jobs with a chunking pool are not daemonic, they would outlive this process
+    exit_with_parent()
+    func(*args)
+
+
 @dataclass
 class SimpleJob:
     """Drop in replacement for `dask.distributed.Future`"""
@@ -76,6 +85,8 @@ class SimpleJobClient:
         self.n_workers = n_workers
         self.job_id_counter = 0
         self.jobs: dict[int, SimpleJob] = {}
+        # otherwise the non-daemonic jobs are waited on when this process exits
+        atexit.register(self.shutdown)
 
     def _cleanup_completed_jobs(self) -> None:
         current_job_ids = list(self.jobs.keys())
@@ -95,10 +106,20 @@ class SimpleJobClient:
         job_id = self.job_id_counter
         self.job_id_counter += 1
 
-        process = multiprocessing.Process(target=func, args=args, daemon=True)
+        # daemonic processes cannot have children of their own, so jobs which chunk
+        # documents on a process pool are started as regular processes
+        process = multiprocessing.Process(
+            target=_run_job,
+            args=(func, *args),
+            daemon=INDEXING_CHUNKER_PROCESSES == 0,
+        )
         job = SimpleJob(id=job_id, process=process)
         process.start()
 
         self.jobs[job_id] = job
 
         return job
+
+    def shutdown(self) -> None:
+        for job in self.jobs.values():
+            job.release()
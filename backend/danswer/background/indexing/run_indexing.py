@@ -1,3 +1,4 @@
+import json
 import time
 from datetime import datetime
 from datetime import timezone
@@ -5,8 +6,16 @@ from datetime import timezone
 import torch
 from sqlalchemy.orm import Session
 
+from danswer.background.indexing.checkpointing import build_checkpoint
+from danswer.background.indexing.checkpointing import CheckpointTracker
+from danswer.background.indexing.checkpointing import get_resumed_time_windows
 from danswer.background.indexing.checkpointing import get_time_windows_for_index_attempt
+from danswer.configs.app_configs import EMBEDDING_CACHE_MAX_ENTRIES
+from danswer.configs.app_configs import ENABLE_EMBEDDING_CACHE
 from danswer.connectors.factory import instantiate_connector
+from danswer.connectors.interfaces import BaseConnector
+from danswer.connectors.interfaces import CheckpointConnector
+from danswer.connectors.interfaces import ConnectorCheckpoint
 from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
 from danswer.connectors.interfaces import PollConnector
@@ -18,13 +27,20 @@ from danswer.db.connector_credential_pair import update_connector_credential_pai
 from danswer.db.credentials import backend_update_credential_json
 from danswer.db.engine import get_sqlalchemy_engine
 from danswer.db.index_attempt import get_index_attempt
+from danswer.db.index_attempt import get_latest_index_attempt_checkpoint
 from danswer.db.index_attempt import mark_attempt_failed
 from danswer.db.index_attempt import mark_attempt_in_progress
 from danswer.db.index_attempt import mark_attempt_succeeded
 from danswer.db.index_attempt import update_docs_indexed
+from danswer.db.index_attempt import update_embedding_cache_stats
+from danswer.db.index_attempt import update_index_attempt_checkpoint
 from danswer.db.models import IndexAttempt
 from danswer.db.models import IndexingStatus
-from danswer.indexing.indexing_pipeline import build_indexing_pipeline
+from danswer.indexing.chunker import Chunker
+from danswer.indexing.chunker import ParallelChunker
+from danswer.indexing.embedder import DefaultEmbedder
+from danswer.indexing.embedding_cache import EmbeddingCache
+from danswer.indexing.indexing_pipeline import run_pipelined_indexing
 from danswer.utils.logger import IndexAttemptSingleton
 from danswer.utils.logger import setup_logger
 
@@ -36,7 +52,8 @@ def _get_document_generator(
     attempt: IndexAttempt,
     start_time: datetime,
     end_time: datetime,
-) -> GenerateDocumentsOutput:
+    checkpoint: ConnectorCheckpoint | None = None,
+) -> tuple[GenerateDocumentsOutput, BaseConnector]:
     """NOTE: `start_time` and `end_time` are only used for poll connectors"""
     task = attempt.connector.input_type
 
@@ -56,6 +73,13 @@ def _get_document_generator(
         disable_connector(attempt.connector.id, db_session)
         raise e
 
+    if (
+        checkpoint is not None
+        and isinstance(runnable_connector, CheckpointConnector)
+        and runnable_connector.resumable
+    ):
+        runnable_connector.set_checkpoint(checkpoint)
+
     if task == InputType.LOAD_STATE:
         assert isinstance(runnable_connector, LoadConnector)
         doc_batch_generator = runnable_connector.load_from_state()
@@ -77,12 +101,13 @@ def _get_document_generator(
         # Event types cannot be handled by a background type
         raise RuntimeError(f"Invalid task type: {task}")
 
-    return doc_batch_generator
+    return doc_batch_generator, runnable_connector
 
 
 def _run_indexing(
     db_session: Session,
     index_attempt: IndexAttempt,
+    chunker: Chunker,
 ) -> None:
     """
     1. Get documents which are either new or updated from specified application
@@ -100,7 +125,8 @@ def _run_indexing(
         attempt_status=IndexingStatus.IN_PROGRESS,
     )
 
-    indexing_pipeline = build_indexing_pipeline()
+    embedding_cache = EmbeddingCache() if ENABLE_EMBEDDING_CACHE else None
+    embedder = DefaultEmbedder(embedding_cache=embedding_cache)
     db_connector = index_attempt.connector
     db_credential = index_attempt.credential
     last_successful_index_time = get_last_successful_attempt_time(
@@ -113,42 +139,71 @@ def _run_indexing(
     document_count = 0
     chunk_count = 0
     run_end_dt = None
-    for ind, (window_start, window_end) in enumerate(
-        get_time_windows_for_index_attempt(
-            last_successful_run=datetime.fromtimestamp(
-                last_successful_index_time, tz=timezone.utc
-            ),
-            source_type=db_connector.source,
+    time_windows = get_time_windows_for_index_attempt(
+        last_successful_run=datetime.fromtimestamp(
+            last_successful_index_time, tz=timezone.utc
+        ),
+        source_type=db_connector.source,
+    )
+    # only the experimental time windows make a failure in a later window count as
+    # progress, not the split of a window that is resumed below
+    allow_partial_success = len(time_windows) > 1
+    resumed_time_windows, resume_checkpoint = get_resumed_time_windows(
+        time_windows=time_windows,
+        checkpoint=get_latest_index_attempt_checkpoint(
+            connector_id=db_connector.id,
+            credential_id=db_credential.id,
+            exclude_attempt_id=index_attempt.id,
+            db_session=db_session,
+        ),
+    )
+    # the time range doesn't apply to loads, no need to redo the previous window's range
+    if db_connector.input_type != InputType.LOAD_STATE:
+        time_windows = resumed_time_windows
+    if resume_checkpoint is not None:
+        logger.info("Resuming from the checkpoint of a previous attempt")
+        # carried over in case this attempt fails before it indexes anything
+        update_index_attempt_checkpoint(
+            db_session=db_session,
+            index_attempt=index_attempt,
+            checkpoint=build_checkpoint(*time_windows[0], resume_checkpoint),
         )
-    ):
-        doc_batch_generator = _get_document_generator(
+
+    for ind, (window_start, window_end) in enumerate(time_windows):
+        window_checkpoint = resume_checkpoint if ind == 0 else None
+        doc_batch_generator, runnable_connector = _get_document_generator(
             db_session=db_session,
             attempt=index_attempt,
             start_time=window_start,
             end_time=window_end,
+            checkpoint=window_checkpoint,
+        )
+        checkpoint_tracker = CheckpointTracker(
+            connector=runnable_connector,
+            resumed_checkpoint_size=len(json.dumps(window_checkpoint))
+            if window_checkpoint is not None
+            else None,
         )
 
         try:
-            for doc_batch in doc_batch_generator:
-                # check if connector is disabled mid run and stop if so
-                db_session.refresh(db_connector)
-                if db_connector.disabled:
-                    # let the `except` block handle this
-                    raise RuntimeError("Connector was disabled mid run")
-
+            # the connector is pulled from and the documents are chunked / embedded
+            # ahead of time on background threads, batches come out fully indexed
+            for indexed_batch in run_pipelined_indexing(
+                doc_batches=checkpoint_tracker.track(doc_batch_generator),
+                index_attempt_metadata=IndexAttemptMetadata(
+                    connector_id=db_connector.id,
+                    credential_id=db_credential.id,
+                ),
+                chunker=chunker,
+                embedder=embedder,
+            ):
+                doc_batch = indexed_batch.documents
                 logger.debug(
-                    f"Indexing batch of documents: {[doc.to_short_descriptor() for doc in doc_batch]}"
+                    f"Indexed batch of documents: {[doc.to_short_descriptor() for doc in doc_batch]}"
                 )
 
-                new_docs, total_batch_chunks = indexing_pipeline(
-                    documents=doc_batch,
-                    index_attempt_metadata=IndexAttemptMetadata(
-                        connector_id=db_connector.id,
-                        credential_id=db_credential.id,
-                    ),
-                )
-                net_doc_change += new_docs
-                chunk_count += total_batch_chunks
+                net_doc_change += indexed_batch.new_docs
+                chunk_count += indexed_batch.num_chunks
                 document_count += len(doc_batch)
 
                 # commit transaction so that the `update` below begins
@@ -165,8 +220,40 @@ def _run_indexing(
                     total_docs_indexed=document_count,
                     new_docs_indexed=net_doc_change,
                 )
+                if embedding_cache is not None:
+                    update_embedding_cache_stats(
+                        db_session=db_session,
+                        index_attempt=index_attempt,
+                        embedding_cache_hits=embedding_cache.hits,
+                        embedding_cache_misses=embedding_cache.misses,
+                    )
+
+                connector_checkpoint = checkpoint_tracker.pop_indexed()
+                if connector_checkpoint is not None:
+                    update_index_attempt_checkpoint(
+                        db_session=db_session,
+                        index_attempt=index_attempt,
+                        checkpoint=build_checkpoint(
+                            window_start, window_end, connector_checkpoint
+                        ),
+                    )
+
+                # check if connector is disabled mid run and stop if so
+                db_session.refresh(db_connector)
+                if db_connector.disabled:
+                    # let the `except` block handle this
+                    raise RuntimeError("Connector was disabled mid run")
 
             run_end_dt = window_end
+            if checkpoint_tracker.num_saved:
+                logger.info(
+                    f"Saved {checkpoint_tracker.num_saved} checkpoints, the largest "
+                    f"was {checkpoint_tracker.max_size} bytes"
+                )
+            # nothing left to resume in this window
+            update_index_attempt_checkpoint(
+                db_session=db_session, index_attempt=index_attempt, checkpoint=None
+            )
             update_connector_credential_pair(
                 db_session=db_session,
                 connector_id=db_connector.id,
@@ -186,7 +273,7 @@ def _run_indexing(
             #
             # NOTE: if the connector is manually disabled, we should mark it as a failure regardless
             # to give better clarity in the UI, as the next run will never happen.
-            if ind == 0 or db_connector.disabled:
+            if ind == 0 or not allow_partial_success or db_connector.disabled:
                 mark_attempt_failed(index_attempt, db_session, failure_reason=str(e))
                 update_connector_credential_pair(
                     db_session=db_session,
@@ -214,6 +301,12 @@ def _run_indexing(
     logger.info(
         f"Indexed or refreshed {document_count} total documents for a total of {chunk_count} indexed chunks"
     )
+    if embedding_cache is not None:
+        logger.info(
+            f"Embedding cache hits: {embedding_cache.hits}, "
+            f"misses: {embedding_cache.misses}"
+        )
+        embedding_cache.evict(max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
     logger.info(
         f"Connector successfully finished, elapsed time: {time.time() - start_time} seconds"
     )
@@ -246,10 +339,17 @@ def run_indexing_entrypoint(index_attempt_id: int, num_threads: int) -> None:
                 f"with credentials: '{attempt.credential_id}'"
             )
 
-            _run_indexing(
-                db_session=db_session,
-                index_attempt=attempt,
-            )
+            # no-op wrapper around the default chunking unless
+            # INDEXING_CHUNKER_PROCESSES is set
+            chunker = ParallelChunker()
+            try:
+                _run_indexing(
+                    db_session=db_session,
+                    index_attempt=attempt,
+                    chunker=chunker,
+                )
+            finally:
+                chunker.shutdown()
 
             logger.info(
                 f"Completed indexing attempt for connector: '{attempt.connector.name}', "
@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 
 from danswer.chat.chat_utils import build_chat_system_message
 from danswer.chat.chat_utils import build_chat_user_message
+from danswer.chat.chat_utils import combine_message_chain
 from danswer.chat.chat_utils import create_chat_chain
 from danswer.chat.chat_utils import get_chunks_for_qa
 from danswer.chat.chat_utils import llm_doc_from_inference_chunk
@@ -48,7 +49,6 @@ from danswer.search.search_runner import chunks_to_search_docs
 from danswer.search.search_runner import full_chunk_search_generator
 from danswer.search.search_runner import inference_documents_from_ids
 from danswer.secondary_llm_flows.choose_search import check_if_need_search
-from danswer.secondary_llm_flows.query_expansion import history_based_query_rephrase
 from danswer.server.query_and_chat.models import CreateChatMessageRequest
 from danswer.server.utils import get_json_line
 from danswer.utils.logger import setup_logger
@@ -384,21 +384,22 @@ def stream_chat_packets(
             ]
 
         elif run_search:
-            rephrased_query = history_based_query_rephrase(
-                query_message=final_msg, history=history_msgs, llm=llm
-            )
-
             (
                 retrieval_request,
                 predicted_search_type,
                 predicted_flow,
             ) = retrieval_preprocessing(
-                query=rephrased_query,
+                query=final_msg.message,
                 retrieval_details=cast(RetrievalDetails, retrieval_options),
                 persona=persona,
                 user=user,
                 db_session=db_session,
+                history_str=combine_message_chain(history_msgs),
+                # chat always rephrased the latest message, even the first one
+                rephrase_without_history=True,
+                llm=llm,
             )
+            rephrased_query = retrieval_request.query
 
             documents_generator = full_chunk_search_generator(
                 search_query=retrieval_request,
@@ -96,6 +96,66 @@ VESPA_TENANT_PORT = os.environ.get("VESPA_TENANT_PORT") or "19071"
 VESPA_DEPLOYMENT_ZIP = (
     os.environ.get("VESPA_DEPLOYMENT_ZIP") or "/app/danswer/vespa-app.zip"
 )
+# Build an HNSW index over the chunk embeddings so that vector search is approximate
+# instead of a brute force scan over every (mini) chunk vector. Worth it for large corpuses,
+# costs extra memory and feeding time. Can be turned on (or off) for an existing index without
+# re-indexing, Vespa builds the HNSW graph from the stored vectors, but only once its content
+# node restarts. After the change the API server refuses to start until Vespa was restarted
+VESPA_ENABLE_HNSW_INDEX = (
+    os.environ.get("VESPA_ENABLE_HNSW_INDEX", "").lower() == "true"
+)
+# Vespa defaults, higher values give better recall at the cost of memory / feeding time
+VESPA_HNSW_MAX_LINKS_PER_NODE = int(
+    os.environ.get("VESPA_HNSW_MAX_LINKS_PER_NODE") or 16
+)
+VESPA_HNSW_NEIGHBORS_TO_EXPLORE_AT_INSERT = int(
+    os.environ.get("VESPA_HNSW_NEIGHBORS_TO_EXPLORE_AT_INSERT") or 200
+)
+# Query time settings, only have an effect if the HNSW index is enabled
+# Set to false to force an exact nearest neighbor search even if the HNSW index exists
+VESPA_ANN_APPROXIMATE = os.environ.get("VESPA_ANN_APPROXIMATE", "").lower() != "false"
+# Additional candidates to explore in the HNSW graph beyond targetHits, trades latency for recall
+VESPA_HNSW_EXPLORE_ADDITIONAL_HITS = int(
+    os.environ.get("VESPA_HNSW_EXPLORE_ADDITIONAL_HITS") or 0
+)
+# Cell type used to store the chunk embeddings in Vespa, one of "float", "bfloat16" or "int8".
+# bfloat16 halves and int8 quarters the memory used by the embeddings, which are the majority
+# of the content node memory, for a small loss in precision. Vectors are scaled per vector to
+# the int8 range, which does not change their angular distances.
+# Changing this (or DOC_EMBEDDING_DIM) for an existing index changes the tensor type of the
+# embeddings fields, which Vespa refuses to deploy, so the API server fails to start. To apply it
+# either reset the index (remove the Vespa volume) or set VESPA_ALLOW_EMBEDDING_TYPE_CHANGE.
+# In both cases the stored embeddings are gone afterwards and every document has to be re-fed:
+# delete the connectors and add them again so that they index everything from scratch
+VESPA_EMBEDDING_CELL_TYPE = (
+    os.environ.get("VESPA_EMBEDDING_CELL_TYPE") or "float"
+).lower()
+# Deploy the Vespa app with a `field-type-change` validation override, so that the type of the
+# embeddings fields of an existing index can be changed in place. Only set this for the restart
+# which applies the change, see above for the re-feed that is needed afterwards
+VESPA_ALLOW_EMBEDDING_TYPE_CHANGE = (
+    os.environ.get("VESPA_ALLOW_EMBEDDING_TYPE_CHANGE", "").lower() == "true"
+)
+# Also store a binarized (1 bit per dimension) copy of the embeddings and use hamming distance
+# over those for the nearest neighbor search, with only the top VESPA_BINARY_RERANK_COUNT hits
+# per content node being scored with the full precision embeddings
+VESPA_ENABLE_BINARY_EMBEDDINGS = (
+    os.environ.get("VESPA_ENABLE_BINARY_EMBEDDINGS", "").lower() == "true"
+)
+VESPA_BINARY_RERANK_COUNT = int(os.environ.get("VESPA_BINARY_RERANK_COUNT") or 1000)
+# Rerank the top hits with the cross-encoder inside Vespa (ONNX model run in the global-phase of
+# the rank profile) instead of sending the chunk texts to the API / model server for reranking.
+# Only uses the first model of CROSS_ENCODER_MODEL_ENSEMBLE. The chunk contents are tokenized at
+# feeding time into a new attribute, existing chunks need to be re-indexed to be reranked
+VESPA_CROSS_ENCODER_RERANKING = (
+    os.environ.get("VESPA_CROSS_ENCODER_RERANKING", "").lower() == "true"
+)
+# Max number of document/v1 operations (feed / update / delete) in flight at once against Vespa
+# Vespa will respond with 429 / 503 when overloaded, in which case the in flight limit is halved
+VESPA_FEED_MAX_IN_FLIGHT = int(os.environ.get("VESPA_FEED_MAX_IN_FLIGHT") or 32)
+# Multiplex feed operations over HTTP/2 (prior knowledge, no TLS) instead of a pool of HTTP/1.1
+# connections. Requires the `h2` package (`pip install httpx[http2]`)
+VESPA_FEED_HTTP2 = os.environ.get("VESPA_FEED_HTTP2", "").lower() == "true"
 # Number of documents in a batch during indexing (further batching done by chunks before passing to bi-encoder)
 INDEX_BATCH_SIZE = 16
 
@@ -128,6 +188,39 @@ WEB_CONNECTOR_IGNORED_ELEMENTS = os.environ.get(
 WEB_CONNECTOR_OAUTH_CLIENT_ID = os.environ.get("WEB_CONNECTOR_OAUTH_CLIENT_ID")
 WEB_CONNECTOR_OAUTH_CLIENT_SECRET = os.environ.get("WEB_CONNECTOR_OAUTH_CLIENT_SECRET")
 WEB_CONNECTOR_OAUTH_TOKEN_URL = os.environ.get("WEB_CONNECTOR_OAUTH_TOKEN_URL")
+# Number of pages the web connector fetches at once, each concurrent fetch keeps its own
+# headless browser alive for the pages which need to be rendered
+WEB_CONNECTOR_MAX_CONCURRENCY = max(
+    1, int(os.environ.get("WEB_CONNECTOR_MAX_CONCURRENCY") or 8)
+)
+# Politeness limits for any single host, the max number of pages fetched from it at once and
+# the min number of seconds between the starts of two fetches
+WEB_CONNECTOR_MAX_CONCURRENCY_PER_HOST = max(
+    1, int(os.environ.get("WEB_CONNECTOR_MAX_CONCURRENCY_PER_HOST") or 4)
+)
+WEB_CONNECTOR_MIN_REQUEST_INTERVAL_PER_HOST = float(
+    os.environ.get("WEB_CONNECTOR_MIN_REQUEST_INTERVAL_PER_HOST") or 0
+)
+# Fetch pages with plain HTTP requests first and only render them in a headless browser if
+# they look like they need JavaScript, i.e. barely any text in the static HTML
+WEB_CONNECTOR_HTTP_FAST_PATH = (
+    os.environ.get("WEB_CONNECTOR_HTTP_FAST_PATH", "").lower() != "false"
+)
+
+# Number of Slack channels fetched at once and number of threads fetched at once across all
+# of them, the calls are also held to Slack's per method rate limits
+SLACK_CONNECTOR_MAX_CONCURRENT_CHANNELS = max(
+    1, int(os.environ.get("SLACK_CONNECTOR_MAX_CONCURRENT_CHANNELS") or 4)
+)
+SLACK_CONNECTOR_MAX_CONCURRENT_THREADS = max(
+    1, int(os.environ.get("SLACK_CONNECTOR_MAX_CONCURRENT_THREADS") or 8)
+)
+
+# Where rate limiters that are shared between processes keep their state, has to be on the
+# same host for all of the processes sharing a limit
+RATE_LIMITER_STATE_DIR = os.environ.get(
+    "RATE_LIMITER_STATE_DIR", "/tmp/danswer_rate_limits"
+)
 
 NOTION_CONNECTOR_ENABLE_RECURSIVE_PAGE_LOOKUP = (
     os.environ.get("NOTION_CONNECTOR_ENABLE_RECURSIVE_PAGE_LOOKUP", "").lower()
@@ -166,6 +259,9 @@ CONTINUE_ON_CONNECTOR_FAILURE = os.environ.get(
 # fairly large amount of memory in order to increase substantially, since
 # each worker loads the embedding models into memory.
 NUM_INDEXING_WORKERS = int(os.environ.get("NUM_INDEXING_WORKERS") or 1)
+# Number of processes each indexing worker uses to chunk documents, 0 chunks in the indexing
+# worker itself. Sized independently of the torch threads used for embedding.
+INDEXING_CHUNKER_PROCESSES = int(os.environ.get("INDEXING_CHUNKER_PROCESSES") or 0)
 CHUNK_OVERLAP = 0
 # More accurate results at the expense of indexing speed and index size (stores additional 4 MINI_CHUNK vectors)
 ENABLE_MINI_CHUNK = os.environ.get("ENABLE_MINI_CHUNK", "").lower() == "true"
@@ -173,6 +269,18 @@ ENABLE_MINI_CHUNK = os.environ.get("ENABLE_MINI_CHUNK", "").lower() == "true"
 # Slightly larger since the sentence aware split is a max cutoff so most minichunks will be under MINI_CHUNK_SIZE
 # tokens. But we need it to be at least as big as 1/4th chunk size to avoid having a tiny mini-chunk at the end
 MINI_CHUNK_SIZE = 150
+# Background indexing overlaps pulling from the connector, chunking, embedding and writing to the
+# document index. This is the max number of document batches waiting between two of these stages,
+# higher values smooth out uneven stages at the cost of memory
+INDEXING_PIPELINE_QUEUE_SIZE = int(os.environ.get("INDEXING_PIPELINE_QUEUE_SIZE") or 2)
+# Reuse the embeddings of chunks whose text (and embedding model / passage prefix) has not
+# changed since they were last indexed, stored in Postgres keyed on a hash of the chunk text
+ENABLE_EMBEDDING_CACHE = os.environ.get("ENABLE_EMBEDDING_CACHE", "").lower() == "true"
+# Least recently used embeddings beyond this count are evicted at the end of each index attempt
+# roughly 3.5KB per entry for a 768 dimension model
+EMBEDDING_CACHE_MAX_ENTRIES = int(
+    os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES") or 1_000_000
+)
 
 
 #####
@@ -183,6 +291,19 @@ MINI_CHUNK_SIZE = 150
 MODEL_SERVER_HOST = os.environ.get("MODEL_SERVER_HOST") or None
 MODEL_SERVER_ALLOWED_HOST = os.environ.get("MODEL_SERVER_HOST") or "0.0.0.0"
 MODEL_SERVER_PORT = int(os.environ.get("MODEL_SERVER_PORT") or "9000")
+# The model server coalesces concurrent embedding / reranking requests into a single batch.
+# A batch waits at most this long for more requests to arrive, 0 only batches requests which
+# are already waiting
+MODEL_SERVER_BATCH_MAX_WAIT_MS = float(
+    os.environ.get("MODEL_SERVER_BATCH_MAX_WAIT_MS") or 5
+)
+# Max number of texts / (query, passage) pairs in a batch, a single request is never split
+MODEL_SERVER_EMBED_MAX_BATCH_SIZE = int(
+    os.environ.get("MODEL_SERVER_EMBED_MAX_BATCH_SIZE") or 64
+)
+MODEL_SERVER_RERANK_MAX_BATCH_SIZE = int(
+    os.environ.get("MODEL_SERVER_RERANK_MAX_BATCH_SIZE") or 128
+)
 
 EMBEDDING_MODEL_SERVER_HOST = (
     os.environ.get("EMBEDDING_MODEL_SERVER_HOST") or MODEL_SERVER_HOST
@@ -216,6 +337,15 @@ JOB_TIMEOUT = 60 * 60 * 6  # 6 hours default
 CURRENT_PROCESS_IS_AN_INDEXING_JOB = (
     os.environ.get("CURRENT_PROCESS_IS_AN_INDEXING_JOB", "").lower() == "true"
 )
+# Max number of threads of the long lived executors which all of the requests served by a
+# process share, for fanning out calls to Vespa, the LLMs and the model servers. Tasks beyond
+# these wait in the executor queue, see GET /manage/admin/executor-stats for the wait times
+DEFAULT_EXECUTOR_MAX_WORKERS = int(os.environ.get("DEFAULT_EXECUTOR_MAX_WORKERS") or 64)
+VESPA_EXECUTOR_MAX_WORKERS = int(os.environ.get("VESPA_EXECUTOR_MAX_WORKERS") or 32)
+LLM_EXECUTOR_MAX_WORKERS = int(os.environ.get("LLM_EXECUTOR_MAX_WORKERS") or 16)
+MODEL_SERVER_EXECUTOR_MAX_WORKERS = int(
+    os.environ.get("MODEL_SERVER_EXECUTOR_MAX_WORKERS") or 16
+)
 # Logs every model prompt and output, mostly used for development or exploration purposes
 LOG_ALL_MODEL_INTERACTIONS = (
     os.environ.get("LOG_ALL_MODEL_INTERACTIONS", "").lower() == "true"
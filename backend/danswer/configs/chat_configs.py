@@ -42,6 +42,16 @@ DISABLE_LLM_FILTER_EXTRACTION = (
 DISABLE_LLM_CHUNK_FILTER = (
     os.environ.get("DISABLE_LLM_CHUNK_FILTER", "").lower() == "true"
 )
+# Number of chunks scored together in one LLM chunk filter prompt, 1 for one call per chunk.
+# Batches with an invalid output are scored again one chunk per call
+LLM_CHUNK_FILTER_BATCH_SIZE = max(
+    1, int(os.environ.get("LLM_CHUNK_FILTER_BATCH_SIZE") or 10)
+)
+# Max number of LLM chunk filter calls in flight at a time, across all of the queries
+# served by an API server process
+LLM_CHUNK_FILTER_MAX_CONCURRENCY = max(
+    1, int(os.environ.get("LLM_CHUNK_FILTER_MAX_CONCURRENCY") or 8)
+)
 # Whether the LLM should be used to decide if a search would help given the chat history
 DISABLE_LLM_CHOOSE_SEARCH = (
     os.environ.get("DISABLE_LLM_CHOOSE_SEARCH", "").lower() == "true"
@@ -63,6 +73,42 @@ HYBRID_ALPHA = max(0, min(1, float(os.environ.get("HYBRID_ALPHA") or 0.6)))
 # A list of languages passed to the LLM to rephase the query
 # For example "English,French,Spanish", be sure to use the "," separator
 MULTILINGUAL_QUERY_EXPANSION = os.environ.get("MULTILINGUAL_QUERY_EXPANSION") or None
+# Max number of query embeddings kept in memory by each API server process, 0 to disable
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE") or 2048)
+QUERY_EMBEDDING_CACHE_TTL = int(
+    os.environ.get("QUERY_EMBEDDING_CACHE_TTL") or 60 * 60 * 24  # 1 day
+)
+# Also look up / store query embeddings in Postgres so that API server replicas share hits,
+# they expire from there after QUERY_EMBEDDING_CACHE_TTL as well
+ENABLE_SHARED_QUERY_EMBEDDING_CACHE = (
+    os.environ.get("ENABLE_SHARED_QUERY_EMBEDDING_CACHE", "").lower() == "true"
+)
+# Max number of full search results (retrieved + reranked chunks and the LLM relevance
+# filter results) kept in memory by each API server process, 0 to disable. Entries are
+# dropped once any of their documents is re-indexed, updated (boost, hidden, access, etc.)
+# or deleted, this needs to be set to the same value for the background indexing processes
+SEARCH_RESULT_CACHE_SIZE = int(os.environ.get("SEARCH_RESULT_CACHE_SIZE") or 256)
+SEARCH_RESULT_CACHE_TTL = int(os.environ.get("SEARCH_RESULT_CACHE_TTL") or 120)
+# Each API server process reads the invalidations at most once per this many seconds and
+# shares the read between the searches, so results are served for up to this long after
+# their documents change
+SEARCH_RESULT_CACHE_REFRESH_INTERVAL = float(
+    os.environ.get("SEARCH_RESULT_CACHE_REFRESH_INTERVAL") or 0.5
+)
+# Rephrase the query with the chat history and extract the time / source filters with a single
+# LLM call instead of one call per flow. The separate flows are used if its output is invalid
+ENABLE_COMBINED_QUERY_UNDERSTANDING = (
+    os.environ.get("ENABLE_COMBINED_QUERY_UNDERSTANDING", "").lower() != "false"
+)
+# Max number of combined query understanding results kept in memory by each API server
+# process, 0 to disable. Relative time filters are recomputed on every hit, the TTL covers
+# the absolute ones which depend on the current day
+QUERY_UNDERSTANDING_CACHE_SIZE = int(
+    os.environ.get("QUERY_UNDERSTANDING_CACHE_SIZE") or 1024
+)
+QUERY_UNDERSTANDING_CACHE_TTL = int(
+    os.environ.get("QUERY_UNDERSTANDING_CACHE_TTL") or 60 * 60  # 1 hour
+)
 
 # The backend logic for this being True isn't fully supported yet
 HARD_DELETE_CHATS = False
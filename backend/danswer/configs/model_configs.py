@@ -13,8 +13,28 @@ CHUNK_SIZE = 512
 DOCUMENT_ENCODER_MODEL = (
     os.environ.get("DOCUMENT_ENCODER_MODEL") or "thenlper/gte-small"
 )
-# If the below is changed, Vespa deployment must also be changed
-DOC_EMBEDDING_DIM = 384
+# Output dimension of commonly used encoders, for any other model DOC_EMBEDDING_DIM must be set
+_KNOWN_ENCODER_DIMS = {
+    "thenlper/gte-small": 384,
+    "thenlper/gte-base": 768,
+    "thenlper/gte-large": 1024,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-en-v1.5": 768,
+    "BAAI/bge-large-en-v1.5": 1024,
+    "intfloat/e5-small-v2": 384,
+    "intfloat/e5-base-v2": 768,
+    "intfloat/e5-large-v2": 1024,
+    "intfloat/multilingual-e5-small": 384,
+    "intfloat/multilingual-e5-base": 768,
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+}
+# The Vespa schema is generated with this dimension, changing it for an existing index
+# requires resetting or re-feeding it, see VESPA_EMBEDDING_CELL_TYPE in app_configs.py
+DOC_EMBEDDING_DIM = int(
+    os.environ.get("DOC_EMBEDDING_DIM")
+    or _KNOWN_ENCODER_DIMS.get(DOCUMENT_ENCODER_MODEL, 384)
+)
 # Model should be chosen with 512 context size, ideally don't change this
 DOC_EMBEDDING_CONTEXT_SIZE = 512
 NORMALIZE_EMBEDDINGS = (
@@ -26,8 +46,30 @@ SIM_SCORE_RANGE_HIGH = float(os.environ.get("SIM_SCORE_RANGE_HIGH") or 1.0)
 # Certain models like e5, BGE, etc use a prefix for asymmetric retrievals (query generally shorter than docs)
 ASYM_QUERY_PREFIX = os.environ.get("ASYM_QUERY_PREFIX", "")
 ASYM_PASSAGE_PREFIX = os.environ.get("ASYM_PASSAGE_PREFIX", "")
+# Backend used to run the bi-encoder and cross-encoders locally (in the model server or, if there
+# is no model server, in the API server / background jobs). One of:
+# "torch": full precision PyTorch models
+# "onnx": models exported to ONNX, run with ONNX Runtime
+# "onnx_int8": same as "onnx" but with int8 weights (dynamic quantization), fastest on CPU
+INFERENCE_BACKEND = (os.environ.get("INFERENCE_BACKEND") or "torch").lower()
+# The ONNX exports are created the first time a model is loaded and reused after that
+ONNX_MODEL_CACHE_DIR = os.environ.get("ONNX_MODEL_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "danswer", "onnx"
+)
 # Purely an optimization, memory limitation consideration
 BATCH_SIZE_ENCODE_CHUNKS = 8
+# Instead of fixed size batches in insertion order, sort the texts to embed by token length and
+# fill each batch up to a budget of padded tokens (batch size * longest text in the batch), so
+# that short mini-chunks are not padded to the length of full chunks. Off by default, the batch
+# sizes and the order the texts are sent to the model in change when this is turned on
+ENABLE_LENGTH_BUCKETED_EMBEDDING = (
+    os.environ.get("ENABLE_LENGTH_BUCKETED_EMBEDDING", "").lower() == "true"
+)
+# Default keeps the same peak memory as BATCH_SIZE_ENCODE_CHUNKS full length chunks
+EMBEDDING_BATCH_TOKEN_BUDGET = int(
+    os.environ.get("EMBEDDING_BATCH_TOKEN_BUDGET")
+    or BATCH_SIZE_ENCODE_CHUNKS * DOC_EMBEDDING_CONTEXT_SIZE
+)
 # This controls the minimum number of pytorch "threads" to allocate to the embedding
 # model. If torch finds more threads on its own, this value is not used.
 MIN_THREADS_ML_MODELS = int(os.environ.get("MIN_THREADS_ML_MODELS") or 1)
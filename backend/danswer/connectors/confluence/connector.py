@@ -14,6 +14,8 @@ from danswer.configs.app_configs import CONTINUE_ON_CONNECTOR_FAILURE
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
 from danswer.configs.constants import DocumentSource
 from danswer.connectors.cross_connector_utils.html_utils import parse_html_page_basic
+from danswer.connectors.interfaces import CheckpointConnector
+from danswer.connectors.interfaces import ConnectorCheckpoint
 from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
 from danswer.connectors.interfaces import PollConnector
@@ -106,7 +108,7 @@ def _comment_dfs(
     return comments_str
 
 
-class ConfluenceConnector(LoadConnector, PollConnector):
+class ConfluenceConnector(LoadConnector, PollConnector, CheckpointConnector):
     def __init__(
         self,
         wiki_page_url: str,
@@ -124,6 +126,15 @@ class ConfluenceConnector(LoadConnector, PollConnector):
             wiki_page_url
         )
         self.confluence_client: Confluence | None = None
+        # offset into the space's pages to start from and to continue from
+        self._resume_start_ind = 0
+        self._next_start_ind = 0
+
+    def get_checkpoint(self) -> ConnectorCheckpoint | None:
+        return {"start_ind": self._next_start_ind}
+
+    def set_checkpoint(self, checkpoint: ConnectorCheckpoint) -> None:
+        self._resume_start_ind = checkpoint["start_ind"]
 
     def load_credentials(self, credentials: dict[str, Any]) -> dict[str, Any] | None:
         username = credentials["confluence_username"]
@@ -309,10 +320,11 @@ class ConfluenceConnector(LoadConnector, PollConnector):
         if self.confluence_client is None:
             raise ConnectorMissingCredentialError("Confluence")
 
-        start_ind = 0
+        start_ind, self._resume_start_ind = self._resume_start_ind, 0
         while True:
             doc_batch, num_pages = self._get_doc_batch(start_ind)
             start_ind += num_pages
+            self._next_start_ind = start_ind
             if doc_batch:
                 yield doc_batch
 
@@ -328,12 +340,13 @@ class ConfluenceConnector(LoadConnector, PollConnector):
         start_time = datetime.fromtimestamp(start, tz=timezone.utc)
         end_time = datetime.fromtimestamp(end, tz=timezone.utc)
 
-        start_ind = 0
+        start_ind, self._resume_start_ind = self._resume_start_ind, 0
         while True:
             doc_batch, num_pages = self._get_doc_batch(
                 start_ind, time_filter=lambda t: start_time <= t <= end_time
             )
             start_ind += num_pages
+            self._next_start_ind = start_ind
             if doc_batch:
                 yield doc_batch
 
@@ -1,10 +1,25 @@
+import asyncio
+import inspect
+import json
+import threading
 import time
+from collections import deque
 from collections.abc import Callable
+from collections.abc import Iterator
+from collections.abc import Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
 from functools import wraps
+from pathlib import Path
 from typing import Any
 from typing import cast
 from typing import TypeVar
 
+import requests
+from filelock import FileLock
+
+from danswer.configs.app_configs import RATE_LIMITER_STATE_DIR
 from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
@@ -12,19 +27,235 @@ logger = setup_logger()
 
 F = TypeVar("F", bound=Callable[..., Any])
 
+_FILE_LOCK_TIMEOUT = 10
+# headers used by APIs to report how many calls are left in the current window and when it
+# resets, either in seconds from now or as a unix timestamp
+_REMAINING_HEADERS = ["X-RateLimit-Remaining", "RateLimit-Remaining"]
+_RESET_HEADERS = ["X-RateLimit-Reset", "RateLimit-Reset"]
+# reset values above this are unix timestamps rather than a number of seconds
+_MIN_RESET_TIMESTAMP = 1_000_000_000
+
 
 class RateLimitTriedTooManyTimesError(Exception):
     pass
 
 
+@dataclass
+class _EndpointState:
+    # start times of the latest calls, the oldest one is `max_calls` calls ago
+    calls: deque[float]
+    # no calls start before this, e.g. after being told to back off by the API
+    paused_until: float = 0
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    """Retry-After is either a number of seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_header(headers: Mapping[str, str], names: list[str]) -> float | None:
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+class RateLimiter:
+    """Allows at most `max_calls` calls per `period` seconds to each endpoint of an API,
+    `endpoint_limits` overrides that for specific endpoints.
+
+    A caller reserves the next free slot under a lock and then waits for it outside of the
+    lock, so a limiter can be shared by any number of threads and asyncio tasks. Only the
+    start times of the last `max_calls` calls are kept, reserving a slot is O(1).
+
+    With a `shared_key`, the state is kept in a file instead so that all of the processes
+    on the host using the same key cooperate, e.g. indexing workers calling an API with the
+    same credentials."""
+
+    def __init__(
+        self,
+        max_calls: int,
+        period: float,  # in seconds
+        endpoint_limits: dict[str, tuple[int, float]] | None = None,
+        shared_key: str | None = None,
+    ) -> None:
+        self.max_calls = max_calls
+        self.period = period
+        self.endpoint_limits = endpoint_limits or {}
+
+        self._lock = threading.Lock()
+        self._states: dict[str, _EndpointState] = {}
+        self._file_path = (
+            Path(RATE_LIMITER_STATE_DIR) / f"{shared_key}.json" if shared_key else None
+        )
+        # the start times have to be comparable across processes if shared
+        self._clock = time.time if shared_key else time.monotonic
+
+    def _get_limits(self, endpoint: str) -> tuple[int, float]:
+        return self.endpoint_limits.get(endpoint, (self.max_calls, self.period))
+
+    def _get_state(self, endpoint: str) -> _EndpointState:
+        if endpoint not in self._states:
+            max_calls, _ = self._get_limits(endpoint)
+            self._states[endpoint] = _EndpointState(calls=deque(maxlen=max_calls))
+        return self._states[endpoint]
+
+    def _load_states(self, file_path: Path) -> None:
+        self._states = {}
+        if not file_path.exists():
+            return
+        with open(file_path) as f:
+            for endpoint, state in json.load(f).items():
+                max_calls, _ = self._get_limits(endpoint)
+                self._states[endpoint] = _EndpointState(
+                    calls=deque(state["calls"], maxlen=max_calls),
+                    paused_until=state["paused_until"],
+                )
+
+    def _save_states(self, file_path: Path) -> None:
+        now = self._clock()
+        with open(file_path, "w") as f:
+            json.dump(
+                {
+                    endpoint: {
+                        "calls": list(state.calls),
+                        "paused_until": state.paused_until,
+                    }
+                    for endpoint, state in self._states.items()
+                    # no need to keep endpoints that haven't been called in a while
+                    if state.paused_until > now
+                    or (
+                        state.calls
+                        and state.calls[-1] > now - self._get_limits(endpoint)[1]
+                    )
+                },
+                f,
+            )
+
+    @contextmanager
+    def _endpoint_state(self, endpoint: str) -> Iterator[_EndpointState]:
+        with self._lock:
+            if self._file_path is None:
+                yield self._get_state(endpoint)
+                return
+
+            self._file_path.parent.mkdir(parents=True, exist_ok=True)
+            with FileLock(self._file_path.with_suffix(".lock")).acquire(
+                timeout=_FILE_LOCK_TIMEOUT
+            ):
+                self._load_states(self._file_path)
+                yield self._get_state(endpoint)
+                self._save_states(self._file_path)
+
+    def reserve(
+        self, endpoint: str = "", max_wait: float | None = None
+    ) -> float | None:
+        """Reserves the next free slot for a call to `endpoint` and returns how many seconds
+        to wait before making it. None, without reserving anything, if that would be more
+        than `max_wait`"""
+        max_calls, period = self._get_limits(endpoint)
+        with self._endpoint_state(endpoint) as state:
+            now = self._clock()
+            start = max(now, state.paused_until)
+            if len(state.calls) >= max_calls:
+                start = max(start, state.calls[0] + period)
+
+            if max_wait is not None and start - now > max_wait:
+                return None
+
+            state.calls.append(start)
+            return start - now
+
+    def acquire(self, endpoint: str = "", max_wait: float | None = None) -> bool:
+        """Blocks until a call to `endpoint` can be made, False if that would take longer
+        than `max_wait`"""
+        wait = self.reserve(endpoint, max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def acquire_async(
+        self, endpoint: str = "", max_wait: float | None = None
+    ) -> bool:
+        wait = self.reserve(endpoint, max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    def pause(self, endpoint: str, seconds: float) -> None:
+        """Holds back all calls to `endpoint` for `seconds`, e.g. after a 429"""
+        with self._endpoint_state(endpoint) as state:
+            state.paused_until = max(state.paused_until, self._clock() + seconds)
+
+    def update_from_headers(self, endpoint: str, headers: Mapping[str, str]) -> None:
+        """Pauses `endpoint` if the API reports that there are no calls left until the
+        rate limit window resets"""
+        retry_after = _parse_retry_after(headers.get("Retry-After"))
+        if retry_after:
+            self.pause(endpoint, retry_after)
+            return
+
+        remaining = _get_header(headers, _REMAINING_HEADERS)
+        reset = _get_header(headers, _RESET_HEADERS)
+        if remaining is None or remaining > 0 or reset is None:
+            return
+
+        if reset > _MIN_RESET_TIMESTAMP:
+            reset -= time.time()
+        if reset > 0:
+            self.pause(endpoint, reset)
+
+
+_RATE_LIMITERS: dict[str, RateLimiter] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(
+    name: str,
+    max_calls: int,
+    period: float,
+    endpoint_limits: dict[str, tuple[int, float]] | None = None,
+    shared_across_processes: bool = False,
+) -> RateLimiter:
+    """The limiter shared by everything in the process using the same `name`, it is
+    created with the limits passed in by the first caller"""
+    with _RATE_LIMITERS_LOCK:
+        if name not in _RATE_LIMITERS:
+            _RATE_LIMITERS[name] = RateLimiter(
+                max_calls=max_calls,
+                period=period,
+                endpoint_limits=endpoint_limits,
+                shared_key=name if shared_across_processes else None,
+            )
+        return _RATE_LIMITERS[name]
+
+
 class _RateLimitDecorator:
     """Builds a generic wrapper/decorator for calls to external APIs that
     prevents making more than `max_calls` requests per `period`
 
-    Implementation inspired by the `ratelimit` library:
-    https://github.com/tomasbasham/ratelimit.
-
-    NOTE: is not thread safe.
+    Thread and asyncio safe, see `RateLimiter`. Decorators with the same `name` share
+    their limit. If the API still responds with a 429, either raised as a
+    `requests.HTTPError` or returned as a `requests.Response`, the call is retried after
+    the `Retry-After` (or `sleep_time` with exponential backoff if there is none).
     """
 
     def __init__(
@@ -34,53 +265,118 @@ class _RateLimitDecorator:
         sleep_time: float = 2,  # in seconds
         sleep_backoff: float = 2,  # applies exponential backoff
         max_num_sleep: int = 0,
+        max_retries: int = 3,  # on 429s
+        name: str | None = None,
+        shared_across_processes: bool = False,
     ):
-        self.max_calls = max_calls
-        self.period = period
         self.sleep_time = sleep_time
         self.sleep_backoff = sleep_backoff
         self.max_num_sleep = max_num_sleep
+        self.max_retries = max_retries
+        self.rate_limiter = (
+            get_rate_limiter(
+                name=name,
+                max_calls=max_calls,
+                period=period,
+                shared_across_processes=shared_across_processes,
+            )
+            if name
+            else RateLimiter(max_calls=max_calls, period=period)
+        )
 
-        self.call_history: list[float] = []
-        self.curr_calls = 0
+    def _max_wait(self) -> float | None:
+        # as long as the sleeps with backoff allowed before giving up used to add up to
+        if self.max_num_sleep == 0:
+            return None
+        return sum(
+            self.sleep_time * (self.sleep_backoff**sleep_cnt)
+            for sleep_cnt in range(self.max_num_sleep)
+        )
+
+    def _rate_limited_delay(self, result: Any, attempt: int) -> float | None:
+        """How long to back off for if the call was rate limited by the API"""
+        response: requests.Response | None = None
+        if isinstance(result, requests.HTTPError):
+            response = result.response
+        elif isinstance(result, requests.Response):
+            response = result
+        if response is None:
+            return None
+
+        self.rate_limiter.update_from_headers("", response.headers)
+        if response.status_code != 429:
+            return None
+        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return retry_after
+        return self.sleep_time * (self.sleep_backoff**attempt)
+
+    def _check_acquired(self, acquired: bool, func: Callable) -> None:
+        if not acquired:
+            raise RateLimitTriedTooManyTimesError(
+                f"Exceeded '{self.max_num_sleep}' retries for function '{func.__name__}'"
+            )
 
     def __call__(self, func: F) -> F:
+        if inspect.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapped_func(*args: list, **kwargs: dict[str, Any]) -> Any:
+                attempt = 0
+                while True:
+                    self._check_acquired(
+                        await self.rate_limiter.acquire_async(
+                            max_wait=self._max_wait()
+                        ),
+                        func,
+                    )
+                    try:
+                        result = await func(*args, **kwargs)
+                    except requests.HTTPError as e:
+                        delay = self._rate_limited_delay(e, attempt)
+                        if delay is None or attempt == self.max_retries:
+                            raise
+                    else:
+                        delay = self._rate_limited_delay(result, attempt)
+                        if delay is None or attempt == self.max_retries:
+                            return result
+
+                    logger.info(
+                        f"Rate limited by the API for function {func.__name__}. "
+                        f"Waiting {delay} seconds before retrying."
+                    )
+                    self.rate_limiter.pause("", delay)
+                    attempt += 1
+
+            return cast(F, async_wrapped_func)
+
         @wraps(func)
         def wrapped_func(*args: list, **kwargs: dict[str, Any]) -> Any:
-            # cleanup calls which are no longer relevant
-            self._cleanup()
+            attempt = 0
+            while True:
+                self._check_acquired(
+                    self.rate_limiter.acquire(max_wait=self._max_wait()), func
+                )
+                try:
+                    result = func(*args, **kwargs)
+                except requests.HTTPError as e:
+                    delay = self._rate_limited_delay(e, attempt)
+                    if delay is None or attempt == self.max_retries:
+                        raise
+                else:
+                    delay = self._rate_limited_delay(result, attempt)
+                    if delay is None or attempt == self.max_retries:
+                        return result
 
-            # check if we've exceeded the rate limit
-            sleep_cnt = 0
-            while len(self.call_history) == self.max_calls:
-                sleep_time = self.sleep_time * (self.sleep_backoff**sleep_cnt)
                 logger.info(
-                    f"Rate limit exceeded for function {func.__name__}. "
-                    f"Waiting {sleep_time} seconds before retrying."
+                    f"Rate limited by the API for function {func.__name__}. "
+                    f"Waiting {delay} seconds before retrying."
                 )
-                time.sleep(sleep_time)
-                sleep_cnt += 1
-                if self.max_num_sleep != 0 and sleep_cnt >= self.max_num_sleep:
-                    raise RateLimitTriedTooManyTimesError(
-                        f"Exceeded '{self.max_num_sleep}' retries for function '{func.__name__}'"
-                    )
-
-                self._cleanup()
-
-            # add the current call to the call history
-            self.call_history.append(time.monotonic())
-            return func(*args, **kwargs)
+                # also holds back the other callers sharing the limit
+                self.rate_limiter.pause("", delay)
+                attempt += 1
 
         return cast(F, wrapped_func)
 
-    def _cleanup(self) -> None:
-        curr_time = time.monotonic()
-        time_to_expire_before = curr_time - self.period
-        self.call_history = [
-            call_time
-            for call_time in self.call_history
-            if call_time > time_to_expire_before
-        ]
-
 
 rate_limit_builder = _RateLimitDecorator
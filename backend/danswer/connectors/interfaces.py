@@ -9,6 +9,9 @@ SecondsSinceUnixEpoch = float
 
 GenerateDocumentsOutput = Iterator[list[Document]]
 
+# JSON serializable connector state, e.g. a page cursor or an offset
+ConnectorCheckpoint = dict[str, Any]
+
 
 class BaseConnector(abc.ABC):
     @abc.abstractmethod
@@ -55,3 +58,29 @@ class EventConnector(BaseConnector):
     @abc.abstractmethod
     def handle_event(self, event: Any) -> GenerateDocumentsOutput:
         raise NotImplementedError
+
+
+# Optionally implemented by Load / Poll connectors whose runs can be resumed part way through
+class CheckpointConnector(BaseConnector):
+    @abc.abstractmethod
+    def get_checkpoint(self) -> ConnectorCheckpoint | None:
+        """Called right after each batch is yielded, the state needed to continue with the
+        batch after it. Saved once the batch is indexed"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_checkpoint(self, checkpoint: ConnectorCheckpoint) -> None:
+        """Called before `load_from_state` / `poll_source` (with the same time range as
+        when the checkpoint was taken) to resume from it"""
+        raise NotImplementedError
+
+    @property
+    def resumable(self) -> bool:
+        """False if `set_checkpoint` can't resume a run, the checkpoints are then only
+        passed to `checkpoint_indexed` and not saved with the index attempt"""
+        return True
+
+    def checkpoint_indexed(self, checkpoint: ConnectorCheckpoint) -> None:
+        """Called once the batches up to the one `checkpoint` was taken after are
+        indexed, for state that must not be saved before that"""
+        return None
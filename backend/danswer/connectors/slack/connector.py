@@ -1,6 +1,11 @@
 import json
+import queue
+import threading
 from collections.abc import Callable
 from collections.abc import Generator
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 from datetime import timezone
 from pathlib import Path
@@ -12,7 +17,12 @@ from slack_sdk.errors import SlackApiError
 from slack_sdk.web import SlackResponse
 
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
+from danswer.configs.app_configs import SLACK_CONNECTOR_MAX_CONCURRENT_CHANNELS
+from danswer.configs.app_configs import SLACK_CONNECTOR_MAX_CONCURRENT_THREADS
 from danswer.configs.constants import DocumentSource
+from danswer.connectors.cross_connector_utils.rate_limit_wrapper import RateLimiter
+from danswer.connectors.interfaces import CheckpointConnector
+from danswer.connectors.interfaces import ConnectorCheckpoint
 from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
 from danswer.connectors.interfaces import PollConnector
@@ -21,6 +31,7 @@ from danswer.connectors.models import ConnectorMissingCredentialError
 from danswer.connectors.models import Document
 from danswer.connectors.models import Section
 from danswer.connectors.slack.utils import get_message_link
+from danswer.connectors.slack.utils import get_slack_rate_limiter
 from danswer.connectors.slack.utils import make_slack_api_call_logged
 from danswer.connectors.slack.utils import make_slack_api_call_paginated
 from danswer.connectors.slack.utils import make_slack_api_rate_limited
@@ -35,26 +46,39 @@ MessageType = dict[str, Any]
 # list of messages in a thread
 ThreadType = list[MessageType]
 
+# max number of fetched documents waiting to be indexed
+_MAX_QUEUED_DOCS = 1000
+
 
 def _make_paginated_slack_api_call(
-    call: Callable[..., SlackResponse], **kwargs: Any
+    call: Callable[..., SlackResponse],
+    rate_limiter: RateLimiter | None = None,
+    **kwargs: Any,
 ) -> Generator[dict[str, Any], None, None]:
     return make_slack_api_call_paginated(
-        make_slack_api_rate_limited(make_slack_api_call_logged(call))
+        make_slack_api_rate_limited(
+            make_slack_api_call_logged(call), rate_limiter=rate_limiter
+        )
     )(**kwargs)
 
 
 def _make_slack_api_call(
-    call: Callable[..., SlackResponse], **kwargs: Any
+    call: Callable[..., SlackResponse],
+    rate_limiter: RateLimiter | None = None,
+    **kwargs: Any,
 ) -> SlackResponse:
-    return make_slack_api_rate_limited(make_slack_api_call_logged(call))(**kwargs)
+    return make_slack_api_rate_limited(
+        make_slack_api_call_logged(call), rate_limiter=rate_limiter
+    )(**kwargs)
 
 
 def get_channel_info(client: WebClient, channel_id: str) -> ChannelType:
     """Get information about a channel. Needed to convert channel ID to channel name"""
-    return _make_slack_api_call(client.conversations_info, channel=channel_id)[0][
-        "channel"
-    ]
+    return _make_slack_api_call(
+        client.conversations_info,
+        rate_limiter=get_slack_rate_limiter(client),
+        channel=channel_id,
+    )[0]["channel"]
 
 
 def _get_channels(
@@ -65,6 +89,7 @@ def _get_channels(
     channels: list[dict[str, Any]] = []
     for result in _make_paginated_slack_api_call(
         client.conversations_list,
+        rate_limiter=get_slack_rate_limiter(client),
         exclude_archived=exclude_archived,
         # also get private channels the bot is added to
         types=["public_channel", "private_channel"]
@@ -94,17 +119,22 @@ def get_channels(
     )
 
 
-def get_channel_messages(
+def get_channel_message_pages(
     client: WebClient,
     channel: dict[str, Any],
     oldest: str | None = None,
     latest: str | None = None,
-) -> Generator[list[MessageType], None, None]:
-    """Get all messages in a channel"""
+    cursor: str | None = None,
+) -> Generator[tuple[list[MessageType], str | None], None, None]:
+    """Get all messages in a channel a page at a time, along with the cursor of the next
+    page (None for the last page). A cursor from a previous call resumes from that page,
+    it is only valid with the same `oldest` and `latest`"""
+    rate_limiter = get_slack_rate_limiter(client)
     # join so that the bot can access messages
     if not channel["is_member"]:
         _make_slack_api_call(
             client.conversations_join,
+            rate_limiter=rate_limiter,
             channel=channel["id"],
             is_private=channel["is_private"],
         )
@@ -112,18 +142,39 @@ def get_channel_messages(
 
     for result in _make_paginated_slack_api_call(
         client.conversations_history,
+        rate_limiter=rate_limiter,
         channel=channel["id"],
         oldest=oldest,
         latest=latest,
+        cursor=cursor,
     ):
-        yield cast(list[MessageType], result["messages"])
+        next_cursor = cast(dict[str, Any], result.get("response_metadata", {})).get(
+            "next_cursor"
+        )
+        yield cast(list[MessageType], result["messages"]), next_cursor or None
+
+
+def get_channel_messages(
+    client: WebClient,
+    channel: dict[str, Any],
+    oldest: str | None = None,
+    latest: str | None = None,
+) -> Generator[list[MessageType], None, None]:
+    """Get all messages in a channel"""
+    for messages, _ in get_channel_message_pages(
+        client=client, channel=channel, oldest=oldest, latest=latest
+    ):
+        yield messages
 
 
 def get_thread(client: WebClient, channel_id: str, thread_id: str) -> ThreadType:
     """Get all messages in a thread"""
     threads: list[MessageType] = []
     for result in _make_paginated_slack_api_call(
-        client.conversations_replies, channel=channel_id, ts=thread_id
+        client.conversations_replies,
+        rate_limiter=get_slack_rate_limiter(client),
+        channel=channel_id,
+        ts=thread_id,
     ):
         threads.extend(result["messages"])
     return threads
@@ -218,58 +269,263 @@ def _filter_channels(
     ]
 
 
-def get_all_docs(
+@dataclass
+class _ChannelProgress:
+    """Emitted once all of the documents from a page of a channel's history were emitted"""
+
+    channel_id: str
+    # everything up to `done_until` has been fetched, `in_progress` is the window after it
+    # being fetched (its `latest` and the cursor of the next page), None if there is none
+    progress: dict[str, Any]
+
+
+@dataclass
+class _ChannelDone:
+    error: Exception | None = None
+
+
+class _FetchStopped(Exception):
+    pass
+
+
+def _get_channel_windows(
+    progress: dict[str, Any], latest: str | None
+) -> list[tuple[str | None, str | None, str | None]]:
+    """The (oldest, latest, cursor) windows of channel history that are left to fetch"""
+    windows: list[tuple[str | None, str | None, str | None]] = []
+    done_until = progress["done_until"]
+    in_progress = progress["in_progress"]
+    if in_progress:
+        windows.append((done_until, in_progress["latest"], in_progress["cursor"]))
+        done_until = in_progress["latest"]
+
+    if done_until is None or latest is None or float(done_until) < float(latest):
+        windows.append((done_until, latest, None))
+    return windows
+
+
+def _message_batch_to_docs(
+    client: WebClient,
+    workspace: str,
+    channel: ChannelType,
+    message_batch: list[MessageType],
+    seen_thread_ts: set[str],
+    msg_filter_func: Callable[[MessageType], bool],
+    slack_cleaner: SlackTextCleaner,
+    thread_executor: ThreadPoolExecutor,
+) -> list[Document]:
+    # all of the threads in the batch are fetched at once
+    threads: list[ThreadType | Future[ThreadType]] = []
+    for message in message_batch:
+        thread_ts = message.get("thread_ts")
+        if thread_ts:
+            # skip threads we've already seen, since we've already processed all
+            # messages in that thread
+            if thread_ts in seen_thread_ts:
+                continue
+            seen_thread_ts.add(thread_ts)
+            threads.append(
+                thread_executor.submit(
+                    get_thread,
+                    client=client,
+                    channel_id=channel["id"],
+                    thread_id=thread_ts,
+                )
+            )
+        else:
+            threads.append([message])
+
+    docs: list[Document] = []
+    for thread in threads:
+        if isinstance(thread, Future):
+            thread = thread.result()
+        filtered_thread = [
+            message for message in thread if not msg_filter_func(message)
+        ]
+        if filtered_thread:
+            docs.append(
+                thread_to_doc(
+                    workspace=workspace,
+                    channel=channel,
+                    thread=filtered_thread,
+                    slack_cleaner=slack_cleaner,
+                )
+            )
+    return docs
+
+
+def _get_window_message_pages(
+    client: WebClient,
+    channel: ChannelType,
+    oldest: str | None,
+    latest: str | None,
+    cursor: str | None,
+) -> Generator[tuple[list[MessageType], str | None], None, None]:
+    try:
+        yield from get_channel_message_pages(
+            client=client, channel=channel, oldest=oldest, latest=latest, cursor=cursor
+        )
+    except SlackApiError as e:
+        if cursor is None or e.response["error"] != "invalid_cursor":
+            raise
+        logger.warning(
+            f"Saved cursor for slack channel {channel['name']} is no longer valid, "
+            "fetching its history again"
+        )
+        yield from get_channel_message_pages(
+            client=client, channel=channel, oldest=oldest, latest=latest
+        )
+
+
+def _fetch_channel_docs(
+    client: WebClient,
+    workspace: str,
+    channel: ChannelType,
+    progress: dict[str, Any],
+    latest: str | None,
+    msg_filter_func: Callable[[MessageType], bool],
+    slack_cleaner: SlackTextCleaner,
+    thread_executor: ThreadPoolExecutor,
+    emit: Callable[[Document | _ChannelProgress], None],
+) -> None:
+    channel_docs = 0
+    seen_thread_ts: set[str] = set()
+    for window_oldest, window_latest, cursor in _get_channel_windows(progress, latest):
+        for message_batch, next_cursor in _get_window_message_pages(
+            client=client,
+            channel=channel,
+            oldest=window_oldest,
+            latest=window_latest,
+            cursor=cursor,
+        ):
+            for doc in _message_batch_to_docs(
+                client=client,
+                workspace=workspace,
+                channel=channel,
+                message_batch=message_batch,
+                seen_thread_ts=seen_thread_ts,
+                msg_filter_func=msg_filter_func,
+                slack_cleaner=slack_cleaner,
+                thread_executor=thread_executor,
+            ):
+                channel_docs += 1
+                emit(doc)
+
+            emit(
+                _ChannelProgress(
+                    channel_id=channel["id"],
+                    progress={
+                        "done_until": window_oldest,
+                        "in_progress": {"latest": window_latest, "cursor": next_cursor},
+                    }
+                    if next_cursor
+                    else {"done_until": window_latest, "in_progress": None},
+                )
+            )
+
+    logger.info(f"Pulled {channel_docs} documents from slack channel {channel['name']}")
+
+
+def _get_all_docs_with_progress(
     client: WebClient,
     workspace: str,
     channels: list[str] | None = None,
     oldest: str | None = None,
     latest: str | None = None,
     msg_filter_func: Callable[[MessageType], bool] = _default_msg_filter,
-) -> Generator[Document, None, None]:
-    """Get all documents in the workspace, channel by channel"""
-    slack_cleaner = SlackTextCleaner(client=client)
+    channel_progress: dict[str, dict[str, Any]] | None = None,
+    max_concurrent_channels: int = SLACK_CONNECTOR_MAX_CONCURRENT_CHANNELS,
+    max_concurrent_threads: int = SLACK_CONNECTOR_MAX_CONCURRENT_THREADS,
+) -> Generator[Document | _ChannelProgress, None, None]:
+    """Documents of every channel, each page of a channel's history followed by the
+    channel's progress. Channels are fetched concurrently, so their documents are
+    interleaved. `channel_progress` resumes channels from where a previous run got to"""
+    slack_cleaner = SlackTextCleaner(
+        client=client, rate_limiter=get_slack_rate_limiter(client)
+    )
+    slack_cleaner.load_user_directory()
 
     all_channels = get_channels(client)
     filtered_channels = _filter_channels(all_channels, channels)
 
-    for channel in filtered_channels:
-        channel_docs = 0
-        channel_message_batches = get_channel_messages(
-            client=client, channel=channel, oldest=oldest, latest=latest
-        )
+    results: queue.Queue[Document | _ChannelProgress | _ChannelDone] = queue.Queue(
+        maxsize=_MAX_QUEUED_DOCS
+    )
+    stop = threading.Event()
+
+    def _emit(item: Document | _ChannelProgress | _ChannelDone) -> None:
+        # don't block forever on a consumer that went away
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+        raise _FetchStopped()
+
+    def _run_channel(channel: ChannelType, thread_executor: ThreadPoolExecutor) -> None:
+        try:
+            _fetch_channel_docs(
+                client=client,
+                workspace=workspace,
+                channel=channel,
+                progress=(channel_progress or {}).get(
+                    channel["id"], {"done_until": oldest, "in_progress": None}
+                ),
+                latest=latest,
+                msg_filter_func=msg_filter_func,
+                slack_cleaner=slack_cleaner,
+                thread_executor=thread_executor,
+                emit=_emit,
+            )
+            _emit(_ChannelDone())
+        except Exception as e:
+            if not stop.is_set():
+                _emit(_ChannelDone(error=e))
+
+    with ThreadPoolExecutor(
+        max_workers=max_concurrent_threads, thread_name_prefix="slack-thread"
+    ) as thread_executor, ThreadPoolExecutor(
+        max_workers=max_concurrent_channels, thread_name_prefix="slack-channel"
+    ) as channel_executor:
+        try:
+            for channel in filtered_channels:
+                channel_executor.submit(_run_channel, channel, thread_executor)
+
+            remaining = len(filtered_channels)
+            while remaining:
+                item = results.get()
+                if isinstance(item, _ChannelDone):
+                    remaining -= 1
+                    if item.error is not None:
+                        raise item.error
+                    continue
+                yield item
+        finally:
+            stop.set()
+            channel_executor.shutdown(wait=False, cancel_futures=True)
+            thread_executor.shutdown(wait=False, cancel_futures=True)
 
-        seen_thread_ts: set[str] = set()
-        for message_batch in channel_message_batches:
-            for message in message_batch:
-                filtered_thread: ThreadType | None = None
-                thread_ts = message.get("thread_ts")
-                if thread_ts:
-                    # skip threads we've already seen, since we've already processed all
-                    # messages in that thread
-                    if thread_ts in seen_thread_ts:
-                        continue
-                    seen_thread_ts.add(thread_ts)
-                    thread = get_thread(
-                        client=client, channel_id=channel["id"], thread_id=thread_ts
-                    )
-                    filtered_thread = [
-                        message for message in thread if not msg_filter_func(message)
-                    ]
-                elif not msg_filter_func(message):
-                    filtered_thread = [message]
-
-                if filtered_thread:
-                    channel_docs += 1
-                    yield thread_to_doc(
-                        workspace=workspace,
-                        channel=channel,
-                        thread=filtered_thread,
-                        slack_cleaner=slack_cleaner,
-                    )
 
-        logger.info(
-            f"Pulled {channel_docs} documents from slack channel {channel['name']}"
-        )
+def get_all_docs(
+    client: WebClient,
+    workspace: str,
+    channels: list[str] | None = None,
+    oldest: str | None = None,
+    latest: str | None = None,
+    msg_filter_func: Callable[[MessageType], bool] = _default_msg_filter,
+) -> Generator[Document, None, None]:
+    """Get all documents in the workspace, multiple channels and threads at a time"""
+    for item in _get_all_docs_with_progress(
+        client=client,
+        workspace=workspace,
+        channels=channels,
+        oldest=oldest,
+        latest=latest,
+        msg_filter_func=msg_filter_func,
+    ):
+        if isinstance(item, Document):
+            yield item
 
 
 class SlackLoadConnector(LoadConnector):
@@ -378,7 +634,7 @@ class SlackLoadConnector(LoadConnector):
         yield list(document_batch.values())
 
 
-class SlackPollConnector(PollConnector):
+class SlackPollConnector(PollConnector, CheckpointConnector):
     def __init__(
         self,
         workspace: str,
@@ -389,12 +645,21 @@ class SlackPollConnector(PollConnector):
         self.channels = channels
         self.batch_size = batch_size
         self.client: WebClient | None = None
+        # channel ID -> how far it got in the poll window, see `_ChannelProgress`
+        self._channel_progress: dict[str, dict[str, Any]] = {}
 
     def load_credentials(self, credentials: dict[str, Any]) -> dict[str, Any] | None:
         bot_token = credentials["slack_bot_token"]
         self.client = WebClient(token=bot_token)
         return None
 
+    def get_checkpoint(self) -> ConnectorCheckpoint | None:
+        return {"channels": dict(self._channel_progress)}
+
+    def set_checkpoint(self, checkpoint: ConnectorCheckpoint) -> None:
+        self._channel_progress = dict(checkpoint["channels"])
+        logger.info(f"Resuming {len(self._channel_progress)} slack channels")
+
     def poll_source(
         self, start: SecondsSinceUnixEpoch, end: SecondsSinceUnixEpoch
     ) -> GenerateDocumentsOutput:
@@ -402,7 +667,7 @@ class SlackPollConnector(PollConnector):
             raise ConnectorMissingCredentialError("Slack")
 
         documents: list[Document] = []
-        for document in get_all_docs(
+        for item in _get_all_docs_with_progress(
             client=self.client,
             workspace=self.workspace,
             channels=self.channels,
@@ -411,8 +676,15 @@ class SlackPollConnector(PollConnector):
             # retention
             oldest=str(start) if start else None,
             latest=str(end),
+            channel_progress=dict(self._channel_progress),
         ):
-            documents.append(document)
+            if isinstance(item, _ChannelProgress):
+                # the documents of the pages it covers are in the batches yielded so far
+                # by the time a checkpoint is taken
+                self._channel_progress[item.channel_id] = item.progress
+                continue
+
+            documents.append(item)
             if len(documents) >= self.batch_size:
                 yield documents
                 documents = []
@@ -1,3 +1,4 @@
+import hashlib
 import re
 import time
 from collections.abc import Callable
@@ -10,6 +11,10 @@ from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 from slack_sdk.web import SlackResponse
 
+from danswer.connectors.cross_connector_utils.rate_limit_wrapper import (
+    get_rate_limiter,
+)
+from danswer.connectors.cross_connector_utils.rate_limit_wrapper import RateLimiter
 from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
@@ -17,6 +22,20 @@ logger = setup_logger()
 # number of messages we request per page when fetching paginated slack messages
 _SLACK_LIMIT = 900
 
+# Requests per minute allowed for each of Slack's rate limit tiers and the tiers of the
+# methods used by Danswer, see https://api.slack.com/apis/rate-limits
+_SLACK_TIER_REQUESTS_PER_MINUTE = {1: 1, 2: 20, 3: 50, 4: 100}
+_SLACK_METHOD_TIERS = {
+    "conversations_list": 2,
+    "conversations_info": 3,
+    "conversations_join": 3,
+    "conversations_history": 3,
+    "conversations_replies": 3,
+    "users_list": 2,
+    "users_info": 4,
+}
+_DEFAULT_SLACK_TIER = 3
+
 
 def get_message_link(
     event: dict[str, Any], workspace: str, channel_id: str | None = None
@@ -53,7 +72,8 @@ def make_slack_api_call_paginated(
 
     @wraps(call)
     def paginated_call(**kwargs: Any) -> Generator[dict[str, Any], None, None]:
-        cursor: str | None = None
+        # a cursor from a previous call resumes from that page
+        cursor: str | None = kwargs.pop("cursor", None)
         has_more = True
         while has_more:
             response = call(cursor=cursor, limit=_SLACK_LIMIT, **kwargs)
@@ -66,14 +86,36 @@ def make_slack_api_call_paginated(
     return paginated_call
 
 
+def get_slack_rate_limiter(client: WebClient) -> RateLimiter:
+    """The rate limiter shared by everything calling Slack with the same token, including
+    the other processes on the host, since Slack's limits apply per app per workspace"""
+    token_hash = hashlib.sha256((client.token or "").encode()).hexdigest()[:16]
+    return get_rate_limiter(
+        name=f"slack_{token_hash}",
+        max_calls=_SLACK_TIER_REQUESTS_PER_MINUTE[_DEFAULT_SLACK_TIER],
+        period=60,
+        endpoint_limits={
+            method: (_SLACK_TIER_REQUESTS_PER_MINUTE[tier], 60)
+            for method, tier in _SLACK_METHOD_TIERS.items()
+        },
+        shared_across_processes=True,
+    )
+
+
 def make_slack_api_rate_limited(
-    call: Callable[..., SlackResponse], max_retries: int = 3
+    call: Callable[..., SlackResponse],
+    max_retries: int = 3,
+    rate_limiter: RateLimiter | None = None,
 ) -> Callable[..., SlackResponse]:
-    """Wraps calls to slack API so that they automatically handle rate limiting"""
+    """Wraps calls to slack API so that they automatically handle rate limiting. With a
+    `rate_limiter`, calls wait for their method's tier limit instead of being rejected
+    """
 
     @wraps(call)
     def rate_limited_call(**kwargs: Any) -> SlackResponse:
         for _ in range(max_retries):
+            if rate_limiter is not None:
+                rate_limiter.acquire(call.__name__)
             try:
                 # Make the API call
                 response = call(**kwargs)
@@ -90,7 +132,11 @@ def make_slack_api_rate_limited(
                     logger.info(
                         f"Slack call rate limited, retrying after {retry_after} seconds. Exception: {e}"
                     )
-                    time.sleep(retry_after)
+                    if rate_limiter is not None:
+                        # also holds back the other threads calling the same method
+                        rate_limiter.pause(call.__name__, retry_after)
+                    else:
+                        time.sleep(retry_after)
                 else:
                     # Raise the error for non-transient errors
                     raise
@@ -106,21 +152,45 @@ class SlackTextCleaner:
     Handles caching, so the same request is not made multiple times
     for the same user ID"""
 
-    def __init__(self, client: WebClient) -> None:
+    def __init__(
+        self, client: WebClient, rate_limiter: RateLimiter | None = None
+    ) -> None:
         self._client = client
+        self._rate_limiter = rate_limiter
         self._id_to_name_map: dict[str, str] = {}
 
+    @staticmethod
+    def _get_user_name(user: dict[str, Any]) -> str:
+        # prefer display name if set, since that is what is shown in Slack
+        return user["profile"]["display_name"] or user["profile"]["real_name"]
+
+    def load_user_directory(self) -> None:
+        """Caches the names of all of the users in the workspace with a few `users_list`
+        calls, instead of a `users_info` call per user as they are mentioned"""
+        try:
+            for result in make_slack_api_call_paginated(
+                make_slack_api_rate_limited(
+                    self._client.users_list, rate_limiter=self._rate_limiter
+                )
+            )():
+                for user in result["members"]:
+                    self._id_to_name_map[user["id"]] = self._get_user_name(user)
+        except SlackApiError as e:
+            # e.g. missing the `users:read` scope, names are looked up one at a time
+            logger.warning(
+                f"Unable to load the Slack user directory: {e.response['error']}"
+            )
+            return
+
+        logger.info(f"Loaded {len(self._id_to_name_map)} Slack users")
+
     def _get_slack_name(self, user_id: str) -> str:
         if user_id not in self._id_to_name_map:
             try:
-                response = make_slack_api_rate_limited(self._client.users_info)(
-                    user=user_id
-                )
-                # prefer display name if set, since that is what is shown in Slack
-                self._id_to_name_map[user_id] = (
-                    response["user"]["profile"]["display_name"]
-                    or response["user"]["profile"]["real_name"]
-                )
+                response = make_slack_api_rate_limited(
+                    self._client.users_info, rate_limiter=self._rate_limiter
+                )(user=user_id)
+                self._id_to_name_map[user_id] = self._get_user_name(response["user"])
             except SlackApiError as e:
                 logger.exception(
                     f"Error fetching data for user {user_id}: {e.response['error']}"
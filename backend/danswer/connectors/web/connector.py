@@ -1,4 +1,8 @@
+import hashlib
 import io
+import threading
+from dataclasses import dataclass
+from dataclasses import field
 from enum import Enum
 from typing import Any
 from typing import cast
@@ -10,25 +14,48 @@ import requests
 from bs4 import BeautifulSoup
 from oauthlib.oauth2 import BackendApplicationClient
 from playwright.sync_api import BrowserContext
+from playwright.sync_api import Page
 from playwright.sync_api import Playwright
 from playwright.sync_api import sync_playwright
 from requests_oauthlib import OAuth2Session  # type:ignore
+from sqlalchemy.orm import Session
 
 from danswer.configs.app_configs import INDEX_BATCH_SIZE
+from danswer.configs.app_configs import WEB_CONNECTOR_HTTP_FAST_PATH
+from danswer.configs.app_configs import WEB_CONNECTOR_MAX_CONCURRENCY
+from danswer.configs.app_configs import WEB_CONNECTOR_MAX_CONCURRENCY_PER_HOST
+from danswer.configs.app_configs import WEB_CONNECTOR_MIN_REQUEST_INTERVAL_PER_HOST
 from danswer.configs.app_configs import WEB_CONNECTOR_OAUTH_CLIENT_ID
 from danswer.configs.app_configs import WEB_CONNECTOR_OAUTH_CLIENT_SECRET
 from danswer.configs.app_configs import WEB_CONNECTOR_OAUTH_TOKEN_URL
 from danswer.configs.constants import DocumentSource
 from danswer.connectors.cross_connector_utils.file_utils import read_pdf_file
 from danswer.connectors.cross_connector_utils.html_utils import web_html_cleanup
+from danswer.connectors.interfaces import CheckpointConnector
+from danswer.connectors.interfaces import ConnectorCheckpoint
 from danswer.connectors.interfaces import GenerateDocumentsOutput
 from danswer.connectors.interfaces import LoadConnector
+from danswer.connectors.interfaces import PollConnector
+from danswer.connectors.interfaces import SecondsSinceUnixEpoch
 from danswer.connectors.models import Document
 from danswer.connectors.models import Section
+from danswer.connectors.web.crawler import crawl
+from danswer.connectors.web.crawler import CrawledPage
+from danswer.connectors.web.crawler import HostThrottle
+from danswer.db.engine import get_sqlalchemy_engine
+from danswer.db.models import WebPageFetchState
+from danswer.db.web_page_state import fetch_web_page_fetch_states
+from danswer.db.web_page_state import upsert_web_page_fetch_states
 from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
 
+# Static HTML with less text than this is assumed to be filled in by JavaScript
+_MIN_STATIC_TEXT_LENGTH = 200
+# Bounds the memory used by a long lived browser
+_MAX_PAGES_PER_BROWSER = 100
+_HTTP_TIMEOUT = 30  # in seconds
+
 
 class WEB_CONNECTOR_VALID_SETTINGS(str, Enum):
     # Given a base site, index everything under that path
@@ -70,39 +97,85 @@ def get_internal_links(
     return internal_links
 
 
+def _get_oauth_headers() -> dict[str, str]:
+    if not (
+        WEB_CONNECTOR_OAUTH_CLIENT_ID
+        and WEB_CONNECTOR_OAUTH_CLIENT_SECRET
+        and WEB_CONNECTOR_OAUTH_TOKEN_URL
+    ):
+        return {}
+
+    client = BackendApplicationClient(client_id=WEB_CONNECTOR_OAUTH_CLIENT_ID)
+    oauth = OAuth2Session(client=client)
+    token = oauth.fetch_token(
+        token_url=WEB_CONNECTOR_OAUTH_TOKEN_URL,
+        client_id=WEB_CONNECTOR_OAUTH_CLIENT_ID,
+        client_secret=WEB_CONNECTOR_OAUTH_CLIENT_SECRET,
+    )
+    return {"Authorization": "Bearer {}".format(token["access_token"])}
+
+
 def start_playwright() -> Tuple[Playwright, BrowserContext]:
     playwright = sync_playwright().start()
     browser = playwright.chromium.launch(headless=True)
 
     context = browser.new_context()
 
-    if (
-        WEB_CONNECTOR_OAUTH_CLIENT_ID
-        and WEB_CONNECTOR_OAUTH_CLIENT_SECRET
-        and WEB_CONNECTOR_OAUTH_TOKEN_URL
-    ):
-        client = BackendApplicationClient(client_id=WEB_CONNECTOR_OAUTH_CLIENT_ID)
-        oauth = OAuth2Session(client=client)
-        token = oauth.fetch_token(
-            token_url=WEB_CONNECTOR_OAUTH_TOKEN_URL,
-            client_id=WEB_CONNECTOR_OAUTH_CLIENT_ID,
-            client_secret=WEB_CONNECTOR_OAUTH_CLIENT_SECRET,
-        )
-        context.set_extra_http_headers(
-            {"Authorization": "Bearer {}".format(token["access_token"])}
-        )
+    oauth_headers = _get_oauth_headers()
+    if oauth_headers:
+        context.set_extra_http_headers(oauth_headers)
 
     return playwright, context
 
 
+class _ThreadBrowsers:
+    """Playwright's sync API can only be used from the thread which started it, so every
+    crawl worker thread gets its own browser, reused across the pages it renders"""
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    def new_page(self) -> Page:
+        if (
+            getattr(self._local, "playwright", None) is None
+            or self._local.num_pages >= _MAX_PAGES_PER_BROWSER
+        ):
+            self.stop()
+            self._local.playwright, self._local.context = start_playwright()
+            self._local.num_pages = 0
+
+        self._local.num_pages += 1
+        return self._local.context.new_page()
+
+    def stop(self) -> None:
+        """Stops the calling thread's browser, if any. The next page starts a new one"""
+        playwright = getattr(self._local, "playwright", None)
+        if playwright is not None:
+            self._local.playwright = None
+            playwright.stop()
+
+
 def extract_urls_from_sitemap(sitemap_url: str) -> list[str]:
+    return list(extract_sitemap_lastmods(sitemap_url))
+
+
+def extract_sitemap_lastmods(sitemap_url: str) -> dict[str, str | None]:
+    """Returns a map of URL -> its <lastmod> in the sitemap, if any"""
     response = requests.get(sitemap_url)
     response.raise_for_status()
 
     soup = BeautifulSoup(response.content, "html.parser")
-    urls = [loc_tag.text for loc_tag in soup.find_all("loc")]
+    lastmods: dict[str, str | None] = {}
+    for url_tag in soup.find_all("url") or soup.find_all("loc"):
+        loc_tag = url_tag if url_tag.name == "loc" else url_tag.find("loc")
+        if loc_tag is None:
+            continue
+        lastmod_tag = url_tag.find("lastmod") if url_tag.name == "url" else None
+        lastmods[loc_tag.text.strip()] = (
+            lastmod_tag.text.strip() if lastmod_tag is not None else None
+        )
 
-    return urls
+    return lastmods
 
 
 def _ensure_valid_url(url: str) -> str:
@@ -117,17 +190,66 @@ def _read_urls_file(location: str) -> list[str]:
     return urls
 
 
-class WebConnector(LoadConnector):
+@dataclass
+class _CrawlRun:
+    base_url: str
+    browsers: _ThreadBrowsers
+    headers: dict[str, str]
+    track_changes: bool
+    # URL -> what was recorded by the previous poll, empty if not tracking changes
+    previous_states: dict[str, WebPageFetchState] = field(default_factory=dict)
+    # URL -> what was seen by this run, not saved yet
+    new_states: dict[str, WebPageFetchState] = field(default_factory=dict)
+    # batch number -> URLs of the documents in it, until the batch is indexed
+    batches: dict[int, list[str]] = field(default_factory=dict)
+    current_batch_ind: int = -1
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record_state(self, state: WebPageFetchState) -> None:
+        with self.lock:
+            self.new_states[state.url] = state
+
+    def pop_batches(self, last_batch_ind: int) -> list[str]:
+        """The URLs of all of the batches up to `last_batch_ind`"""
+        with self.lock:
+            batch_inds = [ind for ind in self.batches if ind <= last_batch_ind]
+            return [url for ind in batch_inds for url in self.batches.pop(ind)]
+
+    def pop_states(self, urls: list[str]) -> list[WebPageFetchState]:
+        """The states of the given pages and of all of the unchanged pages"""
+        with self.lock:
+            to_pop = set(urls) | {
+                url
+                for url, state in self.new_states.items()
+                if (previous := self.previous_states.get(url)) is not None
+                and previous.content_hash == state.content_hash
+            }
+            return [
+                self.new_states.pop(url) for url in to_pop if url in self.new_states
+            ]
+
+
+class WebConnector(LoadConnector, PollConnector, CheckpointConnector):
     def __init__(
         self,
         base_url: str,  # Can't change this without disrupting existing users
         web_connector_type: str = WEB_CONNECTOR_VALID_SETTINGS.RECURSIVE.value,
         mintlify_cleanup: bool = True,  # Mostly ok to apply to other websites as well
         batch_size: int = INDEX_BATCH_SIZE,
+        max_concurrency: int = WEB_CONNECTOR_MAX_CONCURRENCY,
+        http_fast_path: bool = WEB_CONNECTOR_HTTP_FAST_PATH,
     ) -> None:
         self.mintlify_cleanup = mintlify_cleanup
         self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.http_fast_path = http_fast_path
         self.recursive = False
+        # the pages fetched by a poll are recorded under this key
+        self.crawl_key = hashlib.sha256(
+            f"{web_connector_type}:{base_url}".encode()
+        ).hexdigest()
+        self.sitemap_lastmods: dict[str, str | None] = {}
+        self._crawl_run: _CrawlRun | None = None
 
         if web_connector_type == WEB_CONNECTOR_VALID_SETTINGS.RECURSIVE.value:
             self.recursive = True
@@ -138,7 +260,10 @@ class WebConnector(LoadConnector):
             self.to_visit_list = [_ensure_valid_url(base_url)]
 
         elif web_connector_type == WEB_CONNECTOR_VALID_SETTINGS.SITEMAP:
-            self.to_visit_list = extract_urls_from_sitemap(_ensure_valid_url(base_url))
+            self.sitemap_lastmods = extract_sitemap_lastmods(
+                _ensure_valid_url(base_url)
+            )
+            self.to_visit_list = list(self.sitemap_lastmods)
 
         elif web_connector_type == WEB_CONNECTOR_VALID_SETTINGS.UPLOAD:
             self.to_visit_list = _read_urls_file(base_url)
@@ -153,97 +278,275 @@ class WebConnector(LoadConnector):
             logger.warning("Unexpected credentials provided for Web Connector")
         return None
 
-    def load_from_state(self) -> GenerateDocumentsOutput:
-        """Traverses through all pages found on the website
-        and converts them into documents"""
-        visited_links: set[str] = set()
-        to_visit: list[str] = self.to_visit_list
-        base_url = to_visit[0]  # For the recursive case
-        doc_batch: list[Document] = []
+    def _pdf_page(self, url: str, content: bytes) -> CrawledPage:
+        # PDF files are not checked for links
+        page_text = read_pdf_file(file=io.BytesIO(content), file_name=url)
+        return CrawledPage(
+            url=url,
+            document=Document(
+                id=url,
+                sections=[Section(link=url, text=page_text)],
+                source=DocumentSource.WEB,
+                semantic_identifier=url.split(".")[-1],
+                metadata={},
+            ),
+        )
 
-        playwright, context = start_playwright()
-        restart_playwright = False
-        while to_visit:
-            current_url = to_visit.pop()
-            if current_url in visited_links:
-                continue
-            visited_links.add(current_url)
+    def _html_page(self, url: str, soup: BeautifulSoup, base_url: str) -> CrawledPage:
+        internal_links = (
+            get_internal_links(base_url, url, soup) if self.recursive else set()
+        )
+
+        parsed_html = web_html_cleanup(soup, self.mintlify_cleanup)
+
+        return CrawledPage(
+            url=url,
+            document=Document(
+                id=url,
+                sections=[Section(link=url, text=parsed_html.cleaned_text)],
+                source=DocumentSource.WEB,
+                semantic_identifier=parsed_html.title or url,
+                metadata={},
+            ),
+            links=internal_links,
+        )
+
+    def _fetch_static_page(
+        self, url: str, crawl_run: _CrawlRun
+    ) -> tuple[CrawledPage | None, requests.Response]:
+        """Fetches the page without a browser, no page if it needs to be rendered"""
+        headers = dict(crawl_run.headers)
+        previous_state = crawl_run.previous_states.get(url)
+        if previous_state is not None:
+            if previous_state.etag:
+                headers["If-None-Match"] = previous_state.etag
+            if previous_state.last_modified:
+                headers["If-Modified-Since"] = previous_state.last_modified
+
+        response = requests.get(url, headers=headers, timeout=_HTTP_TIMEOUT)
+        if response.status_code == 304 and previous_state is not None:
+            return (
+                CrawledPage(url=url, document=None, links=set(previous_state.links)),
+                response,
+            )
+
+        if not response.ok:
+            # e.g. bot protection, leave it to the browser
+            return None, response
+
+        content_type = response.headers.get("Content-Type", "").lower()
+        if "application/pdf" in content_type or url.split(".")[-1] == "pdf":
+            return self._pdf_page(url, response.content), response
 
-            logger.info(f"Visiting {current_url}")
+        if "text/html" not in content_type:
+            return None, response
 
+        page = self._html_page(
+            response.url,
+            BeautifulSoup(response.text, "html.parser"),
+            crawl_run.base_url,
+        )
+        page_text = page.document.sections[0].text if page.document else ""
+        if len(page_text.strip()) < _MIN_STATIC_TEXT_LENGTH:
+            # most likely filled in by JavaScript
+            return None, response
+        return page, response
+
+    def _fetch_page(self, url: str, crawl_run: _CrawlRun) -> CrawledPage:
+        previous_state = crawl_run.previous_states.get(url)
+        sitemap_lastmod = self.sitemap_lastmods.get(url)
+        if (
+            previous_state is not None
+            and sitemap_lastmod
+            and previous_state.sitemap_lastmod == sitemap_lastmod
+        ):
+            # unchanged according to the sitemap, no need to request it at all
+            return CrawledPage(url=url, document=None, links=set(previous_state.links))
+
+        response: requests.Response | None = None
+        page: CrawledPage | None = None
+        if self.http_fast_path:
+            page, response = self._fetch_static_page(url, crawl_run)
+        elif url.split(".")[-1] == "pdf":
+            response = requests.get(url)
+            page = self._pdf_page(url, response.content)
+
+        if page is None:
+            browser_page = crawl_run.browsers.new_page()
             try:
-                if restart_playwright:
-                    playwright, context = start_playwright()
-                    restart_playwright = False
-
-                if current_url.split(".")[-1] == "pdf":
-                    # PDF files are not checked for links
-                    response = requests.get(current_url)
-                    page_text = read_pdf_file(
-                        file=io.BytesIO(response.content), file_name=current_url
-                    )
-
-                    doc_batch.append(
-                        Document(
-                            id=current_url,
-                            sections=[Section(link=current_url, text=page_text)],
-                            source=DocumentSource.WEB,
-                            semantic_identifier=current_url.split(".")[-1],
-                            metadata={},
-                        )
-                    )
-                    continue
-
-                page = context.new_page()
-                page.goto(current_url)
-                final_page = page.url
-                if final_page != current_url:
-                    logger.info(f"Redirected to {final_page}")
-                    current_url = final_page
-                    if current_url in visited_links:
-                        logger.info("Redirected page already indexed")
-                        continue
-                    visited_links.add(current_url)
-
-                content = page.content()
-                soup = BeautifulSoup(content, "html.parser")
-
-                if self.recursive:
-                    internal_links = get_internal_links(base_url, current_url, soup)
-                    for link in internal_links:
-                        if link not in visited_links:
-                            to_visit.append(link)
-
-                parsed_html = web_html_cleanup(soup, self.mintlify_cleanup)
-
-                doc_batch.append(
-                    Document(
-                        id=current_url,
-                        sections=[
-                            Section(link=current_url, text=parsed_html.cleaned_text)
-                        ],
-                        source=DocumentSource.WEB,
-                        semantic_identifier=parsed_html.title or current_url,
-                        metadata={},
-                    )
+                browser_page.goto(url)
+                final_page = browser_page.url
+                content = browser_page.content()
+                browser_page.close()
+            except Exception:
+                # the browser may be left in a bad state, start a new one for the next page
+                crawl_run.browsers.stop()
+                raise
+
+            page = self._html_page(
+                final_page, BeautifulSoup(content, "html.parser"), crawl_run.base_url
+            )
+            # the headers of a static response don't describe the rendered page
+            response = None
+
+        return self._track_changes(page, response, sitemap_lastmod, crawl_run)
+
+    def _track_changes(
+        self,
+        page: CrawledPage,
+        response: requests.Response | None,
+        sitemap_lastmod: str | None,
+        crawl_run: _CrawlRun,
+    ) -> CrawledPage:
+        """Records what was fetched for the next poll and drops the document if its
+        content is the same as last time"""
+        if not crawl_run.track_changes:
+            return page
+
+        previous_state = crawl_run.previous_states.get(page.url)
+        etag = response.headers.get("ETag") if response is not None else None
+        last_modified = (
+            response.headers.get("Last-Modified") if response is not None else None
+        )
+
+        if page.document is None:
+            # not modified, carry over what was recorded last time
+            if previous_state is None:
+                return page
+            new_state = WebPageFetchState(
+                url=page.url,
+                etag=etag or previous_state.etag,
+                last_modified=last_modified or previous_state.last_modified,
+                sitemap_lastmod=sitemap_lastmod or previous_state.sitemap_lastmod,
+                content_hash=previous_state.content_hash,
+                links=list(page.links),
+            )
+            crawl_run.record_state(new_state)
+            return page
+
+        content_hash = hashlib.sha256(
+            "\n".join(
+                [page.document.semantic_identifier]
+                + [section.text for section in page.document.sections]
+            ).encode()
+        ).hexdigest()
+        crawl_run.record_state(
+            WebPageFetchState(
+                url=page.url,
+                etag=etag,
+                last_modified=last_modified,
+                sitemap_lastmod=sitemap_lastmod,
+                content_hash=content_hash,
+                links=list(page.links),
+            )
+        )
+
+        if previous_state is not None and previous_state.content_hash == content_hash:
+            return CrawledPage(url=page.url, document=None, links=page.links)
+
+        return page
+
+    def _crawl(self, track_changes: bool) -> GenerateDocumentsOutput:
+        crawl_run = _CrawlRun(
+            base_url=self.to_visit_list[0],  # For the recursive case
+            browsers=_ThreadBrowsers(),
+            headers=_get_oauth_headers() if self.http_fast_path else {},
+            track_changes=track_changes,
+        )
+        self._crawl_run = crawl_run
+        if track_changes:
+            with Session(get_sqlalchemy_engine()) as db_session:
+                crawl_run.previous_states = fetch_web_page_fetch_states(
+                    crawl_key=self.crawl_key, db_session=db_session
                 )
+            logger.info(
+                f"Polling {self.crawl_key}, {len(crawl_run.previous_states)} pages "
+                "fetched previously"
+            )
 
-                page.close()
-            except Exception as e:
-                logger.error(f"Failed to fetch '{current_url}': {e}")
-                playwright.stop()
-                restart_playwright = True
+        doc_batch: list[Document] = []
+        batch_ind = 0
+        for page in crawl(
+            start_urls=self.to_visit_list,
+            fetch_page=lambda url: self._fetch_page(url, crawl_run),
+            max_concurrency=self.max_concurrency,
+            host_throttle=HostThrottle(
+                max_concurrency_per_host=WEB_CONNECTOR_MAX_CONCURRENCY_PER_HOST,
+                min_interval=WEB_CONNECTOR_MIN_REQUEST_INTERVAL_PER_HOST,
+            ),
+            on_worker_exit=crawl_run.browsers.stop,
+        ):
+            if page.document is None:
                 continue
 
+            doc_batch.append(page.document)
             if len(doc_batch) >= self.batch_size:
-                playwright.stop()
-                restart_playwright = True
+                self._start_batch(crawl_run, batch_ind, doc_batch)
                 yield doc_batch
                 doc_batch = []
+                batch_ind += 1
 
         if doc_batch:
-            playwright.stop()
+            self._start_batch(crawl_run, batch_ind, doc_batch)
             yield doc_batch
+        if track_changes:
+            # the states of the changed pages are saved as their batches are indexed
+            self._save_states(crawl_run, [])
+
+    def _start_batch(
+        self, crawl_run: _CrawlRun, batch_ind: int, doc_batch: list[Document]
+    ) -> None:
+        with crawl_run.lock:
+            crawl_run.batches[batch_ind] = [doc.id for doc in doc_batch]
+            crawl_run.current_batch_ind = batch_ind
+
+    def _save_states(self, crawl_run: _CrawlRun, urls: list[str]) -> None:
+        states = crawl_run.pop_states(urls)
+        if not states:
+            return
+        with Session(get_sqlalchemy_engine()) as db_session:
+            upsert_web_page_fetch_states(
+                crawl_key=self.crawl_key, states=states, db_session=db_session
+            )
+
+    def get_checkpoint(self) -> ConnectorCheckpoint | None:
+        if self._crawl_run is None or not self._crawl_run.track_changes:
+            return None
+        return {"batch": self._crawl_run.current_batch_ind}
+
+    @property
+    def resumable(self) -> bool:
+        # a crawl can't be resumed part way through, the pages of the batches that
+        # were indexed are skipped as unchanged anyway. The checkpoints are only used
+        # for `checkpoint_indexed`
+        return False
+
+    def set_checkpoint(self, checkpoint: ConnectorCheckpoint) -> None:
+        return None
+
+    def checkpoint_indexed(self, checkpoint: ConnectorCheckpoint) -> None:
+        """A page is only recorded as fetched once its document is indexed, so that the
+        pages of a failed run are sent again by the next poll"""
+        if self._crawl_run is None:
+            return
+        self._save_states(
+            self._crawl_run, self._crawl_run.pop_batches(checkpoint["batch"])
+        )
+
+    def load_from_state(self) -> GenerateDocumentsOutput:
+        """Traverses through all pages found on the website
+        and converts them into documents"""
+        return self._crawl(track_changes=False)
+
+    def poll_source(
+        self, start: SecondsSinceUnixEpoch, end: SecondsSinceUnixEpoch
+    ) -> GenerateDocumentsOutput:
+        """Crawls the same pages as `load_from_state` but only returns the ones whose
+        content changed since the previous poll. Pages are requested with the ETag /
+        Last-Modified seen last time and pages whose sitemap lastmod did not change are
+        not requested at all. The time range itself is not used, websites don't offer a
+        way to list the pages changed within it"""
+        return self._crawl(track_changes=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+"""Concurrent crawl for the web connector. The frontier of URLs to visit is kept by the
+calling thread, which hands out up to `max_concurrency` URLs at a time to long lived worker
+threads. Workers keep their own per thread state (e.g. a headless browser) alive across
+pages, so that it doesn't need to be restarted per page or per batch."""
+import queue
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dataclasses import field
+from urllib.parse import urlparse
+
+from danswer.connectors.models import Document
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+@dataclass
+class CrawledPage:
+    # after any redirects
+    url: str
+    document: Document | None
+    # links to crawl next, already filtered to the ones that should be followed
+    links: set[str] = field(default_factory=set)
+
+
+class HostThrottle:
+    """Caps the number of requests in flight to each host and the rate at which they are
+    started, shared by all of the crawl workers"""
+
+    def __init__(self, max_concurrency_per_host: int, min_interval: float) -> None:
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.Semaphore] = {}
+        self._next_start: dict[str, float] = {}
+
+    @contextmanager
+    def limit(self, url: str) -> Iterator[None]:
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(
+                host, threading.Semaphore(self.max_concurrency_per_host)
+            )
+
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + self.min_interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+
+def _crawl_worker(
+    fetch_page: Callable[[str], CrawledPage],
+    host_throttle: HostThrottle,
+    work_queue: queue.Queue[str | None],
+    results_queue: queue.Queue[tuple[str, CrawledPage | None]],
+    on_worker_exit: Callable[[], None] | None,
+) -> None:
+    try:
+        while True:
+            url = work_queue.get()
+            if url is None:
+                return
+
+            try:
+                with host_throttle.limit(url):
+                    page = fetch_page(url)
+                results_queue.put((url, page))
+            except Exception as e:
+                logger.error(f"Failed to fetch '{url}': {e}")
+                results_queue.put((url, None))
+    finally:
+        if on_worker_exit is not None:
+            try:
+                on_worker_exit()
+            except Exception as e:
+                logger.warning(f"Failed to clean up crawl worker: {e}")
+
+
+def crawl(
+    start_urls: list[str],
+    fetch_page: Callable[[str], CrawledPage],
+    max_concurrency: int,
+    host_throttle: HostThrottle,
+    on_worker_exit: Callable[[], None] | None = None,
+) -> Iterator[CrawledPage]:
+    """Fetches every start URL and every link returned with the fetched pages, each URL at
+    most once. `fetch_page` is called from the worker threads and `on_worker_exit` from each
+    worker thread once the crawl is done. Pages are yielded in the order they are fetched,
+    failed fetches are logged and skipped."""
+    visited: set[str] = set()
+    frontier: deque[str] = deque(start_urls)
+    work_queue: queue.Queue[str | None] = queue.Queue()
+    results_queue: queue.Queue[tuple[str, CrawledPage | None]] = queue.Queue()
+    workers: list[threading.Thread] = []
+    in_flight = 0
+
+    try:
+        while frontier or in_flight:
+            while frontier and in_flight < max_concurrency:
+                url = frontier.popleft()
+                if url in visited:
+                    continue
+                visited.add(url)
+
+                if len(workers) < max_concurrency:
+                    worker = threading.Thread(
+                        target=_crawl_worker,
+                        args=(
+                            fetch_page,
+                            host_throttle,
+                            work_queue,
+                            results_queue,
+                            on_worker_exit,
+                        ),
+                        name=f"web-crawl-{len(workers)}",
+                        daemon=True,
+                    )
+                    worker.start()
+                    workers.append(worker)
+
+                logger.info(f"Visiting {url}")
+                work_queue.put(url)
+                in_flight += 1
+
+            if not in_flight:
+                continue
+
+            requested_url, page = results_queue.get()
+            in_flight -= 1
+            if page is None:
+                continue
+
+            if page.url != requested_url:
+                logger.info(f"Redirected to {page.url}")
+                if page.url in visited:
+                    logger.info("Redirected page already indexed")
+                    continue
+                visited.add(page.url)
+
+            for link in page.links:
+                if link not in visited:
+                    frontier.append(link)
+
+            yield page
+    finally:
+        # workers finish the page they are on, then clean up and exit
+        for _ in workers:
+            work_queue.put(None)
@@ -0,0 +1,111 @@
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy import tuple_
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from danswer.db.models import EmbeddingCacheEntry
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+def fetch_cached_embeddings(
+    model_name: str,
+    passage_prefix: str,
+    content_hashes: list[str],
+    db_session: Session,
+) -> dict[str, list[float]]:
+    """Returns a map of content hash -> embedding for the hashes which are cached, and
+    marks them as recently used"""
+    if not content_hashes:
+        return {}
+
+    stmt = select(
+        EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.embedding
+    ).where(
+        EmbeddingCacheEntry.model_name == model_name,
+        EmbeddingCacheEntry.passage_prefix == passage_prefix,
+        EmbeddingCacheEntry.content_hash.in_(set(content_hashes)),
+    )
+    cached = {row[0]: row[1] for row in db_session.execute(stmt)}
+
+    if cached:
+        db_session.execute(
+            update(EmbeddingCacheEntry)
+            .where(
+                EmbeddingCacheEntry.model_name == model_name,
+                EmbeddingCacheEntry.passage_prefix == passage_prefix,
+                EmbeddingCacheEntry.content_hash.in_(list(cached.keys())),
+            )
+            .values(last_used_at=func.now())
+        )
+        db_session.commit()
+
+    return cached
+
+
+def upsert_cached_embeddings(
+    model_name: str,
+    passage_prefix: str,
+    embeddings_by_hash: dict[str, list[float]],
+    db_session: Session,
+) -> None:
+    if not embeddings_by_hash:
+        return
+
+    insert_stmt = insert(EmbeddingCacheEntry).values(
+        [
+            {
+                "model_name": model_name,
+                "passage_prefix": passage_prefix,
+                "content_hash": content_hash,
+                "embedding": embedding,
+            }
+            for content_hash, embedding in embeddings_by_hash.items()
+        ]
+    )
+    on_conflict_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=["model_name", "passage_prefix", "content_hash"],
+        set_={
+            "embedding": insert_stmt.excluded.embedding,
+            "last_used_at": func.now(),
+        },
+    )
+    db_session.execute(on_conflict_stmt)
+    db_session.commit()
+
+
+def evict_embedding_cache(max_entries: int, db_session: Session) -> int:
+    """Deletes the least recently used entries beyond `max_entries`, returns the number
+    of entries deleted"""
+    num_entries = db_session.scalar(
+        select(func.count()).select_from(EmbeddingCacheEntry)
+    )
+    if not num_entries or num_entries <= max_entries:
+        return 0
+
+    num_to_delete = num_entries - max_entries
+    lru_keys = (
+        select(
+            EmbeddingCacheEntry.model_name,
+            EmbeddingCacheEntry.passage_prefix,
+            EmbeddingCacheEntry.content_hash,
+        )
+        .order_by(EmbeddingCacheEntry.last_used_at)
+        .limit(num_to_delete)
+    )
+    db_session.execute(
+        delete(EmbeddingCacheEntry).where(
+            tuple_(
+                EmbeddingCacheEntry.model_name,
+                EmbeddingCacheEntry.passage_prefix,
+                EmbeddingCacheEntry.content_hash,
+            ).in_(lru_keys)
+        )
+    )
+    db_session.commit()
+    logger.info(f"Evicted {num_to_delete} entries from the embedding cache")
+    return num_to_delete
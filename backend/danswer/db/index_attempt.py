@@ -1,4 +1,5 @@
 from collections.abc import Sequence
+from typing import Any
 
 from sqlalchemy import and_
 from sqlalchemy import ColumnElement
@@ -112,6 +113,52 @@ def update_docs_indexed(
     db_session.commit()
 
 
+def update_index_attempt_checkpoint(
+    db_session: Session,
+    index_attempt: IndexAttempt,
+    checkpoint: dict[str, Any] | None,
+) -> None:
+    index_attempt.checkpoint = checkpoint
+
+    db_session.add(index_attempt)
+    db_session.commit()
+
+
+def get_latest_index_attempt_checkpoint(
+    connector_id: int,
+    credential_id: int,
+    exclude_attempt_id: int,
+    db_session: Session,
+) -> dict[str, Any] | None:
+    """Checkpoint of the latest other attempt for the connector credential pair, it is up
+    to the caller to check whether it still applies"""
+    stmt = (
+        select(IndexAttempt.checkpoint)
+        .where(
+            IndexAttempt.connector_id == connector_id,
+            IndexAttempt.credential_id == credential_id,
+            IndexAttempt.id != exclude_attempt_id,
+            IndexAttempt.status != IndexingStatus.NOT_STARTED,
+        )
+        .order_by(desc(IndexAttempt.time_created))
+        .limit(1)
+    )
+    return db_session.scalars(stmt).first()
+
+
+def update_embedding_cache_stats(
+    db_session: Session,
+    index_attempt: IndexAttempt,
+    embedding_cache_hits: int,
+    embedding_cache_misses: int,
+) -> None:
+    index_attempt.embedding_cache_hits = embedding_cache_hits
+    index_attempt.embedding_cache_misses = embedding_cache_misses
+
+    db_session.add(index_attempt)
+    db_session.commit()
+
+
 def get_last_attempt(
     connector_id: int,
     credential_id: int,
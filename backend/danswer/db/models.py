@@ -314,6 +314,82 @@ class Credential(Base):
     user: Mapped[User | None] = relationship("User", back_populates="credentials")
 
 
+class EmbeddingCacheEntry(Base):
+    """Embeddings of previously indexed chunk texts, so that unchanged chunks of an
+    updated document do not need to go through the embedding model again"""
+
+    __tablename__ = "embedding_cache"
+
+    model_name: Mapped[str] = mapped_column(String, primary_key=True)
+    passage_prefix: Mapped[str] = mapped_column(String, primary_key=True)
+    # sha256 hex digest of the (un-prefixed) chunk text
+    content_hash: Mapped[str] = mapped_column(String, primary_key=True)
+    embedding: Mapped[list[float]] = mapped_column(
+        postgresql.ARRAY(Float), nullable=False
+    )
+    # used to evict the least recently used entries once the cache is full
+    last_used_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
+
+class QueryEmbeddingCacheEntry(Base):
+    """Embeddings of recent search queries, shared by the API server processes. Rows
+    older than the query embedding cache TTL are ignored and deleted periodically, see
+    danswer/db/query_embedding_cache.py"""
+
+    __tablename__ = "query_embedding_cache"
+
+    model_name: Mapped[str] = mapped_column(String, primary_key=True)
+    query_prefix: Mapped[str] = mapped_column(String, primary_key=True)
+    # sha256 hex digest of the normalized (un-prefixed) query
+    query_hash: Mapped[str] = mapped_column(String, primary_key=True)
+    embedding: Mapped[list[float]] = mapped_column(
+        postgresql.ARRAY(Float), nullable=False
+    )
+    time_created: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
+
+class SearchCacheInvalidation(Base):
+    """Ids of documents which were (re-)indexed, updated or deleted. Every API server
+    process reads the rows added since its last read to drop the cached search results
+    containing these documents, see danswer/search/search_cache.py"""
+
+    __tablename__ = "search_cache_invalidation"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    document_id: Mapped[str] = mapped_column(String)
+    # rows older than the search result cache TTL are no longer needed
+    time_created: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
+
+class WebPageFetchState(Base):
+    """What the web connector saw the last time it fetched a page, so that polling runs only
+    re-fetch / emit the pages which changed, see danswer/connectors/web/connector.py"""
+
+    __tablename__ = "web_page_fetch_state"
+
+    # identifies the crawl (connector type + base URL) the page belongs to
+    crawl_key: Mapped[str] = mapped_column(String, primary_key=True)
+    url: Mapped[str] = mapped_column(String, primary_key=True)
+    etag: Mapped[str | None] = mapped_column(String, nullable=True)
+    last_modified: Mapped[str | None] = mapped_column(String, nullable=True)
+    sitemap_lastmod: Mapped[str | None] = mapped_column(String, nullable=True)
+    # sha256 hex digest of the parsed page text
+    content_hash: Mapped[str | None] = mapped_column(String, nullable=True)
+    # internal links on the page, to keep crawling recursively past unchanged pages
+    links: Mapped[list[str]] = mapped_column(
+        postgresql.ARRAY(String), nullable=False, default=list
+    )
+    time_updated: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
 class IndexAttempt(Base):
     """
     Represents an attempt to index a group of 1 or more documents from a
@@ -335,6 +411,13 @@ class IndexAttempt(Base):
     status: Mapped[IndexingStatus] = mapped_column(Enum(IndexingStatus))
     new_docs_indexed: Mapped[int | None] = mapped_column(Integer, default=0)
     total_docs_indexed: Mapped[int | None] = mapped_column(Integer, default=0)
+    # only filled in if the embedding cache is enabled, counts chunk / mini-chunk texts
+    embedding_cache_hits: Mapped[int | None] = mapped_column(Integer, default=0)
+    embedding_cache_misses: Mapped[int | None] = mapped_column(Integer, default=0)
+    # where the connector got to as of the last indexed batch, see checkpointing.py
+    checkpoint: Mapped[dict[str, Any] | None] = mapped_column(
+        postgresql.JSONB(), nullable=True
+    )
     error_msg: Mapped[str | None] = mapped_column(
         Text, default=None
     )  # only filled if status = "failed"
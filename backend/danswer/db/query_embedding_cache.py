@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from danswer.db.models import QueryEmbeddingCacheEntry
+
+
+def fetch_cached_query_embeddings(
+    model_name: str,
+    query_prefix: str,
+    query_hashes: list[str],
+    ttl: timedelta,
+    db_session: Session,
+) -> dict[str, list[float]]:
+    """Returns a map of query hash -> embedding for the hashes cached within the `ttl`.
+    Read only, entries expire based on when they were stored not when they were used"""
+    if not query_hashes:
+        return {}
+
+    stmt = select(
+        QueryEmbeddingCacheEntry.query_hash, QueryEmbeddingCacheEntry.embedding
+    ).where(
+        QueryEmbeddingCacheEntry.model_name == model_name,
+        QueryEmbeddingCacheEntry.query_prefix == query_prefix,
+        QueryEmbeddingCacheEntry.query_hash.in_(set(query_hashes)),
+        QueryEmbeddingCacheEntry.time_created >= func.now() - ttl,
+    )
+    return {row[0]: row[1] for row in db_session.execute(stmt)}
+
+
+def store_cached_query_embeddings(
+    model_name: str,
+    query_prefix: str,
+    embeddings_by_hash: dict[str, list[float]],
+    db_session: Session,
+) -> None:
+    if not embeddings_by_hash:
+        return
+
+    insert_stmt = insert(QueryEmbeddingCacheEntry).values(
+        [
+            {
+                "model_name": model_name,
+                "query_prefix": query_prefix,
+                "query_hash": query_hash,
+                "embedding": embedding,
+            }
+            for query_hash, embedding in embeddings_by_hash.items()
+        ]
+    )
+    db_session.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=["model_name", "query_prefix", "query_hash"],
+            set_={
+                "embedding": insert_stmt.excluded.embedding,
+                "time_created": func.now(),
+            },
+        )
+    )
+    db_session.commit()
+
+
+def delete_expired_query_embeddings(ttl: timedelta, db_session: Session) -> None:
+    """Expired entries are already ignored when reading, this keeps the table bounded"""
+    db_session.execute(
+        delete(QueryEmbeddingCacheEntry).where(
+            QueryEmbeddingCacheEntry.time_created < func.now() - ttl
+        )
+    )
+    db_session.commit()
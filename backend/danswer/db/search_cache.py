@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from danswer.db.models import SearchCacheInvalidation
+
+
+def record_search_cache_invalidations(
+    document_ids: list[str], db_session: Session
+) -> None:
+    if not document_ids:
+        return
+
+    db_session.add_all(
+        SearchCacheInvalidation(document_id=document_id)
+        for document_id in set(document_ids)
+    )
+    db_session.commit()
+
+
+def delete_old_search_cache_invalidations(
+    retention: timedelta, db_session: Session
+) -> None:
+    """The rows older than `retention` are not needed by any process anymore"""
+    db_session.execute(
+        delete(SearchCacheInvalidation).where(
+            SearchCacheInvalidation.time_created < func.now() - retention
+        )
+    )
+    db_session.commit()
+
+
+def fetch_latest_search_cache_invalidation_id(db_session: Session) -> int:
+    return db_session.scalar(select(func.max(SearchCacheInvalidation.id))) or 0
+
+
+def fetch_search_cache_invalidations(
+    after_id: int, db_session: Session
+) -> list[tuple[int, str]]:
+    """Returns (id, document id) of the invalidations after `after_id`, oldest first"""
+    stmt = (
+        select(SearchCacheInvalidation.id, SearchCacheInvalidation.document_id)
+        .where(SearchCacheInvalidation.id > after_id)
+        .order_by(SearchCacheInvalidation.id)
+    )
+    return [(row[0], row[1]) for row in db_session.execute(stmt)]
@@ -0,0 +1,49 @@
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from danswer.db.models import WebPageFetchState
+
+
+def fetch_web_page_fetch_states(
+    crawl_key: str, db_session: Session
+) -> dict[str, WebPageFetchState]:
+    """Returns a map of URL -> fetch state for every page previously seen by the crawl"""
+    stmt = select(WebPageFetchState).where(WebPageFetchState.crawl_key == crawl_key)
+    return {state.url: state for state in db_session.scalars(stmt)}
+
+
+def upsert_web_page_fetch_states(
+    crawl_key: str, states: list[WebPageFetchState], db_session: Session
+) -> None:
+    if not states:
+        return
+
+    # a URL can be seen more than once per batch, e.g. through redirects
+    values_by_url = {
+        state.url: {
+            "crawl_key": crawl_key,
+            "url": state.url,
+            "etag": state.etag,
+            "last_modified": state.last_modified,
+            "sitemap_lastmod": state.sitemap_lastmod,
+            "content_hash": state.content_hash,
+            "links": state.links or [],
+        }
+        for state in states
+    }
+    insert_stmt = insert(WebPageFetchState).values(list(values_by_url.values()))
+    on_conflict_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=["crawl_key", "url"],
+        set_={
+            "etag": insert_stmt.excluded.etag,
+            "last_modified": insert_stmt.excluded.last_modified,
+            "sitemap_lastmod": insert_stmt.excluded.sitemap_lastmod,
+            "content_hash": insert_stmt.excluded.content_hash,
+            "links": insert_stmt.excluded.links,
+            "time_updated": func.now(),
+        },
+    )
+    db_session.execute(on_conflict_stmt)
+    db_session.commit()
@@ -96,7 +96,10 @@ class KeywordCapable(abc.ABC):
         filters: IndexFilters,
         time_decay_multiplier: float,
         num_to_retrieve: int,
+        query_rephrases: list[str] | None = None,
     ) -> list[InferenceChunk]:
+        """`query_rephrases` are searched for in the same query as the original query,
+        e.g. the translations from the multilingual query expansion"""
         raise NotImplementedError
 
 
@@ -108,7 +111,12 @@ class VectorCapable(abc.ABC):
         filters: IndexFilters,
         time_decay_multiplier: float,
         num_to_retrieve: int,
+        num_rerank: int | None = None,
+        query_rephrases: list[str] | None = None,
     ) -> list[InferenceChunk]:
+        """If `num_rerank` is set and the index supports it, the top `num_rerank` hits
+        are reranked with the cross-encoder by the index itself. A chunk's score is its
+        best score over the original query and the `query_rephrases`"""
         raise NotImplementedError
 
 
@@ -121,7 +129,10 @@ class HybridCapable(abc.ABC):
         time_decay_multiplier: float,
         num_to_retrieve: int,
         hybrid_alpha: float | None = None,
+        num_rerank: int | None = None,
+        query_rephrases: list[str] | None = None,
     ) -> list[InferenceChunk]:
+        """See `semantic_retrieval` for `num_rerank` and `query_rephrases`"""
         raise NotImplementedError
 
 
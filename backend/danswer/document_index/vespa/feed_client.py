@@ -0,0 +1,221 @@
+"""Shared client for Vespa document/v1 operations (feeding chunks, partial updates and
+deletes). Vespa does not support batching of these operations, so throughput depends
+entirely on how many requests can be kept in flight over as few connections as possible.
+
+All operations go through a single pooled `httpx.Client` per process (optionally over
+HTTP/2) and a bounded number of in flight requests. When Vespa signals that it is
+overloaded (429 / 503), the in flight limit is halved and the request is retried after a
+backoff, the limit then grows back by roughly one slot per round of successful requests."""
+import threading
+import time
+from collections.abc import Callable
+from collections.abc import Iterable
+from concurrent.futures import as_completed
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import TypeVar
+
+import httpx
+
+from danswer.configs.app_configs import VESPA_FEED_HTTP2
+from danswer.configs.app_configs import VESPA_FEED_MAX_IN_FLIGHT
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+T = TypeVar("T")
+
+# Status codes which Vespa uses to signal that the client should back off
+_THROTTLED_STATUS_CODES = {429, 503}
+_MAX_THROTTLED_RETRIES = 10
+_INITIAL_BACKOFF = 0.1  # in seconds
+_MAX_BACKOFF = 5.0  # in seconds
+# Vespa's own default for document/v1 operations is 180s
+_FEED_TIMEOUT = 60.0  # in seconds
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    ind = min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))
+    return sorted_values[ind]
+
+
+@dataclass
+class VespaFeedStats:
+    operation: str
+    num_operations: int
+    elapsed_time: float  # in seconds
+    latencies: list[float] = field(default_factory=list)  # in seconds
+    num_throttled: int = 0
+
+    @property
+    def operations_per_second(self) -> float:
+        return self.num_operations / self.elapsed_time if self.elapsed_time else 0.0
+
+    def latency_percentile(self, percentile: float) -> float:
+        return _percentile(sorted(self.latencies), percentile)
+
+    def __str__(self) -> str:
+        return (
+            f"Vespa {self.operation}: {self.num_operations} operations in "
+            f"{self.elapsed_time:.2f}s ({self.operations_per_second:.1f}/sec), "
+            f"latency p50={self.latency_percentile(50) * 1000:.0f}ms "
+            f"p95={self.latency_percentile(95) * 1000:.0f}ms "
+            f"p99={self.latency_percentile(99) * 1000:.0f}ms, "
+            f"throttled responses: {self.num_throttled}"
+        )
+
+
+class _AdaptiveConcurrencyLimiter:
+    """Additive increase / multiplicative decrease limit on the number of requests in flight"""
+
+    def __init__(self, max_limit: int, min_limit: int = 1) -> None:
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self._limit = float(max_limit)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, throttled: bool) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self._limit = max(float(self.min_limit), self._limit / 2)
+            else:
+                self._limit = min(
+                    float(self.max_limit), self._limit + 1 / max(self._limit, 1)
+                )
+            self._condition.notify_all()
+
+
+class VespaFeedClient:
+    def __init__(
+        self,
+        max_in_flight: int = VESPA_FEED_MAX_IN_FLIGHT,
+        http2: bool = VESPA_FEED_HTTP2,
+        timeout: float = _FEED_TIMEOUT,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self._limiter = _AdaptiveConcurrencyLimiter(max_limit=max_in_flight)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="vespa-feed"
+        )
+        self._throttled_count = 0
+        self._throttled_lock = threading.Lock()
+
+        limits = httpx.Limits(
+            max_connections=max_in_flight, max_keepalive_connections=max_in_flight
+        )
+        try:
+            # `http1=False` so that HTTP/2 is used with prior knowledge, Vespa
+            # is generally reached over plain HTTP where there is no ALPN negotiation
+            self._client = httpx.Client(
+                http1=not http2, http2=http2, limits=limits, timeout=timeout
+            )
+        except ImportError:
+            logger.warning(
+                "HTTP/2 requested for feeding Vespa but `h2` is not installed, "
+                "falling back to HTTP/1.1"
+            )
+            self._client = httpx.Client(limits=limits, timeout=timeout)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        json: dict[str, Any] | None = None,
+        params: dict[str, str] | None = None,
+    ) -> httpx.Response:
+        """Sends a single document/v1 request. Throttled responses are retried with
+        backoff, any other response (including errors) is returned to the caller."""
+        backoff = _INITIAL_BACKOFF
+        response: httpx.Response | None = None
+        for _ in range(_MAX_THROTTLED_RETRIES + 1):
+            throttled = False
+            self._limiter.acquire()
+            try:
+                response = self._client.request(method, url, json=json, params=params)
+                throttled = response.status_code in _THROTTLED_STATUS_CODES
+            finally:
+                self._limiter.release(throttled=throttled)
+
+            if not throttled:
+                return response
+
+            with self._throttled_lock:
+                self._throttled_count += 1
+            logger.debug(
+                f"Vespa responded with {response.status_code} to {method} {url}, "
+                f"retrying in {backoff}s with in flight limit {self._limiter.limit}"
+            )
+            time.sleep(backoff)
+            backoff = min(backoff * 2, _MAX_BACKOFF)
+
+        assert response is not None
+        return response
+
+    def feed(
+        self,
+        items: Iterable[T],
+        operation_fn: Callable[[T], Any],
+        operation: str = "feed",
+    ) -> VespaFeedStats:
+        """Runs `operation_fn` (which is expected to call `request`) for every item with
+        up to `max_in_flight` operations running concurrently. Raises the first failure
+        after all operations have completed."""
+        item_list = list(items)
+        latencies: list[float] = []
+        throttled_before = self._throttled_count
+
+        def _timed(item: T) -> None:
+            op_start = time.monotonic()
+            operation_fn(item)
+            latencies.append(time.monotonic() - op_start)
+
+        start = time.monotonic()
+        futures = [self._executor.submit(_timed, item) for item in item_list]
+        first_exception: BaseException | None = None
+        for future in as_completed(futures):
+            exception = future.exception()
+            if exception is not None and first_exception is None:
+                first_exception = exception
+
+        stats = VespaFeedStats(
+            operation=operation,
+            num_operations=len(item_list),
+            elapsed_time=time.monotonic() - start,
+            latencies=latencies,
+            num_throttled=self._throttled_count - throttled_before,
+        )
+        if item_list:
+            logger.info(str(stats))
+
+        if first_exception is not None:
+            raise first_exception
+        return stats
+
+
+_FEED_CLIENT: VespaFeedClient | None = None
+_FEED_CLIENT_LOCK = threading.Lock()
+
+
+def get_vespa_feed_client() -> VespaFeedClient:
+    global _FEED_CLIENT
+    if _FEED_CLIENT is None:
+        with _FEED_CLIENT_LOCK:
+            if _FEED_CLIENT is None:
+                _FEED_CLIENT = VespaFeedClient()
+    return _FEED_CLIENT
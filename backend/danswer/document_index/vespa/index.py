@@ -1,7 +1,10 @@
-import concurrent.futures
+import io
 import json
+import os
+import re
 import string
 import time
+import zipfile
 from collections.abc import Callable
 from collections.abc import Mapping
 from dataclasses import dataclass
@@ -11,22 +14,33 @@ from datetime import timezone
 from typing import Any
 from typing import cast
 
+import httpx
 import requests
-from requests import HTTPError
-from requests import Response
 from retry import retry
 
 from danswer.configs.app_configs import DOCUMENT_INDEX_NAME
 from danswer.configs.app_configs import LOG_VESPA_TIMING_INFORMATION
+from danswer.configs.app_configs import VESPA_ALLOW_EMBEDDING_TYPE_CHANGE
+from danswer.configs.app_configs import VESPA_ANN_APPROXIMATE
+from danswer.configs.app_configs import VESPA_BINARY_RERANK_COUNT
+from danswer.configs.app_configs import VESPA_CROSS_ENCODER_RERANKING
 from danswer.configs.app_configs import VESPA_DEPLOYMENT_ZIP
+from danswer.configs.app_configs import VESPA_EMBEDDING_CELL_TYPE
+from danswer.configs.app_configs import VESPA_ENABLE_BINARY_EMBEDDINGS
+from danswer.configs.app_configs import VESPA_ENABLE_HNSW_INDEX
+from danswer.configs.app_configs import VESPA_HNSW_EXPLORE_ADDITIONAL_HITS
+from danswer.configs.app_configs import VESPA_HNSW_MAX_LINKS_PER_NODE
+from danswer.configs.app_configs import VESPA_HNSW_NEIGHBORS_TO_EXPLORE_AT_INSERT
 from danswer.configs.app_configs import VESPA_HOST
 from danswer.configs.app_configs import VESPA_PORT
 from danswer.configs.app_configs import VESPA_TENANT_PORT
 from danswer.configs.chat_configs import DOC_TIME_DECAY
 from danswer.configs.chat_configs import EDIT_KEYWORD_QUERY
 from danswer.configs.chat_configs import HYBRID_ALPHA
+from danswer.configs.chat_configs import NUM_RERANKED_RESULTS
 from danswer.configs.chat_configs import NUM_RETURNED_HITS
 from danswer.configs.constants import ACCESS_CONTROL_LIST
+from danswer.configs.constants import BINARY_EMBEDDINGS
 from danswer.configs.constants import BLURB
 from danswer.configs.constants import BOOST
 from danswer.configs.constants import CHUNK_ID
@@ -46,6 +60,12 @@ from danswer.configs.constants import SEMANTIC_IDENTIFIER
 from danswer.configs.constants import SOURCE_LINKS
 from danswer.configs.constants import SOURCE_TYPE
 from danswer.configs.constants import TITLE
+from danswer.configs.model_configs import CROSS_EMBED_CONTEXT_SIZE
+from danswer.configs.model_configs import CROSS_ENCODER_MODEL_ENSEMBLE
+from danswer.configs.model_configs import CROSS_ENCODER_RANGE_MAX
+from danswer.configs.model_configs import CROSS_ENCODER_RANGE_MIN
+from danswer.configs.model_configs import DOC_EMBEDDING_DIM
+from danswer.configs.model_configs import INFERENCE_BACKEND
 from danswer.configs.model_configs import SEARCH_DISTANCE_CUTOFF
 from danswer.connectors.cross_connector_utils.miscellaneous_utils import (
     get_experts_stores_representations,
@@ -54,16 +74,25 @@ from danswer.document_index.document_index_utils import get_uuid_from_chunk
 from danswer.document_index.interfaces import DocumentIndex
 from danswer.document_index.interfaces import DocumentInsertionRecord
 from danswer.document_index.interfaces import UpdateRequest
+from danswer.document_index.vespa.feed_client import get_vespa_feed_client
+from danswer.document_index.vespa.utils import binarize_embedding
+from danswer.document_index.vespa.utils import build_dynamic_summary
+from danswer.document_index.vespa.utils import cast_embedding
+from danswer.document_index.vespa.utils import escape_yql_string
 from danswer.document_index.vespa.utils import remove_invalid_unicode_chars
+from danswer.dynamic_configs import get_dynamic_config_store
+from danswer.dynamic_configs.interface import ConfigNotFoundError
 from danswer.indexing.models import DocMetadataAwareIndexChunk
 from danswer.indexing.models import InferenceChunk
 from danswer.search.models import IndexFilters
-from danswer.search.search_runner import embed_query
+from danswer.search.search_cache import invalidate_cached_search_results
+from danswer.search.search_runner import embed_queries
 from danswer.search.search_runner import query_processing
 from danswer.search.search_runner import remove_stop_words_and_punctuation
 from danswer.utils.batching import batch_generator
 from danswer.utils.logger import setup_logger
 from danswer.utils.threadpool_concurrency import run_functions_tuples_in_parallel
+from danswer.utils.threadpool_concurrency import VESPA_EXECUTOR
 
 logger = setup_logger()
 
@@ -71,47 +100,495 @@ logger = setup_logger()
 VESPA_CONFIG_SERVER_URL = f"http://{VESPA_HOST}:{VESPA_TENANT_PORT}"
 VESPA_APP_CONTAINER_URL = f"http://{VESPA_HOST}:{VESPA_PORT}"
 VESPA_APPLICATION_ENDPOINT = f"{VESPA_CONFIG_SERVER_URL}/application/v2"
+VESPA_APPLICATION_INSTANCE_ENDPOINT = (
+    f"{VESPA_APPLICATION_ENDPOINT}/tenant/default/application/default"
+    "/environment/prod/region/default/instance/default"
+)
+# Files of the currently deployed app, relative to the app root
+VESPA_APPLICATION_CONTENT_ENDPOINT = f"{VESPA_APPLICATION_INSTANCE_ENDPOINT}/content"
 # danswer_chunk below is defined in vespa/app_configs/schemas/danswer_chunk.sd
 DOCUMENT_ID_ENDPOINT = (
     f"{VESPA_APP_CONTAINER_URL}/document/v1/default/danswer_chunk/docid"
 )
 SEARCH_ENDPOINT = f"{VESPA_APP_CONTAINER_URL}/search/"
+# messages of the config changes that are waiting for Vespa to be restarted
+_VESPA_PENDING_RESTART_KEY = "vespa_pending_restart"
+_SERVICE_CONVERGE_TIMEOUT = 60
 _BATCH_SIZE = 100  # Specific to Vespa
-_NUM_THREADS = (
-    16  # since Vespa doesn't allow batching of inserts / updates, we use threads
-)
 # up from 500ms for now, since we've seen quite a few timeouts
 # in the long term, we are looking to improve the performance of Vespa
 # so that we can bring this back to default
 _VESPA_TIMEOUT = "3s"
-# Specific to Vespa, needed for highlighting matching keywords / section
-CONTENT_SUMMARY = "content_summary"
+# Specific to Vespa, word matched index of `content` which isn't fed or returned, see
+# the schema. Took over the matching of the removed `content_summary` field
+CONTENT_WORDS = "content_words"
+# Also matches the chunks which contain all of the query words, outside of the weakAnd's
+# best hits. Run against the stemmed `content_words` index, not the 3-gram `content`
+# index, so that the same chunks are retrieved as with `content_summary`
+_CONTENT_MATCH_CLAUSE = f'({{defaultIndex: "{CONTENT_WORDS}"}}userInput(@query))'
+
+
+_VALID_EMBEDDING_CELL_TYPES = ("float", "bfloat16", "int8")
+_SCHEMA_PATH = "schemas/danswer_chunk.sd"
+_EMBEDDING_FIELD_TYPE_PATTERN = re.compile(
+    rf"field ({EMBEDDINGS}|{BINARY_EMBEDDINGS}) type (tensor<\w+>\([^)]*\))"
+)
+
+# The original query plus up to this many - 1 rephrasings are searched in a single query,
+# each embedding needs its own query input declared in the schema
+MAX_QUERY_EMBEDDINGS = 8
+
+_CROSS_ENCODER_RANKING_TEMPLATE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "app_config_extensions",
+    "cross_encoder_ranking.sd",
+)
+_CROSS_ENCODER_ONNX_PATH = "models/cross_encoder.onnx"
+_CROSS_ENCODER_TOKENIZER_PATH = "models/cross_encoder_tokenizer.json"
+# Query tokens past this are cut off, the rest of the sequence is for the chunk content
+_CROSS_ENCODER_MAX_QUERY_TOKENS = 64
+
+
+def _build_embeddings_indexing(
+    enable_hnsw: bool,
+    max_links_per_node: int,
+    neighbors_to_explore_at_insert: int,
+) -> str:
+    if not enable_hnsw:
+        return "indexing: attribute"
+
+    return (
+        "indexing: attribute | index\n"
+        "            index {\n"
+        "                hnsw {\n"
+        f"                    max-links-per-node: {max_links_per_node}\n"
+        f"                    neighbors-to-explore-at-insert: {neighbors_to_explore_at_insert}\n"
+        "                }\n"
+        "            }"
+    )
+
+
+def _get_binary_embedding_dim(embedding_dim: int) -> int:
+    # 8 dimensions per int8 cell, rounded up
+    return -(-embedding_dim // 8)
+
+
+def _get_query_embedding_names(ind: int) -> tuple[str, str]:
+    """Names of the full precision and binarized query tensors of the `ind`th query
+    embedding, 0 is the original query"""
+    if ind == 0:
+        return "query_embedding", "query_binary_embedding"
+    return f"query_embedding_{ind}", f"query_binary_embedding_{ind}"
+
+
+def _build_query_rephrase_inputs(
+    embedding_cell_type: str, embedding_dim: int, binary_embedding_dim: int
+) -> str:
+    inputs: list[str] = []
+    for ind in range(1, MAX_QUERY_EMBEDDINGS):
+        embedding_name, binary_embedding_name = _get_query_embedding_names(ind)
+        inputs.append(
+            f"query({embedding_name}) "
+            f"tensor<{embedding_cell_type}>(x[{embedding_dim}])"
+        )
+        inputs.append(
+            f"query({binary_embedding_name}) tensor<int8>(x[{binary_embedding_dim}])"
+        )
+    return "\n            ".join(inputs)
 
 
 @dataclass
-class _VespaUpdateRequest:
-    document_id: str
-    url: str
-    update_request: dict[str, dict]
+class CrossEncoderRankingFiles:
+    """The exported cross-encoder to rank with inside Vespa, see
+    `export_cross_encoder_for_vespa`"""
+
+    onnx_model_path: str
+    tokenizer_path: str
+    input_names: list[str]
+    max_tokens: int = CROSS_EMBED_CONTEXT_SIZE
+
+
+def _build_cross_encoder_ranking(
+    cross_encoder: CrossEncoderRankingFiles,
+    embedding_dim: int,
+    enable_binary_embeddings: bool,
+) -> str:
+    with open(_CROSS_ENCODER_RANKING_TEMPLATE) as f:
+        template = string.Template(f.read())
+
+    onnx_inputs = "\n".join(
+        f"        input {input_name}: {input_name}"
+        for input_name in cross_encoder.input_names
+    )
+    # 1 - the fraction of differing sign bits approximates the cosine similarity
+    hybrid_closeness = (
+        f"(1 - distance(field, {BINARY_EMBEDDINGS}) / {embedding_dim})"
+        if enable_binary_embeddings
+        else f"closeness(field, {EMBEDDINGS})"
+    )
+    return template.substitute(
+        cross_encoder_max_tokens=cross_encoder.max_tokens,
+        cross_encoder_max_query_tokens=_CROSS_ENCODER_MAX_QUERY_TOKENS,
+        cross_encoder_onnx_inputs=onnx_inputs,
+        cross_encoder_score_offset=-CROSS_ENCODER_RANGE_MIN,
+        cross_encoder_score_range=CROSS_ENCODER_RANGE_MAX - CROSS_ENCODER_RANGE_MIN,
+        cross_encoder_rerank_count=NUM_RERANKED_RESULTS,
+        semantic_rank_profile="semantic_search_binary"
+        if enable_binary_embeddings
+        else "semantic_search",
+        hybrid_rank_profile="hybrid_search_binary"
+        if enable_binary_embeddings
+        else "hybrid_search",
+        hybrid_closeness=hybrid_closeness,
+    ).strip()
+
+
+def get_cross_encoder_ranking_files(
+    model_name: str | None = None,
+    quantize: bool = INFERENCE_BACKEND == "onnx_int8",
+) -> CrossEncoderRankingFiles:
+    """Defaults to the first model of CROSS_ENCODER_MODEL_ENSEMBLE"""
+    if model_name is None:
+        if not CROSS_ENCODER_MODEL_ENSEMBLE:
+            raise ValueError(
+                "Ranking with a cross-encoder in Vespa requires a model in "
+                "CROSS_ENCODER_MODEL_ENSEMBLE"
+            )
+        model_name = CROSS_ENCODER_MODEL_ENSEMBLE[0]
 
+    # torch is only needed if the cross-encoder ranking is enabled
+    from danswer.search.onnx_models import export_cross_encoder_for_vespa
 
-@retry(tries=3, delay=1, backoff=2)
-def _does_document_exist(
-    doc_chunk_id: str,
-) -> bool:
-    """Returns whether the document already exists and the users/group whitelists
-    Specifically in this case, document refers to a vespa document which is equivalent to a Danswer
-    chunk. This checks for whether the chunk exists already in the index"""
-    doc_fetch_response = requests.get(f"{DOCUMENT_ID_ENDPOINT}/{doc_chunk_id}")
-    if doc_fetch_response.status_code == 404:
-        return False
-
-    if doc_fetch_response.status_code != 200:
+    onnx_model_path, tokenizer_path, input_names = export_cross_encoder_for_vespa(
+        model_name=model_name, quantize=quantize
+    )
+    return CrossEncoderRankingFiles(
+        onnx_model_path=str(onnx_model_path),
+        tokenizer_path=str(tokenizer_path),
+        input_names=input_names,
+    )
+
+
+def render_vespa_app_config(
+    deployment_zip: str,
+    enable_hnsw: bool = VESPA_ENABLE_HNSW_INDEX,
+    max_links_per_node: int = VESPA_HNSW_MAX_LINKS_PER_NODE,
+    neighbors_to_explore_at_insert: int = VESPA_HNSW_NEIGHBORS_TO_EXPLORE_AT_INSERT,
+    embedding_dim: int = DOC_EMBEDDING_DIM,
+    embedding_cell_type: str = VESPA_EMBEDDING_CELL_TYPE,
+    enable_binary_embeddings: bool = VESPA_ENABLE_BINARY_EMBEDDINGS,
+    cross_encoder: CrossEncoderRankingFiles | None = None,
+    allow_field_type_change: bool = False,
+) -> bytes:
+    """The schemas and services.xml in the app zip are templates (`string.Template`
+    syntax) for settings which are configurable via env variables, this fills them in
+    and returns the zip to deploy. If a cross-encoder is passed, its rank profiles are
+    added to the schema and the model files to the zip. `allow_field_type_change` adds
+    a validation override so that the type of existing fields can be changed"""
+    if embedding_cell_type not in _VALID_EMBEDDING_CELL_TYPES:
+        raise ValueError(
+            f"Invalid Vespa embedding cell type '{embedding_cell_type}', "
+            f"must be one of {_VALID_EMBEDDING_CELL_TYPES}"
+        )
+
+    hnsw_settings = {
+        "max_links_per_node": max_links_per_node,
+        "neighbors_to_explore_at_insert": neighbors_to_explore_at_insert,
+    }
+    # The nearest neighbor search runs against only one of the fields, the other one
+    # does not need an HNSW index
+    binary_embedding_dim = _get_binary_embedding_dim(embedding_dim)
+    template_values = {
+        "embedding_dim": embedding_dim,
+        "embedding_cell_type": embedding_cell_type,
+        "binary_embedding_dim": binary_embedding_dim,
+        "query_rephrase_inputs": _build_query_rephrase_inputs(
+            embedding_cell_type=embedding_cell_type,
+            embedding_dim=embedding_dim,
+            binary_embedding_dim=binary_embedding_dim,
+        ),
+        "embeddings_indexing": _build_embeddings_indexing(
+            enable_hnsw=enable_hnsw and not enable_binary_embeddings,
+            **hnsw_settings,
+        ),
+        "embeddings_attribute_paging": "attribute: paged"
+        if enable_binary_embeddings
+        else "",
+        "binary_embeddings_indexing": _build_embeddings_indexing(
+            enable_hnsw=enable_hnsw and enable_binary_embeddings,
+            **hnsw_settings,
+        ),
+        "cross_encoder_ranking": _build_cross_encoder_ranking(
+            cross_encoder=cross_encoder,
+            embedding_dim=embedding_dim,
+            enable_binary_embeddings=enable_binary_embeddings,
+        )
+        if cross_encoder
+        else "",
+        "container_components": (
+            '<component id="cross_encoder_tokenizer" type="hugging-face-tokenizer">\n'
+            f'            <model path="{_CROSS_ENCODER_TOKENIZER_PATH}"/>\n'
+            "        </component>"
+        )
+        if cross_encoder
+        else "",
+    }
+
+    rendered = io.BytesIO()
+    with zipfile.ZipFile(deployment_zip) as source_zip, zipfile.ZipFile(
+        rendered, "w", zipfile.ZIP_DEFLATED
+    ) as rendered_zip:
+        for item in source_zip.infolist():
+            data = source_zip.read(item.filename)
+            if item.filename.endswith((".sd", "services.xml")):
+                data = (
+                    string.Template(data.decode()).substitute(template_values).encode()
+                )
+            rendered_zip.writestr(item, data)
+
+        if cross_encoder:
+            rendered_zip.write(cross_encoder.onnx_model_path, _CROSS_ENCODER_ONNX_PATH)
+            rendered_zip.write(
+                cross_encoder.tokenizer_path, _CROSS_ENCODER_TOKENIZER_PATH
+            )
+
+        if allow_field_type_change:
+            # Vespa only accepts overrides which expire within the next 30 days
+            until = (datetime.now(timezone.utc) + timedelta(days=7)).date()
+            rendered_zip.writestr(
+                "validation-overrides.xml",
+                "<validation-overrides>\n"
+                f'    <allow until="{until.isoformat()}">field-type-change</allow>\n'
+                "</validation-overrides>\n",
+            )
+    return rendered.getvalue()
+
+
+def _get_embedding_field_types(schema: str) -> dict[str, str]:
+    return dict(_EMBEDDING_FIELD_TYPE_PATTERN.findall(schema))
+
+
+def _get_deployed_schema() -> str | None:
+    """None if no app has been deployed yet"""
+    response = requests.get(f"{VESPA_APPLICATION_CONTENT_ENDPOINT}/{_SCHEMA_PATH}")
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.text
+
+
+def _get_embedding_type_changes(
+    deployed_schema: str, app_zip: bytes
+) -> dict[str, tuple[str, str]]:
+    """The embedding fields whose tensor type differs between the deployed schema and
+    the app to deploy, mapped to their (deployed, new) types"""
+    with zipfile.ZipFile(io.BytesIO(app_zip)) as app:
+        new_types = _get_embedding_field_types(app.read(_SCHEMA_PATH).decode())
+    deployed_types = _get_embedding_field_types(deployed_schema)
+    return {
+        field: (deployed_types[field], new_type)
+        for field, new_type in new_types.items()
+        if field in deployed_types and deployed_types[field] != new_type
+    }
+
+
+def _handle_config_change_actions(response_json: dict[str, Any]) -> None:
+    """Vespa applies most schema changes live, some need more work which a self hosted
+    Vespa does not do by itself:
+    - reindex (e.g. a new field indexed from `content`): reindexing is triggered here,
+      Vespa then rewrites the stored documents in the background
+    - restart (e.g. adding / removing the HNSW index of the embeddings, the graph is
+      built from the stored vectors when the content node starts) and refeed: these
+      cannot be done from here, the deploy which needs them fails instead of the
+      change silently not being in effect. The pending restart is remembered, see
+      `_check_pending_restart`"""
+    change_actions = response_json.get("configChangeActions") or {}
+
+    for action in change_actions.get("reindex") or []:
+        logger.info(
+            f"Vespa schema change requires reindexing, triggering it: "
+            f"{action.get('messages')}"
+        )
+        response = requests.post(
+            f"{VESPA_APPLICATION_INSTANCE_ENDPOINT}/reindex",
+            params={
+                "clusterId": action.get("clusterName"),
+                "documentType": action.get("documentType"),
+            },
+        )
+        response.raise_for_status()
+
+    restart_messages = [
+        message
+        for action in change_actions.get("restart") or []
+        for message in action.get("messages") or []
+    ]
+    if restart_messages:
+        get_dynamic_config_store().store(_VESPA_PENDING_RESTART_KEY, restart_messages)
+        raise RuntimeError(
+            "The Vespa app was deployed but the changes only take effect once Vespa is "
+            f"restarted: {restart_messages}. Restart the Vespa container, then restart "
+            "the API server."
+        )
+
+    refeed_messages = [
+        message
+        for action in change_actions.get("refeed") or []
+        for message in action.get("messages") or []
+    ]
+    if refeed_messages:
         raise RuntimeError(
-            f"Unexpected fetch document by ID value from Vespa "
-            f"with error {doc_fetch_response.status_code}"
+            "The Vespa app was deployed but the changes only take effect once all "
+            f"documents are re-fed: {refeed_messages}. Delete and re-add the "
+            "connectors so that every document is indexed again."
         )
-    return True
+
+
+def _services_converged(timeout: float) -> bool:
+    """Whether all Vespa services run the config of the latest deploy, services which
+    need a restart for it only get there once restarted. Waits for up to `timeout`
+    seconds as the services take a moment to pick up a new deploy"""
+    deadline = time.monotonic() + timeout
+    while True:
+        response = requests.get(
+            f"{VESPA_APPLICATION_INSTANCE_ENDPOINT}/serviceconverge"
+        )
+        if response.ok and response.json().get("converged"):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(2)
+
+
+def _check_pending_restart(timeout: float = _SERVICE_CONVERGE_TIMEOUT) -> None:
+    """Deploying the same app again after a deploy which needed a restart returns no
+    change actions, the restart is remembered until the services converged"""
+    kv_store = get_dynamic_config_store()
+    try:
+        restart_messages = kv_store.load(_VESPA_PENDING_RESTART_KEY)
+    except ConfigNotFoundError:
+        return
+
+    if not _services_converged(timeout):
+        raise RuntimeError(
+            "An earlier deploy of the Vespa app has changes which only take effect "
+            f"once Vespa is restarted: {restart_messages}. Restart the Vespa "
+            "container, then restart the API server."
+        )
+    kv_store.delete(_VESPA_PENDING_RESTART_KEY)
+    logger.info("Vespa was restarted, the changes that needed the restart are applied")
+
+
+def _build_nearest_neighbor_clause(
+    target_hits: int,
+    approximate: bool = VESPA_ANN_APPROXIMATE,
+    explore_additional_hits: int = VESPA_HNSW_EXPLORE_ADDITIONAL_HITS,
+    binary_embeddings: bool = VESPA_ENABLE_BINARY_EMBEDDINGS,
+    num_query_embeddings: int = 1,
+) -> str:
+    # `approximate` and `hnsw.exploreAdditionalHits` are ignored by Vespa if
+    # the embeddings field has no HNSW index, the search is then always exact
+    annotations = [f"targetHits: {target_hits}"]
+    if not approximate:
+        annotations.append("approximate: false")
+    elif explore_additional_hits:
+        annotations.append(f"hnsw.exploreAdditionalHits: {explore_additional_hits}")
+
+    field = BINARY_EMBEDDINGS if binary_embeddings else EMBEDDINGS
+    clauses = []
+    for ind in range(num_query_embeddings):
+        embedding_name, binary_embedding_name = _get_query_embedding_names(ind)
+        query_tensor = binary_embedding_name if binary_embeddings else embedding_name
+        clauses.append(
+            f"({{{', '.join(annotations)}}}nearestNeighbor({field}, {query_tensor}))"
+        )
+    if len(clauses) == 1:
+        return clauses[0]
+    return f"({' or '.join(clauses)})"
+
+
+def _build_query_embedding_params(
+    query_embeddings: list[list[float]],
+    binary_embeddings: bool = VESPA_ENABLE_BINARY_EMBEDDINGS,
+) -> dict[str, str | int]:
+    """The query tensors need to be cast the same way as the embeddings are when fed.
+    The first embedding is of the original query, the rest of its rephrasings"""
+    params: dict[str, str | int] = {}
+    for ind, query_embedding in enumerate(query_embeddings):
+        embedding_name, binary_embedding_name = _get_query_embedding_names(ind)
+        params[f"input.query({embedding_name})"] = str(
+            cast_embedding(query_embedding, VESPA_EMBEDDING_CELL_TYPE)
+        )
+        if binary_embeddings:
+            params[f"input.query({binary_embedding_name})"] = str(
+                binarize_embedding(query_embedding)
+            )
+    if binary_embeddings:
+        params["ranking.rerankCount"] = VESPA_BINARY_RERANK_COUNT
+    return params
+
+
+def _get_query_keywords(search_queries: list[str], edit_keyword_query: bool) -> str:
+    return " ".join(
+        " ".join(remove_stop_words_and_punctuation(search_query))
+        if edit_keyword_query
+        else search_query
+        for search_query in search_queries
+    )
+
+
+def _build_content_match(query_keywords: list[str]) -> tuple[str, dict[str, str]]:
+    """The content match clause and its params for the keywords of each search query.
+    The `query` param holds the words of all of them for the weakAnd, a chunk would have
+    to contain all the words of every rephrasing to match it. So with rephrasings each
+    one is matched with its own param instead"""
+    query_keywords = [keywords for keywords in query_keywords if keywords.strip()]
+    if len(query_keywords) < 2:
+        return _CONTENT_MATCH_CLAUSE, {}
+
+    clauses: list[str] = []
+    params: dict[str, str] = {}
+    for ind, keywords in enumerate(query_keywords):
+        param_name = f"content_query_{ind}"
+        clauses.append(f'({{defaultIndex: "{CONTENT_WORDS}"}}userInput(@{param_name}))')
+        params[param_name] = keywords
+    return f"({' or '.join(clauses)})", params
+
+
+def _get_search_queries(query: str, query_rephrases: list[str] | None) -> list[str]:
+    """The original query followed by the distinct rephrasings, up to the number of
+    query embeddings the schema declares inputs for"""
+    search_queries = list(dict.fromkeys([query, *(query_rephrases or [])]))
+    if len(search_queries) > MAX_QUERY_EMBEDDINGS:
+        logger.warning(
+            f"Only searching with the first {MAX_QUERY_EMBEDDINGS - 1} of "
+            f"{len(search_queries) - 1} query rephrasings"
+        )
+    return search_queries[:MAX_QUERY_EMBEDDINGS]
+
+
+def _build_cross_encoder_rerank_params(
+    query: str, rank_profile: str, num_rerank: int | None
+) -> dict[str, str | int]:
+    """Switches to the `<rank_profile>_cross_encoder` profile which reranks the top
+    `num_rerank` hits with the cross-encoder in the global-phase, if enabled"""
+    if not num_rerank or not VESPA_CROSS_ENCODER_RERANKING:
+        return {"ranking.profile": rank_profile}
+
+    return {
+        "ranking.profile": f"{rank_profile.removesuffix('_binary')}_cross_encoder",
+        # the full query, the `query` param is stripped of stopwords
+        "input.query(query_tokens)": "embed(cross_encoder_tokenizer, @rerank_query)",
+        "rerank_query": query,
+        "ranking.globalPhase.rerankCount": num_rerank,
+    }
+
+
+@dataclass
+class _VespaUpdateRequest:
+    document_id: str
+    url: str
+    update_request: dict[str, dict]
 
 
 def _vespa_get_updated_at_attribute(t: datetime | None) -> int | None:
@@ -138,7 +615,10 @@ def _get_vespa_chunk_ids_by_document_id(
     offset = 0
     doc_chunk_ids = []
     params: dict[str, int | str] = {
-        "yql": f"select documentid from {DOCUMENT_INDEX_NAME} where {filters_str}document_id contains '{document_id}'",
+        "yql": (
+            f"select documentid from {DOCUMENT_INDEX_NAME} where {filters_str}"
+            f"{DOCUMENT_ID} contains '{escape_yql_string(document_id)}'"
+        ),
         "timeout": "10s",
         "offset": offset,
         "hits": hits_per_page,
@@ -158,74 +638,64 @@ def _get_vespa_chunk_ids_by_document_id(
 
 
 @retry(tries=3, delay=1, backoff=2)
-def _delete_vespa_doc_chunks(document_id: str) -> None:
-    doc_chunk_ids = _get_vespa_chunk_ids_by_document_id(document_id)
+def _delete_vespa_docs(document_ids: list[str]) -> None:
+    """Removes all chunks of the given documents with a single selection based
+    delete, rather than looking up and deleting each chunk individually. Vespa visits
+    the matching chunks server side and may need several requests (continuations)
+    to get through all of them."""
+    if not document_ids:
+        return
+
+    # danswer_chunk below is defined in vespa/app_configs/schemas/danswer_chunk.sd
+    selection = " or ".join(
+        f"danswer_chunk.{DOCUMENT_ID}=='{escape_yql_string(doc_id)}'"
+        for doc_id in document_ids
+    )
+    params = {"selection": selection, "cluster": DOCUMENT_INDEX_NAME}
 
-    for chunk_id in doc_chunk_ids:
-        res = requests.delete(f"{DOCUMENT_ID_ENDPOINT}/{chunk_id}")
+    feed_client = get_vespa_feed_client()
+    while True:
+        res = feed_client.request("DELETE", DOCUMENT_ID_ENDPOINT, params=params)
         res.raise_for_status()
 
+        continuation = res.json().get("continuation")
+        if not continuation:
+            break
+        params["continuation"] = continuation
 
-def _delete_vespa_docs(
-    document_ids: list[str],
-    executor: concurrent.futures.ThreadPoolExecutor | None = None,
-) -> None:
-    external_executor = True
-
-    if not executor:
-        external_executor = False
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=_NUM_THREADS)
-
-    try:
-        doc_deletion_future = {
-            executor.submit(_delete_vespa_doc_chunks, doc_id): doc_id
-            for doc_id in document_ids
-        }
-        for future in concurrent.futures.as_completed(doc_deletion_future):
-            # Will raise exception if the deletion raised an exception
-            future.result()
-
-    finally:
-        if not external_executor:
-            executor.shutdown(wait=True)
-
-
-def _get_existing_documents_from_chunks(
-    chunks: list[DocMetadataAwareIndexChunk],
-    executor: concurrent.futures.ThreadPoolExecutor | None = None,
-) -> set[str]:
-    external_executor = True
-
-    if not executor:
-        external_executor = False
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=_NUM_THREADS)
-
-    document_ids: set[str] = set()
-    try:
-        chunk_existence_future = {
-            executor.submit(
-                _does_document_exist, str(get_uuid_from_chunk(chunk))
-            ): chunk
-            for chunk in chunks
-        }
-        for future in concurrent.futures.as_completed(chunk_existence_future):
-            chunk = chunk_existence_future[future]
-            chunk_already_existed = future.result()
-            if chunk_already_existed:
-                document_ids.add(chunk.source_document.id)
 
-    finally:
-        if not external_executor:
-            executor.shutdown(wait=True)
+@retry(tries=3, delay=1, backoff=2)
+def _get_existing_document_ids(document_ids: list[str]) -> set[str]:
+    """Returns which of the given documents have at least one chunk in the index, using
+    a single grouping query instead of one lookup per document"""
+    if not document_ids:
+        return set()
+
+    doc_id_clause = " or ".join(
+        f"{DOCUMENT_ID} contains '{escape_yql_string(doc_id)}'"
+        for doc_id in document_ids
+    )
+    params: dict[str, int | str] = {
+        "yql": (
+            f"select {DOCUMENT_ID} from {DOCUMENT_INDEX_NAME} where ({doc_id_clause}) "
+            f"limit 0 | all(group({DOCUMENT_ID}) max({len(document_ids)}) "
+            f"each(output(count())))"
+        ),
+        "timeout": "10s",
+    }
+    res = requests.get(SEARCH_ENDPOINT, params=params)
+    res.raise_for_status()
 
-    return document_ids
+    existing_document_ids: set[str] = set()
+    for group_root in res.json()["root"].get("children", []):
+        for group_list in group_root.get("children", []):
+            for group in group_list.get("children", []):
+                existing_document_ids.add(group["value"])
+    return existing_document_ids
 
 
 @retry(tries=3, delay=1, backoff=2)
 def _index_vespa_chunk(chunk: DocMetadataAwareIndexChunk) -> None:
-    json_header = {
-        "Content-Type": "application/json",
-    }
     document = chunk.source_document
     # No minichunk documents in vespa, minichunk vectors are stored in the chunk itself
     vespa_chunk_id = str(get_uuid_from_chunk(chunk))
@@ -240,16 +710,17 @@ def _index_vespa_chunk(chunk: DocMetadataAwareIndexChunk) -> None:
         DOCUMENT_ID: document.id,
         CHUNK_ID: chunk.chunk_id,
         BLURB: chunk.blurb,
-        # this duplication of `content` is needed for keyword highlighting :(
         CONTENT: chunk.content,
-        CONTENT_SUMMARY: chunk.content,
         SOURCE_TYPE: str(document.source.value),
         SOURCE_LINKS: json.dumps(chunk.source_links),
         SEMANTIC_IDENTIFIER: document.semantic_identifier,
         TITLE: document.get_title_for_document_index(),
         SECTION_CONTINUATION: chunk.section_continuation,
         METADATA: json.dumps(document.metadata),
-        EMBEDDINGS: embeddings_name_vector_map,
+        EMBEDDINGS: {
+            name: cast_embedding(vector, VESPA_EMBEDDING_CELL_TYPE)
+            for name, vector in embeddings_name_vector_map.items()
+        },
         BOOST: DEFAULT_BOOST,
         DOC_UPDATED_AT: _vespa_get_updated_at_attribute(document.doc_updated_at),
         PRIMARY_OWNERS: get_experts_stores_representations(document.primary_owners),
@@ -259,15 +730,19 @@ def _index_vespa_chunk(chunk: DocMetadataAwareIndexChunk) -> None:
         ACCESS_CONTROL_LIST: {acl_entry: 1 for acl_entry in chunk.access.to_acl()},
         DOCUMENT_SETS: {document_set: 1 for document_set in chunk.document_sets},
     }
+    if VESPA_ENABLE_BINARY_EMBEDDINGS:
+        vespa_document_fields[BINARY_EMBEDDINGS] = {
+            name: binarize_embedding(vector)
+            for name, vector in embeddings_name_vector_map.items()
+        }
 
     def _index_chunk(
         url: str,
-        headers: dict[str, str],
         fields: dict[str, Any],
         log_error: bool = True,
-    ) -> Response:
+    ) -> httpx.Response:
         logger.debug(f'Indexing to URL "{url}"')
-        res = requests.post(url, headers=headers, json={"fields": fields})
+        res = get_vespa_feed_client().request("POST", url, json={"fields": fields})
         try:
             res.raise_for_status()
             return res
@@ -282,12 +757,11 @@ def _index_vespa_chunk(chunk: DocMetadataAwareIndexChunk) -> None:
     try:
         _index_chunk(
             url=vespa_url,
-            headers=json_header,
             fields=vespa_document_fields,
             log_error=False,
         )
-    except HTTPError as e:
-        if cast(Response, e.response).status_code != 400:
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 400:
             raise e
 
         # if it's a 400 response, try again with invalid unicode chars removed
@@ -302,38 +776,16 @@ def _index_vespa_chunk(chunk: DocMetadataAwareIndexChunk) -> None:
         vespa_document_fields[CONTENT] = remove_invalid_unicode_chars(
             cast(str, vespa_document_fields[CONTENT])
         )
-        vespa_document_fields[CONTENT_SUMMARY] = remove_invalid_unicode_chars(
-            cast(str, vespa_document_fields[CONTENT_SUMMARY])
-        )
         _index_chunk(
             url=vespa_url,
-            headers=json_header,
             fields=vespa_document_fields,
             log_error=True,
         )
 
 
-def _batch_index_vespa_chunks(
-    chunks: list[DocMetadataAwareIndexChunk],
-    executor: concurrent.futures.ThreadPoolExecutor | None = None,
-) -> None:
-    external_executor = True
-
-    if not executor:
-        external_executor = False
-        executor = concurrent.futures.ThreadPoolExecutor(max_workers=_NUM_THREADS)
-
-    try:
-        chunk_index_future = {
-            executor.submit(_index_vespa_chunk, chunk): chunk for chunk in chunks
-        }
-        for future in concurrent.futures.as_completed(chunk_index_future):
-            # Will raise exception if any indexing raised an exception
-            future.result()
-
-    finally:
-        if not external_executor:
-            executor.shutdown(wait=True)
+def _batch_index_vespa_chunks(chunks: list[DocMetadataAwareIndexChunk]) -> None:
+    # Will raise exception if any indexing raised an exception
+    get_vespa_feed_client().feed(chunks, _index_vespa_chunk, operation="feed")
 
 
 def _clear_and_index_vespa_chunks(
@@ -343,26 +795,18 @@ def _clear_and_index_vespa_chunks(
     with updating the associated permissions. Assumes that a document will not be split into
     multiple chunk batches calling this function multiple times, otherwise only the last set of
     chunks will be kept"""
+    all_doc_ids = {chunk.source_document.id for chunk in chunks}
     existing_docs: set[str] = set()
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=_NUM_THREADS) as executor:
-        # Check for existing documents, existing documents need to have all of their chunks deleted
-        # prior to indexing as the document size (num chunks) may have shrunk
-        first_chunks = [chunk for chunk in chunks if chunk.chunk_id == 0]
-        for chunk_batch in batch_generator(first_chunks, _BATCH_SIZE):
-            existing_docs.update(
-                _get_existing_documents_from_chunks(
-                    chunks=chunk_batch, executor=executor
-                )
-            )
-
-        for doc_id_batch in batch_generator(existing_docs, _BATCH_SIZE):
-            _delete_vespa_docs(document_ids=doc_id_batch, executor=executor)
+    # Check for existing documents, existing documents need to have all of their chunks deleted
+    # prior to indexing as the document size (num chunks) may have shrunk
+    for doc_id_batch in batch_generator(all_doc_ids, _BATCH_SIZE):
+        existing_docs.update(_get_existing_document_ids(doc_id_batch))
 
-        for chunk_batch in batch_generator(chunks, _BATCH_SIZE):
-            _batch_index_vespa_chunks(chunks=chunk_batch, executor=executor)
+    for doc_id_batch in batch_generator(existing_docs, _BATCH_SIZE):
+        _delete_vespa_docs(document_ids=doc_id_batch)
 
-    all_doc_ids = {chunk.source_document.id for chunk in chunks}
+    _batch_index_vespa_chunks(chunks=chunks)
 
     return {
         DocumentInsertionRecord(
@@ -463,7 +907,9 @@ def _process_dynamic_summary(
     return processed_summary
 
 
-def _vespa_hit_to_inference_chunk(hit: dict[str, Any]) -> InferenceChunk:
+def _vespa_hit_to_inference_chunk(
+    hit: dict[str, Any], query: str | None = None
+) -> InferenceChunk:
     fields = cast(dict[str, Any], hit["fields"])
 
     # parse fields that are stored as strings, but are really json / datetime
@@ -474,9 +920,7 @@ def _vespa_hit_to_inference_chunk(hit: dict[str, Any]) -> InferenceChunk:
         else None
     )
     match_highlights = _process_dynamic_summary(
-        # fallback to regular `content` if the `content_summary` field
-        # isn't present
-        dynamic_summary=hit["fields"].get(CONTENT_SUMMARY, hit["fields"][CONTENT]),
+        dynamic_summary=build_dynamic_summary(fields[CONTENT], query),
     )
     semantic_identifier = fields.get(SEMANTIC_IDENTIFIER, "")
     if not semantic_identifier:
@@ -554,7 +998,10 @@ def _query_vespa(query_params: Mapping[str, str | int | float]) -> list[Inferenc
 
     filtered_hits = [hit for hit in hits if hit["fields"].get(CONTENT) is not None]
 
-    inference_chunks = [_vespa_hit_to_inference_chunk(hit) for hit in filtered_hits]
+    query = cast(str | None, query_params.get("query"))
+    inference_chunks = [
+        _vespa_hit_to_inference_chunk(hit, query=query) for hit in filtered_hits
+    ]
     return inference_chunks
 
 
@@ -583,8 +1030,7 @@ class VespaIndex(DocumentIndex):
         f"{DOC_UPDATED_AT}, "
         f"{PRIMARY_OWNERS}, "
         f"{SECONDARY_OWNERS}, "
-        f"{METADATA}, "
-        f"{CONTENT_SUMMARY} "
+        f"{METADATA} "
         f"from {DOCUMENT_INDEX_NAME} where "
     )
 
@@ -599,58 +1045,85 @@ class VespaIndex(DocumentIndex):
         the index is up-to-date with the expected schema and this does not erase the existing index.
         If the changes cannot be applied without conflict with existing data, it will fail with a non 200
         """
+        app_zip = render_vespa_app_config(
+            self.deployment_zip,
+            cross_encoder=get_cross_encoder_ranking_files()
+            if VESPA_CROSS_ENCODER_RERANKING
+            else None,
+            allow_field_type_change=VESPA_ALLOW_EMBEDDING_TYPE_CHANGE,
+        )
+
+        deployed_schema = _get_deployed_schema()
+        type_changes = (
+            _get_embedding_type_changes(deployed_schema, app_zip)
+            if deployed_schema
+            else {}
+        )
+        if type_changes:
+            changes = ", ".join(
+                f"{field}: {deployed_type} -> {new_type}"
+                for field, (deployed_type, new_type) in type_changes.items()
+            )
+            if not VESPA_ALLOW_EMBEDDING_TYPE_CHANGE:
+                raise RuntimeError(
+                    f"The embedding type of the Vespa index would change ({changes}), "
+                    "most likely because VESPA_EMBEDDING_CELL_TYPE, DOC_EMBEDDING_DIM or "
+                    "DOCUMENT_ENCODER_MODEL changed. Either revert the change, reset the "
+                    "index (remove the Vespa volume) or set "
+                    "VESPA_ALLOW_EMBEDDING_TYPE_CHANGE=true to change it in place. The "
+                    "stored embeddings are lost either way, every document then has to "
+                    "be re-fed by deleting and re-adding the connectors."
+                )
+            logger.warning(
+                f"Changing the embedding type of the Vespa index ({changes}), the stored "
+                "embeddings are dropped. Every document has to be re-fed, delete and "
+                "re-add the connectors."
+            )
+
         deploy_url = f"{VESPA_APPLICATION_ENDPOINT}/tenant/default/prepareandactivate"
         logger.debug(f"Sending Vespa zip to {deploy_url}")
         headers = {"Content-Type": "application/zip"}
-        with open(self.deployment_zip, "rb") as f:
-            response = requests.post(deploy_url, headers=headers, data=f)
-            if response.status_code != 200:
-                raise RuntimeError(
-                    f"Failed to prepare Vespa Danswer Index. Response: {response.text}"
-                )
+        response = requests.post(deploy_url, headers=headers, data=app_zip)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Failed to prepare Vespa Danswer Index. Response: {response.text}"
+            )
+        _handle_config_change_actions(response.json())
+        _check_pending_restart()
 
     def index(
         self,
         chunks: list[DocMetadataAwareIndexChunk],
     ) -> set[DocumentInsertionRecord]:
-        return _clear_and_index_vespa_chunks(chunks=chunks)
+        insertion_records = _clear_and_index_vespa_chunks(chunks=chunks)
+        invalidate_cached_search_results(
+            [record.document_id for record in insertion_records]
+        )
+        return insertion_records
 
     @staticmethod
     def _apply_updates_batched(
         updates: list[_VespaUpdateRequest],
         batch_size: int = _BATCH_SIZE,
     ) -> None:
-        """Runs a batch of updates in parallel via the ThreadPoolExecutor."""
+        """Runs a batch of updates in parallel via the shared Vespa feed client."""
 
-        def _update_chunk(update: _VespaUpdateRequest) -> Response:
-            update_body = json.dumps(update.update_request)
+        def _update_chunk(update: _VespaUpdateRequest) -> None:
             logger.debug(
-                f"Updating with request to {update.url} with body {update_body}"
+                f"Updating with request to {update.url} with body {update.update_request}"
             )
-            return requests.put(
-                update.url,
-                headers={"Content-Type": "application/json"},
-                data=update_body,
+            res = get_vespa_feed_client().request(
+                "PUT", update.url, json=update.update_request
             )
+            try:
+                res.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                failure_msg = f"Failed to update document: {update.document_id}"
+                raise requests.HTTPError(failure_msg) from e
 
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=_NUM_THREADS
-        ) as executor:
-            for update_batch in batch_generator(updates, batch_size):
-                future_to_document_id = {
-                    executor.submit(
-                        _update_chunk,
-                        update,
-                    ): update.document_id
-                    for update in update_batch
-                }
-                for future in concurrent.futures.as_completed(future_to_document_id):
-                    res = future.result()
-                    try:
-                        res.raise_for_status()
-                    except requests.HTTPError as e:
-                        failure_msg = f"Failed to update document: {future_to_document_id[future]}"
-                        raise requests.HTTPError(failure_msg) from e
+        feed_client = get_vespa_feed_client()
+        for update_batch in batch_generator(updates, batch_size):
+            feed_client.feed(update_batch, _update_chunk, operation="update")
 
     def update(self, update_requests: list[UpdateRequest]) -> None:
         logger.info(f"Updating {len(update_requests)} documents in Vespa")
@@ -691,13 +1164,22 @@ class VespaIndex(DocumentIndex):
                     )
 
         self._apply_updates_batched(processed_updates_requests)
+        invalidate_cached_search_results(
+            [
+                document_id
+                for update_request in update_requests
+                for document_id in update_request.document_ids
+            ]
+        )
         logger.info(
             "Finished updating Vespa documents in %s seconds", time.time() - start
         )
 
     def delete(self, doc_ids: list[str]) -> None:
         logger.info(f"Deleting {len(doc_ids)} documents from Vespa")
-        _delete_vespa_docs(doc_ids)
+        for doc_id_batch in batch_generator(doc_ids, _BATCH_SIZE):
+            _delete_vespa_docs(document_ids=doc_id_batch)
+        invalidate_cached_search_results(doc_ids)
 
     def id_based_retrieval(
         self, document_id: str, chunk_ind: int | None, filters: IndexFilters
@@ -719,7 +1201,7 @@ class VespaIndex(DocumentIndex):
                 "Running LLM usefulness eval in parallel (following logging may be out of order)"
             )
             inference_chunks = run_functions_tuples_in_parallel(
-                functions_with_args, allow_failures=True
+                functions_with_args, allow_failures=True, executor_name=VESPA_EXECUTOR
             )
             inference_chunks.sort(key=lambda chunk: chunk.chunk_id)
             return inference_chunks
@@ -729,34 +1211,40 @@ class VespaIndex(DocumentIndex):
             yql = (
                 VespaIndex.yql_base
                 + filters_str
-                + f"({DOCUMENT_ID} contains '{document_id}' and {CHUNK_ID} contains '{chunk_ind}')"
+                + f"({DOCUMENT_ID} contains '{escape_yql_string(document_id)}' "
+                f"and {CHUNK_ID} contains '{chunk_ind}')"
             )
         return _query_vespa({"yql": yql})
 
-    def keyword_retrieval(
-        self,
+    @staticmethod
+    def _keyword_query_params(
         query: str,
         filters: IndexFilters,
         time_decay_multiplier: float,
-        num_to_retrieve: int = NUM_RETURNED_HITS,
+        num_to_retrieve: int,
         edit_keyword_query: bool = EDIT_KEYWORD_QUERY,
-    ) -> list[InferenceChunk]:
+        query_rephrases: list[str] | None = None,
+    ) -> dict[str, str | int | float]:
+        query_keywords = [
+            query_processing(search_query) if edit_keyword_query else search_query
+            for search_query in _get_search_queries(query, query_rephrases)
+        ]
+        content_match_clause, content_match_params = _build_content_match(
+            query_keywords
+        )
         vespa_where_clauses = _build_vespa_filters(filters)
         yql = (
             VespaIndex.yql_base
             + vespa_where_clauses
-            # `({defaultIndex: "content_summary"}userInput(@query))` section is
-            # needed for highlighting while the N-gram highlighting is broken /
-            # not working as desired
             + '({grammar: "weakAnd"}userInput(@query) '
-            + f'or ({{defaultIndex: "{CONTENT_SUMMARY}"}}userInput(@query)))'
+            + f"or {content_match_clause})"
         )
 
-        final_query = query_processing(query) if edit_keyword_query else query
-
-        params: dict[str, str | int] = {
+        return {
             "yql": yql,
-            "query": final_query,
+            # the terms of all the rephrasings are merged into the one weakAnd
+            "query": " ".join(query_keywords),
+            **content_match_params,
             "input.query(decay_factor)": str(DOC_TIME_DECAY * time_decay_multiplier),
             "hits": num_to_retrieve,
             "offset": 0,
@@ -764,93 +1252,200 @@ class VespaIndex(DocumentIndex):
             "timeout": _VESPA_TIMEOUT,
         }
 
-        return _query_vespa(params)
-
-    def semantic_retrieval(
-        self,
+    @staticmethod
+    def _semantic_query_params(
         query: str,
         filters: IndexFilters,
         time_decay_multiplier: float,
-        num_to_retrieve: int = NUM_RETURNED_HITS,
-        distance_cutoff: float | None = SEARCH_DISTANCE_CUTOFF,
+        num_to_retrieve: int,
         edit_keyword_query: bool = EDIT_KEYWORD_QUERY,
-    ) -> list[InferenceChunk]:
+        approximate: bool = VESPA_ANN_APPROXIMATE,
+        explore_additional_hits: int = VESPA_HNSW_EXPLORE_ADDITIONAL_HITS,
+        num_rerank: int | None = None,
+        query_rephrases: list[str] | None = None,
+    ) -> dict[str, str | int | float]:
+        search_queries = _get_search_queries(query, query_rephrases)
         vespa_where_clauses = _build_vespa_filters(filters)
+        nearest_neighbor_clause = _build_nearest_neighbor_clause(
+            target_hits=10 * num_to_retrieve,
+            approximate=approximate,
+            explore_additional_hits=explore_additional_hits,
+            num_query_embeddings=len(search_queries),
+        )
+        content_match_clause, content_match_params = _build_content_match(
+            [
+                _get_query_keywords([search_query], edit_keyword_query)
+                for search_query in search_queries
+            ]
+        )
         yql = (
             VespaIndex.yql_base
             + vespa_where_clauses
-            + f"(({{targetHits: {10 * num_to_retrieve}}}nearestNeighbor(embeddings, query_embedding)) "
-            # `({defaultIndex: "content_summary"}userInput(@query))` section is
-            # needed for highlighting while the N-gram highlighting is broken /
-            # not working as desired
-            + f'or ({{defaultIndex: "{CONTENT_SUMMARY}"}}userInput(@query)))'
+            + f"({nearest_neighbor_clause} or {content_match_clause})"
         )
 
-        query_embedding = embed_query(query)
+        query_embeddings = embed_queries(search_queries)
 
-        query_keywords = (
-            " ".join(remove_stop_words_and_punctuation(query))
-            if edit_keyword_query
-            else query
-        )
+        query_keywords = _get_query_keywords(search_queries, edit_keyword_query)
 
-        params: dict[str, str | int] = {
+        return {
             "yql": yql,
-            "query": query_keywords,  # Needed for highlighting
-            "input.query(query_embedding)": str(query_embedding),
+            # Only used by the content match clause (without rephrasings) and for
+            # highlighting the results
+            "query": query_keywords,
+            **content_match_params,
+            **_build_query_embedding_params(query_embeddings),
             "input.query(decay_factor)": str(DOC_TIME_DECAY * time_decay_multiplier),
             "hits": num_to_retrieve,
             "offset": 0,
-            "ranking.profile": "semantic_search",
+            **_build_cross_encoder_rerank_params(
+                query=query,
+                rank_profile="semantic_search_binary"
+                if VESPA_ENABLE_BINARY_EMBEDDINGS
+                else "semantic_search",
+                num_rerank=num_rerank,
+            ),
             "timeout": _VESPA_TIMEOUT,
         }
 
-        return _query_vespa(params)
-
-    def hybrid_retrieval(
-        self,
+    @staticmethod
+    def _hybrid_query_params(
         query: str,
         filters: IndexFilters,
         time_decay_multiplier: float,
         num_to_retrieve: int,
         hybrid_alpha: float | None = HYBRID_ALPHA,
-        distance_cutoff: float | None = SEARCH_DISTANCE_CUTOFF,
         edit_keyword_query: bool = EDIT_KEYWORD_QUERY,
-    ) -> list[InferenceChunk]:
+        approximate: bool = VESPA_ANN_APPROXIMATE,
+        explore_additional_hits: int = VESPA_HNSW_EXPLORE_ADDITIONAL_HITS,
+        num_rerank: int | None = None,
+        query_rephrases: list[str] | None = None,
+    ) -> dict[str, str | int | float]:
         vespa_where_clauses = _build_vespa_filters(filters)
         # Needs to be at least as much as the value set in Vespa schema config
         target_hits = max(10 * num_to_retrieve, 1000)
+        search_queries = _get_search_queries(query, query_rephrases)
+        nearest_neighbor_clause = _build_nearest_neighbor_clause(
+            target_hits=target_hits,
+            approximate=approximate,
+            explore_additional_hits=explore_additional_hits,
+            num_query_embeddings=len(search_queries),
+        )
+        content_match_clause, content_match_params = _build_content_match(
+            [
+                _get_query_keywords([search_query], edit_keyword_query)
+                for search_query in search_queries
+            ]
+        )
         yql = (
             VespaIndex.yql_base
             + vespa_where_clauses
-            + f"(({{targetHits: {target_hits}}}nearestNeighbor(embeddings, query_embedding)) "
+            + f"({nearest_neighbor_clause} "
             + 'or ({grammar: "weakAnd"}userInput(@query)) '
-            + f'or ({{defaultIndex: "{CONTENT_SUMMARY}"}}userInput(@query)))'
+            + f"or {content_match_clause})"
         )
 
-        query_embedding = embed_query(query)
+        query_embeddings = embed_queries(search_queries)
 
-        query_keywords = (
-            " ".join(remove_stop_words_and_punctuation(query))
-            if edit_keyword_query
-            else query
-        )
+        # the terms of all the rephrasings are merged into the one weakAnd
+        query_keywords = _get_query_keywords(search_queries, edit_keyword_query)
 
-        params: dict[str, str | int | float] = {
+        return {
             "yql": yql,
             "query": query_keywords,
-            "input.query(query_embedding)": str(query_embedding),
+            **content_match_params,
+            **_build_query_embedding_params(query_embeddings),
             "input.query(decay_factor)": str(DOC_TIME_DECAY * time_decay_multiplier),
             "input.query(alpha)": hybrid_alpha
             if hybrid_alpha is not None
             else HYBRID_ALPHA,
             "hits": num_to_retrieve,
             "offset": 0,
-            "ranking.profile": "hybrid_search",
+            **_build_cross_encoder_rerank_params(
+                query=query,
+                rank_profile="hybrid_search_binary"
+                if VESPA_ENABLE_BINARY_EMBEDDINGS
+                else "hybrid_search",
+                num_rerank=num_rerank,
+            ),
             "timeout": _VESPA_TIMEOUT,
         }
 
-        return _query_vespa(params)
+    def keyword_retrieval(
+        self,
+        query: str,
+        filters: IndexFilters,
+        time_decay_multiplier: float,
+        num_to_retrieve: int = NUM_RETURNED_HITS,
+        edit_keyword_query: bool = EDIT_KEYWORD_QUERY,
+        query_rephrases: list[str] | None = None,
+    ) -> list[InferenceChunk]:
+        return _query_vespa(
+            self._keyword_query_params(
+                query=query,
+                filters=filters,
+                time_decay_multiplier=time_decay_multiplier,
+                num_to_retrieve=num_to_retrieve,
+                edit_keyword_query=edit_keyword_query,
+                query_rephrases=query_rephrases,
+            )
+        )
+
+    def semantic_retrieval(
+        self,
+        query: str,
+        filters: IndexFilters,
+        time_decay_multiplier: float,
+        num_to_retrieve: int = NUM_RETURNED_HITS,
+        distance_cutoff: float | None = SEARCH_DISTANCE_CUTOFF,
+        edit_keyword_query: bool = EDIT_KEYWORD_QUERY,
+        approximate: bool = VESPA_ANN_APPROXIMATE,
+        explore_additional_hits: int = VESPA_HNSW_EXPLORE_ADDITIONAL_HITS,
+        num_rerank: int | None = None,
+        query_rephrases: list[str] | None = None,
+    ) -> list[InferenceChunk]:
+        return _query_vespa(
+            self._semantic_query_params(
+                query=query,
+                filters=filters,
+                time_decay_multiplier=time_decay_multiplier,
+                num_to_retrieve=num_to_retrieve,
+                edit_keyword_query=edit_keyword_query,
+                approximate=approximate,
+                explore_additional_hits=explore_additional_hits,
+                num_rerank=num_rerank,
+                query_rephrases=query_rephrases,
+            )
+        )
+
+    def hybrid_retrieval(
+        self,
+        query: str,
+        filters: IndexFilters,
+        time_decay_multiplier: float,
+        num_to_retrieve: int,
+        hybrid_alpha: float | None = HYBRID_ALPHA,
+        distance_cutoff: float | None = SEARCH_DISTANCE_CUTOFF,
+        edit_keyword_query: bool = EDIT_KEYWORD_QUERY,
+        approximate: bool = VESPA_ANN_APPROXIMATE,
+        explore_additional_hits: int = VESPA_HNSW_EXPLORE_ADDITIONAL_HITS,
+        num_rerank: int | None = None,
+        query_rephrases: list[str] | None = None,
+    ) -> list[InferenceChunk]:
+        return _query_vespa(
+            self._hybrid_query_params(
+                query=query,
+                filters=filters,
+                time_decay_multiplier=time_decay_multiplier,
+                num_to_retrieve=num_to_retrieve,
+                hybrid_alpha=hybrid_alpha,
+                edit_keyword_query=edit_keyword_query,
+                approximate=approximate,
+                explore_additional_hits=explore_additional_hits,
+                num_rerank=num_rerank,
+                query_rephrases=query_rephrases,
+            )
+        )
 
     def admin_retrieval(
         self,
@@ -863,10 +1458,7 @@ class VespaIndex(DocumentIndex):
             VespaIndex.yql_base
             + vespa_where_clauses
             + '({grammar: "weakAnd"}userInput(@query) '
-            # `({defaultIndex: "content_summary"}userInput(@query))` section is
-            # needed for highlighting while the N-gram highlighting is broken /
-            # not working as desired
-            + f'or ({{defaultIndex: "{CONTENT_SUMMARY}"}}userInput(@query)))'
+            + f"or {_CONTENT_MATCH_CLAUSE})"
         )
 
         params: dict[str, str | int] = {
@@ -10,3 +10,95 @@ def remove_invalid_unicode_chars(text: str) -> str:
     """Vespa does not take in unicode chars that aren't valid for XML.
     This removes them."""
     return _illegal_xml_chars_RE.sub("", text)
+
+
+def escape_yql_string(value: str) -> str:
+    """Escapes a value to be put in a single quoted string of a YQL query or of a
+    document selection, e.g. a document id with a quote in it"""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def cast_embedding(embedding: list[float], cell_type: str) -> list[float] | list[int]:
+    """Converts an embedding to the values to send to Vespa for a tensor with the given
+    cell type. Vespa converts float values to bfloat16 itself but would truncate them
+    to int8, so for int8 the vector is scaled to use the full int8 range. This does not
+    change the angular distance between vectors."""
+    if cell_type != "int8":
+        return embedding
+
+    max_abs = max((abs(value) for value in embedding), default=0.0)
+    if max_abs == 0:
+        return [0] * len(embedding)
+    return [round(value * 127 / max_abs) for value in embedding]
+
+
+def binarize_embedding(embedding: list[float]) -> list[int]:
+    """Packs the sign of each dimension into bits, 8 dimensions per (signed) int8 cell, as
+    expected for hamming distance in Vespa. Same bit order as `numpy.packbits`."""
+    packed: list[int] = []
+    for start in range(0, len(embedding), 8):
+        byte = 0
+        for ind, value in enumerate(embedding[start : start + 8]):
+            if value > 0:
+                byte |= 1 << (7 - ind)
+        packed.append(byte - 256 if byte > 127 else byte)
+    return packed
+
+
+def _get_highlight_pattern(query: str) -> re.Pattern | None:
+    terms = {term.lower() for term in re.findall(r"\w+", query) if len(term) > 1}
+    if not terms:
+        return None
+    # longest first so that the longest matching term is highlighted, prefix matching
+    # makes up for Vespa's stemming (e.g. `connector` also highlights `connectors`)
+    alternatives = "|".join(
+        re.escape(term) for term in sorted(terms, key=len, reverse=True)
+    )
+    return re.compile(rf"\b(?:{alternatives})\w*", re.IGNORECASE)
+
+
+def build_dynamic_summary(
+    content: str,
+    query: str | None,
+    max_fragments: int = 3,
+    fragment_context: int = 80,
+) -> str:
+    """Builds keyword highlights in the same format as a Vespa dynamic summary: up to
+    `max_fragments` snippets around the query term matches with the matches wrapped in
+    `<hi>` tags and the snippets separated by `<sep />`. Vespa can't produce dynamic
+    summaries for the n-gram matched `content` field, so this is done here instead of
+    storing the content a second time in a normally tokenized field. If nothing matches,
+    the content is returned as is, which is also what Vespa does."""
+    pattern = _get_highlight_pattern(query) if query else None
+    if pattern is None:
+        return content
+
+    # [window start, window end, start of first match, end of last match]
+    windows: list[list[int]] = []
+    for match in pattern.finditer(content):
+        start = max(0, match.start() - fragment_context)
+        end = min(len(content), match.end() + fragment_context)
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+            windows[-1][3] = match.end()
+            continue
+        if len(windows) == max_fragments:
+            break
+        windows.append([start, end, match.start(), match.end()])
+
+    if not windows:
+        return content
+
+    fragments: list[str] = []
+    for start, end, first_match_start, last_match_end in windows:
+        # don't cut words in half at the edges of the snippets
+        if start > 0:
+            space_ind = content.find(" ", start, first_match_start)
+            start = space_ind + 1 if space_ind != -1 else start
+        if end < len(content):
+            space_ind = content.rfind(" ", last_match_end, end)
+            end = space_ind if space_ind != -1 else end
+        fragments.append(
+            pattern.sub(lambda term: f"<hi>{term.group(0)}</hi>", content[start:end])
+        )
+    return "<sep />".join(fragments)
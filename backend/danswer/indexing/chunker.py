@@ -1,30 +1,85 @@
 import abc
+import multiprocessing
 from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain
 
+import torch
 from llama_index.text_splitter import SentenceSplitter
+from tokenizers import pre_tokenizers  # type:ignore
 from transformers import AutoTokenizer  # type:ignore
 
 from danswer.configs.app_configs import BLURB_SIZE
 from danswer.configs.app_configs import CHUNK_OVERLAP
+from danswer.configs.app_configs import INDEXING_CHUNKER_PROCESSES
 from danswer.configs.app_configs import MINI_CHUNK_SIZE
 from danswer.configs.model_configs import CHUNK_SIZE
 from danswer.connectors.models import Document
 from danswer.connectors.models import Section
 from danswer.indexing.models import DocAwareChunk
 from danswer.search.search_nlp_models import get_default_tokenizer
+from danswer.utils.logger import setup_logger
+from danswer.utils.process_watchdog import exit_with_parent
 from danswer.utils.text_processing import shared_precompare_cleanup
 
+logger = setup_logger()
+
 
 SECTION_SEPARATOR = "\n\n"
 ChunkFunc = Callable[[Document], list[DocAwareChunk]]
 
 
-def extract_blurb(text: str, blurb_size: int) -> str:
-    token_count_func = get_default_tokenizer().tokenize
-    blurb_splitter = SentenceSplitter(
-        tokenizer=token_count_func, chunk_size=blurb_size, chunk_overlap=0
+# Texts which the sentence splitters tokenize repeatedly (the splitters tokenize every split while
+# splitting and again while merging)
+_TOKENIZE_CACHE_SIZE = 8192
+
+
+@lru_cache(maxsize=None)
+def _get_sentence_splitter(chunk_size: int, chunk_overlap: int) -> SentenceSplitter:
+    """Building a SentenceSplitter loads the nltk sentence tokenizer, so one splitter
+    is built per size and reused across calls"""
+    tokenize = lru_cache(maxsize=_TOKENIZE_CACHE_SIZE)(get_default_tokenizer().tokenize)
+    return SentenceSplitter(
+        tokenizer=tokenize, chunk_size=chunk_size, chunk_overlap=chunk_overlap
     )
 
+
+def _tokens_are_split_on_whitespace(tokenizer: AutoTokenizer) -> bool:
+    """If no token can span whitespace, the token count of sections joined by
+    SECTION_SEPARATOR is the sum of the token counts of the sections and the separator.
+    True for BERT style WordPiece tokenizers, not for most BPE / SentencePiece ones"""
+    if not getattr(tokenizer, "is_fast", False):
+        return False
+    return isinstance(
+        tokenizer.backend_tokenizer.pre_tokenizer,
+        (
+            pre_tokenizers.BertPreTokenizer,
+            pre_tokenizers.Whitespace,
+            pre_tokenizers.WhitespaceSplit,
+        ),
+    )
+
+
+def get_token_counts(tokenizer: AutoTokenizer, texts: list[str]) -> list[int]:
+    if not texts:
+        return []
+    if getattr(tokenizer, "is_fast", False):
+        # single batched call into the Rust tokenizer, matches `tokenize` for fast tokenizers
+        input_ids = tokenizer(texts, add_special_tokens=False, verbose=False)[
+            "input_ids"
+        ]
+        return [len(ids) for ids in input_ids]
+    return [len(tokenizer.tokenize(text)) for text in texts]
+
+
+def extract_blurb(text: str, blurb_size: int, token_count: int | None = None) -> str:
+    # text that fits in a single blurb is returned as is (after stripping) by the splitter
+    if token_count is not None and 0 < token_count <= blurb_size:
+        return text.strip()
+
+    blurb_splitter = _get_sentence_splitter(chunk_size=blurb_size, chunk_overlap=0)
+
     return blurb_splitter.split_text(text)[0]
 
 
@@ -41,8 +96,14 @@ def chunk_large_section(
     section_link_text = section.link or ""
     blurb = extract_blurb(section_text, blurb_size)
 
-    sentence_aware_splitter = SentenceSplitter(
-        tokenizer=tokenizer.tokenize, chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    sentence_aware_splitter = (
+        _get_sentence_splitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        if tokenizer is get_default_tokenizer()
+        else SentenceSplitter(
+            tokenizer=tokenizer.tokenize,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+        )
     )
 
     split_texts = sentence_aware_splitter.split_text(section_text)
@@ -69,14 +130,29 @@ def chunk_document(
 ) -> list[DocAwareChunk]:
     tokenizer = get_default_tokenizer()
 
+    # Every section is tokenized exactly once (in a single batch). For tokenizers which
+    # never merge across whitespace, the length of the chunk being built is tracked as a
+    # running count instead of re-tokenizing the whole chunk text for every section
+    section_tok_lengths = get_token_counts(
+        tokenizer, [section.text for section in document.sections]
+    )
+    separator_tok_length = len(tokenizer.tokenize(SECTION_SEPARATOR))
+    running_token_counts = _tokens_are_split_on_whitespace(tokenizer)
+
     chunks: list[DocAwareChunk] = []
     link_offsets: dict[int, str] = {}
     chunk_text = ""
-    for section in document.sections:
+    chunk_tok_length = 0
+    # SECTION_SEPARATOR is removed by the cleanup, so the cleaned length is additive
+    chunk_offset_len = 0
+    for section, section_tok_length in zip(document.sections, section_tok_lengths):
         section_link_text = section.link or ""
-        section_tok_length = len(tokenizer.tokenize(section.text))
-        current_tok_length = len(tokenizer.tokenize(chunk_text))
-        curr_offset_len = len(shared_precompare_cleanup(chunk_text))
+        current_tok_length = (
+            chunk_tok_length
+            if running_token_counts
+            else len(tokenizer.tokenize(chunk_text))
+        )
+        curr_offset_len = chunk_offset_len
 
         # Large sections are considered self-contained/unique therefore they start a new chunk and are not concatenated
         # at the end by other sections
@@ -86,7 +162,11 @@ def chunk_document(
                     DocAwareChunk(
                         source_document=document,
                         chunk_id=len(chunks),
-                        blurb=extract_blurb(chunk_text, blurb_size),
+                        blurb=extract_blurb(
+                            chunk_text,
+                            blurb_size,
+                            current_tok_length if running_token_counts else None,
+                        ),
                         content=chunk_text,
                         source_links=link_offsets,
                         section_continuation=False,
@@ -94,6 +174,8 @@ def chunk_document(
                 )
                 link_offsets = {}
                 chunk_text = ""
+                chunk_tok_length = 0
+                chunk_offset_len = 0
 
             large_section_chunks = chunk_large_section(
                 section=section,
@@ -107,23 +189,30 @@ def chunk_document(
             chunks.extend(large_section_chunks)
             continue
 
+        section_offset_len = len(shared_precompare_cleanup(section.text))
         # In the case where the whole section is shorter than a chunk, either adding to chunk or start a new one
         if (
-            current_tok_length
-            + len(tokenizer.tokenize(SECTION_SEPARATOR))
-            + section_tok_length
+            current_tok_length + separator_tok_length + section_tok_length
             <= chunk_tok_size
         ):
-            chunk_text += (
-                SECTION_SEPARATOR + section.text if chunk_text else section.text
-            )
+            if chunk_text:
+                chunk_text += SECTION_SEPARATOR + section.text
+                chunk_tok_length += separator_tok_length + section_tok_length
+            else:
+                chunk_text = section.text
+                chunk_tok_length = section_tok_length
+            chunk_offset_len += section_offset_len
             link_offsets[curr_offset_len] = section_link_text
         else:
             chunks.append(
                 DocAwareChunk(
                     source_document=document,
                     chunk_id=len(chunks),
-                    blurb=extract_blurb(chunk_text, blurb_size),
+                    blurb=extract_blurb(
+                        chunk_text,
+                        blurb_size,
+                        current_tok_length if running_token_counts else None,
+                    ),
                     content=chunk_text,
                     source_links=link_offsets,
                     section_continuation=False,
@@ -131,6 +220,8 @@ def chunk_document(
             )
             link_offsets = {0: section_link_text}
             chunk_text = section.text
+            chunk_tok_length = section_tok_length
+            chunk_offset_len = section_offset_len
 
     # Once we hit the end, if we're still in the process of building a chunk, add what we have
     if chunk_text:
@@ -138,7 +229,11 @@ def chunk_document(
             DocAwareChunk(
                 source_document=document,
                 chunk_id=len(chunks),
-                blurb=extract_blurb(chunk_text, blurb_size),
+                blurb=extract_blurb(
+                    chunk_text,
+                    blurb_size,
+                    chunk_tok_length if running_token_counts else None,
+                ),
                 content=chunk_text,
                 source_links=link_offsets,
                 section_continuation=False,
@@ -150,9 +245,8 @@ def chunk_document(
 def split_chunk_text_into_mini_chunks(
     chunk_text: str, mini_chunk_size: int = MINI_CHUNK_SIZE
 ) -> list[str]:
-    token_count_func = get_default_tokenizer().tokenize
-    sentence_aware_splitter = SentenceSplitter(
-        tokenizer=token_count_func, chunk_size=mini_chunk_size, chunk_overlap=0
+    sentence_aware_splitter = _get_sentence_splitter(
+        chunk_size=mini_chunk_size, chunk_overlap=0
     )
 
     return sentence_aware_splitter.split_text(chunk_text)
@@ -163,7 +257,67 @@ class Chunker:
     def chunk(self, document: Document) -> list[DocAwareChunk]:
         raise NotImplementedError
 
+    def chunk_documents(self, documents: list[Document]) -> list[DocAwareChunk]:
+        """Chunks of all the documents, in document order"""
+        return list(chain(*[self.chunk(document=document) for document in documents]))
+
 
 class DefaultChunker(Chunker):
     def chunk(self, document: Document) -> list[DocAwareChunk]:
         return chunk_document(document)
+
+
+def _init_chunking_worker() -> None:
+    # the pool's queues don't tell the workers that the process using them is gone
+    exit_with_parent()
+    # the workers only tokenize, leave the cores to the embedding model in the parent
+    torch.set_num_threads(1)
+    # load the tokenizer once per worker rather than on the first document
+    get_default_tokenizer()
+
+
+class ParallelChunker(Chunker):
+    """Fans batches of documents out to a persistent pool of worker processes. The pool
+    is sized by `num_processes`, independently of the torch threads used for embedding
+    in the parent process, and is started on first use."""
+
+    def __init__(self, num_processes: int = INDEXING_CHUNKER_PROCESSES) -> None:
+        self.num_processes = num_processes
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor | None:
+        if self._executor is None and self.num_processes > 0:
+            if multiprocessing.current_process().daemon:
+                # e.g. Dask workers, unless `distributed.worker.daemon` is turned off
+                logger.warning(
+                    "Daemonic processes cannot start a chunking pool, "
+                    "chunking in the current process instead"
+                )
+                self.num_processes = 0
+                return None
+
+            # `spawn` since forking a process which already has torch / tokenizer
+            # threads running can deadlock
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_chunking_worker,
+            )
+        return self._executor
+
+    def chunk(self, document: Document) -> list[DocAwareChunk]:
+        return chunk_document(document)
+
+    def chunk_documents(self, documents: list[Document]) -> list[DocAwareChunk]:
+        executor = self._get_executor()
+        if executor is None or len(documents) < 2:
+            return super().chunk_documents(documents)
+
+        # `map` returns results in document order, chunk ids are assigned per document
+        # so they are unaffected by which worker chunked the document
+        return list(chain(*executor.map(chunk_document, documents)))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
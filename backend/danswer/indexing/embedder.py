@@ -1,53 +1,145 @@
-from sentence_transformers import SentenceTransformer  # type: ignore
-
 from danswer.configs.app_configs import ENABLE_MINI_CHUNK
 from danswer.configs.model_configs import ASYM_PASSAGE_PREFIX
 from danswer.configs.model_configs import BATCH_SIZE_ENCODE_CHUNKS
+from danswer.configs.model_configs import EMBEDDING_BATCH_TOKEN_BUDGET
+from danswer.configs.model_configs import ENABLE_LENGTH_BUCKETED_EMBEDDING
+from danswer.indexing.chunker import get_token_counts
 from danswer.indexing.chunker import split_chunk_text_into_mini_chunks
+from danswer.indexing.embedding_cache import EmbeddingCache
+from danswer.indexing.embedding_cache import hash_embedding_text
 from danswer.indexing.models import ChunkEmbedding
 from danswer.indexing.models import DocAwareChunk
 from danswer.indexing.models import IndexChunk
 from danswer.search.models import Embedder
 from danswer.search.search_nlp_models import EmbeddingModel
+from danswer.search.search_nlp_models import get_default_tokenizer
 from danswer.utils.timing import log_function_time
 
 
+def _build_length_bucketed_batches(
+    texts: list[str], token_budget: int, max_seq_length: int, passage_prefix: str = ""
+) -> list[list[int]]:
+    """Groups the indices of `texts` into batches of similar token length, each batch
+    padded to its longest text stays within `token_budget` tokens. The lengths are those
+    of the texts as encoded, with the passage prefix and the special tokens. A text
+    that is longer than the budget on its own gets a batch of its own"""
+    tokenizer = get_default_tokenizer()
+    num_special_tokens = tokenizer.num_special_tokens_to_add()
+    token_counts = [
+        min(count + num_special_tokens, max_seq_length)
+        for count in get_token_counts(
+            tokenizer, [passage_prefix + text for text in texts]
+        )
+    ]
+    sorted_inds = sorted(range(len(texts)), key=lambda ind: token_counts[ind])
+
+    batches: list[list[int]] = []
+    current_batch: list[int] = []
+    for ind in sorted_inds:
+        # sorted ascending, so the text being added is the longest in the batch
+        if (
+            current_batch
+            and (len(current_batch) + 1) * token_counts[ind] > token_budget
+        ):
+            batches.append(current_batch)
+            current_batch = []
+        current_batch.append(ind)
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+
 @log_function_time()
 def embed_chunks(
     chunks: list[DocAwareChunk],
-    embedding_model: SentenceTransformer | None = None,
+    embedding_model: EmbeddingModel | None = None,
     batch_size: int = BATCH_SIZE_ENCODE_CHUNKS,
     enable_mini_chunk: bool = ENABLE_MINI_CHUNK,
     passage_prefix: str = ASYM_PASSAGE_PREFIX,
+    embedding_cache: EmbeddingCache | None = None,
+    length_bucketing: bool = ENABLE_LENGTH_BUCKETED_EMBEDDING,
+    batch_token_budget: int = EMBEDDING_BATCH_TOKEN_BUDGET,
 ) -> list[IndexChunk]:
     embedded_chunks: list[IndexChunk] = []
     if embedding_model is None:
         embedding_model = EmbeddingModel()
 
-    chunk_texts = []
+    # un-prefixed texts, the prefix is added right before encoding
+    chunk_texts: list[str] = []
     chunk_mini_chunks_count = {}
     for chunk_ind, chunk in enumerate(chunks):
-        chunk_texts.append(passage_prefix + chunk.content)
+        chunk_texts.append(chunk.content)
         mini_chunk_texts = (
             split_chunk_text_into_mini_chunks(chunk.content)
             if enable_mini_chunk
             else []
         )
-        prefixed_mini_chunk_texts = [passage_prefix + text for text in mini_chunk_texts]
-        chunk_texts.extend(prefixed_mini_chunk_texts)
-        chunk_mini_chunks_count[chunk_ind] = 1 + len(prefixed_mini_chunk_texts)
+        chunk_texts.extend(mini_chunk_texts)
+        chunk_mini_chunks_count[chunk_ind] = 1 + len(mini_chunk_texts)
 
-    text_batches = [
-        chunk_texts[i : i + batch_size] for i in range(0, len(chunk_texts), batch_size)
-    ]
+    text_hashes: list[str] = []
+    cached_embeddings: dict[str, list[float]] = {}
+    if embedding_cache is not None:
+        text_hashes = [hash_embedding_text(text) for text in chunk_texts]
+        cached_embeddings = embedding_cache.get(
+            model_name=embedding_model.model_name,
+            passage_prefix=passage_prefix,
+            content_hashes=text_hashes,
+        )
+
+    # only the texts missing from the cache go through the model, duplicates within
+    # the batch are only encoded once
+    texts_to_embed: list[str] = []
+    hashes_to_embed: list[str] = []
+    pending_hashes: set[str] = set()
+    for text_ind, text in enumerate(chunk_texts):
+        if embedding_cache is None:
+            texts_to_embed.append(text)
+            continue
+        text_hash = text_hashes[text_ind]
+        if text_hash in cached_embeddings or text_hash in pending_hashes:
+            continue
+        texts_to_embed.append(text)
+        hashes_to_embed.append(text_hash)
+        pending_hashes.add(text_hash)
 
-    embeddings: list[list[float]] = []
-    for text_batch in text_batches:
+    if length_bucketing:
+        batch_inds = _build_length_bucketed_batches(
+            texts=texts_to_embed,
+            token_budget=batch_token_budget,
+            max_seq_length=embedding_model.max_seq_length,
+            passage_prefix=passage_prefix,
+        )
+    else:
+        batch_inds = [
+            list(range(i, min(i + batch_size, len(texts_to_embed))))
+            for i in range(0, len(texts_to_embed), batch_size)
+        ]
+
+    # filled in the original order of `texts_to_embed` regardless of the batching
+    new_embeddings: list[list[float]] = [[] for _ in texts_to_embed]
+    for batch in batch_inds:
+        text_batch = [passage_prefix + texts_to_embed[ind] for ind in batch]
         # Normalize embeddings is only configured via model_configs.py, be sure to use right value for the set loss
-        embeddings.extend(embedding_model.encode(text_batch))
+        batch_embeddings = embedding_model.encode(text_batch)
 
         # Replace line above with the line below for easy debugging of indexing flow, skipping the actual model
-        # embeddings.extend([[0.0] * 384 for _ in range(len(text_batch))])
+        # batch_embeddings = [[0.0] * 384 for _ in range(len(text_batch))]
+
+        for ind, embedding in zip(batch, batch_embeddings):
+            new_embeddings[ind] = embedding
+
+    if embedding_cache is None:
+        embeddings = new_embeddings
+    else:
+        new_embeddings_by_hash = dict(zip(hashes_to_embed, new_embeddings))
+        embedding_cache.put(
+            model_name=embedding_model.model_name,
+            passage_prefix=passage_prefix,
+            embeddings_by_hash=new_embeddings_by_hash,
+        )
+        cached_embeddings.update(new_embeddings_by_hash)
+        embeddings = [cached_embeddings[text_hash] for text_hash in text_hashes]
 
     embedding_ind_start = 0
     for chunk_ind, chunk in enumerate(chunks):
@@ -69,5 +161,20 @@ def embed_chunks(
 
 
 class DefaultEmbedder(Embedder):
+    def __init__(
+        self,
+        embedding_cache: EmbeddingCache | None = None,
+        length_bucketing: bool = ENABLE_LENGTH_BUCKETED_EMBEDDING,
+        batch_token_budget: int = EMBEDDING_BATCH_TOKEN_BUDGET,
+    ) -> None:
+        self.embedding_cache = embedding_cache
+        self.length_bucketing = length_bucketing
+        self.batch_token_budget = batch_token_budget
+
     def embed(self, chunks: list[DocAwareChunk]) -> list[IndexChunk]:
-        return embed_chunks(chunks)
+        return embed_chunks(
+            chunks,
+            embedding_cache=self.embedding_cache,
+            length_bucketing=self.length_bucketing,
+            batch_token_budget=self.batch_token_budget,
+        )
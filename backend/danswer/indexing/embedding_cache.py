@@ -0,0 +1,61 @@
+import hashlib
+
+from sqlalchemy.orm import Session
+
+from danswer.db.embedding_cache import evict_embedding_cache
+from danswer.db.embedding_cache import fetch_cached_embeddings
+from danswer.db.embedding_cache import upsert_cached_embeddings
+from danswer.db.engine import get_sqlalchemy_engine
+
+
+def hash_embedding_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Postgres backed cache of chunk text embeddings. Keys are the embedding model name,
+    the passage prefix and the sha256 hash of the un-prefixed text so that a change of
+    model or prefix never returns stale vectors. Keeps running hit / miss counts for the
+    lifetime of the object (generally one index attempt).
+
+    Every call uses its own short lived session since embedding may happen on a different
+    thread than the rest of the indexing run."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self, model_name: str, passage_prefix: str, content_hashes: list[str]
+    ) -> dict[str, list[float]]:
+        with Session(get_sqlalchemy_engine()) as db_session:
+            cached = fetch_cached_embeddings(
+                model_name=model_name,
+                passage_prefix=passage_prefix,
+                content_hashes=content_hashes,
+                db_session=db_session,
+            )
+        for content_hash in content_hashes:
+            if content_hash in cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return cached
+
+    def put(
+        self,
+        model_name: str,
+        passage_prefix: str,
+        embeddings_by_hash: dict[str, list[float]],
+    ) -> None:
+        with Session(get_sqlalchemy_engine()) as db_session:
+            upsert_cached_embeddings(
+                model_name=model_name,
+                passage_prefix=passage_prefix,
+                embeddings_by_hash=embeddings_by_hash,
+                db_session=db_session,
+            )
+
+    def evict(self, max_entries: int) -> int:
+        with Session(get_sqlalchemy_engine()) as db_session:
+            return evict_embedding_cache(max_entries=max_entries, db_session=db_session)
@@ -1,10 +1,14 @@
+from collections.abc import Iterable
+from collections.abc import Iterator
+from dataclasses import dataclass
+from dataclasses import field
 from functools import partial
-from itertools import chain
 from typing import Protocol
 
 from sqlalchemy.orm import Session
 
 from danswer.access.access import get_access_for_documents
+from danswer.configs.app_configs import INDEXING_PIPELINE_QUEUE_SIZE
 from danswer.connectors.cross_connector_utils.miscellaneous_utils import (
     get_experts_stores_representations,
 )
@@ -24,8 +28,10 @@ from danswer.indexing.chunker import DefaultChunker
 from danswer.indexing.embedder import DefaultEmbedder
 from danswer.indexing.models import DocAwareChunk
 from danswer.indexing.models import DocMetadataAwareIndexChunk
+from danswer.indexing.models import IndexChunk
 from danswer.search.models import Embedder
 from danswer.utils.logger import setup_logger
+from danswer.utils.threadpool_concurrency import run_in_pipeline
 
 logger = setup_logger()
 
@@ -65,44 +71,52 @@ def upsert_documents_in_db(
     )
 
 
-def _indexing_pipeline(
-    *,
-    chunker: Chunker,
-    embedder: Embedder,
-    document_index: DocumentIndex,
+def _get_updatable_documents(
     documents: list[Document],
-    index_attempt_metadata: IndexAttemptMetadata,
-    ignore_time_skip: bool = False,
-) -> tuple[int, int]:
-    """Takes different pieces of the indexing pipeline and applies it to a batch of documents
-    Note that the documents should already be batched at this point so that it does not inflate the
-    memory requirements"""
-    with Session(get_sqlalchemy_engine()) as db_session:
-        document_ids = [document.id for document in documents]
+    ignore_time_skip: bool,
+) -> list[Document]:
+    """Skip indexing docs that don't have a newer updated at
+    Shortcuts the time-consuming flow on connector index retries"""
+    if ignore_time_skip:
+        return documents
 
-        # Skip indexing docs that don't have a newer updated at
-        # Shortcuts the time-consuming flow on connector index retries
+    with Session(get_sqlalchemy_engine()) as db_session:
         db_docs = get_documents_by_ids(
-            document_ids=document_ids,
+            document_ids=[document.id for document in documents],
             db_session=db_session,
         )
         id_update_time_map = {
             doc.id: doc.doc_updated_at for doc in db_docs if doc.doc_updated_at
         }
 
-        updatable_docs: list[Document] = []
-        if ignore_time_skip:
-            updatable_docs = documents
-        else:
-            for doc in documents:
-                if (
-                    doc.id in id_update_time_map
-                    and doc.doc_updated_at
-                    and doc.doc_updated_at <= id_update_time_map[doc.id]
-                ):
-                    continue
-                updatable_docs.append(doc)
+    updatable_docs: list[Document] = []
+    for doc in documents:
+        if (
+            doc.id in id_update_time_map
+            and doc.doc_updated_at
+            and doc.doc_updated_at <= id_update_time_map[doc.id]
+        ):
+            continue
+        updatable_docs.append(doc)
+    return updatable_docs
+
+
+def _chunk_documents(
+    chunker: Chunker, documents: list[Document]
+) -> list[DocAwareChunk]:
+    logger.debug("Starting chunking")
+    return chunker.chunk_documents(documents=documents)
+
 
+def _index_embedded_chunks(
+    document_index: DocumentIndex,
+    updatable_docs: list[Document],
+    chunks_with_embeddings: list[IndexChunk],
+    index_attempt_metadata: IndexAttemptMetadata,
+) -> int:
+    """Writes the embedded chunks to the document index and records the documents in
+    Postgres, returns the number of documents which did not exist in the index before"""
+    with Session(get_sqlalchemy_engine()) as db_session:
         updatable_ids = [doc.id for doc in updatable_docs]
 
         # Acquires a lock on the documents so that no other process can modify them
@@ -116,14 +130,6 @@ def _indexing_pipeline(
             db_session=db_session,
         )
 
-        logger.debug("Starting chunking")
-        chunks: list[DocAwareChunk] = list(
-            chain(*[chunker.chunk(document=document) for document in updatable_docs])
-        )
-
-        logger.debug("Starting embedding")
-        chunks_with_embeddings = embedder.embed(chunks=chunks)
-
         # Attach the latest status from Postgres (source of truth for access) to each
         # chunk. This access status will be attached to each chunk in the document index
         # TODO: attach document sets to the chunk based on the status of Postgres as well
@@ -148,7 +154,7 @@ def _indexing_pipeline(
         ]
 
         logger.debug(
-            f"Indexing the following chunks: {[chunk.to_short_descriptor() for chunk in chunks]}"
+            f"Indexing the following chunks: {[chunk.to_short_descriptor() for chunk in chunks_with_embeddings]}"
         )
         # A document will not be spread across different batches, so all the
         # documents with chunks in this set, are fully represented by the chunks
@@ -173,9 +179,36 @@ def _indexing_pipeline(
             ids_to_new_updated_at=ids_to_new_updated_at, db_session=db_session
         )
 
-    return len([r for r in insertion_records if r.already_existed is False]), len(
-        chunks
+    return len([r for r in insertion_records if r.already_existed is False])
+
+
+def _indexing_pipeline(
+    *,
+    chunker: Chunker,
+    embedder: Embedder,
+    document_index: DocumentIndex,
+    documents: list[Document],
+    index_attempt_metadata: IndexAttemptMetadata,
+    ignore_time_skip: bool = False,
+) -> tuple[int, int]:
+    """Takes different pieces of the indexing pipeline and applies it to a batch of documents
+    Note that the documents should already be batched at this point so that it does not inflate the
+    memory requirements"""
+    updatable_docs = _get_updatable_documents(
+        documents=documents, ignore_time_skip=ignore_time_skip
+    )
+    chunks = _chunk_documents(chunker=chunker, documents=updatable_docs)
+
+    logger.debug("Starting embedding")
+    chunks_with_embeddings = embedder.embed(chunks=chunks)
+
+    new_docs = _index_embedded_chunks(
+        document_index=document_index,
+        updatable_docs=updatable_docs,
+        chunks_with_embeddings=chunks_with_embeddings,
+        index_attempt_metadata=index_attempt_metadata,
     )
+    return new_docs, len(chunks)
 
 
 def build_indexing_pipeline(
@@ -199,3 +232,76 @@ def build_indexing_pipeline(
         document_index=document_index,
         ignore_time_skip=ignore_time_skip,
     )
+
+
+@dataclass
+class _PipelinedBatch:
+    documents: list[Document]
+    updatable_docs: list[Document] = field(default_factory=list)
+    chunks: list[DocAwareChunk] = field(default_factory=list)
+    chunks_with_embeddings: list[IndexChunk] = field(default_factory=list)
+
+
+@dataclass
+class IndexedBatch:
+    documents: list[Document]
+    new_docs: int
+    num_chunks: int
+
+
+def run_pipelined_indexing(
+    *,
+    doc_batches: Iterable[list[Document]],
+    index_attempt_metadata: IndexAttemptMetadata,
+    chunker: Chunker | None = None,
+    embedder: Embedder | None = None,
+    document_index: DocumentIndex | None = None,
+    ignore_time_skip: bool = False,
+    queue_size: int = INDEXING_PIPELINE_QUEUE_SIZE,
+) -> Iterator[IndexedBatch]:
+    """Same flow as `build_indexing_pipeline`, but pulling from the connector, chunking
+    and embedding run in their own threads so that while one batch is being embedded
+    the next one is already being fetched / chunked and the previous one is being written
+    to the document index. Each stage holds at most `queue_size` batches waiting on the
+    next stage.
+
+    Batches are yielded in the order the connector produced them, only once they are
+    fully written to the document index and Postgres, so callers can commit progress per
+    batch exactly as with the sequential pipeline."""
+    chunker = chunker or DefaultChunker()
+    embedder = embedder or DefaultEmbedder()
+    document_index = document_index or get_default_document_index()
+
+    def _chunk_stage(batch: _PipelinedBatch) -> _PipelinedBatch:
+        batch.updatable_docs = _get_updatable_documents(
+            documents=batch.documents, ignore_time_skip=ignore_time_skip
+        )
+        batch.chunks = _chunk_documents(chunker=chunker, documents=batch.updatable_docs)
+        return batch
+
+    def _embed_stage(batch: _PipelinedBatch) -> _PipelinedBatch:
+        logger.debug("Starting embedding")
+        batch.chunks_with_embeddings = embedder.embed(chunks=batch.chunks)
+        return batch
+
+    pipeline = run_in_pipeline(
+        source=(_PipelinedBatch(documents=doc_batch) for doc_batch in doc_batches),
+        stages=[_chunk_stage, _embed_stage],
+        queue_size=queue_size,
+        name="indexing",
+    )
+    try:
+        for batch in pipeline:
+            new_docs = _index_embedded_chunks(
+                document_index=document_index,
+                updatable_docs=batch.updatable_docs,
+                chunks_with_embeddings=batch.chunks_with_embeddings,
+                index_attempt_metadata=index_attempt_metadata,
+            )
+            yield IndexedBatch(
+                documents=batch.documents,
+                new_docs=new_docs,
+                num_chunks=len(batch.chunks),
+            )
+    finally:
+        pipeline.close()
@@ -121,6 +121,11 @@ class DefaultMultiLLM(LangChainChatLLM):
         litellm.api_key = api_key or "dummy-key"
         litellm.api_version = api_version
 
+        self._model_name = (
+            f"{custom_llm_provider}/{model_version}"
+            if custom_llm_provider
+            else _get_model_str(model_provider, model_version)
+        )
         self._llm = ChatLiteLLM(  # type: ignore
             model=model_version
             if custom_llm_provider
@@ -135,6 +140,10 @@ class DefaultMultiLLM(LangChainChatLLM):
             max_retries=0,  # retries are handled outside of langchain
         )
 
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
     @property
     def llm(self) -> ChatLiteLLM:
         return self._llm
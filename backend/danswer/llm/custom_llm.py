@@ -47,6 +47,10 @@ class CustomModelServer(LLM):
         self._max_output_tokens = max_output_tokens
         self._timeout = timeout
 
+    @property
+    def model_name(self) -> str:
+        return self._endpoint
+
     def _execute(self, input: LanguageModelInput) -> str:
         headers = {
             "Content-Type": "application/json",
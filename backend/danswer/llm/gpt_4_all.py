@@ -59,8 +59,13 @@ class DanswerGPT4All(LLM):
         self.timeout = timeout
         self.max_output_tokens = max_output_tokens
         self.temperature = temperature
+        self.model_version = model_version
         self.gpt4all_model = GPT4All(model_version)
 
+    @property
+    def model_name(self) -> str:
+        return f"gpt4all/{self.model_version}"
+
     def log_model_configs(self) -> None:
         logger.debug(
             f"GPT4All Model: {self.gpt4all_model}, Temperature: {self.temperature}"
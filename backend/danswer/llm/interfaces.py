@@ -22,6 +22,12 @@ class LLM(abc.ABC):
     def requires_api_key(self) -> bool:
         return True
 
+    @property
+    def model_name(self) -> str:
+        """Identifies the model behind this LLM, used to keep the cached outputs of
+        different models apart"""
+        return self.__class__.__name__
+
     @abc.abstractmethod
     def log_model_configs(self) -> None:
         raise NotImplementedError
@@ -37,7 +37,6 @@ from danswer.search.request_preprocessing import retrieval_preprocessing
 from danswer.search.search_runner import chunks_to_search_docs
 from danswer.search.search_runner import full_chunk_search_generator
 from danswer.secondary_llm_flows.answer_validation import get_answer_validity
-from danswer.secondary_llm_flows.query_expansion import thread_based_query_rephrase
 from danswer.server.query_and_chat.models import ChatMessageDetail
 from danswer.server.utils import get_json_line
 from danswer.utils.logger import setup_logger
@@ -98,24 +97,21 @@ def stream_answer_objects(
 
     history_str = combine_message_thread(history)
 
-    rephrased_query = thread_based_query_rephrase(
-        user_query=query_msg.message,
-        history_str=history_str,
-    )
-    yield QueryRephrase(rephrased_query=rephrased_query)
-
     (
         retrieval_request,
         predicted_search_type,
         predicted_flow,
     ) = retrieval_preprocessing(
-        query=rephrased_query,
+        query=query_msg.message,
         retrieval_details=query_req.retrieval_options,
         persona=chat_session.persona,
         user=user,
         db_session=db_session,
         bypass_acl=bypass_acl,
+        history_str=history_str,
     )
+    rephrased_query = retrieval_request.query
+    yield QueryRephrase(rephrased_query=rephrased_query)
 
     documents_generator = full_chunk_search_generator(
         search_query=retrieval_request,
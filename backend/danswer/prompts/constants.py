@@ -11,3 +11,4 @@ QUOTE_PAT = "Quote:"
 QUOTES_PAT_PLURAL = "Quotes:"
 INVALID_PAT = "Invalid:"
 SOURCES_KEY = "sources"
+REPHRASED_QUERY_KEY = "rephrased_query"
@@ -1,6 +1,8 @@
 # The following prompts are used for extracting filters to apply along with the query in the
 # document index. For example, a filter for dates or a filter by source type such as GitHub
 # or Slack
+from danswer.prompts.constants import GENERAL_SEP_PAT
+from danswer.prompts.constants import REPHRASED_QUERY_KEY
 from danswer.prompts.constants import SOURCES_KEY
 
 
@@ -59,8 +61,56 @@ Note: The "file" source only applies to when the user refers to uploaded files i
 """.strip()
 
 
+# Used by query_understanding.py, a single call for the query rephrase and both of the filters
+# above. Only the sections for the parts which are needed are included
+QUERY_UNDERSTANDING_PROMPT = """
+You are a tool to prepare a user query for a downstream search application. \
+The current day and time is {current_day_time_str}.
+
+{task_sections}
+
+Always answer with ONLY a json which contains the keys {json_keys}.
+""".strip()
+
+QUERY_UNDERSTANDING_REPHRASE_SECTION = f"""
+"{REPHRASED_QUERY_KEY}": Given the following conversation and the user query as a follow up \
+input, rephrase the follow up into a SHORT, standalone query (which captures any relevant \
+context from previous messages) for a vectorstore. Respond with a short, compressed phrase with \
+mainly keywords instead of a complete sentence. If there is a clear change in topic, disregard \
+the previous messages. If the follow up message is an error or code snippet, repeat the same \
+input back EXACTLY.
+
+{GENERAL_SEP_PAT}
+Chat History:
+{{chat_history}}
+{GENERAL_SEP_PAT}
+""".strip()
+
+QUERY_UNDERSTANDING_TIME_SECTION = """
+"filter_type", "filter_value", "value_multiple" and "date": The time filters to apply to the \
+query. The downstream application is able to use a recency bias or apply a hard cutoff to \
+remove all documents before the cutoff.
+The valid values for "filter_type" are "hard cutoff", "favors recent", or "not time sensitive".
+The valid values for "filter_value" are "day", "week", "month", "quarter", "half", or "year".
+The valid values for "value_multiple" is any number.
+The valid values for "date" is a date in format MM/DD/YYYY, ALWAYS follow this format.
+""".strip()
+
+QUERY_UNDERSTANDING_SOURCE_SECTION = f"""
+"{SOURCES_KEY}": null or a list of the sources to limit the search to. ONLY extract sources when \
+the user is explicitly limiting the scope of where information is coming from. The user may \
+provide invalid source filters, ignore those.
+The valid sources are:
+{{valid_sources}}
+{{web_source_warning}}
+{{file_source_warning}}
+""".strip()
+
+
 # Use the following for easy viewing of prompts
 if __name__ == "__main__":
     print(TIME_FILTER_PROMPT)
     print("------------------")
     print(SOURCE_FILTER_PROMPT)
+    print("------------------")
+    print(QUERY_UNDERSTANDING_PROMPT)
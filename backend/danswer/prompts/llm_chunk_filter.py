@@ -25,6 +25,32 @@ Respond with EXACTLY AND ONLY: "{USEFUL_PAT}" or "{NONUSEFUL_PAT}"
 """.strip()
 
 
+# Same as the above for a batch of numbered sections with a single LLM call
+SECTION_USEFULNESS_KEY = "section_usefulness"
+SECTION_PAT = "Section {section_num}:"
+BATCH_CHUNK_FILTER_PROMPT = f"""
+Determine for EACH of the numbered reference sections if it is USEFUL for answering the user query.
+It is NOT enough for a section to be related to the query, \
+it must contain information that is USEFUL for answering the query.
+If a section contains ANY useful information, that is good enough, \
+it does not need to fully answer the every part of the user query.
+Judge every section on its own, regardless of the other sections.
+
+Reference Sections:
+{{numbered_sections}}
+
+User Query:
+```
+{{user_query}}
+```
+
+Respond with EXACTLY AND ONLY a json with the key "{SECTION_USEFULNESS_KEY}", a list of \
+{{num_sections}} booleans in the order of the sections, true if the section is useful.
+""".strip()
+
+
 # Use the following for easy viewing of prompts
 if __name__ == "__main__":
     print(CHUNK_FILTER_PROMPT)
+    print("------------------")
+    print(BATCH_CHUNK_FILTER_PROMPT)
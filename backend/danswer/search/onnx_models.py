@@ -0,0 +1,325 @@
+"""ONNX Runtime versions of the bi-encoder and cross-encoders. They expose the subset of
+the `SentenceTransformer.encode` / `CrossEncoder.predict` interfaces that Danswer uses,
+so they can be returned in place of the torch models by the local model getters.
+
+The torch model is exported to ONNX (and optionally quantized to int8 weights with
+dynamic quantization) the first time it is loaded, the result is cached on disk under
+ONNX_MODEL_CACHE_DIR. Later loads only read the exported file, the tokenizer and the
+model config, the torch model is never loaded again."""
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import torch
+from sentence_transformers import CrossEncoder  # type: ignore
+from sentence_transformers import SentenceTransformer  # type: ignore
+from sentence_transformers.models import Normalize  # type: ignore
+from sentence_transformers.models import Pooling  # type: ignore
+from transformers import AutoConfig  # type: ignore
+from transformers import AutoTokenizer  # type: ignore
+
+from danswer.configs.model_configs import ONNX_MODEL_CACHE_DIR
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+# batch size used for each ONNX Runtime call, matches the SentenceTransformer default
+_ONNX_BATCH_SIZE = 32
+_ONNX_OPSET_VERSION = 14
+# Saved next to the exported bi-encoder, the pooling / normalization of the
+# SentenceTransformer modules and the tokenizer of its transformer module
+_SENTENCE_CONFIG_FILE = "sentence_config.json"
+_TOKENIZER_DIR = "tokenizer"
+
+
+def _get_onnx_runtime() -> Any:
+    try:
+        import onnxruntime  # type: ignore
+    except ImportError as e:
+        raise RuntimeError(
+            "The ONNX inference backend requires `onnxruntime`, install it or set "
+            "INFERENCE_BACKEND=torch"
+        ) from e
+    return onnxruntime
+
+
+def _get_export_path(model_name: str, quantize: bool) -> Path:
+    model_dir = Path(ONNX_MODEL_CACHE_DIR) / model_name.replace("/", "__")
+    return model_dir / ("model_int8.onnx" if quantize else "model.onnx")
+
+
+def _get_input_names(tokenizer: Any) -> list[str]:
+    return [
+        name
+        for name in ["input_ids", "attention_mask", "token_type_ids"]
+        if name in tokenizer.model_input_names
+    ]
+
+
+def _export_to_onnx(
+    model: torch.nn.Module,
+    tokenizer: Any,
+    input_names: list[str],
+    output_name: str,
+    export_path: Path,
+    quantize: bool,
+) -> None:
+    """Exports `model` with dynamic batch / sequence axes. Written to a temporary file
+    first so that processes loading the same model concurrently never see a partial
+    export"""
+    export_path.parent.mkdir(parents=True, exist_ok=True)
+    fp32_path = export_path.parent / "model.onnx"
+
+    if not fp32_path.exists():
+        logger.info(f"Exporting model to ONNX at {fp32_path}")
+        dummy_inputs = tokenizer(
+            ["Danswer is amazing"], ["Danswer is amazing"], return_tensors="pt"
+        )
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes[output_name] = {0: "batch"}
+        tmp_path = fp32_path.with_suffix(f".{os.getpid()}.tmp")
+        model.eval()
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(dummy_inputs[name] for name in input_names),
+                str(tmp_path),
+                input_names=input_names,
+                output_names=[output_name],
+                dynamic_axes=dynamic_axes,
+                opset_version=_ONNX_OPSET_VERSION,
+            )
+        os.replace(tmp_path, fp32_path)
+
+    if quantize and not export_path.exists():
+        from onnxruntime.quantization import quantize_dynamic  # type: ignore
+        from onnxruntime.quantization import QuantType
+
+        logger.info(f"Quantizing ONNX model to int8 at {export_path}")
+        tmp_path = export_path.with_suffix(f".{os.getpid()}.tmp")
+        quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+        os.replace(tmp_path, export_path)
+
+
+def _create_session(export_path: Path) -> Any:
+    onnxruntime = _get_onnx_runtime()
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = torch.get_num_threads()
+    return onnxruntime.InferenceSession(
+        str(export_path),
+        sess_options=session_options,
+        providers=["CPUExecutionProvider"],
+    )
+
+
+class _TokenEmbeddingsModule(torch.nn.Module):
+    """Wraps the HF model so that the export has a single, named output"""
+
+    def __init__(self, auto_model: torch.nn.Module, input_names: list[str]) -> None:
+        super().__init__()
+        self.auto_model = auto_model
+        self.input_names = input_names
+
+    def forward(self, *inputs: torch.Tensor) -> torch.Tensor:
+        return self.auto_model(**dict(zip(self.input_names, inputs)))[0]
+
+
+def _export_sentence_transformer(
+    model_name: str, export_path: Path, quantize: bool
+) -> None:
+    """Exports the transformer module of the SentenceTransformer and saves its tokenizer
+    and sentence config, which is written last so that it marks a complete export"""
+    torch_model = SentenceTransformer(model_name)
+    transformer = torch_model[0]
+    tokenizer = transformer.tokenizer
+    input_names = _get_input_names(tokenizer)
+    _export_to_onnx(
+        model=_TokenEmbeddingsModule(transformer.auto_model, input_names),
+        tokenizer=tokenizer,
+        input_names=input_names,
+        output_name="token_embeddings",
+        export_path=export_path,
+        quantize=quantize,
+    )
+    tokenizer.save_pretrained(str(export_path.parent / _TOKENIZER_DIR))
+
+    pooling = next(
+        (module for module in torch_model if isinstance(module, Pooling)), None
+    )
+    sentence_config = {
+        "cls_pooling": bool(pooling and pooling.pooling_mode_cls_token),
+        "always_normalize": any(
+            isinstance(module, Normalize) for module in torch_model
+        ),
+        "embedding_dim": torch_model.get_sentence_embedding_dimension(),
+    }
+    config_path = export_path.parent / _SENTENCE_CONFIG_FILE
+    tmp_path = config_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w") as config_file:
+        json.dump(sentence_config, config_file)
+    os.replace(tmp_path, config_path)
+
+
+class OnnxEmbeddingModel:
+    def __init__(self, model_name: str, max_seq_length: int, quantize: bool) -> None:
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+
+        export_path = _get_export_path(model_name, quantize)
+        config_path = export_path.parent / _SENTENCE_CONFIG_FILE
+        if not (export_path.exists() and config_path.exists()):
+            _export_sentence_transformer(model_name, export_path, quantize)
+
+        with open(config_path) as config_file:
+            sentence_config = json.load(config_file)
+        self.cls_pooling: bool = sentence_config["cls_pooling"]
+        self.always_normalize: bool = sentence_config["always_normalize"]
+        self.embedding_dim: int = sentence_config["embedding_dim"]
+
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            str(export_path.parent / _TOKENIZER_DIR)
+        )
+        self.input_names = _get_input_names(self.tokenizer)
+        self.session = _create_session(export_path)
+
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        token_embeddings = self.session.run(
+            None, {name: inputs[name].astype(np.int64) for name in self.input_names}
+        )[0]
+
+        if self.cls_pooling:
+            return token_embeddings[:, 0]
+
+        # mean pooling over the non-padding tokens
+        mask = inputs["attention_mask"][..., None].astype(token_embeddings.dtype)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(
+            mask.sum(axis=1), 1e-9, None
+        )
+
+    def encode(
+        self, texts: str | list[str], normalize_embeddings: bool = False
+    ) -> np.ndarray:
+        single_text = isinstance(texts, str)
+        text_list = [texts] if isinstance(texts, str) else texts
+        if not text_list:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+
+        # longest first, same as SentenceTransformer, so that batches pad little
+        order = np.argsort([-len(text) for text in text_list], kind="stable")
+        sorted_embeddings = np.concatenate(
+            [
+                self._encode_batch(
+                    [text_list[ind] for ind in order[i : i + _ONNX_BATCH_SIZE]]
+                )
+                for i in range(0, len(text_list), _ONNX_BATCH_SIZE)
+            ]
+        )
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+
+        if normalize_embeddings or self.always_normalize:
+            embeddings = embeddings / np.clip(
+                np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None
+            )
+        return embeddings[0] if single_text else embeddings
+
+
+class _LogitsModule(torch.nn.Module):
+    def __init__(self, model: torch.nn.Module, input_names: list[str]) -> None:
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs: torch.Tensor) -> torch.Tensor:
+        return self.model(**dict(zip(self.input_names, inputs))).logits
+
+
+class OnnxCrossEncoder:
+    def __init__(self, model_name: str, max_length: int, quantize: bool) -> None:
+        self.model_name = model_name
+        self.max_length = max_length
+
+        # same tokenizer and config as CrossEncoder loads, without the model weights
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.input_names = _get_input_names(self.tokenizer)
+        # CrossEncoder applies a sigmoid by default for single label models
+        self.apply_sigmoid = AutoConfig.from_pretrained(model_name).num_labels == 1
+
+        export_path = _get_export_path(model_name, quantize)
+        if not export_path.exists():
+            torch_model = CrossEncoder(model_name)
+            _export_to_onnx(
+                model=_LogitsModule(torch_model.model, self.input_names),
+                tokenizer=self.tokenizer,
+                input_names=self.input_names,
+                output_name="logits",
+                export_path=export_path,
+                quantize=quantize,
+            )
+        self.session = _create_session(export_path)
+
+    def predict(self, sentences: tuple[str, str] | list[tuple[str, str]]) -> np.ndarray:
+        single_pair = isinstance(sentences, tuple)
+        pairs = [sentences] if isinstance(sentences, tuple) else sentences
+
+        batch_scores = []
+        for i in range(0, len(pairs), _ONNX_BATCH_SIZE):
+            batch = pairs[i : i + _ONNX_BATCH_SIZE]
+            inputs = self.tokenizer(
+                [pair[0] for pair in batch],
+                [pair[1] for pair in batch],
+                padding=True,
+                truncation="longest_first",
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            logits = self.session.run(
+                None,
+                {name: inputs[name].astype(np.int64) for name in self.input_names},
+            )[0]
+            batch_scores.append(logits)
+
+        scores = np.concatenate(batch_scores) if batch_scores else np.empty((0, 1))
+        if self.apply_sigmoid:
+            scores = 1 / (1 + np.exp(-scores))
+        if scores.shape[-1] == 1:
+            scores = scores[:, 0]
+        return scores[0] if single_pair else scores
+
+
+def export_cross_encoder_for_vespa(
+    model_name: str, quantize: bool
+) -> tuple[Path, Path, list[str]]:
+    """Exports the cross-encoder for ranking inside Vespa, see `render_vespa_app_config`.
+    Returns the paths of the ONNX model (outputs raw logits) and of the HuggingFace
+    `tokenizer.json` used by Vespa to tokenize, plus the names of the model inputs"""
+    export_path = _get_export_path(model_name, quantize)
+    tokenizer_path = export_path.parent / "tokenizer.json"
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    input_names = _get_input_names(tokenizer)
+
+    if not export_path.exists():
+        torch_model = CrossEncoder(model_name)
+        _export_to_onnx(
+            model=_LogitsModule(torch_model.model, input_names),
+            tokenizer=tokenizer,
+            input_names=input_names,
+            output_name="logits",
+            export_path=export_path,
+            quantize=quantize,
+        )
+    if not tokenizer_path.exists():
+        # only fast tokenizers are saved in the `tokenizer.json` format Vespa reads
+        tokenizer.backend_tokenizer.save(str(tokenizer_path))
+
+    return export_path, tokenizer_path, input_names
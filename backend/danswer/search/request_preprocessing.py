@@ -1,12 +1,18 @@
+from datetime import datetime
+from typing import cast
+
 from sqlalchemy.orm import Session
 
 from danswer.configs.chat_configs import DISABLE_LLM_CHUNK_FILTER
 from danswer.configs.chat_configs import DISABLE_LLM_FILTER_EXTRACTION
+from danswer.configs.chat_configs import ENABLE_COMBINED_QUERY_UNDERSTANDING
 from danswer.configs.chat_configs import FAVOR_RECENT_DECAY_MULTIPLIER
 from danswer.configs.model_configs import ENABLE_RERANKING_ASYNC_FLOW
 from danswer.configs.model_configs import ENABLE_RERANKING_REAL_TIME_FLOW
+from danswer.db.connector import fetch_unique_document_sources
 from danswer.db.models import Persona
 from danswer.db.models import User
+from danswer.llm.interfaces import LLM
 from danswer.search.access_filters import build_access_filters_for_user
 from danswer.search.danswer_helper import query_intent
 from danswer.search.models import BaseFilters
@@ -16,9 +22,15 @@ from danswer.search.models import RecencyBiasSetting
 from danswer.search.models import RetrievalDetails
 from danswer.search.models import SearchQuery
 from danswer.search.models import SearchType
+from danswer.secondary_llm_flows.query_expansion import thread_based_query_rephrase
+from danswer.secondary_llm_flows.query_expansion import thread_query_needs_rephrase
+from danswer.secondary_llm_flows.query_understanding import get_query_understanding
+from danswer.secondary_llm_flows.query_understanding import QueryUnderstanding
 from danswer.secondary_llm_flows.source_filter import extract_source_filter
 from danswer.secondary_llm_flows.time_filter import extract_time_filter
 from danswer.utils.threadpool_concurrency import FunctionCall
+from danswer.utils.threadpool_concurrency import LLM_EXECUTOR
+from danswer.utils.threadpool_concurrency import MODEL_SERVER_EXECUTOR
 from danswer.utils.threadpool_concurrency import run_functions_in_parallel
 
 
@@ -35,11 +47,19 @@ def retrieval_preprocessing(
     disable_llm_filter_extraction: bool = DISABLE_LLM_FILTER_EXTRACTION,
     disable_llm_chunk_filter: bool = DISABLE_LLM_CHUNK_FILTER,
     favor_recent_decay_multiplier: float = FAVOR_RECENT_DECAY_MULTIPLIER,
+    history_str: str | None = None,
+    rephrase_without_history: bool = False,
+    llm: LLM | None = None,
+    enable_query_understanding: bool = ENABLE_COMBINED_QUERY_UNDERSTANDING,
 ) -> tuple[SearchQuery, SearchType | None, QueryFlow | None]:
     """Logic is as follows:
     Any global disables apply first
     Then any filters or settings as part of the query are used
     Then defaults to Persona settings if not specified by the query
+
+    If history_str is passed, the query is the latest user message and is first rephrased
+    into a standalone query, the rephrased query is the one in the returned SearchQuery.
+    With rephrase_without_history, it is rephrased even if the history is empty
     """
 
     preset_filters = retrieval_details.filters or BaseFilters()
@@ -51,6 +71,9 @@ def retrieval_preprocessing(
     time_filter = preset_filters.time_cutoff
     source_filter = preset_filters.source_type
 
+    predicted_search_type: SearchType | None = None
+    predicted_flow: QueryFlow | None = None
+
     auto_detect_time_filter = True
     auto_detect_source_filter = True
     if disable_llm_filter_extraction:
@@ -68,51 +91,122 @@ def retrieval_preprocessing(
     if source_filter is not None:
         auto_detect_source_filter = False
 
-    # Based on the query figure out if we should apply any hard time filters /
-    # if we should bias more recent docs even more strongly
-    run_time_filters = (
-        FunctionCall(extract_time_filter, (query,), {})
-        if auto_detect_time_filter
-        else None
-    )
-
-    # Based on the query, figure out if we should apply any source filters
-    run_source_filters = (
-        FunctionCall(extract_source_filter, (query, db_session), {})
-        if auto_detect_source_filter
-        else None
+    rephrase_query = history_str is not None and thread_query_needs_rephrase(
+        user_query=query,
+        history_str=history_str,
+        require_history=not rephrase_without_history,
     )
 
     # NOTE: this isn't really part of building the retrieval request, but is done here
-    # so it can be simply done in parallel with the filters without multi-level multithreading
+    # so it can be simply done in parallel with the filters without multi-level multithreading.
+    # The intent is predicted for the rephrased query, so only in parallel with the
+    # rephrase if there is nothing to rephrase
     run_query_intent = (
-        FunctionCall(query_intent, (query,), {}) if include_query_intent else None
+        FunctionCall(query_intent, (query,), {}, executor_name=MODEL_SERVER_EXECUTOR)
+        if include_query_intent and not rephrase_query
+        else None
     )
+    query_intent_done = False
+
+    # Rephrase and figure out both filters with a single LLM call, the results for the same
+    # query and available sources are memoized
+    query_understanding: QueryUnderstanding | None = None
+    if enable_query_understanding and (
+        rephrase_query or auto_detect_time_filter or auto_detect_source_filter
+    ):
+        run_query_understanding = FunctionCall(
+            get_query_understanding,
+            (),
+            {
+                "query": query,
+                "history_str": history_str if rephrase_query else None,
+                "detect_time_filter": auto_detect_time_filter,
+                "valid_sources": fetch_unique_document_sources(db_session)
+                if auto_detect_source_filter
+                else None,
+                "llm": llm,
+            },
+            executor_name=LLM_EXECUTOR,
+        )
+        parallel_results = run_functions_in_parallel(
+            [fn for fn in [run_query_understanding, run_query_intent] if fn is not None]
+        )
+        query_understanding = parallel_results[run_query_understanding.result_id]
+        if run_query_intent:
+            predicted_search_type, predicted_flow = parallel_results[
+                run_query_intent.result_id
+            ]
+            # already done, not rerun with the separate flows below
+            run_query_intent = None
+            query_intent_done = True
 
-    functions_to_run = [
-        filter_fn
-        for filter_fn in [
-            run_time_filters,
-            run_source_filters,
-            run_query_intent,
+    if query_understanding is not None:
+        query = query_understanding.rephrased_query
+        predicted_time_cutoff: datetime | None = query_understanding.time_cutoff
+        predicted_favor_recent: bool | None = query_understanding.favor_recent
+        predicted_source_filters = query_understanding.source_filters
+        if include_query_intent and not query_intent_done:
+            predicted_search_type, predicted_flow = query_intent(query)
+    else:
+        if rephrase_query:
+            query = thread_based_query_rephrase(
+                user_query=query,
+                history_str=cast(str, history_str),
+                llm=llm,
+                require_history=not rephrase_without_history,
+            )
+        if include_query_intent and not query_intent_done:
+            run_query_intent = FunctionCall(
+                query_intent, (query,), {}, executor_name=MODEL_SERVER_EXECUTOR
+            )
+
+        # Based on the query figure out if we should apply any hard time filters /
+        # if we should bias more recent docs even more strongly
+        run_time_filters = (
+            FunctionCall(extract_time_filter, (query,), {}, executor_name=LLM_EXECUTOR)
+            if auto_detect_time_filter
+            else None
+        )
+
+        # Based on the query, figure out if we should apply any source filters
+        run_source_filters = (
+            FunctionCall(
+                extract_source_filter,
+                (query, db_session),
+                {},
+                executor_name=LLM_EXECUTOR,
+            )
+            if auto_detect_source_filter
+            else None
+        )
+
+        functions_to_run = [
+            filter_fn
+            for filter_fn in [
+                run_time_filters,
+                run_source_filters,
+                run_query_intent,
+            ]
+            if filter_fn
         ]
-        if filter_fn
-    ]
-    parallel_results = run_functions_in_parallel(functions_to_run)
-
-    predicted_time_cutoff, predicted_favor_recent = (
-        parallel_results[run_time_filters.result_id]
-        if run_time_filters
-        else (None, None)
-    )
-    predicted_source_filters = (
-        parallel_results[run_source_filters.result_id] if run_source_filters else None
-    )
-    predicted_search_type, predicted_flow = (
-        parallel_results[run_query_intent.result_id]
-        if run_query_intent
-        else (None, None)
-    )
+        parallel_results = (
+            run_functions_in_parallel(functions_to_run) if functions_to_run else {}
+        )
+
+        predicted_time_cutoff, predicted_favor_recent = (
+            parallel_results[run_time_filters.result_id]
+            if run_time_filters
+            else (None, None)
+        )
+        predicted_source_filters = (
+            parallel_results[run_source_filters.result_id]
+            if run_source_filters
+            else None
+        )
+        if run_query_intent:
+            predicted_search_type, predicted_flow = parallel_results[
+                run_query_intent.result_id
+            ]
 
     user_acl_filters = (
         None if bypass_acl else build_access_filters_for_user(user, db_session)
@@ -0,0 +1,291 @@
+"""In-process cache of full search results, in front of `full_chunk_search_generator`.
+
+Documents are re-indexed / updated by other processes (background indexing, Celery) so
+invalidations go through the `search_cache_invalidation` table: writers record the ids
+of the documents they touched and every API server process reads the rows added since
+its last read before serving from its cache. A cached result is dropped if any of its
+documents was invalidated after the search for it started.
+
+Ids are handed out when rows are inserted but the transactions inserting them can commit
+in any order, so ids skipped by a read are read again until they show up (or are too
+old to matter). Invalidations are ordered by when this process read them rather than by
+their id.
+
+The invalidations are read at most once per refresh interval, the searches in between
+share the last read. Only the searches arriving after the interval wait for the next
+read, a cached result can so be served for up to the interval after it was invalidated.
+The old rows are deleted by a periodic Celery task."""
+import copy
+import threading
+import time
+from collections.abc import Callable
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import cast
+
+from sqlalchemy.orm import Session
+
+from danswer.configs.chat_configs import SEARCH_RESULT_CACHE_REFRESH_INTERVAL
+from danswer.configs.chat_configs import SEARCH_RESULT_CACHE_SIZE
+from danswer.configs.chat_configs import SEARCH_RESULT_CACHE_TTL
+from danswer.db.engine import get_sqlalchemy_engine
+from danswer.db.search_cache import fetch_latest_search_cache_invalidation_id
+from danswer.db.search_cache import fetch_search_cache_invalidations
+from danswer.db.search_cache import record_search_cache_invalidations
+from danswer.indexing.models import InferenceChunk
+from danswer.search.models import SearchQuery
+from danswer.utils.logger import setup_logger
+from danswer.utils.ttl_cache import TTLLRUCache
+
+logger = setup_logger()
+
+SearchCacheKey = tuple
+
+
+@dataclass
+class _CachedSearchResult:
+    chunks: list[InferenceChunk]
+    llm_chunk_selection: list[bool]
+    document_ids: set[str]
+    # number of the latest read of the invalidations before the search started
+    read_num: int
+    search_seconds: float
+
+
+@dataclass
+class SearchResultCacheStats:
+    hits: int
+    misses: int
+    invalidated: int
+    latency_saved_seconds: float
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def build_search_cache_key(
+    search_query: SearchQuery,
+    hybrid_alpha: float,
+    multilingual_expansion_str: str | None,
+    rerank_in_index: bool,
+) -> SearchCacheKey:
+    # the ACL is built from sets, the order of its entries is arbitrary
+    filters = search_query.filters.copy(
+        update={
+            "access_control_list": sorted(search_query.filters.access_control_list)
+            if search_query.filters.access_control_list is not None
+            else None
+        }
+    )
+    return (
+        " ".join(search_query.query.split()),
+        filters.json(),
+        search_query.search_type,
+        search_query.recency_bias_multiplier,
+        search_query.num_hits,
+        search_query.num_rerank,
+        search_query.skip_rerank,
+        search_query.skip_llm_chunk_filter,
+        search_query.max_llm_filter_chunks,
+        hybrid_alpha,
+        multilingual_expansion_str,
+        rerank_in_index,
+    )
+
+
+class SearchResultCache:
+    def __init__(
+        self, max_size: int, ttl_seconds: float, refresh_interval: float
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.refresh_interval = refresh_interval
+        self._cache: TTLLRUCache[SearchCacheKey, _CachedSearchResult] = TTLLRUCache(
+            name="search_result", max_size=max_size, ttl_seconds=ttl_seconds
+        )
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._last_invalidation_id: int | None = None
+        # ids below the last one which were not committed yet at the last read -> when
+        # they were first skipped, rolled back inserts leave gaps which never fill in
+        self._missing_ids: dict[int, float] = {}
+        self._read_num = 0
+        # the next search from this time on reads the invalidations again
+        self._next_read_time = 0.0
+        # document id -> (number of the read it was last invalidated by, time of that
+        # read), only needs to cover the entries which are not expired yet
+        self._invalidations: dict[str, tuple[int, float]] = {}
+        self._hits = 0
+        self._misses = 0
+        self._invalidated = 0
+        self._latency_saved_seconds = 0.0
+
+    def _read_invalidations(self) -> int | None:
+        """Returns the number of this read, None if the invalidations can't be read in
+        which case the cache is not used"""
+        with self._lock:
+            if time.monotonic() < self._next_read_time:
+                return self._read_num
+
+        # One read at a time, an invalidation is then always seen first by a read
+        # numbered after those of the searches which started before it was committed
+        with self._read_lock:
+            read_start = time.monotonic()
+            with self._lock:
+                # read by another search while waiting for the lock
+                if read_start < self._next_read_time:
+                    return self._read_num
+
+            try:
+                with Session(get_sqlalchemy_engine()) as db_session:
+                    if self._last_invalidation_id is None:
+                        # nothing was cached before this process' first read
+                        self._last_invalidation_id = (
+                            fetch_latest_search_cache_invalidation_id(db_session)
+                        )
+                        with self._lock:
+                            self._next_read_time = read_start + self.refresh_interval
+                        return self._read_num
+
+                    invalidations = fetch_search_cache_invalidations(
+                        after_id=min(self._missing_ids) - 1
+                        if self._missing_ids
+                        else self._last_invalidation_id,
+                        db_session=db_session,
+                    )
+            except Exception as e:
+                logger.warning(f"Failed to read the search cache invalidations: {e}")
+                return None
+
+            now = time.monotonic()
+            read_ids = {invalidation_id for invalidation_id, _ in invalidations}
+            with self._lock:
+                self._read_num += 1
+                for invalidation_id, document_id in invalidations:
+                    if (
+                        invalidation_id > self._last_invalidation_id
+                        or self._missing_ids.pop(invalidation_id, None) is not None
+                    ):
+                        self._invalidations[document_id] = (self._read_num, now)
+                self._invalidations = {
+                    document_id: invalidation
+                    for document_id, invalidation in self._invalidations.items()
+                    if now - invalidation[1] < self.ttl_seconds
+                }
+                self._next_read_time = read_start + self.refresh_interval
+
+            latest_id = max(read_ids, default=self._last_invalidation_id)
+            for skipped_id in range(self._last_invalidation_id + 1, latest_id):
+                if skipped_id not in read_ids:
+                    self._missing_ids[skipped_id] = now
+            self._last_invalidation_id = max(self._last_invalidation_id, latest_id)
+            # results cached before an id was skipped are expired by now
+            self._missing_ids = {
+                missing_id: skipped_at
+                for missing_id, skipped_at in self._missing_ids.items()
+                if now - skipped_at < self.ttl_seconds
+            }
+            return self._read_num
+
+    def _is_invalidated(self, result: _CachedSearchResult) -> bool:
+        with self._lock:
+            return any(
+                self._invalidations.get(document_id, (0, 0.0))[0] > result.read_num
+                for document_id in result.document_ids
+            )
+
+    def cached_search(
+        self,
+        key: SearchCacheKey,
+        run_search: Callable[[], Iterator[list[InferenceChunk] | list[bool]]],
+    ) -> Iterator[list[InferenceChunk] | list[bool]]:
+        """Same yields as `full_chunk_search_generator`, the chunks then the LLM
+        relevance filter results. Results are only cached if both are consumed"""
+        read_num = self._read_invalidations()
+
+        cached = self._cache.get(key) if read_num is not None else None
+        if cached is not None and self._is_invalidated(cached):
+            with self._lock:
+                self._invalidated += 1
+            cached = None
+
+        if cached is not None:
+            with self._lock:
+                self._hits += 1
+                self._latency_saved_seconds += cached.search_seconds
+            # callers modify the chunks, e.g. the scores and highlights
+            yield copy.deepcopy(cached.chunks)
+            yield list(cached.llm_chunk_selection)
+            return
+
+        with self._lock:
+            self._misses += 1
+
+        # only the time spent searching, not the time the caller takes between yields
+        start = time.monotonic()
+        search_generator = run_search()
+        chunks = cast(list[InferenceChunk], next(search_generator))
+        search_seconds = time.monotonic() - start
+        chunks_copy = copy.deepcopy(chunks)
+        yield chunks
+
+        start = time.monotonic()
+        llm_chunk_selection = cast(list[bool], next(search_generator))
+        search_seconds += time.monotonic() - start
+        yield llm_chunk_selection
+
+        if read_num is not None:
+            self._cache.put(
+                key,
+                _CachedSearchResult(
+                    chunks=chunks_copy,
+                    llm_chunk_selection=list(llm_chunk_selection),
+                    document_ids={chunk.document_id for chunk in chunks_copy},
+                    read_num=read_num,
+                    search_seconds=search_seconds,
+                ),
+            )
+
+    def stats(self) -> SearchResultCacheStats:
+        with self._lock:
+            return SearchResultCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                invalidated=self._invalidated,
+                latency_saved_seconds=self._latency_saved_seconds,
+            )
+
+
+_SEARCH_RESULT_CACHE: SearchResultCache | None = None
+_SEARCH_RESULT_CACHE_LOCK = threading.Lock()
+
+
+def get_search_result_cache() -> SearchResultCache | None:
+    if SEARCH_RESULT_CACHE_SIZE <= 0:
+        return None
+
+    global _SEARCH_RESULT_CACHE
+    with _SEARCH_RESULT_CACHE_LOCK:
+        if _SEARCH_RESULT_CACHE is None:
+            _SEARCH_RESULT_CACHE = SearchResultCache(
+                max_size=SEARCH_RESULT_CACHE_SIZE,
+                ttl_seconds=SEARCH_RESULT_CACHE_TTL,
+                refresh_interval=SEARCH_RESULT_CACHE_REFRESH_INTERVAL,
+            )
+        return _SEARCH_RESULT_CACHE
+
+
+def invalidate_cached_search_results(document_ids: list[str]) -> None:
+    """Called by whatever changes the indexed documents, in any process"""
+    if SEARCH_RESULT_CACHE_SIZE <= 0 or not document_ids:
+        return
+
+    try:
+        with Session(get_sqlalchemy_engine()) as db_session:
+            record_search_cache_invalidations(
+                document_ids=document_ids, db_session=db_session
+            )
+    except Exception as e:
+        # never fail indexing over the cache, results are stale for at most the TTL
+        logger.warning(f"Failed to record search cache invalidations: {e}")
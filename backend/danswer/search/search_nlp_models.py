@@ -19,9 +19,12 @@ from danswer.configs.model_configs import CROSS_EMBED_CONTEXT_SIZE
 from danswer.configs.model_configs import CROSS_ENCODER_MODEL_ENSEMBLE
 from danswer.configs.model_configs import DOC_EMBEDDING_CONTEXT_SIZE
 from danswer.configs.model_configs import DOCUMENT_ENCODER_MODEL
+from danswer.configs.model_configs import INFERENCE_BACKEND
 from danswer.configs.model_configs import INTENT_MODEL_VERSION
 from danswer.configs.model_configs import NORMALIZE_EMBEDDINGS
 from danswer.configs.model_configs import QUERY_MAX_CONTEXT_SIZE
+from danswer.search.onnx_models import OnnxCrossEncoder
+from danswer.search.onnx_models import OnnxEmbeddingModel
 from danswer.utils.logger import setup_logger
 from shared_models.model_server_models import EmbedRequest
 from shared_models.model_server_models import EmbedResponse
@@ -36,8 +39,8 @@ logging.getLogger("transformers").setLevel(logging.ERROR)
 
 
 _TOKENIZER: None | AutoTokenizer = None
-_EMBED_MODEL: None | SentenceTransformer = None
-_RERANK_MODELS: None | list[CrossEncoder] = None
+_EMBED_MODEL: None | SentenceTransformer | OnnxEmbeddingModel = None
+_RERANK_MODELS: None | list[CrossEncoder | OnnxCrossEncoder] = None
 _INTENT_TOKENIZER: None | AutoTokenizer = None
 _INTENT_MODEL: None | TFDistilBertForSequenceClassification = None
 
@@ -51,29 +54,52 @@ def get_default_tokenizer() -> AutoTokenizer:
     return _TOKENIZER
 
 
+def _use_onnx_backend(inference_backend: str) -> bool:
+    if inference_backend not in ("torch", "onnx", "onnx_int8"):
+        raise ValueError(f"Unknown inference backend: {inference_backend}")
+    return inference_backend != "torch"
+
+
 def get_local_embedding_model(
     model_name: str = DOCUMENT_ENCODER_MODEL,
     max_context_length: int = DOC_EMBEDDING_CONTEXT_SIZE,
-) -> SentenceTransformer:
+    inference_backend: str = INFERENCE_BACKEND,
+) -> SentenceTransformer | OnnxEmbeddingModel:
     global _EMBED_MODEL
     if _EMBED_MODEL is None or max_context_length != _EMBED_MODEL.max_seq_length:
-        logger.info(f"Loading {model_name}")
-        _EMBED_MODEL = SentenceTransformer(model_name)
-        _EMBED_MODEL.max_seq_length = max_context_length
+        logger.info(f"Loading {model_name} with the {inference_backend} backend")
+        if _use_onnx_backend(inference_backend):
+            _EMBED_MODEL = OnnxEmbeddingModel(
+                model_name=model_name,
+                max_seq_length=max_context_length,
+                quantize=inference_backend == "onnx_int8",
+            )
+        else:
+            _EMBED_MODEL = SentenceTransformer(model_name)
+            _EMBED_MODEL.max_seq_length = max_context_length
     return _EMBED_MODEL
 
 
 def get_local_reranking_model_ensemble(
     model_names: list[str] = CROSS_ENCODER_MODEL_ENSEMBLE,
     max_context_length: int = CROSS_EMBED_CONTEXT_SIZE,
-) -> list[CrossEncoder]:
+    inference_backend: str = INFERENCE_BACKEND,
+) -> list[CrossEncoder | OnnxCrossEncoder]:
     global _RERANK_MODELS
     if _RERANK_MODELS is None or max_context_length != _RERANK_MODELS[0].max_length:
         _RERANK_MODELS = []
         for model_name in model_names:
-            logger.info(f"Loading {model_name}")
-            model = CrossEncoder(model_name)
-            model.max_length = max_context_length
+            logger.info(f"Loading {model_name} with the {inference_backend} backend")
+            model: CrossEncoder | OnnxCrossEncoder
+            if _use_onnx_backend(inference_backend):
+                model = OnnxCrossEncoder(
+                    model_name=model_name,
+                    max_length=max_context_length,
+                    quantize=inference_backend == "onnx_int8",
+                )
+            else:
+                model = CrossEncoder(model_name)
+                model.max_length = max_context_length
             _RERANK_MODELS.append(model)
     return _RERANK_MODELS
 
@@ -142,7 +168,7 @@ class EmbeddingModel:
             else None
         )
 
-    def load_model(self) -> SentenceTransformer | None:
+    def load_model(self) -> SentenceTransformer | OnnxEmbeddingModel | None:
         if self.embed_server_endpoint:
             return None
 
@@ -196,7 +222,7 @@ class CrossEncoderEnsembleModel:
             else None
         )
 
-    def load_model(self) -> list[CrossEncoder] | None:
+    def load_model(self) -> list[CrossEncoder | OnnxCrossEncoder] | None:
         if self.rerank_server_endpoint:
             return None
 
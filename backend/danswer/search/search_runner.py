@@ -1,26 +1,36 @@
 import string
 from collections.abc import Callable
 from collections.abc import Iterator
+from datetime import timedelta
 from typing import cast
 
 import numpy
 from nltk.corpus import stopwords  # type:ignore
 from nltk.stem import WordNetLemmatizer  # type:ignore
 from nltk.tokenize import word_tokenize  # type:ignore
+from sqlalchemy.orm import Session
 
 from danswer.chat.models import LlmDoc
+from danswer.configs.app_configs import VESPA_CROSS_ENCODER_RERANKING
+from danswer.configs.chat_configs import ENABLE_SHARED_QUERY_EMBEDDING_CACHE
 from danswer.configs.chat_configs import HYBRID_ALPHA
 from danswer.configs.chat_configs import MULTILINGUAL_QUERY_EXPANSION
 from danswer.configs.chat_configs import NUM_RERANKED_RESULTS
+from danswer.configs.chat_configs import QUERY_EMBEDDING_CACHE_SIZE
+from danswer.configs.chat_configs import QUERY_EMBEDDING_CACHE_TTL
 from danswer.configs.model_configs import ASYM_QUERY_PREFIX
 from danswer.configs.model_configs import CROSS_ENCODER_RANGE_MAX
 from danswer.configs.model_configs import CROSS_ENCODER_RANGE_MIN
 from danswer.configs.model_configs import SIM_SCORE_RANGE_HIGH
 from danswer.configs.model_configs import SIM_SCORE_RANGE_LOW
+from danswer.db.engine import get_sqlalchemy_engine
+from danswer.db.query_embedding_cache import fetch_cached_query_embeddings
+from danswer.db.query_embedding_cache import store_cached_query_embeddings
 from danswer.document_index.document_index_utils import (
     translate_boost_count_to_multiplier,
 )
 from danswer.document_index.interfaces import DocumentIndex
+from danswer.indexing.embedding_cache import hash_embedding_text
 from danswer.indexing.models import InferenceChunk
 from danswer.search.models import ChunkMetric
 from danswer.search.models import IndexFilters
@@ -30,15 +40,20 @@ from danswer.search.models import RetrievalMetricsContainer
 from danswer.search.models import SearchDoc
 from danswer.search.models import SearchQuery
 from danswer.search.models import SearchType
+from danswer.search.search_cache import build_search_cache_key
+from danswer.search.search_cache import get_search_result_cache
 from danswer.search.search_nlp_models import CrossEncoderEnsembleModel
 from danswer.search.search_nlp_models import EmbeddingModel
 from danswer.secondary_llm_flows.chunk_usefulness import llm_batch_eval_chunks
 from danswer.secondary_llm_flows.query_expansion import multilingual_query_expansion
 from danswer.utils.logger import setup_logger
 from danswer.utils.threadpool_concurrency import FunctionCall
+from danswer.utils.threadpool_concurrency import MODEL_SERVER_EXECUTOR
 from danswer.utils.threadpool_concurrency import run_functions_in_parallel
 from danswer.utils.threadpool_concurrency import run_functions_tuples_in_parallel
+from danswer.utils.threadpool_concurrency import VESPA_EXECUTOR
 from danswer.utils.timing import log_function_time
+from danswer.utils.ttl_cache import TTLLRUCache
 
 
 logger = setup_logger()
@@ -76,12 +91,122 @@ def query_processing(
     return query
 
 
+# keyed on (model name, query prefix, normalized query)
+_QUERY_EMBEDDING_CACHE: TTLLRUCache[tuple[str, str, str], list[float]] = TTLLRUCache(
+    name="query_embedding",
+    max_size=QUERY_EMBEDDING_CACHE_SIZE,
+    ttl_seconds=QUERY_EMBEDDING_CACHE_TTL,
+)
+
+
+def _fetch_shared_query_embeddings(
+    model_name: str, prefix: str, normalized_queries: list[str]
+) -> dict[str, list[float]]:
+    try:
+        with Session(get_sqlalchemy_engine()) as db_session:
+            query_hashes = {
+                normalized_query: hash_embedding_text(normalized_query)
+                for normalized_query in normalized_queries
+            }
+            embeddings_by_hash = fetch_cached_query_embeddings(
+                model_name=model_name,
+                query_prefix=prefix,
+                query_hashes=list(query_hashes.values()),
+                ttl=timedelta(seconds=QUERY_EMBEDDING_CACHE_TTL),
+                db_session=db_session,
+            )
+            return {
+                normalized_query: embeddings_by_hash[query_hash]
+                for normalized_query, query_hash in query_hashes.items()
+                if query_hash in embeddings_by_hash
+            }
+    except Exception as e:
+        # the shared cache is only an optimization, never fail the search over it
+        logger.warning(f"Failed to read the shared query embedding cache: {e}")
+        return {}
+
+
+def _store_shared_query_embeddings(
+    model_name: str, prefix: str, embeddings_by_query: dict[str, list[float]]
+) -> None:
+    try:
+        with Session(get_sqlalchemy_engine()) as db_session:
+            store_cached_query_embeddings(
+                model_name=model_name,
+                query_prefix=prefix,
+                embeddings_by_hash={
+                    hash_embedding_text(normalized_query): embedding
+                    for normalized_query, embedding in embeddings_by_query.items()
+                },
+                db_session=db_session,
+            )
+    except Exception as e:
+        logger.warning(f"Failed to update the shared query embedding cache: {e}")
+
+
+def embed_queries(
+    queries: list[str],
+    prefix: str = ASYM_QUERY_PREFIX,
+) -> list[list[float]]:
+    """Embeds all the queries which are not cached in a single call to the model"""
+    embedding_model = EmbeddingModel()
+    # Only for the cache keys, so that trivially different queries share an entry. The
+    # model is still sent the query as it was written
+    normalized_queries = [" ".join(query.split()) for query in queries]
+    query_by_normalized: dict[str, str] = {}
+    for normalized_query, query in zip(normalized_queries, queries):
+        query_by_normalized.setdefault(normalized_query, query)
+
+    embeddings: dict[str, list[float]] = {}
+    for normalized_query in normalized_queries:
+        cached_embedding = _QUERY_EMBEDDING_CACHE.get(
+            (embedding_model.model_name, prefix, normalized_query)
+        )
+        if cached_embedding is not None:
+            embeddings[normalized_query] = cached_embedding
+
+    # dict to dedupe while keeping the order
+    cache_misses = list(
+        dict.fromkeys(query for query in normalized_queries if query not in embeddings)
+    )
+    missing_queries = cache_misses
+    if missing_queries and ENABLE_SHARED_QUERY_EMBEDDING_CACHE:
+        shared_embeddings = _fetch_shared_query_embeddings(
+            embedding_model.model_name, prefix, missing_queries
+        )
+        embeddings.update(shared_embeddings)
+        missing_queries = [
+            query for query in missing_queries if query not in shared_embeddings
+        ]
+
+    if missing_queries:
+        new_embeddings = dict(
+            zip(
+                missing_queries,
+                embedding_model.encode(
+                    [prefix + query_by_normalized[query] for query in missing_queries]
+                ),
+            )
+        )
+        embeddings.update(new_embeddings)
+        if ENABLE_SHARED_QUERY_EMBEDDING_CACHE:
+            _store_shared_query_embeddings(
+                embedding_model.model_name, prefix, new_embeddings
+            )
+
+    for normalized_query in cache_misses:
+        _QUERY_EMBEDDING_CACHE.put(
+            (embedding_model.model_name, prefix, normalized_query),
+            embeddings[normalized_query],
+        )
+    return [embeddings[normalized_query] for normalized_query in normalized_queries]
+
+
 def embed_query(
     query: str,
     prefix: str = ASYM_QUERY_PREFIX,
 ) -> list[float]:
-    prefixed_query = prefix + query
-    return EmbeddingModel().encode([prefixed_query])[0]
+    return embed_queries([query], prefix=prefix)[0]
 
 
 def chunks_to_search_docs(chunks: list[InferenceChunk] | None) -> list[SearchDoc]:
@@ -110,35 +235,13 @@ def chunks_to_search_docs(chunks: list[InferenceChunk] | None) -> list[SearchDoc
     return search_docs
 
 
-def combine_retrieval_results(
-    chunk_sets: list[list[InferenceChunk]],
-) -> list[InferenceChunk]:
-    all_chunks = [chunk for chunk_set in chunk_sets for chunk in chunk_set]
-
-    unique_chunks: dict[tuple[str, int], InferenceChunk] = {}
-    for chunk in all_chunks:
-        key = (chunk.document_id, chunk.chunk_id)
-        if key not in unique_chunks:
-            unique_chunks[key] = chunk
-            continue
-
-        stored_chunk_score = unique_chunks[key].score or 0
-        this_chunk_score = chunk.score or 0
-        if stored_chunk_score < this_chunk_score:
-            unique_chunks[key] = chunk
-
-    sorted_chunks = sorted(
-        unique_chunks.values(), key=lambda x: x.score or 0, reverse=True
-    )
-
-    return sorted_chunks
-
-
 @log_function_time()
 def doc_index_retrieval(
     query: SearchQuery,
     document_index: DocumentIndex,
     hybrid_alpha: float = HYBRID_ALPHA,
+    num_rerank: int | None = None,
+    query_rephrases: list[str] | None = None,
 ) -> list[InferenceChunk]:
     if query.search_type == SearchType.KEYWORD:
         top_chunks = document_index.keyword_retrieval(
@@ -146,6 +249,7 @@ def doc_index_retrieval(
             filters=query.filters,
             time_decay_multiplier=query.recency_bias_multiplier,
             num_to_retrieve=query.num_hits,
+            query_rephrases=query_rephrases,
         )
 
     elif query.search_type == SearchType.SEMANTIC:
@@ -154,6 +258,8 @@ def doc_index_retrieval(
             filters=query.filters,
             time_decay_multiplier=query.recency_bias_multiplier,
             num_to_retrieve=query.num_hits,
+            num_rerank=num_rerank,
+            query_rephrases=query_rephrases,
         )
 
     elif query.search_type == SearchType.HYBRID:
@@ -163,6 +269,8 @@ def doc_index_retrieval(
             time_decay_multiplier=query.recency_bias_multiplier,
             num_to_retrieve=query.num_hits,
             hybrid_alpha=hybrid_alpha,
+            num_rerank=num_rerank,
+            query_rephrases=query_rephrases,
         )
 
     else:
@@ -348,37 +456,43 @@ def retrieve_chunks(
     multilingual_expansion_str: str | None = MULTILINGUAL_QUERY_EXPANSION,
     retrieval_metrics_callback: Callable[[RetrievalMetricsContainer], None]
     | None = None,
+    rerank_in_index: bool = VESPA_CROSS_ENCODER_RERANKING,
 ) -> list[InferenceChunk]:
-    """Returns a list of the best chunks from an initial keyword/semantic/ hybrid search."""
-    # Don't do query expansion on complex queries, rephrasings likely would not work well
-    if not multilingual_expansion_str or "\n" in query.query or "\r" in query.query:
-        top_chunks = doc_index_retrieval(
-            query=query, document_index=document_index, hybrid_alpha=hybrid_alpha
-        )
-    else:
-        simplified_queries = set()
-        run_queries: list[tuple[Callable, tuple]] = []
+    """Returns a list of the best chunks from an initial keyword/semantic/ hybrid search.
 
+    With `rerank_in_index`, the document index reranks the top `query.num_rerank` hits
+    with the cross-encoder as part of the search."""
+    num_rerank = query.num_rerank if rerank_in_index and should_rerank(query) else None
+
+    query_rephrases: list[str] = []
+    # Don't do query expansion on complex queries, rephrasings likely would not work well
+    if (
+        multilingual_expansion_str
+        and "\n" not in query.query
+        and "\r" not in query.query
+    ):
+        simplified_queries = {_simplify_text(query.query)}
         # Currently only uses query expansion on multilingual use cases
-        query_rephrases = multilingual_query_expansion(
+        for rephrase in multilingual_query_expansion(
             query.query, multilingual_expansion_str
-        )
-        # Just to be extra sure, add the original query.
-        query_rephrases.append(query.query)
-        for rephrase in set(query_rephrases):
+        ):
             # Sometimes the model rephrases the query in the same language with minor changes
-            # Avoid doing an extra search with the minor changes as this biases the results
+            # Avoid searching for the minor changes as well as this biases the results
             simplified_rephrase = _simplify_text(rephrase)
             if simplified_rephrase in simplified_queries:
                 continue
             simplified_queries.add(simplified_rephrase)
+            query_rephrases.append(rephrase)
 
-            q_copy = query.copy(update={"query": rephrase}, deep=True)
-            run_queries.append(
-                (doc_index_retrieval, (q_copy, document_index, hybrid_alpha))
-            )
-        parallel_search_results = run_functions_tuples_in_parallel(run_queries)
-        top_chunks = combine_retrieval_results(parallel_search_results)
+    # The rephrasings are searched for in the same query as the original query, the
+    # index scores each chunk by its best match over all of them
+    top_chunks = doc_index_retrieval(
+        query=query,
+        document_index=document_index,
+        hybrid_alpha=hybrid_alpha,
+        num_rerank=num_rerank,
+        query_rephrases=query_rephrases or None,
+    )
 
     if not top_chunks:
         logger.info(
@@ -460,6 +574,7 @@ def full_chunk_search(
     retrieval_metrics_callback: Callable[[RetrievalMetricsContainer], None]
     | None = None,
     rerank_metrics_callback: Callable[[RerankMetricsContainer], None] | None = None,
+    rerank_in_index: bool = VESPA_CROSS_ENCODER_RERANKING,
 ) -> tuple[list[InferenceChunk], list[bool]]:
     """A utility which provides an easier interface than `full_chunk_search_generator`.
     Rather than returning the chunks and llm relevance filter results in two separate
@@ -471,6 +586,7 @@ def full_chunk_search(
         multilingual_expansion_str=multilingual_expansion_str,
         retrieval_metrics_callback=retrieval_metrics_callback,
         rerank_metrics_callback=rerank_metrics_callback,
+        rerank_in_index=rerank_in_index,
     )
     top_chunks = cast(list[InferenceChunk], next(search_generator))
     llm_chunk_selection = cast(list[bool], next(search_generator))
@@ -490,10 +606,54 @@ def full_chunk_search_generator(
     retrieval_metrics_callback: Callable[[RetrievalMetricsContainer], None]
     | None = None,
     rerank_metrics_callback: Callable[[RerankMetricsContainer], None] | None = None,
+    rerank_in_index: bool = VESPA_CROSS_ENCODER_RERANKING,
 ) -> Iterator[list[InferenceChunk] | list[bool]]:
     """Always yields twice. Once with the selected chunks and once with the LLM relevance filter result.
     If LLM filter results are turned off, returns a list of False
     """
+    search_result_cache = get_search_result_cache()
+
+    def _run_search() -> Iterator[list[InferenceChunk] | list[bool]]:
+        return _full_chunk_search_generator(
+            search_query=search_query,
+            document_index=document_index,
+            hybrid_alpha=hybrid_alpha,
+            multilingual_expansion_str=multilingual_expansion_str,
+            retrieval_metrics_callback=retrieval_metrics_callback,
+            rerank_metrics_callback=rerank_metrics_callback,
+            rerank_in_index=rerank_in_index,
+        )
+
+    # the metrics callbacks need an actual search to report on
+    if (
+        search_result_cache is None
+        or retrieval_metrics_callback is not None
+        or rerank_metrics_callback is not None
+    ):
+        yield from _run_search()
+        return
+
+    yield from search_result_cache.cached_search(
+        key=build_search_cache_key(
+            search_query=search_query,
+            hybrid_alpha=hybrid_alpha,
+            multilingual_expansion_str=multilingual_expansion_str,
+            rerank_in_index=rerank_in_index,
+        ),
+        run_search=_run_search,
+    )
+
+
+def _full_chunk_search_generator(
+    search_query: SearchQuery,
+    document_index: DocumentIndex,
+    hybrid_alpha: float = HYBRID_ALPHA,  # Only applicable to hybrid search
+    multilingual_expansion_str: str | None = MULTILINGUAL_QUERY_EXPANSION,
+    retrieval_metrics_callback: Callable[[RetrievalMetricsContainer], None]
+    | None = None,
+    rerank_metrics_callback: Callable[[RerankMetricsContainer], None] | None = None,
+    rerank_in_index: bool = VESPA_CROSS_ENCODER_RERANKING,
+) -> Iterator[list[InferenceChunk] | list[bool]]:
     chunks_yielded = False
 
     retrieved_chunks = retrieve_chunks(
@@ -502,6 +662,7 @@ def full_chunk_search_generator(
         hybrid_alpha=hybrid_alpha,
         multilingual_expansion_str=multilingual_expansion_str,
         retrieval_metrics_callback=retrieval_metrics_callback,
+        rerank_in_index=rerank_in_index,
     )
 
     if not retrieved_chunks:
@@ -512,7 +673,7 @@ def full_chunk_search_generator(
     post_processing_tasks: list[FunctionCall] = []
 
     rerank_task_id = None
-    if should_rerank(search_query):
+    if should_rerank(search_query) and not rerank_in_index:
         post_processing_tasks.append(
             FunctionCall(
                 rerank_chunks,
@@ -521,11 +682,17 @@ def full_chunk_search_generator(
                     retrieved_chunks,
                     rerank_metrics_callback,
                 ),
+                executor_name=MODEL_SERVER_EXECUTOR,
             )
         )
         rerank_task_id = post_processing_tasks[-1].result_id
     else:
         final_chunks = retrieved_chunks
+        if should_rerank(search_query):
+            # Already reranked by the document index, same as `rerank_chunks` the scores
+            # of the hits which were not reranked cannot be compared to the reranked ones
+            for lower_chunk in final_chunks[search_query.num_rerank :]:
+                lower_chunk.score = None
         # NOTE: if we don't rerank, we can return the chunks immediately
         # since we know this is the final order
         _log_top_chunk_links(search_query.search_type.value, final_chunks)
@@ -608,7 +775,7 @@ def inference_documents_from_ids(
     ]
 
     parallel_results = run_functions_tuples_in_parallel(
-        functions_with_args, allow_failures=True
+        functions_with_args, allow_failures=True, executor_name=VESPA_EXECUTOR
     )
 
     # Any failures to retrieve would give a None, drop the Nones and empty lists
@@ -1,14 +1,36 @@
+import threading
 from collections.abc import Callable
 
+from danswer.configs.chat_configs import LLM_CHUNK_FILTER_BATCH_SIZE
+from danswer.configs.chat_configs import LLM_CHUNK_FILTER_MAX_CONCURRENCY
 from danswer.llm.factory import get_default_llm
 from danswer.llm.utils import dict_based_prompt_to_langchain_prompt
+from danswer.prompts.llm_chunk_filter import BATCH_CHUNK_FILTER_PROMPT
 from danswer.prompts.llm_chunk_filter import CHUNK_FILTER_PROMPT
 from danswer.prompts.llm_chunk_filter import NONUSEFUL_PAT
+from danswer.prompts.llm_chunk_filter import SECTION_PAT
+from danswer.prompts.llm_chunk_filter import SECTION_USEFULNESS_KEY
 from danswer.utils.logger import setup_logger
+from danswer.utils.text_processing import extract_embedded_json
+from danswer.utils.threadpool_concurrency import LLM_EXECUTOR
 from danswer.utils.threadpool_concurrency import run_functions_tuples_in_parallel
 
 logger = setup_logger()
 
+# Shared by all of the queries served by this process so that a burst of queries doesn't
+# turn into a burst of requests against the (rate limited) fast LLM
+_LLM_CALL_SEMAPHORE = threading.BoundedSemaphore(LLM_CHUNK_FILTER_MAX_CONCURRENCY)
+
+
+def _invoke_fast_llm(messages: list[dict[str, str]], timeout: int) -> str:
+    filled_llm_prompt = dict_based_prompt_to_langchain_prompt(messages)
+    with _LLM_CALL_SEMAPHORE:
+        model_output = get_default_llm(use_fast_llm=True, timeout=timeout).invoke(
+            filled_llm_prompt
+        )
+    logger.debug(model_output)
+    return model_output
+
 
 def llm_eval_chunk(query: str, chunk_content: str) -> bool:
     def _get_usefulness_messages() -> list[dict[str, str]]:
@@ -31,20 +53,53 @@ def llm_eval_chunk(query: str, chunk_content: str) -> bool:
         return True
 
     messages = _get_usefulness_messages()
-    filled_llm_prompt = dict_based_prompt_to_langchain_prompt(messages)
     # When running in a batch, it takes as long as the longest thread
     # And when running a large batch, one may fail and take the whole timeout
     # instead cap it to 5 seconds
-    model_output = get_default_llm(use_fast_llm=True, timeout=5).invoke(
-        filled_llm_prompt
-    )
-    logger.debug(model_output)
+    model_output = _invoke_fast_llm(messages, timeout=5)
 
     return _extract_usefulness(model_output)
 
 
-def llm_batch_eval_chunks(
-    query: str, chunk_contents: list[str], use_threads: bool = True
+def extract_batch_usefulness(model_output: str, num_chunks: int) -> list[bool] | None:
+    """None if the output isn't exactly one boolean per chunk"""
+    try:
+        usefulness = extract_embedded_json(model_output).get(SECTION_USEFULNESS_KEY)
+    except ValueError:
+        return None
+
+    if not isinstance(usefulness, list) or len(usefulness) != num_chunks:
+        return None
+    if not all(isinstance(useful, bool) for useful in usefulness):
+        return None
+    return usefulness
+
+
+def llm_eval_chunk_batch(query: str, chunk_contents: list[str]) -> list[bool] | None:
+    """Scores all of the chunks with a single LLM call, returns None if the LLM output
+    could not be parsed"""
+    numbered_sections = "\n\n".join(
+        f"{SECTION_PAT.format(section_num=ind + 1)}\n```\n{chunk_content}\n```"
+        for ind, chunk_content in enumerate(chunk_contents)
+    )
+    messages = [
+        {
+            "role": "user",
+            "content": BATCH_CHUNK_FILTER_PROMPT.format(
+                numbered_sections=numbered_sections,
+                user_query=query,
+                num_sections=len(chunk_contents),
+            ),
+        },
+    ]
+    # Longer prompt and output than for a single chunk, but still one call instead of many
+    model_output = _invoke_fast_llm(messages, timeout=10)
+
+    return extract_batch_usefulness(model_output, len(chunk_contents))
+
+
+def _llm_eval_chunks_one_per_call(
+    query: str, chunk_contents: list[str], use_threads: bool
 ) -> list[bool]:
     if use_threads:
         functions_with_args: list[tuple[Callable, tuple]] = [
@@ -54,8 +109,12 @@ def llm_batch_eval_chunks(
         logger.debug(
             "Running LLM usefulness eval in parallel (following logging may be out of order)"
         )
+        # No point in more threads than concurrent LLM calls
         parallel_results = run_functions_tuples_in_parallel(
-            functions_with_args, allow_failures=True
+            functions_with_args,
+            allow_failures=True,
+            max_workers=LLM_CHUNK_FILTER_MAX_CONCURRENCY,
+            executor_name=LLM_EXECUTOR,
         )
 
         # In case of failure/timeout, don't throw out the chunk
@@ -65,3 +124,54 @@ def llm_batch_eval_chunks(
         return [
             llm_eval_chunk(query, chunk_content) for chunk_content in chunk_contents
         ]
+
+
+def _llm_eval_chunks_in_batch(
+    query: str, chunk_contents: list[str], use_threads: bool
+) -> list[bool]:
+    try:
+        usefulness = llm_eval_chunk_batch(query, chunk_contents)
+    except Exception as e:
+        # Same as for a single chunk, a failure/timeout doesn't throw out the chunks
+        logger.exception(f"LLM usefulness eval of a batch of chunks failed due to {e}")
+        return [True] * len(chunk_contents)
+
+    if usefulness is None:
+        logger.warning(
+            "LLM failed to provide a valid batch usefulness output, "
+            "falling back to evaluating the chunks one at a time"
+        )
+        return _llm_eval_chunks_one_per_call(query, chunk_contents, use_threads)
+
+    return usefulness
+
+
+def llm_batch_eval_chunks(
+    query: str,
+    chunk_contents: list[str],
+    use_threads: bool = True,
+    batch_size: int = LLM_CHUNK_FILTER_BATCH_SIZE,
+) -> list[bool]:
+    if batch_size <= 1:
+        return _llm_eval_chunks_one_per_call(query, chunk_contents, use_threads)
+
+    batches = [
+        chunk_contents[start : start + batch_size]
+        for start in range(0, len(chunk_contents), batch_size)
+    ]
+
+    if use_threads and len(batches) > 1:
+        # Not on the LLM executor, the batches wait on it for the per chunk fallback
+        batch_results = run_functions_tuples_in_parallel(
+            [
+                (_llm_eval_chunks_in_batch, (query, batch, use_threads))
+                for batch in batches
+            ],
+            max_workers=LLM_CHUNK_FILTER_MAX_CONCURRENCY,
+        )
+    else:
+        batch_results = [
+            _llm_eval_chunks_in_batch(query, batch, use_threads) for batch in batches
+        ]
+
+    return [useful for batch_result in batch_results for useful in batch_result]
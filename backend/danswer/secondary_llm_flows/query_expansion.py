@@ -10,6 +10,7 @@ from danswer.prompts.chat_prompts import HISTORY_QUERY_REPHRASE
 from danswer.prompts.miscellaneous_prompts import LANGUAGE_REPHRASE_PROMPT
 from danswer.utils.logger import setup_logger
 from danswer.utils.text_processing import count_punctuation
+from danswer.utils.threadpool_concurrency import LLM_EXECUTOR
 from danswer.utils.threadpool_concurrency import run_functions_tuples_in_parallel
 
 logger = setup_logger()
@@ -49,7 +50,9 @@ def multilingual_query_expansion(
             for language in languages
         ]
 
-        query_rephrases = run_functions_tuples_in_parallel(functions_with_args)
+        query_rephrases = run_functions_tuples_in_parallel(
+            functions_with_args, executor_name=LLM_EXECUTOR
+        )
         return query_rephrases
 
     else:
@@ -114,20 +117,42 @@ def history_based_query_rephrase(
     return rephrased_query
 
 
-def thread_based_query_rephrase(
+def thread_query_needs_rephrase(
     user_query: str,
     history_str: str,
-    llm: LLM | None = None,
     size_heuristic: int = 200,
     punctuation_heuristic: int = 10,
-) -> str:
-    if not history_str:
-        return user_query
+    require_history: bool = True,
+) -> bool:
+    """With `require_history` False the query is rephrased even if it is the first one,
+    as is done for chat"""
+    if require_history and not history_str:
+        return False
 
     if len(user_query) >= size_heuristic:
-        return user_query
+        return False
 
     if count_punctuation(user_query) >= punctuation_heuristic:
+        return False
+
+    return True
+
+
+def thread_based_query_rephrase(
+    user_query: str,
+    history_str: str,
+    llm: LLM | None = None,
+    size_heuristic: int = 200,
+    punctuation_heuristic: int = 10,
+    require_history: bool = True,
+) -> str:
+    if not thread_query_needs_rephrase(
+        user_query=user_query,
+        history_str=history_str,
+        size_heuristic=size_heuristic,
+        punctuation_heuristic=punctuation_heuristic,
+        require_history=require_history,
+    ):
         return user_query
 
     prompt_msgs = get_contextual_rephrase_messages(
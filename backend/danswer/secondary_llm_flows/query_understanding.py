@@ -0,0 +1,184 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from danswer.configs.chat_configs import QUERY_UNDERSTANDING_CACHE_SIZE
+from danswer.configs.chat_configs import QUERY_UNDERSTANDING_CACHE_TTL
+from danswer.configs.constants import DocumentSource
+from danswer.llm.factory import get_default_llm
+from danswer.llm.interfaces import LLM
+from danswer.llm.utils import dict_based_prompt_to_langchain_prompt
+from danswer.prompts.constants import REPHRASED_QUERY_KEY
+from danswer.prompts.constants import SOURCES_KEY
+from danswer.prompts.filter_extration import FILE_SOURCE_WARNING
+from danswer.prompts.filter_extration import QUERY_UNDERSTANDING_PROMPT
+from danswer.prompts.filter_extration import QUERY_UNDERSTANDING_REPHRASE_SECTION
+from danswer.prompts.filter_extration import QUERY_UNDERSTANDING_SOURCE_SECTION
+from danswer.prompts.filter_extration import QUERY_UNDERSTANDING_TIME_SECTION
+from danswer.prompts.filter_extration import WEB_SOURCE_WARNING
+from danswer.prompts.prompt_utils import get_current_llm_day_time
+from danswer.secondary_llm_flows.source_filter import strings_to_document_sources
+from danswer.secondary_llm_flows.time_filter import time_filter_from_llm_json
+from danswer.utils.logger import setup_logger
+from danswer.utils.text_processing import extract_embedded_json
+from danswer.utils.timing import log_function_time
+from danswer.utils.ttl_cache import TTLLRUCache
+
+logger = setup_logger()
+
+_TIME_FILTER_KEYS = ["filter_type", "filter_value", "value_multiple", "date"]
+
+
+@dataclass
+class QueryUnderstanding:
+    rephrased_query: str
+    time_cutoff: datetime | None
+    favor_recent: bool
+    source_filters: list[DocumentSource] | None
+
+
+# The parsed LLM output is cached rather than the result so that relative time filters
+# (e.g. "last two weeks") are computed from the current time on every hit
+_QUERY_UNDERSTANDING_CACHE: TTLLRUCache[tuple, dict] = TTLLRUCache(
+    name="query_understanding",
+    max_size=QUERY_UNDERSTANDING_CACHE_SIZE,
+    ttl_seconds=QUERY_UNDERSTANDING_CACHE_TTL,
+)
+
+
+def _get_query_understanding_messages(
+    query: str,
+    history_str: str | None,
+    detect_time_filter: bool,
+    valid_sources: list[DocumentSource] | None,
+) -> list[dict[str, str]]:
+    task_sections: list[str] = []
+    json_keys: list[str] = []
+
+    if history_str is not None:
+        task_sections.append(
+            QUERY_UNDERSTANDING_REPHRASE_SECTION.format(chat_history=history_str)
+        )
+        json_keys.append(REPHRASED_QUERY_KEY)
+
+    if detect_time_filter:
+        task_sections.append(QUERY_UNDERSTANDING_TIME_SECTION)
+        json_keys.extend(_TIME_FILTER_KEYS)
+
+    if valid_sources:
+        task_sections.append(
+            QUERY_UNDERSTANDING_SOURCE_SECTION.format(
+                valid_sources=[s.value for s in valid_sources],
+                web_source_warning=WEB_SOURCE_WARNING
+                if DocumentSource.WEB in valid_sources
+                else "",
+                file_source_warning=FILE_SOURCE_WARNING
+                if DocumentSource.FILE in valid_sources
+                else "",
+            )
+        )
+        json_keys.append(SOURCES_KEY)
+
+    return [
+        {
+            "role": "system",
+            "content": QUERY_UNDERSTANDING_PROMPT.format(
+                current_day_time_str=get_current_llm_day_time(),
+                task_sections="\n\n".join(task_sections),
+                json_keys=", ".join(f'"{key}"' for key in json_keys),
+            ),
+        },
+        {"role": "user", "content": query},
+    ]
+
+
+def query_understanding_from_llm_json(
+    model_json: dict,
+    query: str,
+    rephrase: bool,
+    detect_time_filter: bool,
+    detect_source_filter: bool,
+) -> QueryUnderstanding | None:
+    """Returns None if a requested part is missing or malformed"""
+    rephrased_query = query
+    if rephrase:
+        model_rephrase = model_json.get(REPHRASED_QUERY_KEY)
+        if not isinstance(model_rephrase, str) or not model_rephrase.strip():
+            return None
+        rephrased_query = model_rephrase.strip()
+
+    time_cutoff, favor_recent = (
+        time_filter_from_llm_json(model_json) if detect_time_filter else (None, False)
+    )
+
+    source_filters = None
+    if detect_source_filter:
+        sources_list = model_json.get(SOURCES_KEY)
+        if sources_list is not None and not isinstance(sources_list, list):
+            return None
+        if sources_list:
+            source_filters = strings_to_document_sources(sources_list) or None
+
+    return QueryUnderstanding(
+        rephrased_query=rephrased_query,
+        time_cutoff=time_cutoff,
+        favor_recent=favor_recent,
+        source_filters=source_filters,
+    )
+
+
+@log_function_time()
+def get_query_understanding(
+    query: str,
+    history_str: str | None,
+    detect_time_filter: bool,
+    valid_sources: list[DocumentSource] | None,
+    llm: LLM | None = None,
+) -> QueryUnderstanding | None:
+    """Rephrases the query with the chat history (if history_str is not None) and extracts
+    the time filter and the source filter (if valid_sources are given) with a single LLM
+    call. Returns None if the LLM output is invalid, in which case the separate flows in
+    query_expansion.py, time_filter.py and source_filter.py should be used instead"""
+    rephrase = history_str is not None
+    detect_source_filter = bool(valid_sources)
+
+    # different LLMs (e.g. of different personas) don't share their outputs, no LLM
+    # means the default one
+    cache_key = (
+        llm.model_name if llm is not None else None,
+        query,
+        history_str,
+        detect_time_filter,
+        frozenset(valid_sources) if valid_sources else None,
+    )
+    model_json = _QUERY_UNDERSTANDING_CACHE.get(cache_key)
+
+    if model_json is None:
+        messages = _get_query_understanding_messages(
+            query=query,
+            history_str=history_str,
+            detect_time_filter=detect_time_filter,
+            valid_sources=valid_sources,
+        )
+        filled_llm_prompt = dict_based_prompt_to_langchain_prompt(messages)
+        model_output = (llm or get_default_llm()).invoke(filled_llm_prompt)
+        logger.debug(model_output)
+
+        try:
+            model_json = extract_embedded_json(model_output)
+        except ValueError:
+            logger.warning("LLM failed to provide a valid Query Understanding output")
+            return None
+
+    query_understanding = query_understanding_from_llm_json(
+        model_json=model_json,
+        query=query,
+        rephrase=rephrase,
+        detect_time_filter=detect_time_filter,
+        detect_source_filter=detect_source_filter,
+    )
+    if query_understanding is None:
+        logger.warning("LLM failed to provide a valid Query Understanding output")
+        return None
+
+    _QUERY_UNDERSTANDING_CACHE.put(cache_key, model_json)
+    return query_understanding
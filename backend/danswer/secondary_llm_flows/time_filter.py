@@ -40,6 +40,62 @@ def best_match_time(time_str: str) -> datetime | None:
         return None
 
 
+def time_filter_from_llm_json(model_json: dict) -> tuple[datetime | None, bool]:
+    """Returns a datetime for a hard cutoff and a bool for if the more recent documents
+    should be favored. Shared with the combined query understanding flow"""
+    # If filter type is not present, just assume something has gone wrong
+    # Potentially model has identified a date and just returned that but
+    # better to be conservative and not identify the wrong filter.
+    filter_type = model_json.get("filter_type")
+    if not isinstance(filter_type, str):
+        return None, False
+
+    if "hard" in filter_type or "recent" in filter_type:
+        favor_recent = "recent" in filter_type
+
+        if isinstance(model_json.get("date"), str):
+            extracted_time = best_match_time(model_json["date"])
+            if extracted_time is not None:
+                # LLM struggles to understand the concept of not sensitive within a time range
+                # So if a time is extracted, just go with that alone
+                return extracted_time, False
+
+        time_diff = None
+        multiplier = 1.0
+
+        if "value_multiple" in model_json:
+            try:
+                multiplier = float(model_json["value_multiple"])
+            except (TypeError, ValueError):
+                pass
+
+        if isinstance(model_json.get("filter_value"), str):
+            filter_value = model_json["filter_value"]
+            if "day" in filter_value:
+                time_diff = timedelta(days=multiplier)
+            elif "week" in filter_value:
+                time_diff = timedelta(weeks=multiplier)
+            elif "month" in filter_value:
+                # Have to just use the average here, too complicated to calculate exact day
+                # based on current day etc.
+                time_diff = timedelta(days=multiplier * 30.437)
+            elif "quarter" in filter_value:
+                time_diff = timedelta(days=multiplier * 91.25)
+            elif "year" in filter_value:
+                time_diff = timedelta(days=multiplier * 365)
+
+        if time_diff is not None:
+            current = datetime.now(timezone.utc)
+            # LLM struggles to understand the concept of not sensitive within a time range
+            # So if a time is extracted, just go with that alone
+            return current - time_diff, False
+
+        # If we failed to extract a hard filter, just pass back the value of favor recent
+        return None, favor_recent
+
+    return None, False
+
+
 @log_function_time()
 def extract_time_filter(query: str) -> tuple[datetime | None, bool]:
     """Returns a datetime if a hard time filter should be applied for the given query
@@ -87,72 +143,17 @@ def extract_time_filter(query: str) -> tuple[datetime | None, bool]:
         ]
         return messages
 
-    def _extract_time_filter_from_llm_out(
-        model_out: str,
-    ) -> tuple[datetime | None, bool]:
-        """Returns a datetime for a hard cutoff and a bool for if the"""
-        try:
-            model_json = json.loads(model_out, strict=False)
-        except json.JSONDecodeError:
-            return None, False
-
-        # If filter type is not present, just assume something has gone wrong
-        # Potentially model has identified a date and just returned that but
-        # better to be conservative and not identify the wrong filter.
-        if "filter_type" not in model_json:
-            return None, False
-
-        if "hard" in model_json["filter_type"] or "recent" in model_json["filter_type"]:
-            favor_recent = "recent" in model_json["filter_type"]
-
-            if "date" in model_json:
-                extracted_time = best_match_time(model_json["date"])
-                if extracted_time is not None:
-                    # LLM struggles to understand the concept of not sensitive within a time range
-                    # So if a time is extracted, just go with that alone
-                    return extracted_time, False
-
-            time_diff = None
-            multiplier = 1.0
-
-            if "value_multiple" in model_json:
-                try:
-                    multiplier = float(model_json["value_multiple"])
-                except ValueError:
-                    pass
-
-            if "filter_value" in model_json:
-                filter_value = model_json["filter_value"]
-                if "day" in filter_value:
-                    time_diff = timedelta(days=multiplier)
-                elif "week" in filter_value:
-                    time_diff = timedelta(weeks=multiplier)
-                elif "month" in filter_value:
-                    # Have to just use the average here, too complicated to calculate exact day
-                    # based on current day etc.
-                    time_diff = timedelta(days=multiplier * 30.437)
-                elif "quarter" in filter_value:
-                    time_diff = timedelta(days=multiplier * 91.25)
-                elif "year" in filter_value:
-                    time_diff = timedelta(days=multiplier * 365)
-
-            if time_diff is not None:
-                current = datetime.now(timezone.utc)
-                # LLM struggles to understand the concept of not sensitive within a time range
-                # So if a time is extracted, just go with that alone
-                return current - time_diff, False
-
-            # If we failed to extract a hard filter, just pass back the value of favor recent
-            return None, favor_recent
-
-        return None, False
-
     messages = _get_time_filter_messages(query)
     filled_llm_prompt = dict_based_prompt_to_langchain_prompt(messages)
     model_output = get_default_llm().invoke(filled_llm_prompt)
     logger.debug(model_output)
 
-    return _extract_time_filter_from_llm_out(model_output)
+    try:
+        model_json = json.loads(model_output, strict=False)
+    except json.JSONDecodeError:
+        return None, False
+
+    return time_filter_from_llm_json(model_json)
 
 
 if __name__ == "__main__":
@@ -25,12 +25,18 @@ from danswer.dynamic_configs.interface import ConfigNotFoundError
 from danswer.llm.factory import get_default_llm
 from danswer.llm.utils import get_gen_ai_api_key
 from danswer.llm.utils import test_llm
+from danswer.search.search_cache import get_search_result_cache
 from danswer.server.documents.models import ConnectorCredentialPairIdentifier
 from danswer.server.manage.models import BoostDoc
 from danswer.server.manage.models import BoostUpdateRequest
+from danswer.server.manage.models import CacheStatsSnapshot
+from danswer.server.manage.models import ExecutorStatsSnapshot
 from danswer.server.manage.models import HiddenUpdateRequest
+from danswer.server.manage.models import SearchResultCacheStatsSnapshot
 from danswer.server.models import ApiKey
 from danswer.utils.logger import setup_logger
+from danswer.utils.threadpool_concurrency import get_executor_stats
+from danswer.utils.ttl_cache import get_cache_stats
 
 router = APIRouter(prefix="/manage")
 logger = setup_logger()
@@ -39,6 +45,63 @@ logger = setup_logger()
 """Admin only API endpoints"""
 
 
+@router.get("/admin/cache-stats")
+def get_in_process_cache_stats(
+    _: User | None = Depends(current_admin_user),
+) -> dict[str, CacheStatsSnapshot]:
+    """Stats of the in-memory caches of the API server process handling the request"""
+    return {
+        name: CacheStatsSnapshot(
+            size=stats.size,
+            max_size=stats.max_size,
+            hits=stats.hits,
+            misses=stats.misses,
+            hit_rate=stats.hit_rate,
+        )
+        for name, stats in get_cache_stats().items()
+    }
+
+
+@router.get("/admin/search-cache-stats")
+def get_search_result_cache_stats(
+    _: User | None = Depends(current_admin_user),
+) -> SearchResultCacheStatsSnapshot | None:
+    """Stats of the search result cache of the API server process handling the request,
+    None if the cache is disabled. `latency_saved_seconds` sums the search time of the
+    cached results over all the hits"""
+    search_result_cache = get_search_result_cache()
+    if search_result_cache is None:
+        return None
+
+    stats = search_result_cache.stats()
+    return SearchResultCacheStatsSnapshot(
+        hits=stats.hits,
+        misses=stats.misses,
+        invalidated=stats.invalidated,
+        hit_rate=stats.hit_rate,
+        latency_saved_seconds=stats.latency_saved_seconds,
+    )
+
+
+@router.get("/admin/executor-stats")
+def get_executor_stats_snapshot(
+    _: User | None = Depends(current_admin_user),
+) -> dict[str, ExecutorStatsSnapshot]:
+    """Stats of the shared executors of the API server process handling the request, the
+    wait times are from a task being submitted to a worker picking it up"""
+    return {
+        name: ExecutorStatsSnapshot(
+            max_workers=stats.max_workers,
+            queued=stats.queued,
+            active=stats.active,
+            completed=stats.completed,
+            avg_wait_seconds=stats.avg_wait_seconds,
+            max_wait_seconds=stats.max_wait_seconds,
+        )
+        for name, stats in get_executor_stats().items()
+    }
+
+
 @router.get("/admin/doc-boosts")
 def get_most_boosted_docs(
     ascending: bool,
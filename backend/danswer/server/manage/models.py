@@ -37,6 +37,31 @@ class UserRoleResponse(BaseModel):
     role: str
 
 
+class CacheStatsSnapshot(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+class SearchResultCacheStatsSnapshot(BaseModel):
+    hits: int
+    misses: int
+    invalidated: int
+    hit_rate: float
+    latency_saved_seconds: float
+
+
+class ExecutorStatsSnapshot(BaseModel):
+    max_workers: int
+    queued: int
+    active: int
+    completed: int
+    avg_wait_seconds: float
+    max_wait_seconds: float
+
+
 class BoostDoc(BaseModel):
     document_id: str
     semantic_id: str
@@ -0,0 +1,35 @@
+"""Multiprocessing only stops the processes it started when their parent exits if they
+are daemonic, and only if the parent exits normally. Processes which run a process pool
+of their own (e.g. the indexing jobs with a chunking pool) can't be daemonic, so they
+watch their parent themselves."""
+import multiprocessing
+import os
+import threading
+import time
+
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+_PARENT_CHECK_INTERVAL = 5.0
+
+
+def _watch_parent(parent_pid: int, check_interval: float) -> None:
+    while os.getppid() == parent_pid:
+        time.sleep(check_interval)
+
+    logger.error(f"Parent process {parent_pid} exited, stopping process {os.getpid()}")
+    for child in multiprocessing.active_children():
+        child.terminate()
+    os._exit(1)
+
+
+def exit_with_parent(check_interval: float = _PARENT_CHECK_INTERVAL) -> None:
+    """Called at the start of a process, terminates the processes it started and exits
+    once the process which started it is gone, even if that one was killed"""
+    threading.Thread(
+        target=_watch_parent,
+        args=(os.getppid(), check_interval),
+        name="parent-watchdog",
+        daemon=True,
+    ).start()
@@ -1,22 +1,227 @@
+import contextvars
+import os
+import queue
+import threading
+import time
 import uuid
 from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
 from concurrent.futures import as_completed
+from concurrent.futures import Future
 from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
 from typing import Any
 from typing import Generic
 from typing import TypeVar
 
+from danswer.configs.app_configs import DEFAULT_EXECUTOR_MAX_WORKERS
+from danswer.configs.app_configs import LLM_EXECUTOR_MAX_WORKERS
+from danswer.configs.app_configs import MODEL_SERVER_EXECUTOR_MAX_WORKERS
+from danswer.configs.app_configs import VESPA_EXECUTOR_MAX_WORKERS
 from danswer.utils.logger import setup_logger
 
 logger = setup_logger()
 
 R = TypeVar("R")
 
+# Names of the shared executors, see `get_executor`
+DEFAULT_EXECUTOR = "default"
+VESPA_EXECUTOR = "vespa"
+LLM_EXECUTOR = "llm"
+MODEL_SERVER_EXECUTOR = "model_server"
+
+# how often threads blocked on a pipeline queue check whether the pipeline was stopped
+_PIPELINE_POLL_INTERVAL = 0.1  # in seconds
+
+
+@dataclass
+class ExecutorStats:
+    max_workers: int
+    # tasks submitted but not picked up by a worker yet
+    queued: int
+    active: int
+    completed: int
+    total_wait_seconds: float
+    max_wait_seconds: float
+
+    @property
+    def avg_wait_seconds(self) -> float:
+        started = self.active + self.completed
+        return self.total_wait_seconds / started if started else 0.0
+
+
+class NamedExecutor:
+    """
+    Long lived thread pool shared by every caller in the process, so that the number of
+    threads doing a given kind of work (e.g. calling Vespa) is capped for the whole process
+    rather than per call. The contextvars of the submitting thread are propagated to the
+    task.
+    """
+
+    def __init__(self, name: str, max_workers: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"{name}-executor",
+            initializer=self._mark_worker_thread,
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._total_wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    def _mark_worker_thread(self) -> None:
+        _worker_thread_state.executor_name = self.name
+
+    def in_worker_thread(self) -> bool:
+        return getattr(_worker_thread_state, "executor_name", None) == self.name
+
+    def submit(self, func: Callable[..., R], *args: Any, **kwargs: Any) -> Future[R]:
+        with self._lock:
+            self._queued += 1
+        return self._submit_queued(func, *args, **kwargs)
+
+    def try_submit(
+        self, func: Callable[..., R], *args: Any, **kwargs: Any
+    ) -> Future[R] | None:
+        """Only submits if a worker is free to pick the call up right away, i.e. it is
+        not queued behind other calls"""
+        with self._lock:
+            if self._active + self._queued >= self.max_workers:
+                return None
+            self._queued += 1
+        return self._submit_queued(func, *args, **kwargs)
+
+    def _submit_queued(
+        self, func: Callable[..., R], *args: Any, **kwargs: Any
+    ) -> Future[R]:
+        context = contextvars.copy_context()
+        submitted_at = time.monotonic()
+
+        def _run() -> R:
+            wait_seconds = time.monotonic() - submitted_at
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._total_wait_seconds += wait_seconds
+                self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+            try:
+                return context.run(func, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        return self._executor.submit(_run)
+
+    def stats(self) -> ExecutorStats:
+        with self._lock:
+            return ExecutorStats(
+                max_workers=self.max_workers,
+                queued=self._queued,
+                active=self._active,
+                completed=self._completed,
+                total_wait_seconds=self._total_wait_seconds,
+                max_wait_seconds=self._max_wait_seconds,
+            )
+
+
+_EXECUTOR_MAX_WORKERS = {
+    DEFAULT_EXECUTOR: DEFAULT_EXECUTOR_MAX_WORKERS,
+    VESPA_EXECUTOR: VESPA_EXECUTOR_MAX_WORKERS,
+    LLM_EXECUTOR: LLM_EXECUTOR_MAX_WORKERS,
+    MODEL_SERVER_EXECUTOR: MODEL_SERVER_EXECUTOR_MAX_WORKERS,
+}
+_EXECUTORS: dict[str, NamedExecutor] = {}
+_EXECUTORS_LOCK = threading.Lock()
+_worker_thread_state = threading.local()
+
+
+def _reset_executors_after_fork() -> None:
+    # the worker threads of the parent process don't exist in the child
+    global _EXECUTORS_LOCK
+    _EXECUTORS_LOCK = threading.Lock()
+    _EXECUTORS.clear()
+
+
+os.register_at_fork(after_in_child=_reset_executors_after_fork)
+
+
+def get_executor(name: str = DEFAULT_EXECUTOR) -> NamedExecutor:
+    with _EXECUTORS_LOCK:
+        if name not in _EXECUTORS:
+            _EXECUTORS[name] = NamedExecutor(
+                name=name,
+                max_workers=_EXECUTOR_MAX_WORKERS.get(
+                    name, DEFAULT_EXECUTOR_MAX_WORKERS
+                ),
+            )
+        return _EXECUTORS[name]
+
+
+def get_executor_stats() -> dict[str, ExecutorStats]:
+    with _EXECUTORS_LOCK:
+        return {name: executor.stats() for name, executor in _EXECUTORS.items()}
+
+
+def _execute_calls(
+    calls: list[tuple[Callable[[], Any], str]], max_workers: int | None = None
+) -> Iterator[tuple[int, Future]]:
+    """Runs each call on the named executor it is paired with, yields the index and the
+    done future of each call in order of completion"""
+    inline_calls: list[tuple[int, Callable[[], Any]]] = []
+    future_to_index: dict[Future, int] = {}
+    # caps the calls of this batch running at once, on top of the executor's own cap
+    window = threading.BoundedSemaphore(max_workers) if max_workers else None
+
+    for index, (call, executor_name) in enumerate(calls):
+        executor = get_executor(executor_name)
+        if window is not None:
+            window.acquire()
+
+        future: Future | None
+        if executor.in_worker_thread():
+            # The caller holds one of the executor's workers already, waiting on calls
+            # queued behind other calls would deadlock once every worker is held by such
+            # a caller. So only the calls that a free worker picks up right away are
+            # submitted, the rest run in the caller's thread
+            future = executor.try_submit(call)
+        else:
+            future = executor.submit(call)
+
+        if future is None:
+            if window is not None:
+                window.release()
+            inline_calls.append((index, call))
+            continue
+
+        if window is not None:
+            release = window.release
+            future.add_done_callback(lambda _: release())
+        future_to_index[future] = index
+
+    for index, call in inline_calls:
+        inline_future: Future = Future()
+        try:
+            inline_future.set_result(call())
+        except Exception as e:
+            inline_future.set_exception(e)
+        yield index, inline_future
+
+    for future in as_completed(future_to_index):
+        yield future_to_index[future], future
+
 
 def run_functions_tuples_in_parallel(
     functions_with_args: list[tuple[Callable, tuple]],
     allow_failures: bool = False,
     max_workers: int | None = None,
+    executor_name: str = DEFAULT_EXECUTOR,
 ) -> list[Any]:
     """
     Executes multiple functions in parallel and returns a list of the results for each function.
@@ -24,37 +229,25 @@ def run_functions_tuples_in_parallel(
     Args:
         functions_with_args: List of tuples each containing the function callable and a tuple of arguments.
         allow_failures: if set to True, then the function result will just be None
-        max_workers: Max number of worker threads
+        max_workers: Max number of these functions running at once
+        executor_name: The shared executor to run the functions on, see `get_executor`
 
     Returns:
-        dict: A dictionary mapping function names to their results or error messages.
+        list: The results of the functions, in the same order as the functions.
     """
-    workers = (
-        min(max_workers, len(functions_with_args))
-        if max_workers is not None
-        else len(functions_with_args)
-    )
-
-    if workers <= 0:
-        return []
-
     results = []
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        future_to_index = {
-            executor.submit(func, *args): i
-            for i, (func, args) in enumerate(functions_with_args)
-        }
-
-        for future in as_completed(future_to_index):
-            index = future_to_index[future]
-            try:
-                results.append((index, future.result()))
-            except Exception as e:
-                logger.exception(f"Function at index {index} failed due to {e}")
-                results.append((index, None))
+    for index, future in _execute_calls(
+        [(partial(func, *args), executor_name) for func, args in functions_with_args],
+        max_workers=max_workers,
+    ):
+        try:
+            results.append((index, future.result()))
+        except Exception as e:
+            logger.exception(f"Function at index {index} failed due to {e}")
+            results.append((index, None))
 
-                if not allow_failures:
-                    raise
+            if not allow_failures:
+                raise
 
     results.sort(key=lambda x: x[0])
     return [result for index, result in results]
@@ -67,11 +260,16 @@ class FunctionCall(Generic[R]):
     """
 
     def __init__(
-        self, func: Callable[..., R], args: tuple = (), kwargs: dict | None = None
+        self,
+        func: Callable[..., R],
+        args: tuple = (),
+        kwargs: dict | None = None,
+        executor_name: str = DEFAULT_EXECUTOR,
     ):
         self.func = func
         self.args = args
         self.kwargs = kwargs if kwargs is not None else {}
+        self.executor_name = executor_name
         self.result_id = str(uuid.uuid4())
 
     def execute(self) -> R:
@@ -85,23 +283,142 @@ def run_functions_in_parallel(
     """
     Executes a list of FunctionCalls in parallel and stores the results in a dictionary where the keys
     are the result_id of the FunctionCall and the values are the results of the call.
+    Each FunctionCall runs on the shared executor it names.
     """
     results = {}
-    with ThreadPoolExecutor(max_workers=len(function_calls)) as executor:
-        future_to_id = {
-            executor.submit(func_call.execute): func_call.result_id
-            for func_call in function_calls
-        }
-
-        for future in as_completed(future_to_id):
-            result_id = future_to_id[future]
-            try:
-                results[result_id] = future.result()
-            except Exception as e:
-                logger.exception(f"Function with ID {result_id} failed due to {e}")
-                results[result_id] = None
+    for index, future in _execute_calls(
+        [(func_call.execute, func_call.executor_name) for func_call in function_calls]
+    ):
+        result_id = function_calls[index].result_id
+        try:
+            results[result_id] = future.result()
+        except Exception as e:
+            logger.exception(f"Function with ID {result_id} failed due to {e}")
+            results[result_id] = None
 
-                if not allow_failures:
-                    raise
+            if not allow_failures:
+                raise
 
     return results
+
+
+class _PipelineEnd:
+    pass
+
+
+class _PipelineFailure:
+    def __init__(self, exception: BaseException) -> None:
+        self.exception = exception
+
+
+def _pipeline_put(
+    out_queue: queue.Queue, item: Any, stop_event: threading.Event
+) -> bool:
+    while not stop_event.is_set():
+        try:
+            out_queue.put(item, timeout=_PIPELINE_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _pipeline_get(in_queue: queue.Queue, stop_event: threading.Event) -> Any:
+    while not stop_event.is_set():
+        try:
+            return in_queue.get(timeout=_PIPELINE_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return _PipelineEnd()
+
+
+def _pipeline_source_worker(
+    source: Iterable[Any], out_queue: queue.Queue, stop_event: threading.Event
+) -> None:
+    try:
+        for item in source:
+            if not _pipeline_put(out_queue, item, stop_event):
+                return
+    except BaseException as e:
+        _pipeline_put(out_queue, _PipelineFailure(e), stop_event)
+        return
+    _pipeline_put(out_queue, _PipelineEnd(), stop_event)
+
+
+def _pipeline_stage_worker(
+    stage: Callable[[Any], Any],
+    in_queue: queue.Queue,
+    out_queue: queue.Queue,
+    stop_event: threading.Event,
+) -> None:
+    while True:
+        item = _pipeline_get(in_queue, stop_event)
+        if isinstance(item, (_PipelineEnd, _PipelineFailure)):
+            _pipeline_put(out_queue, item, stop_event)
+            return
+
+        try:
+            result = stage(item)
+        except BaseException as e:
+            _pipeline_put(out_queue, _PipelineFailure(e), stop_event)
+            return
+
+        if not _pipeline_put(out_queue, result, stop_event):
+            return
+
+
+def run_in_pipeline(
+    source: Iterable[Any],
+    stages: list[Callable[[Any], Any]],
+    queue_size: int = 1,
+    name: str = "pipeline",
+) -> Iterator[Any]:
+    """
+    Pulls items from `source` and passes each one through `stages` in order, with the
+    source and every stage running in its own thread so that the stages overlap. Stages
+    are connected by queues of at most `queue_size` items, so a slow stage blocks the
+    stages before it instead of letting work pile up in memory.
+
+    Results are yielded in the same order as the source items. The first exception raised
+    by the source or any stage is re-raised to the caller once all items before it have
+    been yielded. Closing the returned generator early stops all the threads.
+    """
+    stop_event = threading.Event()
+    queues: list[queue.Queue] = [
+        queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)
+    ]
+
+    threads = [
+        threading.Thread(
+            target=_pipeline_source_worker,
+            args=(source, queues[0], stop_event),
+            name=f"{name}-source",
+            daemon=True,
+        )
+    ]
+    for ind, stage in enumerate(stages):
+        threads.append(
+            threading.Thread(
+                target=_pipeline_stage_worker,
+                args=(stage, queues[ind], queues[ind + 1], stop_event),
+                name=f"{name}-stage-{ind}",
+                daemon=True,
+            )
+        )
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if isinstance(item, _PipelineEnd):
+                return
+            if isinstance(item, _PipelineFailure):
+                raise item.exception
+            yield item
+    finally:
+        # NOTE: threads blocked inside the source or a stage (e.g. a slow connector call)
+        # only exit once that call returns, they are daemon threads so they never block
+        # process shutdown
+        stop_event.set()
@@ -0,0 +1,90 @@
+"""In-process, size bounded LRU caches with a time to live on every entry. Caches are
+registered by name so that their hit rates can be reported from a single place."""
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from typing import Generic
+from typing import TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class TTLLRUCache(Generic[K, V]):
+    def __init__(self, name: str, max_size: int, ttl_seconds: float | None) -> None:
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _register_cache(self)
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                inserted_at, value = entry
+                if (
+                    self.ttl_seconds is None
+                    or time.monotonic() - inserted_at < self.ttl_seconds
+                ):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: K, value: V) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                size=len(self._entries),
+                max_size=self.max_size,
+                hits=self.hits,
+                misses=self.misses,
+            )
+
+
+_CACHES: dict[str, TTLLRUCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def _register_cache(cache: TTLLRUCache) -> None:
+    with _CACHES_LOCK:
+        _CACHES[cache.name] = cache
+
+
+def get_cache_stats() -> dict[str, CacheStats]:
+    with _CACHES_LOCK:
+        return {name: cache.stats() for name, cache in _CACHES.items()}
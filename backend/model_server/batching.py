@@ -0,0 +1,148 @@
+"""Coalesces concurrent model server requests into a single forward pass. Requests are
+gathered for up to `max_wait_ms` (or until `max_batch_size` items are waiting), run as
+one batch on a dedicated thread and the results are scattered back to each request."""
+import asyncio
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Generic
+from typing import TypeVar
+
+from pydantic import BaseModel
+
+from danswer.utils.logger import setup_logger
+
+logger = setup_logger()
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class BatcherStats(BaseModel):
+    queued_requests: int
+    queued_items: int
+    num_batches: int
+    num_requests: int
+    num_items: int
+    avg_items_per_batch: float
+    avg_requests_per_batch: float
+
+
+@dataclass
+class _PendingRequest(Generic[T, R]):
+    items: list[T]
+    future: asyncio.Future[list[R]]
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(
+        self,
+        name: str,
+        process_batch: Callable[[list[T]], list[R]],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ) -> None:
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # the models are not safe to call concurrently + already use all cores per call
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"{name}-batcher"
+        )
+        self._queue: asyncio.Queue[_PendingRequest[T, R]] | None = None
+        self._worker: asyncio.Task | None = None
+        # a request which did not fit in the previous batch, starts the next one
+        self._carry_over: _PendingRequest[T, R] | None = None
+        self._queued_items = 0
+        self._num_batches = 0
+        self._num_requests = 0
+        self._num_items = 0
+
+    async def submit(self, items: list[T]) -> list[R]:
+        if not items:
+            return []
+
+        if self._queue is None or self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future: asyncio.Future[list[R]] = asyncio.get_running_loop().create_future()
+        self._queued_items += len(items)
+        await self._queue.put(_PendingRequest(items=items, future=future))
+        return await future
+
+    def stats(self) -> BatcherStats:
+        return BatcherStats(
+            queued_requests=self._queue.qsize() if self._queue else 0,
+            queued_items=self._queued_items,
+            num_batches=self._num_batches,
+            num_requests=self._num_requests,
+            num_items=self._num_items,
+            avg_items_per_batch=self._num_items / self._num_batches
+            if self._num_batches
+            else 0.0,
+            avg_requests_per_batch=self._num_requests / self._num_batches
+            if self._num_batches
+            else 0.0,
+        )
+
+    async def _gather_batch(self) -> list[_PendingRequest[T, R]]:
+        assert self._queue is not None
+        if self._carry_over is not None:
+            batch = [self._carry_over]
+            self._carry_over = None
+        else:
+            batch = [await self._queue.get()]
+        num_items = len(batch[0].items)
+        deadline = time.monotonic() + self.max_wait
+
+        while num_items < self.max_batch_size:
+            try:
+                if self._queue.empty():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    request = await asyncio.wait_for(self._queue.get(), remaining)
+                else:
+                    request = self._queue.get_nowait()
+            except asyncio.TimeoutError:
+                break
+
+            # requests are never split, one that does not fit starts the next batch
+            if num_items + len(request.items) > self.max_batch_size:
+                self._carry_over = request
+                break
+            batch.append(request)
+            num_items += len(request.items)
+
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._gather_batch()
+
+            items = [item for request in batch for item in request.items]
+            self._queued_items -= len(items)
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.process_batch, items
+                )
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            self._num_batches += 1
+            self._num_requests += len(batch)
+            self._num_items += len(items)
+
+            ind = 0
+            for request in batch:
+                request_results = results[ind : ind + len(request.items)]
+                ind += len(request.items)
+                if not request.future.done():
+                    request.future.set_result(request_results)
@@ -1,6 +1,9 @@
 from fastapi import APIRouter
 from fastapi import HTTPException
 
+from danswer.configs.app_configs import MODEL_SERVER_BATCH_MAX_WAIT_MS
+from danswer.configs.app_configs import MODEL_SERVER_EMBED_MAX_BATCH_SIZE
+from danswer.configs.app_configs import MODEL_SERVER_RERANK_MAX_BATCH_SIZE
 from danswer.configs.model_configs import CROSS_ENCODER_MODEL_ENSEMBLE
 from danswer.configs.model_configs import DOCUMENT_ENCODER_MODEL
 from danswer.configs.model_configs import NORMALIZE_EMBEDDINGS
@@ -8,6 +11,8 @@ from danswer.search.search_nlp_models import get_local_embedding_model
 from danswer.search.search_nlp_models import get_local_reranking_model_ensemble
 from danswer.utils.logger import setup_logger
 from danswer.utils.timing import log_function_time
+from model_server.batching import BatcherStats
+from model_server.batching import MicroBatcher
 from shared_models.model_server_models import EmbedRequest
 from shared_models.model_server_models import EmbedResponse
 from shared_models.model_server_models import RerankRequest
@@ -35,37 +40,63 @@ def embed_text(
 
 
 @log_function_time()
-def calc_sim_scores(query: str, docs: list[str]) -> list[list[float]]:
+def _score_pairs(pairs: list[tuple[str, str]]) -> list[list[float]]:
+    """Scores of every (query, doc) pair, one score per cross encoder in the ensemble"""
     cross_encoders = get_local_reranking_model_ensemble()
-    sim_scores = [
-        encoder.predict([(query, doc) for doc in docs]).tolist()  # type: ignore
-        for encoder in cross_encoders
+    encoder_scores = [
+        encoder.predict(pairs).tolist() for encoder in cross_encoders  # type: ignore
     ]
-    return sim_scores
+    return [list(pair_scores) for pair_scores in zip(*encoder_scores)]
+
+
+_EMBED_BATCHER: MicroBatcher[str, list[float]] = MicroBatcher(
+    name="bi-encoder",
+    process_batch=embed_text,
+    max_batch_size=MODEL_SERVER_EMBED_MAX_BATCH_SIZE,
+    max_wait_ms=MODEL_SERVER_BATCH_MAX_WAIT_MS,
+)
+_RERANK_BATCHER: MicroBatcher[tuple[str, str], list[float]] = MicroBatcher(
+    name="cross-encoder",
+    process_batch=_score_pairs,
+    max_batch_size=MODEL_SERVER_RERANK_MAX_BATCH_SIZE,
+    max_wait_ms=MODEL_SERVER_BATCH_MAX_WAIT_MS,
+)
 
 
 @router.post("/bi-encoder-embed")
-def process_embed_request(
+async def process_embed_request(
     embed_request: EmbedRequest,
 ) -> EmbedResponse:
     try:
-        embeddings = embed_text(texts=embed_request.texts)
+        embeddings = await _EMBED_BATCHER.submit(embed_request.texts)
         return EmbedResponse(embeddings=embeddings)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/cross-encoder-scores")
-def process_rerank_request(embed_request: RerankRequest) -> RerankResponse:
+async def process_rerank_request(embed_request: RerankRequest) -> RerankResponse:
+    if not embed_request.documents:
+        return RerankResponse(scores=[[] for _ in get_local_reranking_model_ensemble()])
+
     try:
-        sim_scores = calc_sim_scores(
-            query=embed_request.query, docs=embed_request.documents
+        pair_scores = await _RERANK_BATCHER.submit(
+            [(embed_request.query, doc) for doc in embed_request.documents]
         )
+        # scores are returned per cross encoder, each with one score per document
+        sim_scores = [list(encoder_scores) for encoder_scores in zip(*pair_scores)]
         return RerankResponse(scores=sim_scores)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/batching-stats")
+def get_batching_stats() -> dict[str, BatcherStats]:
+    return {
+        batcher.name: batcher.stats() for batcher in (_EMBED_BATCHER, _RERANK_BATCHER)
+    }
+
+
 def warm_up_bi_encoder() -> None:
     logger.info(f"Warming up Bi-Encoders: {DOCUMENT_ENCODER_MODEL}")
     get_local_embedding_model().encode(WARM_UP_STRING)
@@ -0,0 +1,70 @@
+# This file is purely for development use, not included in any builds
+# Compares chunking a document with many sections using running token counts vs
+# re-tokenizing the chunk being built for every section
+import argparse
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+# makes it so `PYTHONPATH=.` is not required when running this script
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from danswer.configs.constants import DocumentSource  # noqa: E402
+from danswer.connectors.models import Document  # noqa: E402
+from danswer.connectors.models import Section  # noqa: E402
+from danswer.indexing import chunker  # noqa: E402
+from danswer.indexing.chunker import chunk_document  # noqa: E402
+
+_WORDS = (
+    "the connector failed to index the résumé because the vespa feed timed out "
+    "while the embedding model v1.2.3 was still warming up on 2023-12-01 #general"
+).split()
+
+
+def _build_document(num_sections: int, seed: int = 0) -> Document:
+    rand = random.Random(seed)
+    sections = []
+    for ind in range(num_sections):
+        # mostly short sections (e.g. Slack messages), with the occasional large one
+        num_words = rand.choice([3, 8, 15, 40, 120]) if ind % 500 else 900
+        text = " ".join(rand.choice(_WORDS) for _ in range(num_words)) + "."
+        sections.append(Section(text=text, link=f"https://example.com/{ind}"))
+    return Document(
+        id="chunker-benchmark",
+        sections=sections,
+        source=DocumentSource.SLACK,
+        semantic_identifier="Chunker Benchmark",
+        metadata={},
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-sections", type=int, default=5000)
+    args = parser.parse_args()
+
+    document = _build_document(args.num_sections)
+    # load the tokenizer / sentence splitter models outside of the timed runs
+    chunk_document(_build_document(num_sections=10))
+
+    start = time.monotonic()
+    with mock.patch.object(
+        chunker, "_tokens_are_split_on_whitespace", return_value=False
+    ):
+        retokenized_chunks = chunk_document(document)
+    retokenize_time = time.monotonic() - start
+
+    start = time.monotonic()
+    chunks = chunk_document(document)
+    running_count_time = time.monotonic() - start
+
+    print(
+        f"Chunked {len(document.sections)} sections into {len(chunks)} chunks: "
+        f"{retokenize_time:.2f}s re-tokenizing, {running_count_time:.2f}s with "
+        f"running token counts ({retokenize_time / running_count_time:.1f}x speedup)"
+    )
+    if chunks != retokenized_chunks:
+        print("The chunks differ, running token counts are not exact for this model")
@@ -0,0 +1,79 @@
+# This file is purely for development use, not included in any builds
+# Compares indexing embedding throughput with fixed size batches vs length bucketed batches
+import argparse
+import os
+import random
+import sys
+import time
+
+# makes it so `PYTHONPATH=.` is not required when running this script
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from danswer.configs.constants import DocumentSource  # noqa: E402
+from danswer.connectors.models import Document  # noqa: E402
+from danswer.connectors.models import Section  # noqa: E402
+from danswer.indexing.chunker import DefaultChunker  # noqa: E402
+from danswer.indexing.embedder import embed_chunks  # noqa: E402
+from danswer.search.search_nlp_models import EmbeddingModel  # noqa: E402
+
+_WORDS = (
+    "the connector failed to index the page because the vespa feed timed out "
+    "while the embedding model was still warming up on the background worker"
+).split()
+
+
+def _build_documents(num_docs: int, seed: int = 0) -> list[Document]:
+    rand = random.Random(seed)
+    documents = []
+    for doc_ind in range(num_docs):
+        # a mix of short messages and long pages, as seen across connectors
+        num_sections = rand.choice([1, 2, 5, 20])
+        sections = [
+            Section(
+                text=" ".join(
+                    rand.choice(_WORDS) for _ in range(rand.choice([10, 60, 400]))
+                )
+                + ".",
+                link=f"https://example.com/{doc_ind}/{section_ind}",
+            )
+            for section_ind in range(num_sections)
+        ]
+        documents.append(
+            Document(
+                id=f"benchmark-{doc_ind}",
+                sections=sections,
+                source=DocumentSource.WEB,
+                semantic_identifier=f"Benchmark {doc_ind}",
+                metadata={},
+            )
+        )
+    return documents
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-docs", type=int, default=200)
+    parser.add_argument("--mini-chunks", action="store_true")
+    args = parser.parse_args()
+
+    documents = _build_documents(args.num_docs)
+    chunks = DefaultChunker().chunk_documents(documents)
+    embedding_model = EmbeddingModel()
+    # warm up so that model loading is not part of the timing
+    embed_chunks(chunks[:4], embedding_model=embedding_model)
+
+    for length_bucketing in [False, True]:
+        start = time.monotonic()
+        embed_chunks(
+            chunks,
+            embedding_model=embedding_model,
+            enable_mini_chunk=args.mini_chunks,
+            length_bucketing=length_bucketing,
+        )
+        elapsed = time.monotonic() - start
+        print(
+            f"length_bucketing={length_bucketing}: {len(documents)} docs / "
+            f"{len(chunks)} chunks in {elapsed:.2f}s "
+            f"({len(documents) / elapsed:.1f} docs/sec)"
+        )
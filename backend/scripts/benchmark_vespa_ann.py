@@ -0,0 +1,139 @@
+# This file is purely for development use, not included in any builds
+# Compares recall and latency of approximate (HNSW) vs exact nearest neighbor search
+# against a running Vespa instance. Requires the index to be deployed with
+# VESPA_ENABLE_HNSW_INDEX=true, otherwise every search is exact.
+import argparse
+import os
+import sys
+import time
+
+# makes it so `PYTHONPATH=.` is not required when running this script
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from danswer.document_index.vespa.index import VespaIndex  # noqa: E402
+from danswer.indexing.models import InferenceChunk  # noqa: E402
+from danswer.search.models import IndexFilters  # noqa: E402
+from danswer.search.search_runner import embed_query  # noqa: E402
+
+_DEFAULT_QUERIES = [
+    "How do I set up a new connector?",
+    "What is our vacation policy?",
+    "Why did the deployment fail last week?",
+    "Who owns the billing service?",
+    "How to rotate the database credentials",
+    "onboarding checklist for new engineers",
+    "what are the quarterly sales targets",
+    "instructions for requesting access to production",
+]
+
+
+def _chunk_key(chunk: InferenceChunk) -> tuple[str, int]:
+    return chunk.document_id, chunk.chunk_id
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    ind = min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))
+    return sorted_values[ind]
+
+
+def _run_queries(
+    index: VespaIndex,
+    queries: list[str],
+    num_hits: int,
+    repeats: int,
+    approximate: bool,
+    explore_additional_hits: int = 0,
+) -> tuple[list[set[tuple[str, int]]], list[float]]:
+    results: list[set[tuple[str, int]]] = []
+    latencies: list[float] = []
+    for query in queries:
+        for repeat in range(repeats):
+            start = time.monotonic()
+            chunks = index.semantic_retrieval(
+                query=query,
+                filters=IndexFilters(access_control_list=None),
+                time_decay_multiplier=0.0,
+                num_to_retrieve=num_hits,
+                approximate=approximate,
+                explore_additional_hits=explore_additional_hits,
+            )
+            latencies.append(time.monotonic() - start)
+            if repeat == 0:
+                results.append({_chunk_key(chunk) for chunk in chunks})
+    return results, sorted(latencies)
+
+
+def benchmark(
+    queries: list[str], num_hits: int, repeats: int, explore_values: list[int]
+) -> None:
+    index = VespaIndex()
+    # embeddings are cached after the first call so only the Vespa query is timed
+    for query in queries:
+        embed_query(query)
+
+    exact_results, exact_latencies = _run_queries(
+        index, queries, num_hits, repeats, approximate=False
+    )
+    print(
+        f"exact:                      recall@{num_hits}=1.000 "
+        f"p50={_percentile(exact_latencies, 50) * 1000:.1f}ms "
+        f"p95={_percentile(exact_latencies, 95) * 1000:.1f}ms"
+    )
+
+    for explore_additional_hits in explore_values:
+        approx_results, approx_latencies = _run_queries(
+            index,
+            queries,
+            num_hits,
+            repeats,
+            approximate=True,
+            explore_additional_hits=explore_additional_hits,
+        )
+        recalls = [
+            len(exact & approx) / len(exact)
+            for exact, approx in zip(exact_results, approx_results)
+            if exact
+        ]
+        recall = sum(recalls) / len(recalls) if recalls else 0.0
+        print(
+            f"approximate (explore +{explore_additional_hits:<5}): "
+            f"recall@{num_hits}={recall:.3f} "
+            f"p50={_percentile(approx_latencies, 50) * 1000:.1f}ms "
+            f"p95={_percentile(approx_latencies, 95) * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recall vs latency of HNSW approximate search against exact search"
+    )
+    parser.add_argument(
+        "--queries-file",
+        type=str,
+        default=None,
+        help="File with one query per line, uses a small built in set if not provided",
+    )
+    parser.add_argument("--num-hits", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--explore-additional-hits",
+        type=int,
+        nargs="+",
+        default=[0, 100, 500],
+        help="Values of hnsw.exploreAdditionalHits to benchmark",
+    )
+    args = parser.parse_args()
+
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            benchmark_queries = [line.strip() for line in f if line.strip()]
+    else:
+        benchmark_queries = _DEFAULT_QUERIES
+
+    benchmark(
+        queries=benchmark_queries,
+        num_hits=args.num_hits,
+        repeats=args.repeats,
+        explore_values=args.explore_additional_hits,
+    )
@@ -0,0 +1,141 @@
+# This file is purely for development use, not included in any builds
+# Compares the latency of reranking with the cross-encoder on the API / model server
+# (`semantic_reranking`) against reranking in the global-phase of the Vespa rank profile.
+# Requires a running Vespa instance deployed with VESPA_CROSS_ENCODER_RERANKING=true, which
+# also needs to be set when running this script
+import argparse
+import os
+import sys
+import time
+
+# makes it so `PYTHONPATH=.` is not required when running this script
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from danswer.configs.app_configs import VESPA_CROSS_ENCODER_RERANKING  # noqa: E402
+from danswer.document_index.vespa.index import VespaIndex  # noqa: E402
+from danswer.indexing.models import InferenceChunk  # noqa: E402
+from danswer.search.models import IndexFilters  # noqa: E402
+from danswer.search.search_runner import embed_query  # noqa: E402
+from danswer.search.search_runner import semantic_reranking  # noqa: E402
+
+_DEFAULT_QUERIES = [
+    "How do I set up a new connector?",
+    "What is our vacation policy?",
+    "Why did the deployment fail last week?",
+    "Who owns the billing service?",
+    "How to rotate the database credentials",
+    "onboarding checklist for new engineers",
+    "what are the quarterly sales targets",
+    "instructions for requesting access to production",
+]
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    ind = min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))
+    return sorted_values[ind]
+
+
+def _top_keys(chunks: list[InferenceChunk], k: int) -> set[tuple[str, int]]:
+    return {(chunk.document_id, chunk.chunk_id) for chunk in chunks[:k]}
+
+
+def _client_side_rerank(
+    index: VespaIndex, query: str, num_hits: int, num_rerank: int
+) -> list[InferenceChunk]:
+    chunks = index.hybrid_retrieval(
+        query=query,
+        filters=IndexFilters(access_control_list=None),
+        time_decay_multiplier=1.0,
+        num_to_retrieve=num_hits,
+    )
+    if not chunks:
+        return []
+    reranked, _ = semantic_reranking(query=query, chunks=chunks[:num_rerank])
+    return reranked + chunks[num_rerank:]
+
+
+def _vespa_rerank(
+    index: VespaIndex, query: str, num_hits: int, num_rerank: int
+) -> list[InferenceChunk]:
+    return index.hybrid_retrieval(
+        query=query,
+        filters=IndexFilters(access_control_list=None),
+        time_decay_multiplier=1.0,
+        num_to_retrieve=num_hits,
+        num_rerank=num_rerank,
+    )
+
+
+def benchmark(queries: list[str], num_hits: int, num_rerank: int, repeats: int) -> None:
+    if not VESPA_CROSS_ENCODER_RERANKING:
+        raise RuntimeError(
+            "Set VESPA_CROSS_ENCODER_RERANKING=true to run the benchmark"
+        )
+
+    index = VespaIndex()
+    # embeddings are cached after the first call and the first run of each path warms up
+    # the models, so neither is included in the timings
+    for query in queries:
+        embed_query(query)
+        _client_side_rerank(index, query, num_hits, num_rerank)
+        _vespa_rerank(index, query, num_hits, num_rerank)
+
+    results: dict[str, list[list[InferenceChunk]]] = {}
+    for name, rerank_fn in (
+        ("api server rerank", _client_side_rerank),
+        ("vespa global-phase", _vespa_rerank),
+    ):
+        latencies: list[float] = []
+        results[name] = []
+        for query in queries:
+            for repeat in range(repeats):
+                start = time.monotonic()
+                chunks = rerank_fn(index, query, num_hits, num_rerank)
+                latencies.append(time.monotonic() - start)
+                if repeat == 0:
+                    results[name].append(chunks)
+        latencies.sort()
+        print(
+            f"{name:<20} p50={_percentile(latencies, 50) * 1000:.1f}ms "
+            f"p95={_percentile(latencies, 95) * 1000:.1f}ms"
+        )
+
+    # Vespa only runs the first model of the ensemble, so the orders are not identical
+    k = min(5, num_rerank)
+    overlaps = [
+        len(_top_keys(client, k) & _top_keys(vespa, k)) / k
+        for client, vespa in zip(*results.values())
+        if client
+    ]
+    if overlaps:
+        print(f"top {k} overlap between the two: {sum(overlaps) / len(overlaps):.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Latency of API server vs Vespa cross-encoder reranking"
+    )
+    parser.add_argument(
+        "--queries-file",
+        type=str,
+        default=None,
+        help="File with one query per line, uses a small built in set if not provided",
+    )
+    parser.add_argument("--num-hits", type=int, default=50)
+    parser.add_argument("--num-rerank", type=int, default=15)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            benchmark_queries = [line.strip() for line in f if line.strip()]
+    else:
+        benchmark_queries = _DEFAULT_QUERIES
+
+    benchmark(
+        queries=benchmark_queries,
+        num_hits=args.num_hits,
+        num_rerank=args.num_rerank,
+        repeats=args.repeats,
+    )
@@ -0,0 +1,174 @@
+# This file is purely for development use, not included in any builds
+# Compares the memory footprint and the nearest neighbor recall of the embedding storage
+# options for Vespa (VESPA_EMBEDDING_CELL_TYPE / VESPA_ENABLE_BINARY_EMBEDDINGS) against
+# full precision float embeddings. Runs locally with numpy, no Vespa instance needed.
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# makes it so `PYTHONPATH=.` is not required when running this script
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from danswer.configs.model_configs import DOC_EMBEDDING_DIM  # noqa: E402
+from danswer.document_index.vespa.utils import binarize_embedding  # noqa: E402
+from danswer.document_index.vespa.utils import cast_embedding  # noqa: E402
+
+
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)])
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _to_bfloat16(vectors: np.ndarray) -> np.ndarray:
+    # bfloat16 is the upper 16 bits of a float32, round to nearest even like Vespa does
+    bits = vectors.astype(np.float32).view(np.uint32)
+    rounded = (bits + 0x7FFF + ((bits >> 16) & 1)) & 0xFFFF0000
+    return rounded.astype(np.uint32).view(np.float32)
+
+
+def _top_k_cosine(queries: np.ndarray, docs: np.ndarray, k: int) -> np.ndarray:
+    scores = _normalize(queries) @ _normalize(docs).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def _top_k_hamming(query_bits: np.ndarray, doc_bits: np.ndarray, k: int) -> np.ndarray:
+    doc_bytes = doc_bits.view(np.uint8)
+    distances = np.array(
+        [
+            _POPCOUNT[np.bitwise_xor(doc_bytes, query)].sum(axis=1)
+            for query in query_bits.view(np.uint8)
+        ]
+    )
+    return np.argsort(distances, axis=1, kind="stable")[:, :k]
+
+
+def _recall(expected: np.ndarray, actual: np.ndarray) -> float:
+    return float(
+        np.mean(
+            [
+                len(set(expected_row) & set(actual_row)) / len(expected_row)
+                for expected_row, actual_row in zip(expected, actual)
+            ]
+        )
+    )
+
+
+def _load_vectors(
+    texts_file: str | None, num_docs: int, num_queries: int, seed: int
+) -> tuple[np.ndarray, np.ndarray]:
+    if texts_file is None:
+        # clustered random vectors, real embeddings are far from uniformly distributed
+        rand = np.random.default_rng(seed)
+        centers = rand.normal(size=(max(num_docs // 50, 1), DOC_EMBEDDING_DIM))
+        docs = centers[rand.integers(len(centers), size=num_docs)] + 0.5 * rand.normal(
+            size=(num_docs, DOC_EMBEDDING_DIM)
+        )
+        queries = docs[rand.integers(num_docs, size=num_queries)] + 0.5 * rand.normal(
+            size=(num_queries, DOC_EMBEDDING_DIM)
+        )
+        return docs.astype(np.float32), queries.astype(np.float32)
+
+    from danswer.search.search_nlp_models import EmbeddingModel
+
+    with open(texts_file) as f:
+        texts = [line.strip() for line in f if line.strip()]
+    embeddings = np.array(EmbeddingModel().encode(texts), dtype=np.float32)
+    # the first lines are used as queries against the rest
+    return embeddings[num_queries:], embeddings[:num_queries]
+
+
+def compare(docs: np.ndarray, queries: np.ndarray, k: int, rerank_count: int) -> None:
+    num_docs, dim = docs.shape
+    expected = _top_k_cosine(queries, docs, k)
+
+    int8_docs = np.array(
+        [cast_embedding(doc.tolist(), "int8") for doc in docs], dtype=np.int8
+    )
+    int8_queries = np.array(
+        [cast_embedding(query.tolist(), "int8") for query in queries], dtype=np.int8
+    )
+    binary_docs = np.array([binarize_embedding(doc.tolist()) for doc in docs], np.int8)
+    binary_queries = np.array(
+        [binarize_embedding(query.tolist()) for query in queries], np.int8
+    )
+
+    hamming_candidates = _top_k_hamming(
+        binary_queries, binary_docs, max(k, rerank_count)
+    )
+    reranked = np.array(
+        [
+            candidates[_top_k_cosine(query[None, :], docs[candidates], k)[0]]
+            for query, candidates in zip(queries, hamming_candidates)
+        ]
+    )
+
+    binary_bytes = binary_docs.shape[1]
+    rows = [
+        ("float", dim * 4, 1.0),
+        (
+            "bfloat16",
+            dim * 2,
+            _recall(
+                expected, _top_k_cosine(_to_bfloat16(queries), _to_bfloat16(docs), k)
+            ),
+        ),
+        (
+            "int8",
+            dim,
+            _recall(
+                expected,
+                _top_k_cosine(
+                    int8_queries.astype(np.float32), int8_docs.astype(np.float32), k
+                ),
+            ),
+        ),
+        (
+            "binary (hamming only)",
+            binary_bytes,
+            _recall(expected, hamming_candidates[:, :k]),
+        ),
+        # the full precision embeddings are paged to disk when binarized embeddings are
+        # enabled, only the candidates to rerank are read
+        (
+            f"binary + paged float rerank of top {rerank_count}",
+            binary_bytes,
+            _recall(expected, reranked),
+        ),
+    ]
+
+    print(f"{num_docs} vectors of dimension {dim}, {len(queries)} queries\n")
+    print(f"{'storage':<40}{'bytes/vector':>14}{'MB in memory':>14}{f'recall@{k}':>12}")
+    for name, bytes_per_vector, recall in rows:
+        print(
+            f"{name:<40}{bytes_per_vector:>14}"
+            f"{bytes_per_vector * num_docs / 1024 ** 2:>14.1f}{recall:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Memory vs recall of reduced precision embedding storage"
+    )
+    parser.add_argument(
+        "--texts-file",
+        type=str,
+        default=None,
+        help="File with one passage per line to embed with the configured encoder, "
+        "uses clustered random vectors if not provided",
+    )
+    parser.add_argument("--num-docs", type=int, default=20000)
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank-count", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    doc_vectors, query_vectors = _load_vectors(
+        args.texts_file, args.num_docs, args.num_queries, args.seed
+    )
+    compare(doc_vectors, query_vectors, k=args.k, rerank_count=args.rerank_count)
@@ -0,0 +1,111 @@
+"""Compares the rankings of the int8 ONNX models against the torch models on a small
+corpus. Downloads and exports the configured bi-encoder and cross-encoders, so it is not
+part of the unit tests. Exits with an error if the recall is below --min_recall."""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from unittest import mock
+
+import numpy as np
+
+from danswer.configs.model_configs import CROSS_EMBED_CONTEXT_SIZE
+from danswer.configs.model_configs import CROSS_ENCODER_MODEL_ENSEMBLE
+from danswer.configs.model_configs import DOC_EMBEDDING_CONTEXT_SIZE
+from danswer.configs.model_configs import DOCUMENT_ENCODER_MODEL
+from danswer.search.search_nlp_models import get_local_embedding_model
+from danswer.search.search_nlp_models import get_local_reranking_model_ensemble
+
+
+def recall_at_k(reference_scores: np.ndarray, scores: np.ndarray, k: int) -> float:
+    """Fraction of the reference top-k (per query) which is also in the top-k of `scores`"""
+    recalls = []
+    for reference_row, row in zip(reference_scores, scores):
+        reference_top_k = set(np.argsort(-reference_row)[:k])
+        top_k = set(np.argsort(-row)[:k])
+        recalls.append(len(reference_top_k & top_k) / k)
+    return float(np.mean(recalls))
+
+
+def load_models(inference_backend: str, cache_dir: str) -> tuple:
+    # the getters keep a single global model, reset it to switch backends
+    with mock.patch(
+        "danswer.search.onnx_models.ONNX_MODEL_CACHE_DIR", cache_dir
+    ), mock.patch(
+        "danswer.search.search_nlp_models._EMBED_MODEL", None
+    ), mock.patch(
+        "danswer.search.search_nlp_models._RERANK_MODELS", None
+    ):
+        return get_local_embedding_model(
+            model_name=DOCUMENT_ENCODER_MODEL,
+            max_context_length=DOC_EMBEDDING_CONTEXT_SIZE,
+            inference_backend=inference_backend,
+        ), get_local_reranking_model_ensemble(
+            model_names=CROSS_ENCODER_MODEL_ENSEMBLE,
+            max_context_length=CROSS_EMBED_CONTEXT_SIZE,
+            inference_backend=inference_backend,
+        )
+
+
+def main(corpus_path: str, top_k: int, min_recall: float) -> bool:
+    with open(corpus_path) as corpus_file:
+        corpus = json.load(corpus_file)
+    queries = corpus["queries"]
+    passages = corpus["passages"]
+
+    # the exported models are loaded into the ONNX Runtime sessions, the files are only
+    # needed while loading
+    with tempfile.TemporaryDirectory() as cache_dir:
+        torch_embed_model, torch_rerank_models = load_models("torch", cache_dir)
+        onnx_embed_model, onnx_rerank_models = load_models("onnx_int8", cache_dir)
+
+    def _similarities(model: object) -> np.ndarray:
+        query_embeddings = model.encode(queries, normalize_embeddings=True)  # type: ignore
+        passage_embeddings = model.encode(passages, normalize_embeddings=True)  # type: ignore
+        return np.asarray(query_embeddings) @ np.asarray(passage_embeddings).T
+
+    recalls = {
+        DOCUMENT_ENCODER_MODEL: recall_at_k(
+            _similarities(torch_embed_model), _similarities(onnx_embed_model), top_k
+        )
+    }
+
+    pairs = [[(query, passage) for passage in passages] for query in queries]
+    for model_name, torch_model, onnx_model in zip(
+        CROSS_ENCODER_MODEL_ENSEMBLE, torch_rerank_models, onnx_rerank_models
+    ):
+        torch_scores = np.array([torch_model.predict(p) for p in pairs])
+        onnx_scores = np.array([onnx_model.predict(p) for p in pairs])
+        recalls[model_name] = recall_at_k(torch_scores, onnx_scores, top_k)
+
+    for model_name, recall in recalls.items():
+        print(f"{model_name}: int8 ONNX recall@{top_k} vs torch {recall:.3f}")
+    return all(recall >= min_recall for recall in recalls.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "corpus_json",
+        type=str,
+        help="Path to the corpus JSON file, with `queries` and `passages`.",
+        default=os.path.join(os.path.dirname(__file__), "onnx_parity_corpus.json"),
+        nargs="?",
+    )
+    parser.add_argument(
+        "--top_k",
+        type=int,
+        help="Number of top ranked passages per query to compare.",
+        default=5,
+    )
+    parser.add_argument(
+        "--min_recall",
+        type=float,
+        help="Fail if any model's recall@k is below this.",
+        default=0.9,
+    )
+    args = parser.parse_args()
+
+    if not main(args.corpus_json, args.top_k, args.min_recall):
+        sys.exit(1)
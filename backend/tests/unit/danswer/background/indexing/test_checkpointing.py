@@ -0,0 +1,93 @@
+import datetime
+import unittest
+from typing import Any
+
+from danswer.background.indexing.checkpointing import build_checkpoint
+from danswer.background.indexing.checkpointing import CheckpointTracker
+from danswer.background.indexing.checkpointing import get_resumed_time_windows
+from danswer.connectors.interfaces import CheckpointConnector
+from danswer.connectors.interfaces import ConnectorCheckpoint
+from danswer.connectors.interfaces import GenerateDocumentsOutput
+
+
+def _dt(day: int) -> datetime.datetime:
+    return datetime.datetime(2024, 1, day, tzinfo=datetime.timezone.utc)
+
+
+class _OffsetConnector(CheckpointConnector):
+    def __init__(self) -> None:
+        self.offset = 0
+
+    def load_credentials(self, credentials: dict[str, Any]) -> dict[str, Any] | None:
+        return None
+
+    def get_checkpoint(self) -> ConnectorCheckpoint | None:
+        return {"offset": self.offset}
+
+    def set_checkpoint(self, checkpoint: ConnectorCheckpoint) -> None:
+        self.offset = checkpoint["offset"]
+
+    def load_from_state(self) -> GenerateDocumentsOutput:
+        while self.offset < 3:
+            self.offset += 1
+            yield []
+
+
+class _IndexedHookConnector(_OffsetConnector):
+    """Only uses the checkpoints to know which batches were indexed"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.indexed: list[ConnectorCheckpoint] = []
+
+    @property
+    def resumable(self) -> bool:
+        return False
+
+    def checkpoint_indexed(self, checkpoint: ConnectorCheckpoint) -> None:
+        self.indexed.append(checkpoint)
+
+
+class TestCheckpointing(unittest.TestCase):
+    def test_resume_same_window(self) -> None:
+        checkpoint = build_checkpoint(_dt(1), _dt(5), {"offset": 2})
+        windows, connector_checkpoint = get_resumed_time_windows(
+            [(_dt(1), _dt(3)), (_dt(3), _dt(6)), (_dt(6), _dt(9))], checkpoint
+        )
+        self.assertEqual(connector_checkpoint, {"offset": 2})
+        self.assertEqual(
+            windows, [(_dt(1), _dt(5)), (_dt(5), _dt(6)), (_dt(6), _dt(9))]
+        )
+
+    def test_no_resume_other_window(self) -> None:
+        checkpoint = build_checkpoint(_dt(1), _dt(5), {"offset": 2})
+        windows = [(_dt(2), _dt(9))]
+        self.assertEqual(get_resumed_time_windows(windows, checkpoint), (windows, None))
+        self.assertEqual(get_resumed_time_windows(windows, None), (windows, None))
+
+    def test_tracker_checkpoint_per_batch(self) -> None:
+        connector = _OffsetConnector()
+        tracker = CheckpointTracker(connector=connector)
+        # batches are pulled ahead of them being indexed
+        batches = list(tracker.track(connector.load_from_state()))
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(
+            [tracker.pop_indexed() for _ in batches],
+            [{"offset": 1}, {"offset": 2}, {"offset": 3}],
+        )
+        self.assertEqual(tracker.num_saved, 3)
+
+    def test_tracker_not_resumable(self) -> None:
+        connector = _IndexedHookConnector()
+        tracker = CheckpointTracker(connector=connector)
+        batches = list(tracker.track(connector.load_from_state()))
+        # nothing to save, which would make the next attempt redo the time window
+        self.assertEqual([tracker.pop_indexed() for _ in batches], [None] * 3)
+        self.assertEqual(tracker.num_saved, 0)
+        self.assertEqual(
+            connector.indexed, [{"offset": 1}, {"offset": 2}, {"offset": 3}]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
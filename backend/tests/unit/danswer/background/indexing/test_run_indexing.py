@@ -0,0 +1,131 @@
+import datetime
+import unittest
+from collections.abc import Iterator
+from typing import Any
+from unittest import mock
+
+import tiktoken
+
+from danswer.background.indexing.checkpointing import build_checkpoint
+from danswer.connectors.interfaces import GenerateDocumentsOutput
+from danswer.connectors.models import InputType
+from danswer.indexing.indexing_pipeline import IndexedBatch
+
+# litellm downloads a tiktoken encoding on import, it is not used here
+with mock.patch.object(tiktoken, "get_encoding"):
+    from danswer.background.indexing import run_indexing
+    from danswer.background.indexing.run_indexing import _run_indexing
+
+_LAST_SUCCESS = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _pipeline(
+    doc_batches: GenerateDocumentsOutput, **kwargs: Any
+) -> Iterator[IndexedBatch]:
+    for doc_batch in doc_batches:
+        yield IndexedBatch(
+            documents=doc_batch, new_docs=len(doc_batch), num_chunks=len(doc_batch)
+        )
+
+
+class TestRunIndexing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.windows: list[tuple[datetime.datetime, datetime.datetime]] = []
+        self.checkpoint: dict[str, Any] | None = None
+        self.mocks: dict[str, mock.MagicMock] = {}
+        for name in [
+            "mark_attempt_in_progress",
+            "mark_attempt_failed",
+            "mark_attempt_succeeded",
+            "update_connector_credential_pair",
+            "update_docs_indexed",
+            "update_index_attempt_checkpoint",
+            "DefaultEmbedder",
+        ]:
+            patcher = mock.patch.object(run_indexing, name)
+            self.mocks[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patches = [
+            mock.patch.object(run_indexing, "ENABLE_EMBEDDING_CACHE", False),
+            mock.patch.object(
+                run_indexing,
+                "get_last_successful_attempt_time",
+                return_value=_LAST_SUCCESS.timestamp(),
+            ),
+            mock.patch.object(
+                run_indexing,
+                "get_latest_index_attempt_checkpoint",
+                side_effect=lambda **kwargs: self.checkpoint,
+            ),
+            mock.patch.object(
+                run_indexing, "_get_document_generator", self._document_generator
+            ),
+            mock.patch.object(run_indexing, "run_pipelined_indexing", _pipeline),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.index_attempt = mock.MagicMock()
+        self.index_attempt.connector.input_type = InputType.POLL
+        self.index_attempt.connector.disabled = False
+
+    def _document_generator(
+        self,
+        start_time: datetime.datetime,
+        end_time: datetime.datetime,
+        **kwargs: Any,
+    ) -> tuple[GenerateDocumentsOutput, Any]:
+        """The connector fails in every window after the first one"""
+        self.windows.append((start_time, end_time))
+        is_tail_window = len(self.windows) > 1
+
+        def generate() -> GenerateDocumentsOutput:
+            if is_tail_window:
+                raise RuntimeError("Connector failed in the tail window")
+            yield [mock.MagicMock()]
+
+        return generate(), mock.Mock()
+
+    def _run(self, experimental_checkpointing: bool) -> None:
+        with mock.patch(
+            "danswer.background.indexing.checkpointing."
+            "EXPERIMENTAL_CHECKPOINTING_ENABLED",
+            experimental_checkpointing,
+        ):
+            _run_indexing(
+                db_session=mock.MagicMock(),
+                index_attempt=self.index_attempt,
+                chunker=mock.Mock(),
+            )
+
+    def test_resumed_window_failure_fails_attempt(self) -> None:
+        resumed_window_end = datetime.datetime(
+            2024, 1, 5, tzinfo=datetime.timezone.utc
+        )
+        self.checkpoint = build_checkpoint(
+            _LAST_SUCCESS, resumed_window_end, {"offset": 1}
+        )
+
+        with self.assertRaises(RuntimeError):
+            self._run(experimental_checkpointing=False)
+
+        # the single window was split in two to resume, the failure is not progress
+        self.assertEqual(len(self.windows), 2)
+        self.assertEqual(self.windows[0], (_LAST_SUCCESS, resumed_window_end))
+        self.mocks["mark_attempt_failed"].assert_called_once()
+        self.mocks["mark_attempt_succeeded"].assert_not_called()
+
+    def test_experimental_window_failure_is_progress(self) -> None:
+        self._run(experimental_checkpointing=True)
+
+        self.assertEqual(len(self.windows), 2)
+        self.mocks["mark_attempt_failed"].assert_not_called()
+        self.mocks["mark_attempt_succeeded"].assert_called_once()
+        update_cc_pair = self.mocks["update_connector_credential_pair"]
+        self.assertEqual(update_cc_pair.call_args.kwargs["run_dt"], self.windows[0][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,13 @@
+import threading
 import time
 import unittest
 
+import requests
+
 from danswer.connectors.cross_connector_utils.rate_limit_wrapper import (
     rate_limit_builder,
 )
+from danswer.connectors.cross_connector_utils.rate_limit_wrapper import RateLimiter
 
 
 class TestRateLimit(unittest.TestCase):
@@ -31,6 +35,44 @@ class TestRateLimit(unittest.TestCase):
         self.assertLess(time_to_finish_non_ratelimited, 1)
         self.assertGreater(time_to_finish_ratelimited, 5)
 
+    def test_rate_limit_threads(self) -> None:
+        rate_limiter = RateLimiter(max_calls=3, period=0.2)
+        start_times: list[float] = []
+        lock = threading.Lock()
+
+        def _call() -> None:
+            for _ in range(3):
+                rate_limiter.acquire()
+                with lock:
+                    start_times.append(time.monotonic())
+
+        threads = [threading.Thread(target=_call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        start_times.sort()
+        self.assertEqual(len(start_times), 12)
+        for ind in range(len(start_times) - 3):
+            self.assertGreaterEqual(start_times[ind + 3] - start_times[ind], 0.19)
+
+    def test_retry_after_429(self) -> None:
+        self.call_cnt = 0
+
+        @rate_limit_builder(max_calls=10, period=1)
+        def func() -> int:
+            self.call_cnt += 1
+            response = requests.Response()
+            response.status_code = 429 if self.call_cnt == 1 else 200
+            response.headers["Retry-After"] = "1"
+            response.raise_for_status()
+            return self.call_cnt
+
+        start = time.time()
+        self.assertEqual(func(), 2)
+        self.assertGreater(time.time() - start, 1)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,111 @@
+import importlib.util
+import unittest
+from typing import Any
+from unittest import mock
+
+import requests
+from bs4 import BeautifulSoup
+
+from danswer.connectors.web.crawler import CrawledPage
+
+_TEXT = "Some text that is long enough to not need a browser. " * 5
+
+
+@unittest.skipIf(
+    importlib.util.find_spec("playwright") is None, "playwright is not installed"
+)
+class TestWebConnectorPoll(unittest.TestCase):
+    def setUp(self) -> None:
+        from danswer.connectors.web import connector as web_connector
+
+        self.web_connector = web_connector
+        # URL -> page text, changed between polls by the tests
+        self.site = {f"https://a.com/{i}": f"{_TEXT} {i}" for i in range(3)}
+        # what the DB would contain
+        self.saved_states: dict[str, Any] = {}
+
+        patches = [
+            mock.patch.object(web_connector, "get_sqlalchemy_engine"),
+            mock.patch.object(web_connector, "Session"),
+            mock.patch.object(
+                web_connector,
+                "fetch_web_page_fetch_states",
+                side_effect=lambda crawl_key, db_session: dict(self.saved_states),
+            ),
+            mock.patch.object(
+                web_connector,
+                "upsert_web_page_fetch_states",
+                side_effect=self._upsert_states,
+            ),
+            mock.patch.object(
+                web_connector.WebConnector,
+                "_fetch_static_page",
+                new=lambda connector, url, crawl_run: self._fetch_static_page(
+                    connector, url
+                ),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _upsert_states(
+        self, crawl_key: str, states: list[Any], db_session: Any
+    ) -> None:
+        for state in states:
+            self.saved_states[state.url] = state
+
+    def _fetch_static_page(
+        self, connector: Any, url: str
+    ) -> tuple[CrawledPage, requests.Response]:
+        response = requests.Response()
+        response.status_code = 200
+        html = f"<html><body><p>{self.site[url]}</p></body></html>"
+        return (
+            connector._html_page(url, BeautifulSoup(html, "html.parser"), url),
+            response,
+        )
+
+    def _poll(self, fail_after_batches: int | None = None) -> list[str]:
+        """Runs a poll the way indexing does, each batch is indexed after it is pulled
+        and the run fails after `fail_after_batches` batches"""
+        from danswer.background.indexing.checkpointing import CheckpointTracker
+
+        connector = self.web_connector.WebConnector(
+            "https://a.com/0",
+            web_connector_type="single",
+            batch_size=1,
+            max_concurrency=1,
+            http_fast_path=True,
+        )
+        connector.to_visit_list = sorted(self.site)
+        tracker = CheckpointTracker(connector=connector)
+
+        polled: list[str] = []
+        for doc_batch in tracker.track(connector.poll_source(0, 0)):
+            if fail_after_batches is not None and len(polled) == fail_after_batches:
+                break
+            polled.extend(doc.id for doc in doc_batch)
+            tracker.pop_indexed()
+        return sorted(polled)
+
+    def test_unchanged_pages_skipped(self) -> None:
+        self.assertEqual(self._poll(), sorted(self.site))
+        self.assertEqual(set(self.saved_states), set(self.site))
+        self.assertEqual(self._poll(), [])
+
+    def test_changed_pages_sent_again(self) -> None:
+        self._poll()
+        self.site["https://a.com/1"] = f"{_TEXT} changed"
+        self.assertEqual(self._poll(), ["https://a.com/1"])
+        self.assertEqual(self._poll(), [])
+
+    def test_failed_batch_not_saved(self) -> None:
+        self.assertEqual(len(self._poll(fail_after_batches=1)), 1)
+        self.assertEqual(len(self.saved_states), 1)
+        # the pages that weren't indexed are sent by the next poll
+        self.assertEqual(len(self._poll()), len(self.site) - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
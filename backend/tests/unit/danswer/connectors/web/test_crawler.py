@@ -0,0 +1,89 @@
+import threading
+import time
+import unittest
+
+from danswer.connectors.web.crawler import crawl
+from danswer.connectors.web.crawler import CrawledPage
+from danswer.connectors.web.crawler import HostThrottle
+
+_SITE = {
+    "https://a.com/": ["https://a.com/1", "https://a.com/2"],
+    "https://a.com/1": ["https://a.com/", "https://a.com/3"],
+    "https://a.com/2": ["https://a.com/3", "https://a.com/broken"],
+    "https://a.com/3": [],
+    "https://a.com/old": [],
+}
+_REDIRECTS = {"https://a.com/old": "https://a.com/3"}
+
+
+class TestCrawl(unittest.TestCase):
+    def setUp(self) -> None:
+        self.fetched: list[str] = []
+        self.lock = threading.Lock()
+
+    def _fetch_page(self, url: str) -> CrawledPage:
+        with self.lock:
+            self.fetched.append(url)
+        if url not in _SITE:
+            raise ValueError("404")
+        final_url = _REDIRECTS.get(url, url)
+        return CrawledPage(url=final_url, document=None, links=set(_SITE[final_url]))
+
+    def test_visits_each_page_once(self) -> None:
+        pages = list(
+            crawl(
+                start_urls=["https://a.com/"],
+                fetch_page=self._fetch_page,
+                max_concurrency=3,
+                host_throttle=HostThrottle(max_concurrency_per_host=2, min_interval=0),
+            )
+        )
+        self.assertEqual(
+            sorted(self.fetched), sorted(list(_SITE)[:4] + ["https://a.com/broken"])
+        )
+        self.assertEqual(sorted(page.url for page in pages), sorted(list(_SITE)[:4]))
+
+    def test_redirect_to_visited_page_skipped(self) -> None:
+        pages = list(
+            crawl(
+                start_urls=["https://a.com/3", "https://a.com/old"],
+                fetch_page=self._fetch_page,
+                max_concurrency=1,
+                host_throttle=HostThrottle(max_concurrency_per_host=1, min_interval=0),
+            )
+        )
+        self.assertEqual([page.url for page in pages], ["https://a.com/3"])
+
+    def test_host_throttle(self) -> None:
+        active = 0
+        max_active = 0
+        start_times: list[float] = []
+
+        def _slow_fetch(url: str) -> CrawledPage:
+            nonlocal active, max_active
+            with self.lock:
+                active += 1
+                max_active = max(max_active, active)
+                start_times.append(time.monotonic())
+            time.sleep(0.02)
+            with self.lock:
+                active -= 1
+            return CrawledPage(url=url, document=None)
+
+        list(
+            crawl(
+                start_urls=[f"https://a.com/{i}" for i in range(8)],
+                fetch_page=_slow_fetch,
+                max_concurrency=8,
+                host_throttle=HostThrottle(
+                    max_concurrency_per_host=2, min_interval=0.01
+                ),
+            )
+        )
+        self.assertLessEqual(max_active, 2)
+        start_times.sort()
+        self.assertGreaterEqual(start_times[-1] - start_times[0], 0.07 - 0.005)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+import httpx
+
+from danswer.document_index.vespa.feed_client import VespaFeedClient
+
+
+class TestVespaFeedClient(unittest.TestCase):
+    def test_retries_throttled_requests(self) -> None:
+        call_cnt = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal call_cnt
+            call_cnt += 1
+            if call_cnt == 1:
+                return httpx.Response(429)
+            return httpx.Response(200, json={"id": "id:default:danswer_chunk::1"})
+
+        feed_client = VespaFeedClient(max_in_flight=4)
+        feed_client._client = httpx.Client(transport=httpx.MockTransport(handler))
+
+        response = feed_client.request("POST", "http://vespa/document/v1/1", json={})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(call_cnt, 2)
+        # the in flight limit is halved on a throttled response
+        self.assertLess(feed_client._limiter.limit, 4)
+
+    def test_feed_reports_stats_and_raises_failures(self) -> None:
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path.endswith("/bad"):
+                return httpx.Response(400)
+            return httpx.Response(200)
+
+        feed_client = VespaFeedClient(max_in_flight=4)
+        feed_client._client = httpx.Client(transport=httpx.MockTransport(handler))
+
+        def _post(doc_chunk_id: str) -> None:
+            feed_client.request(
+                "POST", f"http://vespa/document/v1/{doc_chunk_id}"
+            ).raise_for_status()
+
+        stats = feed_client.feed([str(i) for i in range(10)], _post)
+        self.assertEqual(stats.num_operations, 10)
+        self.assertEqual(len(stats.latencies), 10)
+        self.assertGreater(stats.operations_per_second, 0)
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            feed_client.feed(["1", "bad", "3"], _post)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,362 @@
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from typing import Any
+from unittest import mock
+
+import tiktoken
+
+from danswer.dynamic_configs.interface import ConfigNotFoundError
+from danswer.dynamic_configs.interface import DynamicConfigStore
+from danswer.dynamic_configs.interface import JSON_ro
+
+# litellm downloads a tiktoken encoding on import, it is not used here
+with mock.patch.object(tiktoken, "get_encoding"):
+    from danswer.document_index.vespa import index as vespa_index
+    from danswer.document_index.vespa.index import _build_cross_encoder_ranking
+    from danswer.document_index.vespa.index import _check_pending_restart
+    from danswer.document_index.vespa.index import _delete_vespa_docs
+    from danswer.document_index.vespa.index import _get_embedding_type_changes
+    from danswer.document_index.vespa.index import (
+        _get_vespa_chunk_ids_by_document_id,
+    )
+    from danswer.document_index.vespa.index import _handle_config_change_actions
+    from danswer.document_index.vespa.index import CrossEncoderRankingFiles
+    from danswer.document_index.vespa.index import get_cross_encoder_ranking_files
+    from danswer.document_index.vespa.index import render_vespa_app_config
+    from danswer.document_index.vespa.index import VespaIndex
+    from danswer.search.models import IndexFilters
+
+_APP_CONFIG_DIR = os.path.join(os.path.dirname(vespa_index.__file__), "app_config")
+
+
+def _build_deployment_zip(tmp_dir: str) -> str:
+    deployment_zip = os.path.join(tmp_dir, "app.zip")
+    with zipfile.ZipFile(deployment_zip, "w") as zip_file:
+        for root, _, files in os.walk(_APP_CONFIG_DIR):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                zip_file.write(path, os.path.relpath(path, _APP_CONFIG_DIR))
+    return deployment_zip
+
+
+class TestCrossEncoderRanking(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+
+        onnx_model_path = os.path.join(self.tmp_dir, "model.onnx")
+        tokenizer_path = os.path.join(self.tmp_dir, "tokenizer.json")
+        for path in [onnx_model_path, tokenizer_path]:
+            with open(path, "w") as f:
+                f.write(path)
+        self.cross_encoder = CrossEncoderRankingFiles(
+            onnx_model_path=onnx_model_path,
+            tokenizer_path=tokenizer_path,
+            input_names=["input_ids", "attention_mask"],
+            max_tokens=256,
+        )
+
+    def test_build_ranking(self) -> None:
+        ranking = _build_cross_encoder_ranking(
+            cross_encoder=self.cross_encoder,
+            embedding_dim=768,
+            enable_binary_embeddings=False,
+        )
+        self.assertNotIn("${", ranking)
+        self.assertIn("tensor<float>(d0[256])", ranking)
+        self.assertIn("input input_ids: input_ids", ranking)
+        self.assertIn("input attention_mask: attention_mask", ranking)
+        self.assertIn("inherits hybrid_search, cross_encoder_rank", ranking)
+        self.assertIn("closeness(field, embeddings)", ranking)
+
+        binary_ranking = _build_cross_encoder_ranking(
+            cross_encoder=self.cross_encoder,
+            embedding_dim=768,
+            enable_binary_embeddings=True,
+        )
+        self.assertIn(
+            "inherits hybrid_search_binary, cross_encoder_rank", binary_ranking
+        )
+        self.assertIn("/ 768)", binary_ranking)
+
+    def test_rendered_app_config(self) -> None:
+        deployment_zip = _build_deployment_zip(self.tmp_dir)
+
+        rendered = render_vespa_app_config(
+            deployment_zip, cross_encoder=self.cross_encoder
+        )
+
+        with zipfile.ZipFile(io.BytesIO(rendered)) as rendered_zip:
+            schema = rendered_zip.read("schemas/danswer_chunk.sd").decode()
+            services = rendered_zip.read("services.xml").decode()
+            names = rendered_zip.namelist()
+
+        self.assertIn("rank-profile semantic_search_cross_encoder", schema)
+        self.assertIn("rank-profile hybrid_search_cross_encoder", schema)
+        self.assertIn('type="hugging-face-tokenizer"', services)
+        self.assertIn("models/cross_encoder.onnx", names)
+        self.assertIn("models/cross_encoder_tokenizer.json", names)
+
+        without_cross_encoder = render_vespa_app_config(deployment_zip)
+        self.assertNotIn(b"cross_encoder.onnx", without_cross_encoder)
+
+    def test_no_cross_encoder_model(self) -> None:
+        with mock.patch.object(vespa_index, "CROSS_ENCODER_MODEL_ENSEMBLE", []):
+            with self.assertRaises(ValueError):
+                get_cross_encoder_ranking_files()
+
+
+class TestEmbeddingTypeChange(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.deployment_zip = _build_deployment_zip(tmp_dir.name)
+
+    def _render_schema(self, **kwargs: Any) -> str:
+        rendered = render_vespa_app_config(self.deployment_zip, **kwargs)
+        with zipfile.ZipFile(io.BytesIO(rendered)) as rendered_zip:
+            return rendered_zip.read("schemas/danswer_chunk.sd").decode()
+
+    def test_type_changes(self) -> None:
+        deployed_schema = self._render_schema(
+            embedding_dim=384, embedding_cell_type="float"
+        )
+
+        same_app = render_vespa_app_config(
+            self.deployment_zip, embedding_dim=384, embedding_cell_type="float"
+        )
+        self.assertEqual(_get_embedding_type_changes(deployed_schema, same_app), {})
+
+        changed_app = render_vespa_app_config(
+            self.deployment_zip, embedding_dim=768, embedding_cell_type="bfloat16"
+        )
+        self.assertEqual(
+            _get_embedding_type_changes(deployed_schema, changed_app),
+            {
+                "embeddings": (
+                    "tensor<float>(t{},x[384])",
+                    "tensor<bfloat16>(t{},x[768])",
+                ),
+                "binary_embeddings": (
+                    "tensor<int8>(t{},x[48])",
+                    "tensor<int8>(t{},x[96])",
+                ),
+            },
+        )
+
+    def test_validation_override(self) -> None:
+        rendered = render_vespa_app_config(
+            self.deployment_zip, allow_field_type_change=True
+        )
+        with zipfile.ZipFile(io.BytesIO(rendered)) as rendered_zip:
+            overrides = rendered_zip.read("validation-overrides.xml").decode()
+        self.assertIn(">field-type-change</allow>", overrides)
+
+        without_override = render_vespa_app_config(self.deployment_zip)
+        with zipfile.ZipFile(io.BytesIO(without_override)) as rendered_zip:
+            self.assertNotIn("validation-overrides.xml", rendered_zip.namelist())
+
+
+class _InMemoryConfigStore(DynamicConfigStore):
+    def __init__(self) -> None:
+        self.values: dict[str, JSON_ro] = {}
+
+    def store(self, key: str, val: JSON_ro) -> None:
+        self.values[key] = val
+
+    def load(self, key: str) -> JSON_ro:
+        if key not in self.values:
+            raise ConfigNotFoundError
+        return self.values[key]
+
+    def delete(self, key: str) -> None:
+        self.values.pop(key, None)
+
+
+class TestConfigChangeActions(unittest.TestCase):
+    def setUp(self) -> None:
+        self.kv_store = _InMemoryConfigStore()
+        patcher = mock.patch.object(
+            vespa_index, "get_dynamic_config_store", return_value=self.kv_store
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reindex_is_triggered(self) -> None:
+        response_json = {
+            "configChangeActions": {
+                "restart": [],
+                "reindex": [
+                    {
+                        "name": "indexing-change",
+                        "documentType": "danswer_chunk",
+                        "clusterName": "danswer_index",
+                        "messages": ["Field 'content_words' changed"],
+                    }
+                ],
+            }
+        }
+        with mock.patch.object(vespa_index.requests, "post") as post:
+            _handle_config_change_actions(response_json)
+
+        self.assertTrue(post.call_args.args[0].endswith("/reindex"))
+        self.assertEqual(
+            post.call_args.kwargs["params"],
+            {"clusterId": "danswer_index", "documentType": "danswer_chunk"},
+        )
+
+    def test_restart_fails(self) -> None:
+        response_json = {
+            "configChangeActions": {
+                "restart": [
+                    {
+                        "clusterName": "danswer_index",
+                        "messages": ["Add hnsw index for tensor field 'embeddings'"],
+                    }
+                ],
+            }
+        }
+        with self.assertRaises(RuntimeError):
+            _handle_config_change_actions(response_json)
+
+        _handle_config_change_actions({})
+        self.assertEqual(
+            list(self.kv_store.values.values()),
+            [["Add hnsw index for tensor field 'embeddings'"]],
+        )
+
+    def test_pending_restart_until_converged(self) -> None:
+        _check_pending_restart(timeout=0)
+
+        self.kv_store.store("vespa_pending_restart", ["Restart services"])
+        with mock.patch.object(vespa_index.requests, "get") as get:
+            # deploying the same app again returns no change actions
+            get.return_value.json.return_value = {"converged": False}
+            with self.assertRaises(RuntimeError):
+                _check_pending_restart(timeout=0)
+            self.assertIn("vespa_pending_restart", self.kv_store.values)
+
+            get.return_value.json.return_value = {"converged": True}
+            _check_pending_restart(timeout=0)
+            self.assertEqual(self.kv_store.values, {})
+            self.assertTrue(get.call_args.args[0].endswith("/serviceconverge"))
+
+
+class TestDeleteVespaDocs(unittest.TestCase):
+    def test_selection_escapes_document_ids(self) -> None:
+        feed_client = mock.Mock()
+        feed_client.request.return_value.json.return_value = {}
+        with mock.patch.object(
+            vespa_index, "get_vespa_feed_client", return_value=feed_client
+        ):
+            _delete_vespa_docs(["doc-1", "it's\\"])
+
+        params = feed_client.request.call_args.kwargs["params"]
+        self.assertEqual(
+            params["selection"],
+            "danswer_chunk.document_id=='doc-1' or "
+            "danswer_chunk.document_id=='it\\'s\\\\'",
+        )
+
+
+class TestGetVespaChunkIds(unittest.TestCase):
+    def test_query_escapes_document_id(self) -> None:
+        with mock.patch.object(vespa_index.requests, "get") as get:
+            get.return_value.json.return_value = {"root": {}}
+            _get_vespa_chunk_ids_by_document_id("https://site.com/it's")
+
+        self.assertTrue(
+            get.call_args.kwargs["params"]["yql"].endswith(
+                "document_id contains 'https://site.com/it\\'s'"
+            )
+        )
+
+
+class TestQueryParams(unittest.TestCase):
+    def test_content_match_clause(self) -> None:
+        filters = IndexFilters(access_control_list=None)
+        with mock.patch.object(
+            vespa_index,
+            "embed_queries",
+            side_effect=lambda queries: [[1.0]] * len(queries),
+        ):
+            # without editing the keyword query, the stop words would be downloaded
+            all_params = [
+                VespaIndex._keyword_query_params(
+                    query="vespa timeout",
+                    filters=filters,
+                    time_decay_multiplier=1,
+                    num_to_retrieve=10,
+                    edit_keyword_query=False,
+                ),
+                VespaIndex._semantic_query_params(
+                    query="vespa timeout",
+                    filters=filters,
+                    time_decay_multiplier=1,
+                    num_to_retrieve=10,
+                    edit_keyword_query=False,
+                ),
+                VespaIndex._hybrid_query_params(
+                    query="vespa timeout",
+                    filters=filters,
+                    time_decay_multiplier=1,
+                    num_to_retrieve=10,
+                    edit_keyword_query=False,
+                ),
+            ]
+
+        for params in all_params:
+            self.assertIn(
+                'or ({defaultIndex: "content_words"}userInput(@query)))',
+                str(params["yql"]),
+            )
+            self.assertTrue(str(params["query"]).strip())
+            self.assertNotIn("content_query_0", params)
+
+    def test_content_match_clause_per_rephrase(self) -> None:
+        filters = IndexFilters(access_control_list=None)
+        query_kwargs: dict[str, Any] = dict(
+            query="vespa timeout",
+            filters=filters,
+            time_decay_multiplier=1,
+            num_to_retrieve=10,
+            edit_keyword_query=False,
+            query_rephrases=["vespa zeitüberschreitung"],
+        )
+        with mock.patch.object(
+            vespa_index,
+            "embed_queries",
+            side_effect=lambda queries: [[float(ind)] for ind in range(len(queries))],
+        ):
+            keyword_params = VespaIndex._keyword_query_params(**query_kwargs)
+            semantic_params = VespaIndex._semantic_query_params(**query_kwargs)
+            hybrid_params = VespaIndex._hybrid_query_params(**query_kwargs)
+
+        for params in [keyword_params, semantic_params, hybrid_params]:
+            yql = str(params["yql"])
+            # each rephrasing has to match all of its own words, not the merged ones
+            self.assertIn(
+                'or (({defaultIndex: "content_words"}userInput(@content_query_0)) '
+                'or ({defaultIndex: "content_words"}userInput(@content_query_1))))',
+                yql,
+            )
+            self.assertNotIn("userInput(@query))", yql)
+            self.assertEqual(params["content_query_0"], "vespa timeout")
+            self.assertEqual(params["content_query_1"], "vespa zeitüberschreitung")
+            # the weakAnd and highlighting use the words of all the rephrasings
+            self.assertEqual(params["query"], "vespa timeout vespa zeitüberschreitung")
+
+        for params in [semantic_params, hybrid_params]:
+            yql = str(params["yql"])
+            self.assertIn("nearestNeighbor(embeddings, query_embedding)) or (", yql)
+            self.assertIn("nearestNeighbor(embeddings, query_embedding_1)))", yql)
+            self.assertEqual(params["input.query(query_embedding)"], "[0.0]")
+            self.assertEqual(params["input.query(query_embedding_1)"], "[1.0]")
+
+
+if __name__ == "__main__":
+    unittest.main()
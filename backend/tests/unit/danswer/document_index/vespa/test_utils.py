@@ -0,0 +1,76 @@
+import math
+import random
+import unittest
+
+import numpy as np
+
+from danswer.document_index.vespa.utils import binarize_embedding
+from danswer.document_index.vespa.utils import build_dynamic_summary
+from danswer.document_index.vespa.utils import cast_embedding
+from danswer.document_index.vespa.utils import escape_yql_string
+
+
+def _cosine(a: list[float] | list[int], b: list[float] | list[int]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    return dot / (math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b)))
+
+
+class TestEmbeddingCasting(unittest.TestCase):
+    def test_int8_cast_keeps_angles(self) -> None:
+        rand = random.Random(0)
+        a = [rand.uniform(-0.1, 0.1) for _ in range(384)]
+        b = [rand.uniform(-0.1, 0.1) for _ in range(384)]
+
+        int8_a = cast_embedding(a, "int8")
+        int8_b = cast_embedding(b, "int8")
+
+        self.assertTrue(all(-127 <= value <= 127 for value in int8_a + int8_b))
+        self.assertEqual(max(abs(value) for value in int8_a), 127)
+        self.assertAlmostEqual(_cosine(a, b), _cosine(int8_a, int8_b), places=2)
+        self.assertEqual(cast_embedding([0.0, 0.0], "int8"), [0, 0])
+        # Vespa converts to bfloat16 itself
+        self.assertIs(cast_embedding(a, "bfloat16"), a)
+
+    def test_binarize_matches_packbits(self) -> None:
+        rand = random.Random(0)
+        embedding = [rand.uniform(-1, 1) for _ in range(20)]
+
+        expected = np.packbits(np.array(embedding) > 0).astype(np.int8).tolist()
+        self.assertEqual(binarize_embedding(embedding), expected)
+        self.assertEqual(len(binarize_embedding(embedding)), 3)
+
+
+class TestDynamicSummary(unittest.TestCase):
+    def test_highlights_query_terms(self) -> None:
+        content = (
+            "Danswer supports many connectors. "
+            + "Unrelated filler text about other things. " * 10
+            + "The Slack connector indexes public channels."
+        )
+
+        summary = build_dynamic_summary(content, "slack connector", fragment_context=20)
+
+        fragments = summary.split("<sep />")
+        self.assertEqual(len(fragments), 2)
+        self.assertIn("<hi>connectors</hi>", fragments[0])
+        self.assertIn("The <hi>Slack</hi> <hi>connector</hi> indexes", fragments[1])
+        # snippets don't start or end in the middle of a word
+        for fragment in fragments:
+            self.assertIn(fragment.replace("<hi>", "").replace("</hi>", ""), content)
+            self.assertFalse(fragment.startswith(" "))
+
+    def test_no_match_returns_content(self) -> None:
+        content = "Nothing to see here"
+        self.assertEqual(build_dynamic_summary(content, "slack"), content)
+        self.assertEqual(build_dynamic_summary(content, None), content)
+
+
+class TestEscapeYqlString(unittest.TestCase):
+    def test_escapes_quotes_and_backslashes(self) -> None:
+        self.assertEqual(escape_yql_string("doc-1"), "doc-1")
+        self.assertEqual(escape_yql_string("it's"), "it\\'s")
+        self.assertEqual(escape_yql_string("a\\' or true"), "a\\\\\\' or true")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,273 @@
+import random
+import re
+import string
+import unittest
+from unittest import mock
+
+import tiktoken
+from tokenizers import models
+from tokenizers import normalizers
+from tokenizers import pre_tokenizers
+from tokenizers import Tokenizer
+from transformers import PreTrainedTokenizerFast  # type:ignore
+
+from danswer.configs.app_configs import BLURB_SIZE
+from danswer.configs.constants import DocumentSource
+from danswer.configs.model_configs import CHUNK_SIZE
+from danswer.connectors.models import Document
+from danswer.connectors.models import Section
+from danswer.indexing.models import DocAwareChunk
+from danswer.search import search_nlp_models
+from danswer.search.search_nlp_models import get_default_tokenizer
+from danswer.utils.text_processing import shared_precompare_cleanup
+
+
+def _tiktoken_available() -> bool:
+    try:
+        tiktoken.get_encoding("cl100k_base")
+        return True
+    except Exception:
+        return False
+
+
+# llama_index imports litellm, which downloads a tiktoken encoding on import. It is not
+# used for chunking
+_TIKTOKEN_AVAILABLE = _tiktoken_available()
+with mock.patch.object(tiktoken, "get_encoding"):
+    from llama_index.text_splitter import SentenceSplitter
+
+    from danswer.indexing import chunker
+    from danswer.indexing.chunker import chunk_document
+    from danswer.indexing.chunker import chunk_large_section
+    from danswer.indexing.chunker import get_token_counts
+    from danswer.indexing.chunker import DefaultChunker
+    from danswer.indexing.chunker import ParallelChunker
+    from danswer.indexing.chunker import SECTION_SEPARATOR
+
+
+_WORDS = [
+    "deploy",
+    "the",
+    "vespa",
+    "index",
+    "failed",
+    "because",
+    "of",
+    "a",
+    "timeout",
+    "connector",
+    "Slack",
+    "thread",
+    "reply",
+    "résumé",
+    "naïve",
+    "embedding",
+    "2023-12-01",
+    "v1.2.3",
+    "e-mail",
+    "#general",
+]
+
+
+class _WordTokenizer:
+    """Slow tokenizer (no `is_fast`), chunking falls back to re-tokenizing chunks"""
+
+    def tokenize(self, text: str) -> list[str]:
+        return re.findall(r"\w+|[^\w\s]", text)
+
+
+def _build_wordpiece_tokenizer() -> PreTrainedTokenizerFast:
+    """BERT style fast tokenizer like the default embedding model's, built in memory
+    instead of downloaded. Only some of the words are in the vocab, the others are
+    split into word pieces"""
+    whole_words = sorted({word.lower() for word in _WORDS[::2] if word.isalpha()})
+    characters = string.ascii_lowercase + string.digits + string.punctuation
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]"] + whole_words
+    vocab += list(characters) + [f"##{char}" for char in characters]
+
+    tokenizer = Tokenizer(
+        models.WordPiece(
+            {token: ind for ind, token in enumerate(vocab)}, unk_token="[UNK]"
+        )
+    )
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        unk_token="[UNK]",
+        pad_token="[PAD]",
+        cls_token="[CLS]",
+        sep_token="[SEP]",
+    )
+
+
+def _build_document(num_sections: int, seed: int = 0) -> Document:
+    rand = random.Random(seed)
+    sections = []
+    for ind in range(num_sections):
+        # mostly short sections (e.g. Slack messages), with the occasional large one
+        num_words = rand.choice([3, 8, 15, 40, 120]) if ind % 500 else 900
+        words = [rand.choice(_WORDS) for _ in range(num_words)]
+        text = " ".join(words) + "."
+        sections.append(Section(text=text, link=f"https://example.com/{ind}"))
+    return Document(
+        id="chunker-benchmark",
+        sections=sections,
+        source=DocumentSource.SLACK,
+        semantic_identifier="Chunker Benchmark",
+        metadata={},
+    )
+
+
+def _reference_extract_blurb(text: str, blurb_size: int) -> str:
+    blurb_splitter = SentenceSplitter(
+        tokenizer=get_default_tokenizer().tokenize,
+        chunk_size=blurb_size,
+        chunk_overlap=0,
+    )
+    return blurb_splitter.split_text(text)[0]
+
+
+def _reference_chunk_document(
+    document: Document,
+    chunk_tok_size: int = CHUNK_SIZE,
+    blurb_size: int = BLURB_SIZE,
+) -> list[DocAwareChunk]:
+    """The original chunking flow, re-tokenizes the accumulated chunk for every section"""
+    tokenizer = get_default_tokenizer()
+
+    chunks: list[DocAwareChunk] = []
+    link_offsets: dict[int, str] = {}
+    chunk_text = ""
+    for section in document.sections:
+        section_link_text = section.link or ""
+        section_tok_length = len(tokenizer.tokenize(section.text))
+        current_tok_length = len(tokenizer.tokenize(chunk_text))
+        curr_offset_len = len(shared_precompare_cleanup(chunk_text))
+
+        if section_tok_length > chunk_tok_size:
+            if chunk_text:
+                chunks.append(
+                    DocAwareChunk(
+                        source_document=document,
+                        chunk_id=len(chunks),
+                        blurb=_reference_extract_blurb(chunk_text, blurb_size),
+                        content=chunk_text,
+                        source_links=link_offsets,
+                        section_continuation=False,
+                    )
+                )
+                link_offsets = {}
+                chunk_text = ""
+
+            chunks.extend(
+                chunk_large_section(
+                    section=section,
+                    document=document,
+                    start_chunk_id=len(chunks),
+                    tokenizer=tokenizer,
+                    chunk_size=chunk_tok_size,
+                    chunk_overlap=0,
+                    blurb_size=blurb_size,
+                )
+            )
+            continue
+
+        if (
+            current_tok_length
+            + len(tokenizer.tokenize(SECTION_SEPARATOR))
+            + section_tok_length
+            <= chunk_tok_size
+        ):
+            chunk_text += (
+                SECTION_SEPARATOR + section.text if chunk_text else section.text
+            )
+            link_offsets[curr_offset_len] = section_link_text
+        else:
+            chunks.append(
+                DocAwareChunk(
+                    source_document=document,
+                    chunk_id=len(chunks),
+                    blurb=_reference_extract_blurb(chunk_text, blurb_size),
+                    content=chunk_text,
+                    source_links=link_offsets,
+                    section_continuation=False,
+                )
+            )
+            link_offsets = {0: section_link_text}
+            chunk_text = section.text
+
+    if chunk_text:
+        chunks.append(
+            DocAwareChunk(
+                source_document=document,
+                chunk_id=len(chunks),
+                blurb=_reference_extract_blurb(chunk_text, blurb_size),
+                content=chunk_text,
+                source_links=link_offsets,
+                section_continuation=False,
+            )
+        )
+    return chunks
+
+
+class TestChunkDocument(unittest.TestCase):
+    def _use_tokenizer(self, tokenizer: object) -> None:
+        patch = mock.patch.object(search_nlp_models, "_TOKENIZER", tokenizer)
+        patch.start()
+        self.addCleanup(patch.stop)
+        # the splitters hold on to the tokenizer they were built with
+        chunker._get_sentence_splitter.cache_clear()
+        self.addCleanup(chunker._get_sentence_splitter.cache_clear)
+
+    def test_running_counts_match_reference(self) -> None:
+        tokenizer = _build_wordpiece_tokenizer()
+        self._use_tokenizer(tokenizer)
+        self.assertTrue(chunker._tokens_are_split_on_whitespace(tokenizer))
+
+        document = _build_document(num_sections=300, seed=1)
+        texts = [section.text for section in document.sections]
+        self.assertEqual(
+            get_token_counts(tokenizer, texts),
+            [len(tokenizer.tokenize(text)) for text in texts],
+        )
+        # smaller chunks to have more sections land right at a chunk boundary
+        for chunk_tok_size in [128, CHUNK_SIZE]:
+            with self.subTest(chunk_tok_size=chunk_tok_size):
+                self.assertEqual(
+                    chunk_document(document, chunk_tok_size=chunk_tok_size),
+                    _reference_chunk_document(document, chunk_tok_size=chunk_tok_size),
+                )
+
+    def test_slow_tokenizer_matches_reference(self) -> None:
+        tokenizer = _WordTokenizer()
+        self._use_tokenizer(tokenizer)
+        self.assertFalse(chunker._tokens_are_split_on_whitespace(tokenizer))
+
+        document = _build_document(num_sections=300, seed=1)
+        self.assertEqual(chunk_document(document), _reference_chunk_document(document))
+
+
+@unittest.skipUnless(
+    _TIKTOKEN_AVAILABLE, "the chunking worker processes need to download the models"
+)
+class TestParallelChunker(unittest.TestCase):
+    def test_matches_default_chunker(self) -> None:
+        documents = [
+            _build_document(num_sections=50, seed=seed).copy(
+                update={"id": f"doc-{seed}"}
+            )
+            for seed in range(8)
+        ]
+        chunker = ParallelChunker(num_processes=2)
+        try:
+            self.assertEqual(
+                chunker.chunk_documents(documents),
+                DefaultChunker().chunk_documents(documents),
+            )
+        finally:
+            chunker.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest import mock
+
+import tiktoken
+
+# litellm downloads a tiktoken encoding on import, it is not used here
+with mock.patch.object(tiktoken, "get_encoding"):
+    from danswer.indexing import embedder
+    from danswer.indexing.embedder import _build_length_bucketed_batches
+
+
+class _WhitespaceTokenizer:
+    """Slow tokenizer, one token per word plus [CLS] and [SEP] when encoding"""
+
+    def tokenize(self, text: str) -> list[str]:
+        return text.split()
+
+    def num_special_tokens_to_add(self) -> int:
+        return 2
+
+
+def _build_batches(
+    texts: list[str], token_budget: int, max_seq_length: int = 512
+) -> list[list[int]]:
+    with mock.patch.object(
+        embedder, "get_default_tokenizer", return_value=_WhitespaceTokenizer()
+    ):
+        return _build_length_bucketed_batches(
+            texts=texts,
+            token_budget=token_budget,
+            max_seq_length=max_seq_length,
+            passage_prefix="passage: ",
+        )
+
+
+class TestLengthBucketedBatches(unittest.TestCase):
+    def test_prefix_and_special_tokens_count_towards_budget(self) -> None:
+        # 3 words + 1 prefix token + 2 special tokens = 6 tokens per text
+        texts = ["one two three"] * 4
+
+        self.assertEqual(_build_batches(texts, token_budget=12), [[0, 1], [2, 3]])
+        self.assertEqual(_build_batches(texts, token_budget=11), [[0], [1], [2], [3]])
+
+    def test_batches_stay_within_budget(self) -> None:
+        texts = [" ".join(["word"] * num_words) for num_words in [40, 2, 9, 17, 5, 1]]
+        token_counts = [len(text.split()) + 3 for text in texts]
+
+        batches = _build_batches(texts, token_budget=48)
+
+        self.assertEqual(
+            sorted(ind for batch in batches for ind in batch), list(range(len(texts)))
+        )
+        for batch in batches:
+            # similar lengths are batched together, shortest first
+            self.assertEqual(batch, sorted(batch, key=lambda ind: token_counts[ind]))
+            self.assertLessEqual(
+                len(batch) * max(token_counts[ind] for ind in batch), 48
+            )
+
+    def test_long_text_gets_own_batch(self) -> None:
+        texts = ["short text", " ".join(["word"] * 100)]
+
+        self.assertEqual(_build_batches(texts, token_budget=50), [[0], [1]])
+        # truncated to the max sequence length by the model
+        self.assertEqual(
+            _build_batches(texts, token_budget=50, max_seq_length=20), [[0, 1]]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+from typing import Any
+from unittest import mock
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import Delete
+from sqlalchemy.sql import Insert
+from sqlalchemy.sql import Select
+from sqlalchemy.sql import Update
+
+from danswer.indexing.embedding_cache import EmbeddingCache
+from danswer.indexing.embedding_cache import hash_embedding_text
+
+
+def _sql(stmt: Any) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+class _FakeSession:
+    """Records the statements, selects return `rows` and counts return `count`"""
+
+    def __init__(self, rows: list[tuple[str, list[float]]], count: int = 0) -> None:
+        self.rows = rows
+        self.count = count
+        self.statements: list[Any] = []
+        self.commits = 0
+
+    def execute(self, stmt: Any) -> list[tuple[str, list[float]]]:
+        self.statements.append(stmt)
+        return self.rows if isinstance(stmt, Select) else []
+
+    def scalar(self, stmt: Any) -> int:
+        self.statements.append(stmt)
+        return self.count
+
+    def commit(self) -> None:
+        self.commits += 1
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def _patch_session(self, db_session: _FakeSession) -> None:
+        session = mock.MagicMock()
+        session.return_value.__enter__.return_value = db_session
+        patches = [
+            mock.patch("danswer.indexing.embedding_cache.Session", session),
+            mock.patch("danswer.indexing.embedding_cache.get_sqlalchemy_engine"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_hit_and_miss(self) -> None:
+        hit_hash = hash_embedding_text("unchanged chunk")
+        miss_hash = hash_embedding_text("new chunk")
+        db_session = _FakeSession(rows=[(hit_hash, [0.1, 0.2])])
+        self._patch_session(db_session)
+
+        cache = EmbeddingCache()
+        cached = cache.get("model", "passage: ", [hit_hash, miss_hash])
+
+        self.assertEqual(cached, {hit_hash: [0.1, 0.2]})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        select_stmt, update_stmt = db_session.statements
+        # keyed on the model and the prefix as well as the text
+        self.assertIn("embedding_cache.model_name =", _sql(select_stmt))
+        self.assertIn("embedding_cache.passage_prefix =", _sql(select_stmt))
+        # the hits are marked as recently used for the eviction
+        self.assertIsInstance(update_stmt, Update)
+        self.assertIn("last_used_at=now()", _sql(update_stmt))
+        self.assertEqual(db_session.commits, 1)
+
+    def test_all_misses_are_read_only(self) -> None:
+        db_session = _FakeSession(rows=[])
+        self._patch_session(db_session)
+
+        cache = EmbeddingCache()
+        self.assertEqual(cache.get("model", "", [hash_embedding_text("a")]), {})
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertEqual(len(db_session.statements), 1)
+        self.assertEqual(db_session.commits, 0)
+
+    def test_store(self) -> None:
+        db_session = _FakeSession(rows=[])
+        self._patch_session(db_session)
+
+        EmbeddingCache().put("model", "passage: ", {"hash_a": [0.1], "hash_b": [0.2]})
+
+        (insert_stmt,) = db_session.statements
+        self.assertIsInstance(insert_stmt, Insert)
+        sql = _sql(insert_stmt)
+        self.assertIn(
+            "ON CONFLICT (model_name, passage_prefix, content_hash) DO UPDATE", sql
+        )
+        self.assertIn("last_used_at = now()", sql)
+        self.assertEqual(db_session.commits, 1)
+
+        # nothing to store, no round trip
+        db_session.statements = []
+        EmbeddingCache().put("model", "passage: ", {})
+        self.assertEqual(db_session.statements, [])
+
+    def test_eviction(self) -> None:
+        db_session = _FakeSession(rows=[], count=10)
+        self._patch_session(db_session)
+
+        self.assertEqual(EmbeddingCache().evict(max_entries=10), 0)
+        self.assertEqual(len(db_session.statements), 1)
+
+        db_session.statements = []
+        self.assertEqual(EmbeddingCache().evict(max_entries=7), 3)
+        _, delete_stmt = db_session.statements
+        self.assertIsInstance(delete_stmt, Delete)
+        sql = _sql(delete_stmt)
+        # the least recently used entries
+        self.assertIn("ORDER BY embedding_cache.last_used_at", sql)
+        self.assertEqual(
+            delete_stmt.compile(dialect=postgresql.dialect()).params["param_1"], 3
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
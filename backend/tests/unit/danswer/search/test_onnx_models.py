@@ -0,0 +1,62 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from danswer.search import onnx_models
+from danswer.search.onnx_models import OnnxEmbeddingModel
+
+
+class TestOnnxEmbeddingModel(unittest.TestCase):
+    def test_encode_no_texts(self) -> None:
+        # skips loading and exporting the model, nothing should be run for no texts
+        model = OnnxEmbeddingModel.__new__(OnnxEmbeddingModel)
+        model.embedding_dim = 384
+        model.always_normalize = True
+        model.session = mock.Mock()
+
+        embeddings = model.encode([], normalize_embeddings=True)
+
+        self.assertEqual(embeddings.shape, (0, 384))
+        model.session.run.assert_not_called()
+
+    def test_load_exported_model(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        with mock.patch.object(onnx_models, "ONNX_MODEL_CACHE_DIR", tmp_dir.name):
+            export_path = onnx_models._get_export_path("org/model", quantize=True)
+        export_path.parent.mkdir(parents=True)
+        export_path.touch()
+        with open(export_path.parent / "sentence_config.json", "w") as config_file:
+            json.dump(
+                {"cls_pooling": True, "always_normalize": False, "embedding_dim": 768},
+                config_file,
+            )
+
+        tokenizer = mock.Mock(model_input_names=["input_ids", "attention_mask"])
+        with mock.patch.object(
+            onnx_models, "ONNX_MODEL_CACHE_DIR", tmp_dir.name
+        ), mock.patch.object(
+            onnx_models, "SentenceTransformer"
+        ) as sentence_transformer, mock.patch.object(
+            onnx_models.AutoTokenizer, "from_pretrained", return_value=tokenizer
+        ) as from_pretrained, mock.patch.object(
+            onnx_models, "_create_session"
+        ) as create_session:
+            model = OnnxEmbeddingModel("org/model", max_seq_length=512, quantize=True)
+
+        # the torch model is only needed to export
+        sentence_transformer.assert_not_called()
+        self.assertEqual(
+            Path(from_pretrained.call_args.args[0]), export_path.parent / "tokenizer"
+        )
+        create_session.assert_called_once_with(export_path)
+        self.assertTrue(model.cls_pooling)
+        self.assertFalse(model.always_normalize)
+        self.assertEqual(model.embedding_dim, 768)
+        self.assertEqual(model.input_names, ["input_ids", "attention_mask"])
+
+
+if __name__ == "__main__":
+    unittest.main()
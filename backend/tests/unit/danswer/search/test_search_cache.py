@@ -0,0 +1,135 @@
+import unittest
+from collections.abc import Iterator
+from typing import Any
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from danswer.configs.constants import DocumentSource
+from danswer.indexing.models import InferenceChunk
+from danswer.search.search_cache import SearchResultCache
+
+
+def _chunk(document_id: str) -> InferenceChunk:
+    return InferenceChunk(
+        document_id=document_id,
+        chunk_id=0,
+        blurb="",
+        content="content",
+        source_links=None,
+        section_continuation=False,
+        source_type=DocumentSource.WEB,
+        semantic_identifier=document_id,
+        boost=0,
+        recency_bias=1.0,
+        score=1.0,
+        hidden=False,
+        metadata={},
+        match_highlights=[],
+        updated_at=None,
+    )
+
+
+class TestSearchResultCache(unittest.TestCase):
+    def setUp(self) -> None:
+        # the committed rows
+        self.invalidations: list[tuple[int, str]] = []
+        self.num_searches = 0
+        self.num_reads = 0
+        patches = [
+            patch("danswer.search.search_cache.Session", MagicMock()),
+            patch("danswer.search.search_cache.get_sqlalchemy_engine"),
+            patch(
+                "danswer.search.search_cache.fetch_latest_search_cache_invalidation_id",
+                lambda db_session: max(
+                    (row[0] for row in self.invalidations), default=0
+                ),
+            ),
+            patch(
+                "danswer.search.search_cache.fetch_search_cache_invalidations",
+                self._fetch_invalidations,
+            ),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _fetch_invalidations(self, after_id: int, db_session: Any) -> list:
+        self.num_reads += 1
+        return sorted(row for row in self.invalidations if row[0] > after_id)
+
+    def _run_search(self) -> Iterator[list[InferenceChunk] | list[bool]]:
+        self.num_searches += 1
+        yield [_chunk("doc_a"), _chunk("doc_b")]
+        yield [True, False]
+
+    def _search(self, cache: SearchResultCache) -> list:
+        return list(cache.cached_search(("query",), self._run_search))
+
+    def test_hit_returns_copy(self) -> None:
+        cache = SearchResultCache(max_size=10, ttl_seconds=60, refresh_interval=0)
+        first = self._search(cache)
+        first[0][0].score = 0.0
+        second = self._search(cache)
+
+        self.assertEqual(self.num_searches, 1)
+        self.assertEqual(second[0][0].score, 1.0)
+        self.assertEqual(second[1], [True, False])
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+        self.assertAlmostEqual(stats.hit_rate, 0.5)
+
+    def test_invalidated_by_document_update(self) -> None:
+        cache = SearchResultCache(max_size=10, ttl_seconds=60, refresh_interval=0)
+        self._search(cache)
+        self.invalidations.append((1, "doc_unrelated"))
+        self._search(cache)
+        self.assertEqual(self.num_searches, 1)
+
+        self.invalidations.append((2, "doc_b"))
+        self._search(cache)
+        self.assertEqual(self.num_searches, 2)
+        self.assertEqual(cache.stats().invalidated, 1)
+
+        # the new result was searched after the invalidation
+        self._search(cache)
+        self.assertEqual(self.num_searches, 2)
+
+    def test_invalidations_committed_out_of_order(self) -> None:
+        cache = SearchResultCache(max_size=10, ttl_seconds=60, refresh_interval=0)
+        self._search(cache)
+        # the transaction which got id 1 commits after the one which got id 2
+        self.invalidations.append((2, "doc_unrelated"))
+        self._search(cache)
+        self.assertEqual(self.num_searches, 1)
+
+        self.invalidations.append((1, "doc_a"))
+        self._search(cache)
+        self.assertEqual(self.num_searches, 2)
+        self.assertEqual(cache.stats().invalidated, 1)
+
+        # not read again once it showed up
+        self._search(cache)
+        self.assertEqual(self.num_searches, 2)
+
+    def test_invalidations_read_once_per_refresh_interval(self) -> None:
+        cache = SearchResultCache(max_size=10, ttl_seconds=60, refresh_interval=1.0)
+        now = [100.0]
+        with patch("danswer.search.search_cache.time.monotonic", lambda: now[0]):
+            self._search(cache)
+            now[0] += 0.5
+            self._search(cache)
+            self.assertEqual(self.num_reads, 0)
+
+            # served from the last read until the interval is over
+            self.invalidations.append((1, "doc_a"))
+            self._search(cache)
+            self.assertEqual((self.num_reads, self.num_searches), (0, 1))
+
+            now[0] += 0.5
+            self._search(cache)
+            self.assertEqual((self.num_reads, self.num_searches), (1, 2))
+            self.assertEqual(cache.stats().invalidated, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
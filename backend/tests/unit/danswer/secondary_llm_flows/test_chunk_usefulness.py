@@ -0,0 +1,92 @@
+import unittest
+from unittest import mock
+
+import tiktoken
+
+from danswer.prompts.llm_chunk_filter import NONUSEFUL_PAT
+
+# litellm downloads a tiktoken encoding on import, it is not used here
+with mock.patch.object(tiktoken, "get_encoding"):
+    from danswer.secondary_llm_flows import chunk_usefulness
+    from danswer.secondary_llm_flows.chunk_usefulness import extract_batch_usefulness
+    from danswer.secondary_llm_flows.chunk_usefulness import llm_batch_eval_chunks
+
+
+class TestExtractBatchUsefulness(unittest.TestCase):
+    def test_valid_output(self) -> None:
+        self.assertEqual(
+            extract_batch_usefulness(
+                'Sure: {"section_usefulness": [true, false, true]}', 3
+            ),
+            [True, False, True],
+        )
+
+    def test_missing_section(self) -> None:
+        self.assertIsNone(
+            extract_batch_usefulness('{"section_usefulness": [true, false]}', 3)
+        )
+
+    def test_extra_section(self) -> None:
+        self.assertIsNone(
+            extract_batch_usefulness(
+                '{"section_usefulness": [true, false, true, true]}', 3
+            )
+        )
+
+    def test_malformed_output(self) -> None:
+        for model_output in [
+            "The first section is useful",
+            '{"section_usefulness": [true, false, "true"]}',
+            '{"section_usefulness": {"1": true, "2": false, "3": true}}',
+            '{"useful": [true, false, true]}',
+            '{"section_usefulness": [true, false, true]',
+        ]:
+            self.assertIsNone(extract_batch_usefulness(model_output, 3))
+
+
+class TestLlmBatchEvalChunks(unittest.TestCase):
+    def setUp(self) -> None:
+        self.prompts: list[str] = []
+        self.batch_output = '{"section_usefulness": [true, false]}'
+        patch = mock.patch.object(
+            chunk_usefulness, "_invoke_fast_llm", side_effect=self._invoke_fast_llm
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _invoke_fast_llm(self, messages: list[dict[str, str]], timeout: int) -> str:
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        if "Section 1:" in prompt:
+            return self.batch_output
+        # the single chunk prompt, only the chunks with "useless" in them aren't useful
+        return NONUSEFUL_PAT if "useless" in prompt else "Useful"
+
+    def test_batches(self) -> None:
+        usefulness = llm_batch_eval_chunks(
+            "query", ["a", "useless b", "c", "useless d"], batch_size=2
+        )
+        self.assertEqual(usefulness, [True, False, True, False])
+        self.assertEqual(len(self.prompts), 2)
+
+    def test_falls_back_to_one_call_per_chunk(self) -> None:
+        self.batch_output = '{"section_usefulness": [true]}'
+        usefulness = llm_batch_eval_chunks(
+            "query", ["a", "useless b"], use_threads=False, batch_size=2
+        )
+        self.assertEqual(usefulness, [True, False])
+        # the batch call and then one call per chunk
+        self.assertEqual(len(self.prompts), 3)
+
+    def test_failed_batch_keeps_chunks(self) -> None:
+        with mock.patch.object(
+            chunk_usefulness, "_invoke_fast_llm", side_effect=TimeoutError()
+        ):
+            usefulness = llm_batch_eval_chunks(
+                "query", ["a", "useless b"], use_threads=False, batch_size=2
+            )
+        self.assertEqual(usefulness, [True, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
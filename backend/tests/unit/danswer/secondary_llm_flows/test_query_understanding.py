@@ -0,0 +1,131 @@
+import unittest
+from unittest import mock
+
+import tiktoken
+
+from danswer.configs.constants import DocumentSource
+
+# litellm downloads a tiktoken encoding on import, it is not used here
+with mock.patch.object(tiktoken, "get_encoding"):
+    from danswer.secondary_llm_flows import query_understanding
+    from danswer.secondary_llm_flows.query_understanding import (
+        get_query_understanding,
+    )
+    from danswer.secondary_llm_flows.query_understanding import (
+        query_understanding_from_llm_json,
+    )
+
+
+def _parse(model_json: dict) -> object:
+    return query_understanding_from_llm_json(
+        model_json=model_json,
+        query="what did we decide about the launch",
+        rephrase=True,
+        detect_time_filter=True,
+        detect_source_filter=True,
+    )
+
+
+class TestQueryUnderstandingFromLlmJson(unittest.TestCase):
+    def test_full_output(self) -> None:
+        understanding = _parse(
+            {
+                "rephrased_query": " launch decision ",
+                "filter_type": "hard cutoff",
+                "filter_value": "week",
+                "value_multiple": 2,
+                "date": None,
+                "sources": ["slack", "not_a_source"],
+            }
+        )
+        assert understanding is not None
+        self.assertEqual(understanding.rephrased_query, "launch decision")
+        self.assertIsNotNone(understanding.time_cutoff)
+        self.assertFalse(understanding.favor_recent)
+        self.assertEqual(understanding.source_filters, [DocumentSource.SLACK])
+
+    def test_malformed_rephrase(self) -> None:
+        for rephrase in [None, "", "   ", ["launch"], 3]:
+            self.assertIsNone(_parse({"rephrased_query": rephrase, "sources": None}))
+
+    def test_malformed_sources(self) -> None:
+        self.assertIsNone(_parse({"rephrased_query": "launch", "sources": "slack"}))
+        understanding = _parse({"rephrased_query": "launch", "sources": ["nope"]})
+        assert understanding is not None
+        self.assertIsNone(understanding.source_filters)
+
+    def test_partial_output(self) -> None:
+        # no time filter keys is the same as not time sensitive
+        understanding = _parse({"rephrased_query": "launch"})
+        assert understanding is not None
+        self.assertIsNone(understanding.time_cutoff)
+        self.assertFalse(understanding.favor_recent)
+        self.assertIsNone(understanding.source_filters)
+
+        # unparsable time values are ignored rather than failing the whole output
+        understanding = _parse(
+            {
+                "rephrased_query": "launch",
+                "filter_type": "hard cutoff",
+                "filter_value": 7,
+                "value_multiple": "a few",
+            }
+        )
+        assert understanding is not None
+        self.assertIsNone(understanding.time_cutoff)
+
+        understanding = _parse(
+            {"rephrased_query": "launch", "filter_type": "favors recent"}
+        )
+        assert understanding is not None
+        self.assertIsNone(understanding.time_cutoff)
+        self.assertTrue(understanding.favor_recent)
+
+    def test_only_requested_parts_are_needed(self) -> None:
+        understanding = query_understanding_from_llm_json(
+            model_json={},
+            query="launch",
+            rephrase=False,
+            detect_time_filter=False,
+            detect_source_filter=False,
+        )
+        assert understanding is not None
+        self.assertEqual(understanding.rephrased_query, "launch")
+
+
+class TestGetQueryUnderstanding(unittest.TestCase):
+    def setUp(self) -> None:
+        query_understanding._QUERY_UNDERSTANDING_CACHE.clear()
+
+    @staticmethod
+    def _mock_llm(model_name: str, rephrase: str) -> mock.Mock:
+        llm = mock.Mock()
+        llm.model_name = model_name
+        llm.invoke.return_value = f'{{"rephrased_query": "{rephrase}"}}'
+        return llm
+
+    def _rephrase(self, llm: mock.Mock) -> str:
+        understanding = get_query_understanding(
+            query="and for the launch?",
+            history_str="what did we decide about pricing",
+            detect_time_filter=False,
+            valid_sources=None,
+            llm=llm,
+        )
+        assert understanding is not None
+        return understanding.rephrased_query
+
+    def test_cached_per_model(self) -> None:
+        first_llm = self._mock_llm("openai/gpt-4", "launch decision")
+        second_llm = self._mock_llm("ollama/llama2", "launch plans")
+
+        self.assertEqual(self._rephrase(first_llm), "launch decision")
+        self.assertEqual(self._rephrase(second_llm), "launch plans")
+        self.assertEqual(self._rephrase(first_llm), "launch decision")
+
+        self.assertEqual(first_llm.invoke.call_count, 1)
+        self.assertEqual(second_llm.invoke.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+import contextvars
+import threading
+import time
+import unittest
+from collections.abc import Callable
+from collections.abc import Iterator
+
+from danswer.utils.threadpool_concurrency import FunctionCall
+from danswer.utils.threadpool_concurrency import get_executor
+from danswer.utils.threadpool_concurrency import run_functions_in_parallel
+from danswer.utils.threadpool_concurrency import run_functions_tuples_in_parallel
+from danswer.utils.threadpool_concurrency import run_in_pipeline
+
+_request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "request_id", default=None
+)
+
+
+class TestSharedExecutors(unittest.TestCase):
+    def test_results_in_order_and_threads_reused(self) -> None:
+        thread_ids: set[int] = set()
+
+        def _square(x: int) -> int:
+            thread_ids.add(threading.get_ident())
+            return x * x
+
+        for _ in range(5):
+            results = run_functions_tuples_in_parallel(
+                [(_square, (x,)) for x in range(20)], executor_name="test_reuse"
+            )
+            self.assertEqual(results, [x * x for x in range(20)])
+
+        self.assertLessEqual(len(thread_ids), get_executor("test_reuse").max_workers)
+        self.assertEqual(get_executor("test_reuse").stats().completed, 100)
+
+    def test_max_workers(self) -> None:
+        active = 0
+        max_active = 0
+        lock = threading.Lock()
+
+        def _work() -> None:
+            nonlocal active, max_active
+            with lock:
+                active += 1
+                max_active = max(max_active, active)
+            time.sleep(0.01)
+            with lock:
+                active -= 1
+
+        run_functions_tuples_in_parallel(
+            [(_work, ()) for _ in range(20)], max_workers=3
+        )
+        self.assertLessEqual(max_active, 3)
+
+    def test_contextvars_propagated(self) -> None:
+        _request_id.set("abc")
+        results = run_functions_tuples_in_parallel(
+            [(_request_id.get, ()) for _ in range(5)]
+        )
+        self.assertEqual(results, ["abc"] * 5)
+
+    def test_nested_calls_on_same_executor(self) -> None:
+        def _inner(x: int) -> int:
+            return x + 1
+
+        def _outer(x: int) -> list[int]:
+            return run_functions_tuples_in_parallel(
+                [(_inner, (x,)) for _ in range(3)], executor_name="test_nested"
+            )
+
+        executor = get_executor("test_nested")
+        # more outer calls than workers would deadlock if the inner calls waited on workers
+        results = run_functions_tuples_in_parallel(
+            [(_outer, (x,)) for x in range(executor.max_workers * 2)],
+            executor_name="test_nested",
+        )
+        self.assertEqual(results[3], [4, 4, 4])
+
+    def test_nested_calls_overlap(self) -> None:
+        def _outer() -> list[None]:
+            return run_functions_tuples_in_parallel(
+                [(time.sleep, (0.3,)) for _ in range(4)],
+                executor_name="test_nested_overlap",
+            )
+
+        # e.g. the LLM filter batches fanned out by a post processing task
+        start = time.monotonic()
+        run_functions_tuples_in_parallel(
+            [(_outer, ())], executor_name="test_nested_overlap"
+        )
+        self.assertLess(time.monotonic() - start, 0.9)
+
+    def test_function_calls_failures(self) -> None:
+        def _fail() -> None:
+            raise ValueError("failed")
+
+        ok_call = FunctionCall(lambda: 1)
+        failed_call = FunctionCall(_fail, executor_name="test_failures")
+        results = run_functions_in_parallel([ok_call, failed_call], allow_failures=True)
+        self.assertEqual(results[ok_call.result_id], 1)
+        self.assertIsNone(results[failed_call.result_id])
+
+        with self.assertRaises(ValueError):
+            run_functions_in_parallel([FunctionCall(_fail)])
+
+
+class TestRunInPipeline(unittest.TestCase):
+    def test_results_in_order(self) -> None:
+        def _slow_on_even(x: int) -> int:
+            if x % 2 == 0:
+                time.sleep(0.01)
+            return x * 2
+
+        results = list(
+            run_in_pipeline(range(20), [_slow_on_even, lambda x: x + 1], queue_size=2)
+        )
+        self.assertEqual(results, [x * 2 + 1 for x in range(20)])
+
+    def test_stages_overlap(self) -> None:
+        active: set[str] = set()
+        max_active = 0
+        lock = threading.Lock()
+
+        def _make_stage(stage_name: str) -> Callable[[int], int]:
+            def _stage(x: int) -> int:
+                nonlocal max_active
+                with lock:
+                    active.add(stage_name)
+                    max_active = max(max_active, len(active))
+                time.sleep(0.02)
+                with lock:
+                    active.discard(stage_name)
+                return x
+
+            return _stage
+
+        list(run_in_pipeline(range(10), [_make_stage("a"), _make_stage("b")]))
+        self.assertEqual(max_active, 2)
+
+    def test_exception_propagates_after_prior_results(self) -> None:
+        def _source() -> Iterator[int]:
+            yield 1
+            yield 2
+            raise ValueError("connector failed")
+
+        results = []
+        with self.assertRaises(ValueError):
+            for result in run_in_pipeline(_source(), [lambda x: x]):
+                results.append(result)
+        self.assertEqual(results, [1, 2])
+
+    def test_backpressure(self) -> None:
+        pulled = 0
+
+        def _source() -> Iterator[int]:
+            nonlocal pulled
+            for i in range(100):
+                pulled += 1
+                yield i
+
+        pipeline = run_in_pipeline(_source(), [lambda x: x], queue_size=1)
+        next(pipeline)
+        time.sleep(0.2)
+        # one yielded + at most one item held by / queued around each thread
+        self.assertLess(pulled, 10)
+        pipeline.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import time
+import unittest
+
+from danswer.utils.ttl_cache import get_cache_stats
+from danswer.utils.ttl_cache import TTLLRUCache
+
+
+class TestTTLLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self) -> None:
+        cache: TTLLRUCache[str, int] = TTLLRUCache(
+            name="test_lru", max_size=2, ttl_seconds=None
+        )
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+
+        stats = get_cache_stats()["test_lru"]
+        self.assertEqual((stats.size, stats.hits, stats.misses), (2, 3, 1))
+        self.assertAlmostEqual(stats.hit_rate, 0.75)
+
+    def test_expires_entries(self) -> None:
+        cache: TTLLRUCache[str, int] = TTLLRUCache(
+            name="test_ttl", max_size=10, ttl_seconds=0.05
+        )
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats().size, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
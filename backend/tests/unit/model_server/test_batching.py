@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+
+from model_server.batching import MicroBatcher
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_coalesces_concurrent_requests(self) -> None:
+        batch_sizes: list[int] = []
+
+        def _double(items: list[int]) -> list[int]:
+            batch_sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        batcher: MicroBatcher[int, int] = MicroBatcher(
+            name="test", process_batch=_double, max_batch_size=8, max_wait_ms=50
+        )
+
+        async def _run() -> list[list[int]]:
+            return await asyncio.gather(
+                *[batcher.submit([i, i + 100]) for i in range(6)]
+            )
+
+        results = asyncio.run(_run())
+
+        self.assertEqual(results, [[i * 2, (i + 100) * 2] for i in range(6)])
+        # requests are never split across batches
+        self.assertEqual(batch_sizes, [8, 4])
+        stats = batcher.stats()
+        self.assertEqual((stats.num_batches, stats.num_requests), (2, 6))
+        self.assertEqual(stats.queued_items, 0)
+
+    def test_failure_is_returned_to_every_request(self) -> None:
+        def _fail(items: list[int]) -> list[int]:
+            raise RuntimeError("model failed")
+
+        batcher: MicroBatcher[int, int] = MicroBatcher(
+            name="test_failure", process_batch=_fail, max_batch_size=8, max_wait_ms=10
+        )
+
+        async def _run() -> list:
+            return await asyncio.gather(
+                batcher.submit([1]), batcher.submit([2]), return_exceptions=True
+            )
+
+        results = asyncio.run(_run())
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
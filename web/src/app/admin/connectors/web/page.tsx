@@ -1,5 +1,6 @@
 "use client";
 
+import { useState } from "react";
 import useSWR, { useSWRConfig } from "swr";
 import * as Yup from "yup";
 
@@ -11,11 +12,18 @@ import {
 } from "@/components/icons/icons";
 import { fetcher } from "@/lib/fetcher";
 import {
+  Label,
   SelectorFormField,
+  SubLabel,
   TextFormField,
 } from "@/components/admin/connectors/Field";
+import { DefaultDropdown } from "@/components/Dropdown";
 import { HealthCheckBanner } from "@/components/health/healthcheck";
-import { ConnectorIndexingStatus, WebConfig } from "@/lib/types";
+import {
+  ConnectorIndexingStatus,
+  ValidInputTypes,
+  WebConfig,
+} from "@/lib/types";
 import { ConnectorsTable } from "@/components/admin/connectors/table/ConnectorsTable";
 import { ConnectorForm } from "@/components/admin/connectors/ConnectorForm";
 import { AdminPageTitle } from "@/components/admin/Title";
@@ -27,8 +35,23 @@ const SCRAPE_TYPE_TO_PRETTY_NAME = {
   sitemap: "Sitemap",
 };
 
+const REFRESH_METHOD_OPTIONS = [
+  {
+    name: "Full Re-fetch",
+    value: "load_state",
+    description: "Re-fetch and re-index every page of the website on each run.",
+  },
+  {
+    name: "Changed Pages Only",
+    value: "poll",
+    description:
+      "Re-fetch pages conditionally (ETag / Last-Modified, sitemap lastmod) and only re-index the pages whose content changed since the previous run.",
+  },
+];
+
 export default function Web() {
   const { mutate } = useSWRConfig();
+  const [inputType, setInputType] = useState<ValidInputTypes>("load_state");
 
   const {
     data: connectorIndexingStatuses,
@@ -57,9 +80,22 @@ export default function Web() {
         Step 1: Specify which websites to index
       </Title>
       <p className="text-sm mb-2">
-        We re-fetch the latest state of the website once a day.
+        We re-fetch the latest state of the website once a day. Choose
+        &quot;Changed Pages Only&quot; to skip re-indexing the pages that did
+        not change since the previous run.
       </p>
       <Card>
+        <div className="mb-4">
+          <Label>Refresh Method:</Label>
+          <SubLabel>
+            Can&apos;t be changed once the website has been added.
+          </SubLabel>
+          <DefaultDropdown
+            options={REFRESH_METHOD_OPTIONS}
+            selected={inputType}
+            onSelect={(selected) => setInputType(selected as ValidInputTypes)}
+          />
+        </div>
         <ConnectorForm<WebConfig>
           nameBuilder={(values) => `WebConnector-${values.base_url}`}
           ccPairNameBuilder={(values) => values.base_url}
@@ -69,7 +105,7 @@ export default function Web() {
           // associated with it.
           shouldCreateEmptyCredentialForConnector={true}
           source="web"
-          inputType="load_state"
+          inputType={inputType}
           formBody={
             <>
               <TextFormField
@@ -171,6 +207,14 @@ export default function Web() {
                   : "Recursive";
               },
             },
+            {
+              header: "Refresh Method",
+              key: "input_type",
+              getValue: (ccPairStatus) =>
+                ccPairStatus.connector.input_type === "poll"
+                  ? "Changed Pages Only"
+                  : "Full Re-fetch",
+            },
           ]}
           onUpdate={() => mutate("/api/manage/admin/connector/indexing-status")}
         />